@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+Approximate nearest-neighbor search with an IVF (inverted file) index.
+
+Vectors are clustered with spherical k-means into `nlist` cells; a query only scores
+the vectors in its `nprobe` closest cells. Rows are stored grouped by cell so each
+probe scans one contiguous slice. New sources can be added incrementally (new rows
+are assigned to the existing centroids and folded into the grouped layout on the
+next compact/save), and the index persists to a single .npz file.
+
+Usage:
+    python ann_index.py build <index.npz> <file.jsonl> [...] [--nlist N] [--nprobe N]
+    python ann_index.py add <index.npz> <file.jsonl> [...]
+    python ann_index.py search <index.npz> --like <chunk id> [--nprobe N]
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from vector_search import VectorIndex, normalize_rows, top_k
+
+DEFAULT_NPROBE = 8
+DEFAULT_ITERATIONS = 20
+
+# k-means is trained on a sample; more points than this add time, not quality
+MAX_TRAINING_POINTS = 256 * 1024
+
+def default_nlist(count):
+    """Rule of thumb: about 4 * sqrt(n) cells."""
+    return max(1, min(count, int(4 * np.sqrt(count))))
+
+def kmeans(vectors, k, iterations=DEFAULT_ITERATIONS, seed=0, max_points=MAX_TRAINING_POINTS):
+    """Spherical k-means on normalized vectors. Returns (k, dims) normalized centroids."""
+    rng = np.random.default_rng(seed)
+    if len(vectors) > max_points:
+        vectors = vectors[np.sort(rng.choice(len(vectors), max_points, replace=False))]
+
+    centroids = np.array(vectors[rng.choice(len(vectors), k, replace=False)], dtype=np.float32)
+
+    for _ in range(iterations):
+        assignments = assign(vectors, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, vectors)
+        counts = np.bincount(assignments, minlength=k)
+
+        # Re-seed empty cells from random points so every centroid stays in use
+        empty = np.flatnonzero(counts == 0)
+        if len(empty):
+            sums[empty] = vectors[rng.choice(len(vectors), len(empty), replace=False)]
+
+        centroids = normalize_rows(sums)
+
+    return centroids
+
+def assign(vectors, centroids, block=65536):
+    """Index of the most similar centroid for each vector."""
+    result = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), block):
+        result[start:start + block] = np.argmax(vectors[start:start + block] @ centroids.T, axis=1)
+    return result
+
+class IVFIndex:
+    """Inverted-file ANN index with the same search interface as VectorIndex."""
+
+    def __init__(self, centroids, nprobe=DEFAULT_NPROBE):
+        self.centroids = np.asarray(centroids, dtype=np.float32)
+        self.nprobe = nprobe
+        self.ids = []
+        self.payloads = []
+        self.positions = {}
+        self.vectors = np.zeros((0, self.centroids.shape[1]), dtype=np.float32)
+        self.assignments = np.zeros(0, dtype=np.int32)
+        self.alive = np.zeros(0, dtype=bool)
+        # Rows [0, sorted_count) are grouped by cell; offsets[c]:offsets[c + 1] is cell c
+        self.offsets = np.zeros(self.nlist + 1, dtype=np.int64)
+        self.sorted_count = 0
+
+    @property
+    def nlist(self):
+        return len(self.centroids)
+
+    @property
+    def dims(self):
+        return self.centroids.shape[1]
+
+    def __len__(self):
+        return int(self.alive.sum())
+
+    @classmethod
+    def build(cls, ids, payloads, vectors, nlist=None, nprobe=DEFAULT_NPROBE,
+              iterations=DEFAULT_ITERATIONS, seed=0):
+        """Train centroids on `vectors` and index them."""
+        if len(vectors) == 0:
+            raise ValueError("Cannot build an IVF index without any vectors")
+        vectors = normalize_rows(np.array(vectors, dtype=np.float32, copy=True))
+        nlist = min(nlist or default_nlist(len(vectors)), len(vectors))
+        index = cls(kmeans(vectors, nlist, iterations, seed), nprobe)
+        index.add(ids, payloads, vectors)
+        index.compact()
+        return index
+
+    @classmethod
+    def from_jsonl(cls, *paths, **options):
+        """Build an index from embedding JSONL files."""
+        exact = VectorIndex.from_jsonl(*paths)
+        return cls.build(exact.ids, exact.payloads, exact.vectors, **options)
+
+    def add(self, ids, payloads, vectors):
+        """Insert vectors, replacing any existing points with the same ids (within a batch, the last one wins)."""
+        ids = list(ids)
+        payloads = list(payloads)
+        vectors = normalize_rows(np.array(vectors, dtype=np.float32, ndmin=2, copy=True))
+        if len(ids) != len(payloads) or len(ids) != len(vectors):
+            raise ValueError("ids, payloads and vectors must have the same length")
+        if len(vectors) == 0:
+            return
+        if vectors.shape[1] != self.dims:
+            raise ValueError(f"Expected {self.dims}-dimensional vectors, got {vectors.shape[1]}")
+
+        last = {point: i for i, point in enumerate(ids)}
+        if len(last) < len(ids):
+            keep = sorted(last.values())
+            ids = [ids[i] for i in keep]
+            payloads = [payloads[i] for i in keep]
+            vectors = vectors[keep]
+        self.remove(point for point in ids if point in self.positions)
+
+        start = len(self.ids)
+        self.ids.extend(ids)
+        self.payloads.extend(payloads)
+        self.positions.update((point, start + i) for i, point in enumerate(ids))
+        self.vectors = np.concatenate([self.vectors, vectors])
+        self.assignments = np.concatenate([self.assignments, assign(vectors, self.centroids)])
+        self.alive = np.concatenate([self.alive, np.ones(len(vectors), dtype=bool)])
+
+    def remove(self, ids):
+        """Delete points by id (tombstoned until the next compact)."""
+        for point in list(ids):
+            row = self.positions.pop(point, None)
+            if row is not None:
+                self.alive[row] = False
+
+    def compact(self):
+        """Drop deleted rows and regroup every row by cell."""
+        live = np.flatnonzero(self.alive)
+        order = live[np.argsort(self.assignments[live], kind='stable')]
+
+        self.vectors = np.ascontiguousarray(self.vectors[order])
+        self.assignments = self.assignments[order]
+        self.alive = np.ones(len(order), dtype=bool)
+        self.ids = [self.ids[i] for i in order]
+        self.payloads = [self.payloads[i] for i in order]
+        self.positions = {point: i for i, point in enumerate(self.ids)}
+        self.offsets = np.zeros(self.nlist + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.assignments, minlength=self.nlist), out=self.offsets[1:])
+        self.sorted_count = len(order)
+
+    def vector(self, point):
+        return self.vectors[self.positions[point]]
+
+    def _candidates(self, cells):
+        """Row indices of every live vector in the given cells."""
+        parts = [np.arange(self.offsets[c], self.offsets[c + 1]) for c in cells]
+        if self.sorted_count < len(self.ids):
+            tail = np.arange(self.sorted_count, len(self.ids))
+            parts.append(tail[np.isin(self.assignments[tail], cells)])
+        rows = np.concatenate(parts) if parts else np.zeros(0, dtype=np.int64)
+        if self.sorted_count < len(self.ids) or not self.alive.all():
+            rows = rows[self.alive[rows]]
+        return rows
+
+    def search_batch(self, query_vectors, limit=10, with_payload=True, nprobe=None):
+        """Approximate top-k cosine matches for each query vector."""
+        queries = normalize_rows(np.array(query_vectors, dtype=np.float32, ndmin=2, copy=True))
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        probes = top_k(queries @ self.centroids.T, nprobe)
+        results = []
+
+        for query, cells in zip(queries, probes):
+            rows = self._candidates(cells)
+            scores = self.vectors[rows] @ query
+            best = top_k(scores[np.newaxis, :], limit)[0]
+            hits = []
+            for i in best:
+                point = {"id": self.ids[rows[i]], "score": float(scores[i])}
+                if with_payload:
+                    point["payload"] = self.payloads[rows[i]]
+                hits.append(point)
+            results.append(hits)
+
+        return results
+
+    def search(self, query_vector, limit=10, with_payload=True, nprobe=None):
+        return self.search_batch([query_vector], limit, with_payload, nprobe)[0]
+
+    def save(self, path):
+        """Compact and write the index to a single .npz file."""
+        self.compact()
+        meta = {"nprobe": self.nprobe, "ids": self.ids}
+        payloads = '\n'.join(json.dumps(payload, ensure_ascii=False) for payload in self.payloads)
+        with open(path, 'wb') as f:
+            np.savez(
+                f,
+                centroids=self.centroids,
+                vectors=self.vectors,
+                assignments=self.assignments,
+                meta=np.frombuffer(json.dumps(meta).encode('utf-8'), dtype=np.uint8),
+                payloads=np.frombuffer(payloads.encode('utf-8'), dtype=np.uint8),
+            )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            meta = json.loads(data['meta'].tobytes().decode('utf-8'))
+            payloads = data['payloads'].tobytes().decode('utf-8')
+            index = cls(data['centroids'], meta['nprobe'])
+            index.vectors = data['vectors']
+            index.assignments = data['assignments']
+
+        index.ids = meta['ids']
+        index.payloads = [json.loads(line) for line in payloads.split('\n')] if index.ids else []
+        index.positions = {point: i for i, point in enumerate(index.ids)}
+        index.alive = np.ones(len(index.ids), dtype=bool)
+        np.cumsum(np.bincount(index.assignments, minlength=index.nlist), out=index.offsets[1:])
+        index.sorted_count = len(index.ids)
+        return index
+
+def main():
+    """Build, extend or query an IVF index from the command line."""
+
+    parser = argparse.ArgumentParser(description="IVF approximate nearest-neighbor index over embedding files.")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    build = sub.add_parser('build', help="Train centroids and index embedding files")
+    build.add_argument('index')
+    build.add_argument('files', nargs='+')
+    build.add_argument('--nlist', type=int, help="Number of cells (default: 4 * sqrt(n))")
+    build.add_argument('--nprobe', type=int, default=DEFAULT_NPROBE, help=f"Cells probed per query (default: {DEFAULT_NPROBE})")
+    build.add_argument('--iterations', type=int, default=DEFAULT_ITERATIONS, help="k-means iterations")
+
+    add = sub.add_parser('add', help="Insert (or replace) the chunks of more embedding files")
+    add.add_argument('index')
+    add.add_argument('files', nargs='+')
+
+    search = sub.add_parser('search', help="Query with a stored chunk's vector")
+    search.add_argument('index')
+    search.add_argument('--like', required=True, help="Chunk id whose vector is the query")
+    search.add_argument('--limit', type=int, default=5)
+    search.add_argument('--nprobe', type=int)
+
+    args = parser.parse_args()
+
+    for path in getattr(args, 'files', []):
+        if not Path(path).exists():
+            print(f"Error: File '{path}' not found")
+            sys.exit(1)
+
+    if args.command == 'build':
+        started = time.perf_counter()
+        try:
+            index = IVFIndex.from_jsonl(*args.files, nlist=args.nlist, nprobe=args.nprobe, iterations=args.iterations)
+        except ValueError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        index.save(args.index)
+        print(f"Indexed {len(index)} vectors into {index.nlist} cells in {time.perf_counter() - started:.1f}s")
+        print(f"Index saved to: {args.index}")
+
+    elif args.command == 'add':
+        index = IVFIndex.load(args.index)
+        exact = VectorIndex.from_jsonl(*args.files)
+        index.add(exact.ids, exact.payloads, exact.vectors)
+        index.save(args.index)
+        print(f"Added {len(exact)} vectors; index now holds {len(index)}")
+
+    else:
+        index = IVFIndex.load(args.index)
+        if args.like not in index.positions:
+            print(f"Error: no chunk with id '{args.like}'")
+            sys.exit(1)
+        for rank, point in enumerate(index.search(index.vector(args.like), args.limit, nprobe=args.nprobe), 1):
+            print(f"{rank:2d}. {point['score']:.4f}  {point['id']}")
+
+if __name__ == "__main__":
+    main()
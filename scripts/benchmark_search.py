@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Benchmark local vector search settings against exact search.
+
+Reports recall@k (overlap with exact top-k) and p50/p99 single-query latency so
+index parameters can be chosen knowingly. Runs on embedding JSONL files, or on a
+synthetic clustered corpus when no files are given.
+
+Synthetic queries are held-out draws from the corpus distribution (never indexed
+themselves). With files, queries are corpus vectors plus Gaussian noise as large
+as the vector itself (--query-noise), so they are not near-copies of an indexed
+point. Only the prefix benchmark gives the synthetic corpus Matryoshka-like
+decaying variance (--decay), which favours prefix search.
+
+Usage:
+    python benchmark_search.py ann [file.jsonl ...] [--synthetic 200000] [--nlist 1024] [--nprobe 4 8 16 32]
+    python benchmark_search.py quant [file.jsonl ...] [--synthetic 100000] [--rescore 0 50 200]
+    python benchmark_search.py prefix [file.jsonl ...] [--prefix-dims 256 512] [--rerank 0 50 200]
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from ann_index import IVFIndex, default_nlist
+from quantization import QuantizedIndex
+from vector_search import PrefixIndex, VectorIndex, normalize_rows
+
+DEFAULT_QUERY_NOISE = 1.0
+DEFAULT_DECAY = 64
+
+def synthetic_corpus(count, dims=1536, clusters=None, seed=0, decay=None):
+    """
+    Clustered unit vectors, a rough stand-in for real embedding distributions.
+
+    With `decay`, the variance of dimension i is scaled by 1 / (1 + i / decay),
+    mimicking Matryoshka embeddings whose leading dimensions carry most of the
+    signal.
+    """
+    rng = np.random.default_rng(seed)
+    clusters = clusters or max(1, count // 200)
+    centers = rng.standard_normal((clusters, dims), dtype=np.float32)
+    vectors = centers[rng.integers(0, clusters, count)]
+    vectors += 0.8 * rng.standard_normal((count, dims), dtype=np.float32)
+    if decay:
+        vectors *= (1 / np.sqrt(1 + np.arange(dims) / decay)).astype(np.float32)
+    return normalize_rows(vectors)
+
+def perturbed_queries(vectors, count, noise=DEFAULT_QUERY_NOISE, seed=1):
+    """Corpus vectors plus Gaussian noise whose expected norm is `noise` (the vectors are unit length)."""
+    rng = np.random.default_rng(seed)
+    picks = np.asarray(vectors[rng.integers(0, len(vectors), count)], dtype=np.float32)
+    jitter = noise * rng.standard_normal(picks.shape, dtype=np.float32) / np.sqrt(picks.shape[1])
+    return normalize_rows(picks + jitter)
+
+def load_corpus(args, decay=None):
+    """(exact index, query vectors) for the given files, or for a synthetic corpus."""
+    if args.files:
+        for path in args.files:
+            if not Path(path).exists():
+                print(f"Error: File '{path}' not found")
+                sys.exit(1)
+        exact = VectorIndex.from_jsonl(*args.files)
+        return exact, perturbed_queries(exact.vectors, args.queries, args.query_noise)
+
+    # One draw, split: the queries come from the same clusters but are not in the index
+    vectors = synthetic_corpus(args.synthetic + args.queries, args.dims, max(1, args.synthetic // 200), decay=decay)
+    ids = [str(i) for i in range(args.synthetic)]
+    return VectorIndex(ids, [{} for _ in ids], vectors[:args.synthetic]), vectors[args.synthetic:]
+
+def format_bytes(size):
+    """Human-readable size; small corpora would otherwise all print as 0.0 MB."""
+    if size < 1024 * 1024:
+        return f"{size / 1024:.1f} KB"
+    return f"{size / 1024 / 1024:.1f} MB"
+
+def exact_neighbours(exact, queries, k):
+    return [[hit['id'] for hit in hits] for hits in exact.search_batch(queries, k, with_payload=False)]
+
+def recall_at_k(truth, results):
+    """Mean fraction of the exact top-k found in each result list."""
+    overlaps = [len(set(t) & {hit['id'] for hit in r}) / len(t) for t, r in zip(truth, results) if t]
+    return float(np.mean(overlaps)) if overlaps else 0.0
+
+def time_queries(search, queries):
+    """Run queries one at a time; returns (results, latencies in ms)."""
+    results = []
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        results.append(search(query))
+        latencies.append((time.perf_counter() - started) * 1000)
+    return results, np.array(latencies)
+
+def print_row(label, recall, latencies, extra=''):
+    p50, p99 = np.percentile(latencies, [50, 99])
+    print(f"{label:<28} {recall:>9.3f} {p50:>9.2f} {p99:>9.2f}  {extra}")
+
+def print_header(k):
+    print(f"{'setting':<28} {f'recall@{k}':>9} {'p50 ms':>9} {'p99 ms':>9}")
+    print('-' * 60)
+
+def benchmark_ann(args):
+    exact, queries = load_corpus(args)
+    k = args.k
+    print(f"Corpus: {len(exact)} vectors x {exact.dims} dims, {len(queries)} queries\n")
+
+    truth = exact_neighbours(exact, queries, k)
+    print_header(k)
+    results, latencies = time_queries(lambda q: exact.search(q, k, with_payload=False), queries)
+    print_row('exact', recall_at_k(truth, results), latencies)
+
+    for nlist in args.nlist or [default_nlist(len(exact))]:
+        started = time.perf_counter()
+        index = IVFIndex.build(exact.ids, exact.payloads, exact.vectors, nlist=nlist, iterations=args.iterations)
+        build_seconds = time.perf_counter() - started
+        for nprobe in args.nprobe:
+            if nprobe > index.nlist:
+                continue
+            results, latencies = time_queries(
+                lambda q: index.search(q, k, with_payload=False, nprobe=nprobe), queries
+            )
+            print_row(f"ivf nlist={index.nlist} nprobe={nprobe}", recall_at_k(truth, results), latencies,
+                      f"build {build_seconds:.1f}s")
+
+def benchmark_quant(args):
+    exact, queries = load_corpus(args)
+    k = args.k
+    float_bytes = exact.vectors.nbytes
+    print(f"Corpus: {len(exact)} vectors x {exact.dims} dims, {len(queries)} queries")
+    print(f"float32 vectors: {format_bytes(float_bytes)}\n")
+
+    truth = exact_neighbours(exact, queries, k)
+    print_header(k)
+    results, latencies = time_queries(lambda q: exact.search(q, k, with_payload=False), queries)
+    print_row('exact float32', recall_at_k(truth, results), latencies, format_bytes(float_bytes))
+
+    methods = [('sq', {})]
+    if exact.dims % args.m == 0:
+        methods.append(('pq', {"m": args.m}))
+    else:
+        print(f"(skipping pq: {exact.dims} dims not divisible by m={args.m})")
+
+    for method, options in methods:
+        if method == 'pq' and len(exact) < 256:
+            print("(skipping pq: fewer than 256 vectors to train its codebooks)")
+            continue
+        index = QuantizedIndex.build(exact.ids, exact.payloads, exact.vectors, method=method, **options)
+        label = 'int8 sq' if method == 'sq' else f"pq m={args.m}"
+        size = f"{format_bytes(index.code_bytes())} codes ({float_bytes / index.code_bytes():.0f}x smaller)"
+        for rescore in args.rescore:
+            results, latencies = time_queries(
+                lambda q: index.search(q, k, with_payload=False, rescore=rescore), queries
+            )
+            print_row(f"{label} rescore={rescore}", recall_at_k(truth, results), latencies, size)
+
+def benchmark_prefix(args):
+    exact, queries = load_corpus(args, decay=args.decay)
+    k = args.k
+    print(f"Corpus: {len(exact)} vectors x {exact.dims} dims, {len(queries)} queries\n")
+
+    truth = exact_neighbours(exact, queries, k)
+    print_header(k)
+    results, latencies = time_queries(lambda q: exact.search(q, k, with_payload=False), queries)
+    print_row(f"full {exact.dims} dims", recall_at_k(truth, results), latencies,
+              f"{format_bytes(exact.vectors.nbytes)} scanned")
+
+    for dims in args.prefix_dims:
+        if dims > exact.dims:
+            continue
+        index = PrefixIndex(exact.ids, exact.payloads, exact.vectors, dims)
+        scanned = f"{format_bytes(index.prefix.nbytes)} scanned"
+        for rerank in args.rerank:
+            results, latencies = time_queries(
+                lambda q: index.search(q, k, with_payload=False, rerank=rerank), queries
+            )
+            print_row(f"prefix {dims} rerank={rerank}", recall_at_k(truth, results), latencies, scanned)
+
+def add_corpus_arguments(parser):
+    parser.add_argument('files', nargs='*', help="Embedding JSONL files (default: synthetic corpus)")
+    parser.add_argument('--synthetic', type=int, default=100000, help="Synthetic corpus size (default: 100000)")
+    parser.add_argument('--dims', type=int, default=1536, help="Synthetic vector dimensions (default: 1536)")
+    parser.add_argument('--queries', type=int, default=200, help="Number of queries (default: 200)")
+    parser.add_argument('--query-noise', type=float, default=DEFAULT_QUERY_NOISE,
+                        help=f"Norm of the noise added to file vectors to make queries (default: {DEFAULT_QUERY_NOISE})")
+    parser.add_argument('-k', type=int, default=10, help="Neighbours per query (default: 10)")
+
+def main():
+    """Run a benchmark from the command line."""
+
+    parser = argparse.ArgumentParser(description="Benchmark local vector search against exact search.")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    ann = sub.add_parser('ann', help="IVF recall and latency across nlist/nprobe settings")
+    add_corpus_arguments(ann)
+    ann.add_argument('--nlist', type=int, nargs='+', help="Cell counts to try (default: 4 * sqrt(n))")
+    ann.add_argument('--nprobe', type=int, nargs='+', default=[1, 4, 8, 16, 32], help="Probe counts to try")
+    ann.add_argument('--iterations', type=int, default=10, help="k-means iterations (default: 10)")
+    ann.set_defaults(run=benchmark_ann)
+
+    quant = sub.add_parser('quant', help="Memory saved and recall lost by int8 / product quantization")
+    add_corpus_arguments(quant)
+    quant.add_argument('--rescore', type=int, nargs='+', default=[0, 50, 200], help="Shortlist sizes to rescore")
+    quant.add_argument('--m', type=int, default=96, help="PQ subvectors (default: 96)")
+    quant.set_defaults(run=benchmark_quant)
+
+    prefix = sub.add_parser('prefix', help="Two-stage Matryoshka prefix search: recall vs latency")
+    add_corpus_arguments(prefix)
+    prefix.add_argument('--prefix-dims', type=int, nargs='+', default=[128, 256, 512], help="Prefix sizes to try")
+    prefix.add_argument('--rerank', type=int, nargs='+', default=[0, 50, 200], help="Rerank shortlist sizes")
+    prefix.add_argument('--decay', type=float, default=DEFAULT_DECAY,
+                        help=f"Synthetic variance decay length in dimensions, 0 for none (default: {DEFAULT_DECAY})")
+    prefix.set_defaults(run=benchmark_prefix)
+
+    args = parser.parse_args()
+    args.run(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,387 @@
+#!/usr/bin/env python3
+"""
+Local keyword search: a positional inverted index over chunk `content` with BM25
+scoring, plus reciprocal rank fusion with vector results (hybrid search).
+
+Reproduces the keyword half of the Azure `hybridSearch` offline. Postings are
+delta-encoded and stored as varints in three streams (document gaps, term
+frequencies, position gaps), so an index is a few bytes per token and a term's
+postings decode in one vectorized pass. Quoted phrases ("chronological
+snobbery") must match at consecutive positions; other words are scored OR-style.
+
+Fusion ranks each document by sum(1 / (k + rank)) over the keyword and vector
+result lists, as Azure and Qdrant do for hybrid queries. Build the keyword index
+from the same files as the vector index so point ids line up.
+
+Usage:
+    python bm25_index.py build <index.npz> <file.jsonl> [...]
+    python bm25_index.py search <index.npz> --query '"chronological snobbery"' [--query ...]
+    python bm25_index.py search <index.npz> --query "What is the nature of virtue?" --hybrid <file_embeddings.jsonl>
+"""
+
+import argparse
+import json
+import re
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from convert_to_qdrant import chunk_id, fallback_slug, loads
+from vector_search import top_k
+
+DEFAULT_K1 = 1.2
+DEFAULT_B = 0.75
+
+# Reciprocal rank fusion constant (the usual default) and the depth fused per list
+RRF_K = 60
+DEFAULT_CANDIDATES = 50
+
+TOKEN_PATTERN = re.compile(r"[^\W_]+(?:'[^\W_]+)*")
+PHRASE_PATTERN = re.compile(r'"([^"]+)"')
+
+# Payload keys that are too large (or meaningless) to keep in a keyword index
+DROPPED_KEYS = ('id', 'embedding', 'embedding_row')
+
+def tokenize(text):
+    """Lowercased word tokens; curly apostrophes are folded so "Lewis’s" matches "Lewis's"."""
+    return TOKEN_PATTERN.findall(text.lower().replace('’', "'"))
+
+def parse_query(query):
+    """Split a query into (free terms, phrases); each phrase is a list of terms."""
+    phrases = [tokenize(phrase) for phrase in PHRASE_PATTERN.findall(query)]
+    terms = tokenize(PHRASE_PATTERN.sub(' ', query))
+    return terms, [phrase for phrase in phrases if phrase]
+
+def value_lengths(values):
+    """Bytes each value takes as a varint."""
+    values = np.asarray(values, dtype=np.uint64)
+    lengths = np.ones(len(values), dtype=np.int64)
+    for i in range(1, 10):
+        lengths += (values >> np.uint64(7 * i)) > 0
+    return lengths
+
+def encode_varints(values):
+    """LEB128-style varints (7 bits per byte, high bit = more bytes follow) for non-negative ints."""
+    values = np.asarray(values, dtype=np.uint64)
+    if not len(values):
+        return np.zeros(0, dtype=np.uint8)
+    groups = np.stack([(values >> np.uint64(7 * i)) & np.uint64(0x7f) for i in range(10)], axis=1).astype(np.uint8)
+    lengths = value_lengths(values)
+    used = np.arange(10) < lengths[:, None]
+    more = np.arange(10) < (lengths - 1)[:, None]
+    groups[more] |= 0x80
+    return groups[used]
+
+def decode_varints(data):
+    """Inverse of encode_varints, vectorized over the whole byte string."""
+    data = np.asarray(data, dtype=np.uint8)
+    if not len(data):
+        return np.zeros(0, dtype=np.int64)
+    single = data < 0x80
+    if single.all():
+        # Common case for frequencies and dense postings: every value fits in one byte
+        return data.astype(np.int64)
+    ends = np.flatnonzero(single)
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    # Byte position within its value gives the shift
+    shift = np.arange(len(data)) - np.repeat(starts, ends - starts + 1)
+    parts = (data & 0x7f).astype(np.int64) << (7 * shift)
+    return np.add.reduceat(parts, starts)
+
+class BM25Index:
+    """Immutable positional BM25 index; build with `build`/`from_jsonl`, persist with `save`/`load`."""
+
+    def __init__(self, ids, payloads, vocabulary, doc_lengths, streams, offsets, k1=DEFAULT_K1, b=DEFAULT_B):
+        self.ids = list(ids)
+        self.payloads = list(payloads)
+        self.vocabulary = vocabulary
+        self.terms = {term: i for i, term in enumerate(vocabulary)}
+        self.doc_lengths = doc_lengths
+        self.average_length = float(doc_lengths.mean()) if len(doc_lengths) else 0.0
+        # streams: (document gaps, term frequencies, position gaps); offsets: per-term byte offsets into each
+        self.streams = streams
+        self.offsets = offsets
+        self.df = np.diff(offsets[3])
+        self.k1 = k1
+        self.b = b
+        self.positions = {point: i for i, point in enumerate(self.ids)}
+
+    @classmethod
+    def build(cls, ids, payloads, texts, **options):
+        """Index `texts` (one per id)."""
+        terms = {}
+        term_ids = []
+        doc_lengths = np.zeros(len(ids), dtype=np.int64)
+        for doc, text in enumerate(texts):
+            tokens = tokenize(text or '')
+            doc_lengths[doc] = len(tokens)
+            term_ids.append(np.fromiter((terms.setdefault(token, len(terms)) for token in tokens),
+                                        dtype=np.int64, count=len(tokens)))
+
+        term_array = np.concatenate(term_ids) if term_ids else np.zeros(0, dtype=np.int64)
+        doc_array = np.repeat(np.arange(len(ids)), doc_lengths)
+        pos_array = np.arange(len(term_array)) - np.repeat(np.cumsum(doc_lengths) - doc_lengths, doc_lengths)
+
+        # Occurrences grouped by term, then document, then position
+        order = np.lexsort((pos_array, doc_array, term_array))
+        term_array, doc_array, pos_array = term_array[order], doc_array[order], pos_array[order]
+
+        # One posting per (term, document)
+        new_posting = np.ones(len(term_array), dtype=bool)
+        new_posting[1:] = (term_array[1:] != term_array[:-1]) | (doc_array[1:] != doc_array[:-1])
+        posting_starts = np.flatnonzero(new_posting)
+        posting_terms = term_array[posting_starts]
+        posting_docs = doc_array[posting_starts]
+        tfs = np.diff(np.append(posting_starts, len(term_array)))
+
+        new_term = np.ones(len(posting_terms), dtype=bool)
+        new_term[1:] = posting_terms[1:] != posting_terms[:-1]
+        doc_gaps = np.where(new_term, posting_docs, np.diff(posting_docs, prepend=0))
+        position_gaps = np.where(new_posting, pos_array, np.diff(pos_array, prepend=0))
+
+        # Byte offsets of every term's slice in each stream
+        vocab_size = len(terms)
+        offsets = []
+        streams = []
+        for values, owners in ((doc_gaps, posting_terms), (tfs, posting_terms), (position_gaps, term_array)):
+            encoded = encode_varints(values)
+            lengths = np.bincount(owners, weights=value_lengths(values), minlength=vocab_size).astype(np.int64)
+            offsets.append(np.concatenate(([0], np.cumsum(lengths))))
+            streams.append(encoded)
+        offsets.append(np.concatenate(([0], np.cumsum(np.bincount(posting_terms, minlength=vocab_size)))))
+
+        vocabulary = [None] * vocab_size
+        for term, i in terms.items():
+            vocabulary[i] = term
+        return cls(ids, payloads, vocabulary, doc_lengths.astype(np.float32), tuple(streams), tuple(offsets), **options)
+
+    @classmethod
+    def from_jsonl(cls, *paths, **options):
+        """Index the chunks of one or more JSONL files (raw, embeddings or Qdrant-ready)."""
+        ids = []
+        payloads = []
+        texts = []
+        for path in paths:
+            fallback = fallback_slug(path)
+            with open(path, 'rb') as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    chunk = loads(line)
+                    ids.append(chunk_id(chunk, fallback))
+                    payloads.append({key: value for key, value in chunk.items() if key not in DROPPED_KEYS})
+                    texts.append(chunk.get('content') or '')
+        return cls.build(ids, payloads, texts, **options)
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def index_bytes(self):
+        return sum(stream.nbytes for stream in self.streams)
+
+    def _slice(self, stream, term):
+        offsets = self.offsets[stream]
+        return self.streams[stream][offsets[term]:offsets[term + 1]]
+
+    def postings(self, term):
+        """(documents, term frequencies) of a term id."""
+        return np.cumsum(decode_varints(self._slice(0, term))), decode_varints(self._slice(1, term))
+
+    def term_positions(self, term):
+        """(documents, term frequencies, positions) with positions absolute within each document."""
+        docs, tfs = self.postings(term)
+        gaps = decode_varints(self._slice(2, term))
+        running = np.cumsum(gaps)
+        before = np.concatenate(([0], running[np.cumsum(tfs)[:-1] - 1]))
+        return docs, tfs, running - np.repeat(before, tfs)
+
+    def phrase_documents(self, phrase):
+        """Documents where the phrase's terms occur at consecutive positions."""
+        if any(term not in self.terms for term in phrase):
+            return np.zeros(0, dtype=np.int64)
+        term_ids = [self.terms[term] for term in phrase]
+        if len(term_ids) == 1:
+            return self.postings(term_ids[0])[0]
+
+        # Key each occurrence by (document, phrase start); a match is a key every term produces
+        width = int(self.doc_lengths.max()) + len(phrase) + 1
+        keys = None
+        for i, term in enumerate(term_ids):
+            docs, tfs, positions = self.term_positions(term)
+            term_keys = np.repeat(docs, tfs) * width + positions - i + len(phrase)
+            keys = term_keys if keys is None else np.intersect1d(keys, term_keys, assume_unique=False)
+            if not len(keys):
+                break
+        return np.unique(keys // width)
+
+    def score(self, terms):
+        """BM25 score of every document for a bag of terms (unknown terms are ignored)."""
+        scores = np.zeros(len(self.ids), dtype=np.float32)
+        count = len(self.ids)
+        norms = self.k1 * (1 - self.b + self.b * self.doc_lengths / (self.average_length or 1))
+        for term in set(terms):
+            term_id = self.terms.get(term)
+            if term_id is None:
+                continue
+            docs, tfs = self.postings(term_id)
+            df = len(docs)
+            idf = np.log(1 + (count - df + 0.5) / (df + 0.5))
+            scores[docs] += (idf * tfs * (self.k1 + 1) / (tfs + norms[docs])).astype(np.float32)
+        return scores
+
+    def _format(self, rows, scores, with_payload):
+        results = []
+        for row, score in zip(rows, scores):
+            point = {"id": self.ids[row], "score": float(score)}
+            if with_payload:
+                point["payload"] = self.payloads[row]
+            results.append(point)
+        return results
+
+    def search_batch(self, queries, limit=10, with_payload=True):
+        """Top-k BM25 matches for each query string, as lists of {id, score, payload}."""
+        results = []
+        for query in queries:
+            terms, phrases = parse_query(query)
+            scores = self.score(terms + [term for phrase in phrases for term in phrase])
+            candidates = np.flatnonzero(scores > 0)
+            for phrase in phrases:
+                candidates = np.intersect1d(candidates, self.phrase_documents(phrase), assume_unique=True)
+            best = top_k(scores[candidates][np.newaxis, :], limit)[0]
+            results.append(self._format(candidates[best], scores[candidates[best]], with_payload))
+        return results
+
+    def search(self, query, limit=10, with_payload=True):
+        """Top-k BM25 matches for one query string."""
+        return self.search_batch([query], limit, with_payload)[0]
+
+    def save(self, path):
+        """Write the index to a single .npz file."""
+        meta = {"ids": self.ids, "vocabulary": self.vocabulary, "k1": self.k1, "b": self.b}
+        payloads = '\n'.join(json.dumps(payload, ensure_ascii=False) for payload in self.payloads)
+        with open(path, 'wb') as f:
+            np.savez(
+                f,
+                doc_lengths=self.doc_lengths,
+                docs=self.streams[0], tfs=self.streams[1], positions=self.streams[2],
+                doc_offsets=self.offsets[0], tf_offsets=self.offsets[1], position_offsets=self.offsets[2],
+                posting_offsets=self.offsets[3],
+                meta=np.frombuffer(json.dumps(meta, ensure_ascii=False).encode('utf-8'), dtype=np.uint8),
+                payloads=np.frombuffer(payloads.encode('utf-8'), dtype=np.uint8),
+            )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            meta = json.loads(data['meta'].tobytes().decode('utf-8'))
+            payloads = data['payloads'].tobytes().decode('utf-8')
+            streams = (data['docs'], data['tfs'], data['positions'])
+            offsets = (data['doc_offsets'], data['tf_offsets'], data['position_offsets'], data['posting_offsets'])
+            doc_lengths = data['doc_lengths']
+        payloads = [json.loads(line) for line in payloads.split('\n')] if meta['ids'] else []
+        return cls(meta['ids'], payloads, meta['vocabulary'], doc_lengths, streams, offsets, meta['k1'], meta['b'])
+
+def rrf_fuse(rankings, limit=10, k=RRF_K, weights=None):
+    """
+    Reciprocal rank fusion of several ranked result lists.
+
+    Each document scores sum(weight / (k + rank)) over the lists it appears in
+    (rank starting at 1); the payload comes from the first list that has one.
+    """
+    weights = weights or [1.0] * len(rankings)
+    scores = {}
+    payloads = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, point in enumerate(ranking, 1):
+            scores[point['id']] = scores.get(point['id'], 0.0) + weight / (k + rank)
+            if 'payload' in point:
+                payloads.setdefault(point['id'], point['payload'])
+    fused = sorted(scores.items(), key=lambda item: -item[1])[:limit]
+    return [{"id": point, "score": score, **({"payload": payloads[point]} if point in payloads else {})}
+            for point, score in fused]
+
+class HybridSearch:
+    """Keyword (BM25) plus vector search, fused with RRF."""
+
+    def __init__(self, keyword, vector, candidates=DEFAULT_CANDIDATES, k=RRF_K, weights=(1.0, 1.0)):
+        self.keyword = keyword
+        self.vector = vector
+        self.candidates = candidates
+        self.k = k
+        self.weights = list(weights)
+
+    def search_batch(self, queries, query_vectors, limit=10, with_payload=True):
+        """Fused top-k for each (query text, query vector) pair."""
+        depth = max(limit, self.candidates)
+        keyword_hits = self.keyword.search_batch(queries, depth, with_payload)
+        vector_hits = self.vector.search_batch(query_vectors, depth, with_payload)
+        return [rrf_fuse([kw, vec], limit, self.k, self.weights) for kw, vec in zip(keyword_hits, vector_hits)]
+
+    def search(self, query, query_vector, limit=10, with_payload=True):
+        return self.search_batch([query], [query_vector], limit, with_payload)[0]
+
+def main():
+    """Build or query a BM25 index from the command line."""
+
+    parser = argparse.ArgumentParser(description="BM25 keyword index over chunk JSONL files, with hybrid fusion.")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    build = sub.add_parser('build', help="Index the content of JSONL files")
+    build.add_argument('index')
+    build.add_argument('files', nargs='+')
+
+    search = sub.add_parser('search', help="Keyword or hybrid search")
+    search.add_argument('index')
+    search.add_argument('--query', action='append', required=True, help='Query text; quote phrases ("...") ; repeatable')
+    search.add_argument('--limit', type=int, default=5, help="Results per query (default: 5)")
+    search.add_argument('--hybrid', nargs='+', metavar='FILE',
+                        help="Fuse with exact vector search over these embedding files (queries are embedded with OpenAI)")
+    search.add_argument('--candidates', type=int, default=DEFAULT_CANDIDATES,
+                        help=f"Results per list fed into fusion (default: {DEFAULT_CANDIDATES})")
+    search.add_argument('--json', action='store_true', help="Print results as JSON")
+
+    args = parser.parse_args()
+
+    for path in getattr(args, 'files', None) or getattr(args, 'hybrid', None) or []:
+        if not Path(path).exists():
+            print(f"Error: File '{path}' not found")
+            sys.exit(1)
+
+    if args.command == 'build':
+        started = time.perf_counter()
+        index = BM25Index.from_jsonl(*args.files)
+        index.save(args.index)
+        print(f"Indexed {len(index)} chunks, {len(index.vocabulary):,} terms, "
+              f"{int(index.doc_lengths.sum()):,} tokens in {time.perf_counter() - started:.1f}s")
+        print(f"Postings: {index.index_bytes / 1e6:.2f} MB")
+        print(f"Index saved to: {args.index}")
+        return
+
+    from vector_search import print_results
+
+    index = BM25Index.load(args.index)
+    started = time.perf_counter()
+    if args.hybrid:
+        from vector_search import VectorIndex, embed_queries
+        hybrid = HybridSearch(index, VectorIndex.from_jsonl(*args.hybrid), args.candidates)
+        vectors = embed_queries(args.query)
+        started = time.perf_counter()
+        results = hybrid.search_batch(args.query, vectors, args.limit)
+    else:
+        results = index.search_batch(args.query, args.limit)
+    elapsed = time.perf_counter() - started
+    print(f"{len(args.query)} queries in {elapsed * 1000:.1f} ms", file=sys.stderr)
+
+    if args.json:
+        print(json.dumps([{"query": query, "results": hits} for query, hits in zip(args.query, results)],
+                         indent=2, ensure_ascii=False))
+        return
+
+    for query, hits in zip(args.query, results):
+        print_results(query, hits)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+Stream a Qdrant-ready JSONL file straight into a Qdrant collection.
+
+Replaces posting the whole file to the backend's /upload-jsonl endpoint (one
+request body holding every chunk, then one upsert per point). The file is read
+line by line and upserted in batches of --batch-size points over a pooled
+keep-alive session (see qdrant_rest.py), with --workers batches in flight and
+gzip-compressed request bodies. Memory stays proportional to the batches in
+flight, not the file.
+
+Every batch Qdrant acknowledges is recorded in `<input>.upload.jsonl`. An
+interrupted or partly failed run resumes by skipping the acknowledged batches
+(use --restart to upload everything again). Upserts are idempotent, so a batch
+that was applied but not yet recorded is simply sent twice. The checkpoint
+records a fingerprint of the input (size, modification time and a hash of its
+first megabyte, plus the same for a vector sidecar); if the file has been
+regenerated since, the upload starts over instead of skipping batches that now
+hold different points.
+
+Accepts `_qdrant.jsonl` files from convert_to_qdrant.py (inline or sidecar
+layout) and raw `_embeddings.jsonl` files, which are converted on the fly.
+
+Usage:
+    python bulk_upload.py <file_qdrant.jsonl> [--collection documents] [--batch-size 256] [--workers 4]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+
+import numpy as np
+
+from convert_to_qdrant import fallback_slug, loads, source_slug, to_qdrant
+from jsonl_checkpoint import CheckpointWriter, recover_jsonl
+from qdrant_rest import DEFAULT_COLLECTION, QdrantError, QdrantREST
+from scripture_refs import parse as parse_scripture_refs
+from vector_store import ChunkVectors, sidecar_path
+
+DEFAULT_BATCH_SIZE = 256
+DEFAULT_WORKERS = 4
+
+# Errors reported per run; the rest are only counted
+MAX_REPORTED_ERRORS = 10
+
+# Bytes of the input hashed into its checkpoint fingerprint
+FINGERPRINT_BYTES = 1024 * 1024
+
+def checkpoint_path(input_file):
+    """Acknowledged-batch log that sits next to the input file."""
+    path = Path(input_file)
+    return path.with_name(f"{path.name}.upload.jsonl")
+
+def file_fingerprint(path):
+    """Size, mtime and a hash of the first FINGERPRINT_BYTES of a file, or None if it doesn't exist."""
+    try:
+        stat = os.stat(path)
+        with open(path, 'rb') as f:
+            head = hashlib.sha256(f.read(FINGERPRINT_BYTES)).hexdigest()
+    except FileNotFoundError:
+        return None
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "head": head}
+
+def input_fingerprint(input_file):
+    """Fingerprint of an input file and its vector sidecar, stored with the checkpoint settings."""
+    return {"jsonl": file_fingerprint(input_file), "vectors": file_fingerprint(sidecar_path(input_file))}
+
+def qdrant_point(chunk, fallback, source_id=None, source=None):
+    """
+    {id, vector, payload} for one chunk, in the payload layout the backend writes.
+
+    `community_source_id` is the source slug (`source`, or author surname and title)
+    with dashes, which sync_source.py uses to find a source's points again.
+    `scripture_ranges` holds the verse-ordinal intervals of `scripture_refs` (see
+    scripture_refs.py).
+    """
+    if 'point_id' not in chunk:
+        chunk = to_qdrant(chunk, fallback)
+    metadata = chunk.get('metadata') or {}
+    payload = {
+        "chunk_id": chunk['id'],
+        "source_title": chunk.get('source_title'),
+        "author": chunk.get('author'),
+        "year": chunk.get('year'),
+        "genre": chunk.get('genre'),
+        "content": chunk['content'],
+        "chunk_index": chunk.get('chunk_index'),
+        "structure_path": chunk.get('structure_path') or '',
+        "source_type": metadata.get('source_type') or 'unknown',
+        "syntopicon_tags": metadata.get('syntopicon_tags') or [],
+        "rhetorical_function": metadata.get('rhetorical_function') or [],
+        "scripture_refs": metadata.get('scripture_refs') or [],
+        "scripture_ranges": [list(interval) for interval in parse_scripture_refs(metadata.get('scripture_refs'))],
+        "topics": metadata.get('topics') or [],
+        "entities": metadata.get('entities') or {},
+        "is_community": True,
+        "community_source_id": (source or source_slug(chunk, fallback)).replace('_', '-'),
+    }
+    if source_id:
+        payload['source_id'] = source_id
+    vector = chunk['embedding']
+    if isinstance(vector, np.ndarray):
+        vector = np.ascontiguousarray(vector, dtype=np.float32)
+    return {"id": chunk['point_id'], "vector": vector, "payload": payload}
+
+class UploadCheckpoint:
+    """
+    Durable log of acknowledged batches.
+
+    The first line records the settings batches were numbered under; a log written
+    with a different collection, URL, batch size or input file is discarded.
+    """
+
+    def __init__(self, path, settings, restart=False):
+        self.path = path
+        self.acked = set()
+        rows = [] if restart else recover_jsonl(path)
+        resume = bool(rows) and rows[0] == settings
+        if rows and not resume:
+            print(f"Existing checkpoint {path} was written with different settings or another version of the input, "
+                  "starting over")
+        if resume:
+            self.acked = {row['batch'] for row in rows[1:]}
+        self.writer = CheckpointWriter(path, resume=resume)
+        if not resume:
+            self.writer.append([json.dumps(settings) + '\n'])
+
+    def ack(self, batch, first_line, last_line, points):
+        self.writer.append([json.dumps({"batch": batch, "lines": [first_line, last_line], "points": points}) + '\n'])
+        self.acked.add(batch)
+
+    def close(self):
+        self.writer.close()
+
+def iter_batches(infile, batch_size, skip=()):
+    """
+    Yield (batch number, first line, last line, raw lines) for every batch not in `skip`.
+
+    Batches are numbered by position (every `batch_size` non-empty lines), so the
+    numbering is the same on every run; skipped batches are never parsed.
+    """
+    batch = []
+    first_line = None
+    number = 0
+    for line_num, line in enumerate(infile, 1):
+        if not line.strip():
+            continue
+        if first_line is None:
+            first_line = line_num
+        batch.append((line_num, line))
+        if len(batch) >= batch_size:
+            if number not in skip:
+                yield number, first_line, line_num, batch
+            number += 1
+            batch = []
+            first_line = None
+    if batch and number not in skip:
+        yield number, first_line, batch[-1][0], batch
+
+def build_points(lines, vectors, fallback, source_id=None):
+    """Parse a batch's lines into points; returns (points, error messages)."""
+    points = []
+    errors = []
+    for line_num, line in lines:
+        try:
+            chunk = loads(line)
+            row = chunk.pop('embedding_row', None)
+            if row is not None:
+                chunk['embedding'] = vectors.vectors[row]
+            points.append(qdrant_point(chunk, fallback, source_id))
+        except Exception as e:
+            errors.append(f"Error processing line {line_num}: {type(e).__name__}: {e}")
+    return points, errors
+
+def ensure_collection(client, collection, input_file, create=False):
+    """Check the collection exists, creating it (sized from the first vector) if asked."""
+    if client.get_collection(collection) is not None:
+        return
+    if not create:
+        raise QdrantError(f"Collection '{collection}' does not exist (use --create-collection)")
+
+    vectors = ChunkVectors(input_file)
+    with open(input_file, 'rb') as f:
+        for line in f:
+            if line.strip():
+                chunk = loads(line)
+                break
+        else:
+            raise QdrantError(f"{input_file} is empty")
+    row = chunk.get('embedding_row')
+    size = len(vectors.vectors[row]) if row is not None else len(chunk['embedding'])
+    client.create_collection(collection, size)
+    client.create_payload_index(collection, 'source_id')
+    print(f"Created collection '{collection}' ({size} dimensions, cosine)")
+
+def upload_file(input_file, collection=DEFAULT_COLLECTION, batch_size=DEFAULT_BATCH_SIZE, workers=DEFAULT_WORKERS,
+                url=None, api_key=None, gzip_requests=True, source_id=None, restart=False, create=False):
+    """Upload every point of a JSONL file. Returns (points uploaded, line errors, failed batches)."""
+    started = time.perf_counter()
+    fallback = fallback_slug(input_file)
+    vectors = ChunkVectors(input_file)
+
+    client = QdrantREST(url, api_key, gzip_requests, pool_size=workers)
+    ensure_collection(client, collection, input_file, create)
+
+    settings = {"collection": collection, "url": client.url, "batch_size": batch_size, "source_id": source_id,
+                "input": input_fingerprint(input_file)}
+    checkpoint = UploadCheckpoint(checkpoint_path(input_file), settings, restart)
+
+    print(f"Uploading {input_file} to {client.url}/collections/{collection}")
+    print(f"Batch size: {batch_size}, {workers} batches in flight, gzip {'on' if gzip_requests else 'off'}")
+    if checkpoint.acked:
+        print(f"Found checkpoint with {len(checkpoint.acked)} acknowledged batches, resuming...")
+
+    uploaded = 0
+    error_count = 0
+    failed = []
+    reported = 0
+    pending = {}
+    last_report = time.perf_counter()
+
+    def settle(done):
+        nonlocal uploaded
+        for future in done:
+            number, first_line, last_line, count = pending.pop(future)
+            try:
+                future.result()
+            except QdrantError as e:
+                failed.append(number)
+                print(f"Batch {number} (lines {first_line}-{last_line}) failed: {e}")
+                continue
+            checkpoint.ack(number, first_line, last_line, count)
+            uploaded += count
+
+    with open(input_file, 'rb') as infile, ThreadPoolExecutor(workers) as pool:
+        for number, first_line, last_line, lines in iter_batches(infile, batch_size, checkpoint.acked):
+            points, errors = build_points(lines, vectors, fallback, source_id)
+            error_count += len(errors)
+            for message in errors[:max(0, MAX_REPORTED_ERRORS - reported)]:
+                print(message)
+            reported += len(errors)
+
+            future = pool.submit(client.upsert, collection, points) if points else pool.submit(lambda: None)
+            pending[future] = (number, first_line, last_line, len(points))
+
+            while len(pending) >= workers * 2:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                settle(done)
+
+            if time.perf_counter() - last_report >= 5:
+                elapsed = time.perf_counter() - started
+                print(f"  {uploaded:,} points acknowledged ({uploaded / elapsed:,.0f} points/s)")
+                last_report = time.perf_counter()
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            settle(done)
+
+    checkpoint.close()
+    client.close()
+
+    elapsed = time.perf_counter() - started
+    print(f"\nCompleted!")
+    print(f"Uploaded: {uploaded:,} points in {elapsed:.1f}s ({uploaded / elapsed if elapsed else 0:,.0f} points/s)")
+    print(f"Errors: {error_count} lines")
+    if client.bytes_uncompressed:
+        print(f"Sent: {client.bytes_sent / 1e6:,.1f} MB ({client.bytes_uncompressed / 1e6:,.1f} MB before compression)")
+    if failed:
+        print(f"Failed batches: {len(failed)}; rerun the same command to retry them")
+    else:
+        os.remove(checkpoint.path)
+    return uploaded, error_count, failed
+
+def main():
+    """Upload a JSONL file from the command line."""
+
+    parser = argparse.ArgumentParser(
+        description="Stream a Qdrant-ready JSONL file into a Qdrant collection in batches.",
+        epilog="Example: python bulk_upload.py data/sources/reading_old_books_lewis_qdrant.jsonl"
+    )
+    parser.add_argument('input_file', help="Qdrant or embeddings JSONL file (inline or sidecar layout)")
+    parser.add_argument('--collection', default=DEFAULT_COLLECTION, help=f"Collection (default: {DEFAULT_COLLECTION})")
+    parser.add_argument('--url', help="Qdrant URL (default: QDRANT_URL or http://localhost:6333)")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                        help=f"Points per upsert request (default: {DEFAULT_BATCH_SIZE})")
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help=f"Batches in flight at once (default: {DEFAULT_WORKERS})")
+    parser.add_argument('--source-id', help="Database source id to store in each payload's source_id")
+    parser.add_argument('--no-gzip', action='store_true', help="Send uncompressed request bodies")
+    parser.add_argument('--create-collection', action='store_true',
+                        help="Create the collection (cosine, sized from the first vector) if it does not exist")
+    parser.add_argument('--restart', action='store_true', help="Ignore the checkpoint and upload every batch")
+    args = parser.parse_args()
+
+    if not Path(args.input_file).exists():
+        print(f"Error: File '{args.input_file}' not found")
+        sys.exit(1)
+
+    try:
+        _, _, failed = upload_file(args.input_file, args.collection, max(1, args.batch_size), max(1, args.workers),
+                                   args.url, None, not args.no_gzip, args.source_id, args.restart,
+                                   args.create_collection)
+    except QdrantError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    if failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Semantic Syntopicon tagging from the chunk embeddings generate_embeddings.py wrote.
+
+Each Idea is embedded once from its name, description, topics and terms. The
+resulting (ideas x dims) matrix is cached in data/cache/taxonomy, keyed by the
+Idea texts and embedding model, so it is only re-embedded when the taxonomy
+changes. Tagging a file is then one matrix multiply of all chunk vectors against
+the Idea matrix; no API calls are made per chunk.
+
+Tags are written to `metadata.syntopicon_tags` as {concept, confidence} objects,
+best first (the format in docs/community_library_jsonl_specs.md). Existing tags
+are kept unless --replace is given. --names writes plain Idea names instead, with
+the cosine scores in `metadata.syntopicon_scores`.
+
+Output goes to `<input>_classified.jsonl` next to the input unless an output file
+is given.
+
+Usage:
+    python concept_classifier.py <file_embeddings.jsonl> [output.jsonl] [--top-k 3] [--min-score 0.25] [--names]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from taxonomy_loader import DEFAULT_CACHE_DIR, load_taxonomy_file
+from vector_search import normalize_rows, top_k
+from vector_store import has_embedding, load_embeddings, sidecar_path
+
+DEFAULT_TAXONOMY_PATH = Path(__file__).resolve().parent.parent / 'data' / 'taxonomies' / 'syntopicon_taxonomy.json'
+
+DEFAULT_TOP_K = 3
+DEFAULT_MIN_SCORE = 0.25
+
+# Chunk vectors are scored in blocks so a memory-mapped corpus is never copied whole
+SCORE_BLOCK = 65536
+
+def idea_text(concept):
+    """Text embedded to represent one Idea."""
+    parts = [f"{concept['name']}. {concept.get('description', '')}".strip()]
+    if concept.get('topics'):
+        parts.append("Topics: " + "; ".join(concept['topics']))
+    if concept.get('terms'):
+        parts.append("Terms: " + "; ".join(concept['terms']))
+    return "\n".join(parts)
+
+class IdeaVectors:
+    """Names and normalized embedding vectors of every Idea in the taxonomy."""
+
+    def __init__(self, names, vectors):
+        self.names = list(names)
+        self.vectors = normalize_rows(np.array(vectors, dtype=np.float32, copy=True))
+        self.positions = {name: i for i, name in enumerate(self.names)}
+
+    @property
+    def dims(self):
+        return self.vectors.shape[1]
+
+    @classmethod
+    def load(cls, taxonomy_path=DEFAULT_TAXONOMY_PATH, cache_dir=None):
+        """Idea vectors for a taxonomy, embedding the Ideas only if no cached matrix matches."""
+        from generate_embeddings import EMBEDDING_MODEL
+
+        concepts = load_taxonomy_file(taxonomy_path)['syntopicon_taxonomy']['concepts']
+        names = [concept['name'] for concept in concepts]
+        texts = [idea_text(concept) for concept in concepts]
+
+        digest = hashlib.sha256(json.dumps([EMBEDDING_MODEL, names, texts]).encode('utf-8')).hexdigest()
+        cache_dir = Path(cache_dir or os.getenv('TAXONOMY_CACHE_DIR') or DEFAULT_CACHE_DIR)
+        path = cache_dir / f"idea_vectors-{digest[:16]}.npz"
+
+        if path.exists():
+            with np.load(path) as data:
+                return cls(data['names'].tolist(), data['vectors'])
+
+        from vector_search import embed_queries
+        print(f"Embedding {len(texts)} Ideas with {EMBEDDING_MODEL}...")
+        ideas = cls(names, embed_queries(texts))
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        with open(path, 'wb') as f:
+            np.savez(f, names=np.array(names), vectors=ideas.vectors)
+        return ideas
+
+    def score(self, chunk_vectors, limit=DEFAULT_TOP_K):
+        """
+        Best Ideas for every chunk vector.
+
+        Returns (indices, scores, all_scores): the `limit` best Idea indices and their
+        cosine scores per chunk, plus the full (chunks x ideas) score matrix.
+        """
+        if chunk_vectors.shape[1] != self.dims:
+            raise ValueError(f"Chunk vectors have {chunk_vectors.shape[1]} dimensions, Idea vectors {self.dims}")
+
+        all_scores = np.empty((len(chunk_vectors), len(self.names)), dtype=np.float32)
+        for start in range(0, len(chunk_vectors), SCORE_BLOCK):
+            block = normalize_rows(np.array(chunk_vectors[start:start + SCORE_BLOCK], dtype=np.float32))
+            all_scores[start:start + SCORE_BLOCK] = block @ self.vectors.T
+
+        best = top_k(all_scores, limit)
+        return best, np.take_along_axis(all_scores, best, axis=1), all_scores
+
+def merge_tags(metadata, ideas, predicted, chunk_scores, replace=False, objects=True):
+    """Write predicted tags (names with scores) into a chunk's metadata."""
+    existing = [] if replace else (metadata.get('syntopicon_tags') or [])
+    names = [tag.get('concept') if isinstance(tag, dict) else tag for tag in existing]
+    names += [name for name in predicted if name not in names]
+
+    scores = {name: round(float(chunk_scores[ideas.positions[name]]), 4) for name in names if name in ideas.positions}
+    # Scored tags best first; tags that are not Ideas keep their place after them
+    names.sort(key=lambda name: (name not in scores, -scores.get(name, 0)))
+
+    if objects:
+        metadata['syntopicon_tags'] = [{"concept": name, "confidence": scores.get(name)} for name in names]
+        metadata.pop('syntopicon_scores', None)
+    else:
+        metadata['syntopicon_tags'] = names
+        metadata['syntopicon_scores'] = scores
+
+def classify_file(input_file, output_file, ideas, limit=DEFAULT_TOP_K, min_score=DEFAULT_MIN_SCORE,
+                  replace=False, objects=True):
+    """Tag every embedded chunk of a JSONL file (either layout). Returns the number tagged."""
+    started = time.perf_counter()
+    _, matrix = load_embeddings(input_file)
+    if len(matrix) == 0:
+        print(f"No embedded chunks in {input_file}")
+        return 0
+
+    best, best_scores, all_scores = ideas.score(matrix, limit)
+    scored = time.perf_counter()
+    print(f"Scored {len(matrix)} chunks against {len(ideas.names)} Ideas in {scored - started:.2f}s")
+
+    in_place = Path(output_file).resolve() == Path(input_file).resolve()
+    temp_path = Path(output_file).with_name(f".{Path(output_file).name}.tmp") if in_place else Path(output_file)
+
+    row = 0
+    with open(input_file, 'r', encoding='utf-8') as infile, \
+         open(temp_path, 'w', encoding='utf-8') as outfile:
+        for line in infile:
+            if not line.strip():
+                continue
+            chunk = json.loads(line)
+            if has_embedding(chunk):
+                predicted = [ideas.names[i] for i, score in zip(best[row], best_scores[row]) if score >= min_score]
+                metadata = chunk.get('metadata')
+                if not isinstance(metadata, dict):
+                    metadata = chunk['metadata'] = {}
+                merge_tags(metadata, ideas, predicted, all_scores[row], replace, objects)
+                row += 1
+            outfile.write(json.dumps(chunk, ensure_ascii=False) + '\n')
+
+    if in_place:
+        os.replace(temp_path, output_file)
+    elif sidecar_path(input_file).exists():
+        # Rows keep their embedding_row references, so the output needs its own sidecar
+        shutil.copyfile(sidecar_path(input_file), sidecar_path(output_file))
+
+    print(f"Tagged {row} chunks in {time.perf_counter() - started:.2f}s")
+    return row
+
+def main():
+    """Tag embedding files from the command line."""
+
+    parser = argparse.ArgumentParser(description="Tag embedded chunks with their nearest Syntopicon Ideas.")
+    parser.add_argument('input', help="Embedding JSONL file (inline or sidecar layout)")
+    parser.add_argument('output', nargs='?', help="Output file (default: <input>_classified.jsonl)")
+    parser.add_argument('--taxonomy', default=DEFAULT_TAXONOMY_PATH, help="Taxonomy file (default: data/taxonomies/syntopicon_taxonomy.json)")
+    parser.add_argument('--top-k', type=int, default=DEFAULT_TOP_K, help=f"Ideas considered per chunk (default: {DEFAULT_TOP_K})")
+    parser.add_argument('--min-score', type=float, default=DEFAULT_MIN_SCORE,
+                        help=f"Minimum cosine score for a tag (default: {DEFAULT_MIN_SCORE})")
+    parser.add_argument('--replace', action='store_true', help="Drop existing syntopicon_tags instead of merging")
+    parser.add_argument('--names', action='store_true',
+                        help="Write tags as plain Idea names, with scores in syntopicon_scores")
+    args = parser.parse_args()
+
+    if not Path(args.input).exists():
+        print(f"Error: File '{args.input}' not found")
+        sys.exit(1)
+
+    input_path = Path(args.input)
+    output_file = args.output or str(input_path.parent / f"{input_path.stem}_classified{input_path.suffix}")
+
+    ideas = IdeaVectors.load(args.taxonomy)
+    classify_file(args.input, output_file, ideas, args.top_k, args.min_score, args.replace, not args.names)
+    print(f"Output saved to: {output_file}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+"""
+Bounded-concurrency concept generation for the Syntopicon taxonomy scripts.
+
+Keeps several `messages.create` calls in flight under the shared rate limiter
+(see rate_limiter.py), retries API failures and unparseable responses with
+backoff, and hands results back in canonical concept order no matter which call
+finishes first.
+
+Alternatively, run_batch submits every concept as one Message Batch (half price,
+no rate limits to manage), polls until it ends and merges the results in the
+same canonical order. TokenUsage totals prompt-cache reads and writes so the
+saving from the cached instructions/examples prefix can be reported.
+
+The prompt builder, the argument parser and generate_concepts (which journals
+each concept as it is committed) are shared by generate_remaining_concepts.py and
+generate_volume1_remaining.py; those scripts only choose which concepts to run.
+
+Set ANTHROPIC_BASE_URL to point the scripts at a local fake Messages endpoint.
+"""
+
+import asyncio
+import json
+import os
+import re
+import time
+
+import anthropic
+from anthropic import Anthropic, AsyncAnthropic
+
+from rate_limiter import AdaptiveConcurrency, RETRYABLE_STATUS_CODES, TokenBucket, retry_delay
+from taxonomy_journal import apply_concepts
+
+DEFAULT_MODEL = "claude-3-5-sonnet-20241022"
+DEFAULT_WORKERS = 4
+DEFAULT_REQUESTS_PER_MINUTE = 50
+MAX_RETRIES = 4
+DEFAULT_POLL_SECONDS = 30
+
+class UnparseableResponse(Exception):
+    """The model's reply did not contain a valid JSON concept object."""
+
+def parse_concept_response(content):
+    """Extract the JSON concept object from a model reply."""
+    start_idx = content.find('{')
+    end_idx = content.rfind('}') + 1
+
+    if start_idx == -1 or end_idx == 0:
+        raise UnparseableResponse("no JSON object in response")
+    try:
+        concept = json.loads(content[start_idx:end_idx])
+    except json.JSONDecodeError as e:
+        raise UnparseableResponse(f"invalid JSON in response: {e}")
+    if not isinstance(concept, dict) or not concept.get('name'):
+        raise UnparseableResponse("response JSON is not a concept object")
+    return concept
+
+def response_text(message):
+    """Text of a Messages API reply; a reply without any text is unparseable."""
+    text = ''.join(block.text for block in message.content or [] if getattr(block, 'type', None) == 'text')
+    if not text:
+        raise UnparseableResponse("empty response")
+    return text
+
+class TokenUsage:
+    """Running token totals across requests, including prompt-cache writes and reads."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.requests = 0
+        self.input_tokens = 0
+        self.cache_write_tokens = 0
+        self.cache_read_tokens = 0
+        self.output_tokens = 0
+
+    def add(self, usage):
+        """Add the `usage` block of one Messages API response."""
+        self.requests += 1
+        self.input_tokens += usage.input_tokens or 0
+        self.cache_write_tokens += getattr(usage, 'cache_creation_input_tokens', None) or 0
+        self.cache_read_tokens += getattr(usage, 'cache_read_input_tokens', None) or 0
+        self.output_tokens += usage.output_tokens or 0
+
+    def report(self):
+        """Print token totals, the input tokens saved by the cached prefix, and elapsed time."""
+        elapsed = time.perf_counter() - self.started
+        prompt_tokens = self.input_tokens + self.cache_write_tokens + self.cache_read_tokens
+        # Cache reads are billed at 10% of the base input price and cache writes at 125%
+        saved = 0.9 * self.cache_read_tokens - 0.25 * self.cache_write_tokens
+
+        print(f"\nToken usage ({self.requests} responses, {elapsed:.1f}s end to end):")
+        print(f"  Input tokens:        {prompt_tokens:,}")
+        print(f"    uncached:          {self.input_tokens:,}")
+        print(f"    cache writes:      {self.cache_write_tokens:,}")
+        print(f"    cache reads:       {self.cache_read_tokens:,}")
+        print(f"  Output tokens:       {self.output_tokens:,}")
+        if prompt_tokens:
+            print(f"  Input tokens saved:  {saved:,.0f} ({saved / prompt_tokens:.0%} of input cost)")
+
+async def generate_one(client, concept_name, request, limiter, concurrency, max_retries=MAX_RETRIES, usage=None):
+    """
+    Generate one concept, retrying rate limits, server errors and unparseable replies.
+
+    `request` holds the keyword arguments for messages.create. Returns the concept
+    dict, or None once the retries are used up.
+    """
+    for attempt in range(max_retries + 1):
+        await limiter.acquire(request.get('max_tokens', 0))
+        headers = {}
+        try:
+            async with concurrency:
+                raw = await client.messages.with_raw_response.create(**request)
+            headers = raw.headers
+            concurrency.on_success(headers)
+            response = raw.parse()
+            if usage is not None:
+                usage.add(response.usage)
+            return parse_concept_response(response_text(response))
+
+        except anthropic.APIStatusError as e:
+            if e.status_code not in RETRYABLE_STATUS_CODES:
+                print(f"Error generating concept {concept_name}: {e}")
+                return None
+            headers = e.response.headers
+            if e.status_code in (429, 529):
+                concurrency.on_throttle()
+            reason = f"API returned {e.status_code}"
+        except (anthropic.APIConnectionError, anthropic.APITimeoutError) as e:
+            reason = f"connection error ({e})"
+        except UnparseableResponse as e:
+            reason = str(e)
+
+        if attempt == max_retries:
+            print(f"Error generating concept {concept_name}: {reason}, giving up after {attempt + 1} attempts")
+            return None
+        delay = retry_delay(attempt, headers, base=2.0)
+        print(f"{concept_name}: {reason}, retrying in {delay:.1f}s...")
+        await asyncio.sleep(delay)
+
+async def generate_in_order(concept_names, build_request, on_result, workers=DEFAULT_WORKERS,
+                            requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE, max_retries=MAX_RETRIES, usage=None):
+    """
+    Generate concepts concurrently and call on_result(name, concept_or_None) in the
+    order of `concept_names`.
+
+    The first concept is requested on its own to warm the prompt cache. Results that
+    finish early are held until every concept before them is done, so the taxonomy is
+    always committed in canonical order.
+    """
+    client = AsyncAnthropic(api_key=os.getenv('ANTHROPIC_API_KEY'), max_retries=0)
+    limiter = TokenBucket(requests_per_minute)
+    concurrency = AdaptiveConcurrency(workers, maximum=workers)
+
+    def start(name):
+        return asyncio.create_task(
+            generate_one(client, name, build_request(name), limiter, concurrency, max_retries, usage))
+
+    # The first request writes the shared prefix to the prompt cache. The others only start once it
+    # is back, so they read the cached prefix instead of each writing it in parallel
+    tasks = [start(name) for name in concept_names[:1]]
+    try:
+        for index, name in enumerate(concept_names):
+            concept = await tasks[index]
+            if index == 0:
+                tasks += [start(later) for later in concept_names[1:]]
+            on_result(name, concept)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await client.close()
+
+def run_concurrently(concept_names, build_request, on_result, workers=DEFAULT_WORKERS,
+                     requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE, usage=None):
+    """Synchronous entry point for the generation scripts."""
+    asyncio.run(generate_in_order(concept_names, build_request, on_result, workers, requests_per_minute,
+                                  usage=usage))
+
+def batch_custom_id(concept_name):
+    """Batch request id for a concept (custom ids allow only letters, digits, _ and -)."""
+    return re.sub(r'[^A-Za-z0-9_-]', '_', concept_name)[:64]
+
+def run_batch(concept_names, build_request, on_result, usage=None, batch_id=None,
+              poll_interval=DEFAULT_POLL_SECONDS):
+    """
+    Generate every concept in one Message Batch and call on_result(name, concept_or_None)
+    in the order of `concept_names` once the batch has ended.
+
+    With `batch_id`, re-attach to a batch submitted earlier instead of creating one;
+    results are matched to concepts by name, so concepts merged since are skipped.
+    """
+    client = Anthropic(api_key=os.getenv('ANTHROPIC_API_KEY'))
+
+    if batch_id:
+        batch = client.messages.batches.retrieve(batch_id)
+        print(f"Resuming batch {batch.id}")
+    else:
+        batch = client.messages.batches.create(requests=[
+            {"custom_id": batch_custom_id(name), "params": build_request(name)}
+            for name in concept_names
+        ])
+        print(f"Submitted batch {batch.id} with {len(concept_names)} requests")
+        print(f"(if interrupted, rerun with --batch-id {batch.id} to collect the results)")
+
+    while batch.processing_status != 'ended':
+        counts = batch.request_counts
+        print(f"Batch {batch.id}: {counts.processing} processing, {counts.succeeded} succeeded, "
+              f"{counts.errored} errored; checking again in {poll_interval}s...")
+        time.sleep(poll_interval)
+        batch = client.messages.batches.retrieve(batch.id)
+
+    results = {entry.custom_id: entry.result for entry in client.messages.batches.results(batch.id)}
+
+    for name in concept_names:
+        result = results.get(batch_custom_id(name))
+        concept = None
+        if result is None:
+            print(f"Error generating concept {name}: not part of batch {batch.id}")
+        elif result.type != 'succeeded':
+            print(f"Error generating concept {name}: batch request {result.type}")
+        else:
+            if usage is not None:
+                usage.add(result.message.usage)
+            try:
+                concept = parse_concept_response(response_text(result.message))
+            except UnparseableResponse as e:
+                print(f"Error generating concept {name}: {e}")
+        on_result(name, concept)
+
+def shared_prompt_prefix(instructions, existing_concepts):
+    """The part of the prompt that is identical for every concept: instructions and examples."""
+    
+    # Get a few examples from existing concepts for context
+    example_concepts = existing_concepts[:3]  # First 3 as examples
+    
+    return f"""You are helping to build a comprehensive JSON taxonomy based on Mortimer Adler's Syntopicon. 
+
+{instructions}
+
+Here are some examples of completed concepts to follow the same pattern:
+
+{json.dumps(example_concepts, indent=2)}
+
+Requirements for each concept:
+1. Create 8-15 topics that outline theological/philosophical discussion areas
+2. Create 15-20+ terms that are actual memorable phrases from the tradition with specific source attributions
+3. Keep terms under 5-7 words maximum
+4. Ensure terms are concept handles from discourse, not invented descriptions
+5. Include appropriate domains for the concept
+6. Write a brief but comprehensive description
+
+Return ONLY the JSON object for the requested concept, formatted exactly like the examples above."""
+
+def generate_concept_prompt(concept_name):
+    """Generate the per-concept part of the prompt."""
+    
+    return f"""I need you to create a complete entry for the concept: "{concept_name}"
+
+Please create a complete JSON entry for "{concept_name}" following the exact same structure and quality standards as the examples."""
+
+def concept_request(concept_name, instructions, existing_concepts):
+    """Build the messages.create arguments for a single concept."""
+    
+    return {
+        "model": DEFAULT_MODEL,
+        "max_tokens": 4000,
+        "temperature": 0.7,
+        # Instructions and examples are the same for every concept, so they go in a cached
+        # system block; after the first request they are read from the prompt cache
+        "system": [{
+            "type": "text",
+            "text": shared_prompt_prefix(instructions, existing_concepts),
+            "cache_control": {"type": "ephemeral"}
+        }],
+        "messages": [{
+            "role": "user",
+            "content": generate_concept_prompt(concept_name)
+        }]
+    }
+
+def add_generation_arguments(parser):
+    """Add the --workers/--rpm/--batch/--batch-id options shared by the generation scripts."""
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Concurrent API requests; 1 generates one concept at a time (default: 1)")
+    parser.add_argument('--rpm', type=int, default=DEFAULT_REQUESTS_PER_MINUTE,
+                        help=f"Requests per minute across all workers (default: {DEFAULT_REQUESTS_PER_MINUTE})")
+    parser.add_argument('--batch', action='store_true',
+                        help="Submit all concepts as one Message Batch and merge the results when it ends")
+    parser.add_argument('--batch-id',
+                        help="Collect the results of a batch submitted earlier (implies --batch)")
+    return parser
+
+def generate_concepts(concepts_to_generate, instructions, existing_concepts, taxonomy, journal, args, usage=None):
+    """
+    Generate concepts with `args.workers` requests in flight (or as one Message Batch
+    with --batch/--batch-id), committing them in canonical order.
+
+    Each concept is added to `taxonomy` and appended to `journal` as it is committed.
+    Returns the updated taxonomy and the number of concepts generated.
+    """
+    
+    successful_generations = 0
+    total = len(concepts_to_generate)
+    
+    def commit(concept_name, concept_data):
+        nonlocal successful_generations
+        position = concepts_to_generate.index(concept_name) + 1
+        if concept_data:
+            apply_concepts(taxonomy, [concept_data])
+            successful_generations += 1
+            print(f"[{position}/{total}] ✓ Successfully generated: {concept_name}")
+            # Journal after each successful generation (compacted into the taxonomy file by the caller)
+            journal.append(concept_data)
+        else:
+            print(f"[{position}/{total}] ✗ Failed to generate: {concept_name}")
+    
+    # Examples are fixed up front so every prompt is identical regardless of completion order
+    examples = list(existing_concepts[:3])
+    build_request = lambda name: concept_request(name, instructions, examples)
+    if args.batch or args.batch_id:
+        run_batch(concepts_to_generate, build_request, commit, usage, args.batch_id)
+    else:
+        if args.workers > 1:
+            print(f"Running {args.workers} requests concurrently...")
+        run_concurrently(concepts_to_generate, build_request, commit, args.workers, args.rpm, usage)
+    return taxonomy, successful_generations
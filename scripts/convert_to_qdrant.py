@@ -1,96 +1,289 @@
 #!/usr/bin/env python3
 """
 Convert application JSONL format to Qdrant-ready format.
-Takes the embeddings JSONL and converts it to the format expected by Qdrant.
+Takes embeddings JSONL files and converts them to the format expected by Qdrant.
+
+Accepts one file or a directory of sources (every `*_embeddings.jsonl` in it by
+default); files are converted in parallel across a process pool and streamed line
+by line, so memory stays flat however large a source is. Progress is reported per
+file and in total, not per chunk.
+
+Each point keeps the chunk's own `id` when it has one; otherwise a stable id is
+derived from the source as `<author surname>_<title>_<chunk_index>`
+(e.g. `plato_the_republic_0`). Sources that were already uploaded under the old
+hard-coded ids keep them through LEGACY_SOURCE_SLUGS, so On Reading Old Books is
+still `lewis_reading_old_books_<chunk_index>` with community_source_id
+`lewis-reading-old-books`. `point_id` is a UUID5 of the id, the form Qdrant
+accepts as a point id, so re-converting a source always yields the same points.
+
+Embeddings may be inline or in a `.vectors.npy` sidecar (see vector_store.py); use
+--layout store to write the output's vectors to a sidecar as well. JSON is read and
+written with orjson when it is installed.
+
+Usage:
+    python convert_to_qdrant.py <file_embeddings.jsonl | directory> [--output-dir DIR] [--workers N]
 """
 
+import argparse
 import json
+import os
+import re
 import sys
+import time
+import unicodedata
+import uuid
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
 
-def convert_to_qdrant_format(input_file, output_file):
-    """Convert application JSONL to Qdrant-ready format."""
-    
-    print(f"Reading from: {input_file}")
-    print(f"Writing to: {output_file}")
-    
+import numpy as np
+
+from vector_store import ChunkVectors, VectorWriter, sidecar_path
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Namespace for point UUIDs; changing it would renumber every point in the collection
+POINT_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_URL, 'research-assistant/community-library')
+
+DEFAULT_PATTERN = '*_embeddings.jsonl'
+
+# Output lines are written in blocks of this many bytes
+WRITE_BUFFER_BYTES = 4 * 1024 * 1024
+
+# Errors reported per file; the rest are only counted
+MAX_REPORTED_ERRORS = 5
+
+# Derived slug -> slug the source's points were first uploaded under. Add an entry
+# before changing how slugs are derived, or existing sources get new ids (and
+# duplicate points on the next upload or sync).
+LEGACY_SOURCE_SLUGS = {
+    "lewis_on_reading_old_books": "lewis_reading_old_books",
+}
+
+METADATA_FIELDS = ("source_type", "syntopicon_tags", "rhetorical_function", "scripture_refs", "topics", "entities")
+
+if orjson is not None:
+    loads = orjson.loads
+
+    def dumps(obj):
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY).decode('utf-8')
+else:
+    loads = json.loads
+
+    def dumps(obj):
+        return json.dumps(obj, ensure_ascii=False, default=lambda value: value.tolist())
+
+def slugify(text):
+    """Lowercase ASCII words joined by underscores."""
+    text = unicodedata.normalize('NFKD', str(text)).encode('ascii', 'ignore').decode('ascii')
+    return '_'.join(re.findall(r'[a-z0-9]+', text.lower()))
+
+def fallback_slug(path):
+    """Source slug taken from a file name, for chunks without a title: `book_embeddings.jsonl` -> `book`."""
+    return slugify(Path(path).stem.replace('_embeddings', '').replace('_qdrant', ''))
+
+def source_slug(chunk, fallback):
+    """Stable slug for a chunk's source: author surname and title, else `fallback`."""
+    title = slugify(chunk.get('source_title') or chunk.get('source') or '')
+    if not title:
+        return fallback
+    author = slugify(chunk.get('author') or '').split('_')
+    slug = f"{author[-1]}_{title}" if author[-1] else title
+    return LEGACY_SOURCE_SLUGS.get(slug, slug)
+
+def chunk_id(chunk, fallback):
+    """The chunk's own id, or `<source slug>_<chunk_index>`."""
+    if chunk.get('id') is not None:
+        return str(chunk['id'])
+    return f"{source_slug(chunk, fallback)}_{chunk['chunk_index']}"
+
+def point_id(identifier):
+    """Qdrant point id (UUID string) for a chunk id."""
+    return str(uuid.uuid5(POINT_NAMESPACE, identifier))
+
+def to_qdrant(chunk, fallback):
+    """Qdrant-ready point for one chunk (embedding left as the caller resolved it)."""
+    identifier = chunk_id(chunk, fallback)
+    metadata = chunk.get('metadata') or {}
+    return {
+        "id": identifier,
+        "point_id": point_id(identifier),
+        "content": chunk['content'],
+        "source_title": chunk.get('source_title') or chunk.get('source'),
+        "author": chunk.get('author'),
+        "year": chunk.get('year'),
+        "genre": chunk.get('genre'),
+        "structure_path": chunk.get('structure_path'),
+        "chunk_index": chunk['chunk_index'],
+        "embedding": chunk['embedding'],
+        "metadata": {field: metadata.get(field) for field in METADATA_FIELDS},
+    }
+
+def output_path(input_file, output_dir=None):
+    """`book_embeddings.jsonl` -> `book_qdrant.jsonl`, next to the input or in `output_dir`."""
+    input_path = Path(input_file)
+    name = f"{input_path.stem.replace('_embeddings', '')}_qdrant{input_path.suffix}"
+    return Path(output_dir) / name if output_dir else input_path.parent / name
+
+def convert_to_qdrant_format(input_file, output_file, layout='inline', dtype='float32'):
+    """
+    Convert one application JSONL file to Qdrant-ready format.
+
+    Returns a stats dict: input/output paths, processed and error counts, the
+    first few error messages, the source slugs seen and the elapsed time.
+    """
+    started = time.perf_counter()
+    fallback = fallback_slug(input_file)
+    vectors = ChunkVectors(input_file)
+    vector_writer = VectorWriter(sidecar_path(output_file), dtype) if layout == 'store' else None
+
     processed_count = 0
-    
-    with open(input_file, 'r', encoding='utf-8') as infile, \
+    error_count = 0
+    errors = []
+    slugs = set()
+    buffer = []
+    buffered = 0
+
+    with open(input_file, 'rb') as infile, \
          open(output_file, 'w', encoding='utf-8') as outfile:
-        
+
         for line_num, line in enumerate(infile, 1):
             line = line.strip()
             if not line:
                 continue
-                
+
             try:
-                # Parse JSON line
-                chunk = json.loads(line)
-                
-                # Convert to Qdrant format
-                qdrant_chunk = {
-                    "id": f"lewis_reading_old_books_{chunk['chunk_index']}",
-                    "content": chunk['content'],
-                    "source_title": chunk['source_title'],
-                    "author": chunk['author'],
-                    "year": chunk['year'],
-                    "genre": chunk['genre'],
-                    "structure_path": chunk['structure_path'],
-                    "chunk_index": chunk['chunk_index'],
-                    "embedding": chunk['embedding'],
-                    "metadata": {
-                        "source_type": chunk['metadata']['source_type'],
-                        "syntopicon_tags": chunk['metadata']['syntopicon_tags'],
-                        "rhetorical_function": chunk['metadata']['rhetorical_function'],
-                        "scripture_refs": chunk['metadata']['scripture_refs'],
-                        "topics": chunk['metadata']['topics'],
-                        "entities": chunk['metadata']['entities']
-                    }
-                }
-                
-                # Write Qdrant-ready chunk
-                json.dump(qdrant_chunk, outfile, ensure_ascii=False)
-                outfile.write('\n')
-                
-                processed_count += 1
-                print(f"Converted chunk {chunk['chunk_index']}")
-                
-            except json.JSONDecodeError as e:
-                print(f"Error parsing JSON on line {line_num}: {e}")
-                continue
+                chunk = loads(line)
+                row = chunk.pop('embedding_row', None)
+                if row is not None:
+                    # Sidecar rows stay arrays: copied as-is to a sidecar, serialized directly inline
+                    chunk['embedding'] = vectors.vectors[row]
+                point = to_qdrant(chunk, fallback)
+
+                if vector_writer is not None:
+                    point['embedding_row'] = vector_writer.append(point.pop('embedding'))
+                elif isinstance(point['embedding'], np.ndarray):
+                    point['embedding'] = np.ascontiguousarray(point['embedding'], dtype=np.float32)
+
+                text = dumps(point)
             except Exception as e:
-                print(f"Error processing line {line_num}: {e}")
+                error_count += 1
+                if len(errors) < MAX_REPORTED_ERRORS:
+                    errors.append(f"line {line_num}: {type(e).__name__}: {e}")
                 continue
-    
+
+            if chunk.get('id') is None:
+                slugs.add(source_slug(chunk, fallback))
+            buffer.append(text)
+            buffered += len(text)
+            processed_count += 1
+            if buffered >= WRITE_BUFFER_BYTES:
+                outfile.write('\n'.join(buffer) + '\n')
+                buffer = []
+                buffered = 0
+
+        if buffer:
+            outfile.write('\n'.join(buffer) + '\n')
+
+    if vector_writer is not None:
+        vector_writer.close()
+
+    return {
+        "input": str(input_file),
+        "output": str(output_file),
+        "processed": processed_count,
+        "errors": error_count,
+        "error_messages": errors,
+        "slugs": sorted(slugs),
+        "elapsed": time.perf_counter() - started,
+    }
+
+def find_sources(path, pattern=DEFAULT_PATTERN):
+    """Input files for a file or directory argument, largest first to balance the pool."""
+    path = Path(path)
+    if path.is_file():
+        return [path]
+    files = [f for f in path.glob(pattern) if f.is_file() and not f.name.endswith('_qdrant.jsonl')]
+    return sorted(files, key=lambda f: f.stat().st_size, reverse=True)
+
+def convert_sources(input_files, output_dir=None, layout='inline', dtype='float32', workers=None):
+    """Convert many files across a process pool, reporting progress as each file finishes."""
+    started = time.perf_counter()
+    workers = max(1, min(workers or os.cpu_count() or 1, len(input_files)))
+    print(f"Converting {len(input_files)} files with {workers} processes "
+          f"({'orjson' if orjson is not None else 'json'} codec)...")
+
+    results = []
+    total = 0
+    slug_files = {}
+
+    def report(result):
+        nonlocal total
+        results.append(result)
+        total += result['processed']
+        rate = result['processed'] / result['elapsed'] if result['elapsed'] else 0
+        print(f"[{len(results)}/{len(input_files)}] {Path(result['input']).name}: {result['processed']} chunks, "
+              f"{result['errors']} errors ({rate:,.0f} chunks/s; {total:,} chunks so far)")
+        for message in result['error_messages']:
+            print(f"  Error on {message}")
+        for slug in result['slugs']:
+            slug_files.setdefault(slug, []).append(result['input'])
+
+    jobs = [(str(f), str(output_path(f, output_dir)), layout, dtype) for f in input_files]
+    if workers == 1:
+        for job in jobs:
+            report(convert_to_qdrant_format(*job))
+    else:
+        with ProcessPoolExecutor(workers) as pool:
+            futures = [pool.submit(convert_to_qdrant_format, *job) for job in jobs]
+            for future in as_completed(futures):
+                report(future.result())
+
+    elapsed = time.perf_counter() - started
     print(f"\nCompleted!")
-    print(f"Processed: {processed_count} chunks")
-    print(f"Output saved to: {output_file}")
+    print(f"Processed: {total:,} chunks from {len(results)} files in {elapsed:.1f}s "
+          f"({total / elapsed if elapsed else 0:,.0f} chunks/s)")
+    print(f"Errors: {sum(result['errors'] for result in results)} chunks")
+    for slug, files in slug_files.items():
+        if len(files) > 1:
+            print(f"Warning: {len(files)} files share source id '{slug}' and may produce duplicate ids: "
+                  + ", ".join(Path(f).name for f in files))
+    return results
 
 def main():
     """Main function to handle command line arguments."""
-    
-    if len(sys.argv) != 2:
-        print("Usage: python convert_to_qdrant.py <embeddings_file.jsonl>")
-        print("Example: python convert_to_qdrant.py community_sources/reading_old_books_lewis_embeddings.jsonl")
+
+    parser = argparse.ArgumentParser(
+        description="Convert embeddings JSONL files to Qdrant-ready format.",
+        epilog="Example: python convert_to_qdrant.py data/sources/"
+    )
+    parser.add_argument('input', help="Embeddings JSONL file (inline or sidecar layout) or a directory of them")
+    parser.add_argument('--pattern', default=DEFAULT_PATTERN,
+                        help=f"Files to convert when the input is a directory (default: {DEFAULT_PATTERN})")
+    parser.add_argument('--output-dir', help="Directory for the output files (default: next to each input)")
+    parser.add_argument('--workers', type=int, help="Processes to convert with (default: one per core)")
+    parser.add_argument('--layout', choices=['inline', 'store'], default='inline',
+                        help="Write vectors inline as JSON or to a binary .vectors.npy sidecar (default: inline)")
+    parser.add_argument('--dtype', choices=['float32', 'float16'], default='float32',
+                        help="Sidecar precision for --layout store (default: float32)")
+    args = parser.parse_args()
+
+    # Check if input exists
+    if not Path(args.input).exists():
+        print(f"Error: Input '{args.input}' not found")
         sys.exit(1)
-    
-    input_file = sys.argv[1]
-    
-    # Check if input file exists
-    if not Path(input_file).exists():
-        print(f"Error: Input file '{input_file}' not found")
+
+    input_files = find_sources(args.input, args.pattern)
+    if not input_files:
+        print(f"Error: No files matching '{args.pattern}' in {args.input}")
         sys.exit(1)
-    
-    # Generate output filename
-    input_path = Path(input_file)
-    output_file = input_path.parent / f"{input_path.stem.replace('_embeddings', '')}_qdrant{input_path.suffix}"
-    
-    print(f"Converting: {input_file}")
-    print(f"Output: {output_file}")
-    
-    # Convert to Qdrant format
-    convert_to_qdrant_format(input_file, str(output_file))
+
+    if args.output_dir:
+        Path(args.output_dir).mkdir(parents=True, exist_ok=True)
+
+    convert_sources(input_files, args.output_dir, args.layout, args.dtype, args.workers)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Persistent, content-addressed embedding cache shared across runs.
+
+Vectors are stored in SQLite as packed float32 blobs, keyed by
+sha256(model, dimensions, normalized content), so identical text is only embedded
+once no matter which file or run it came from. The cache can be bounded by entry
+count and/or size; least recently used entries are evicted first.
+
+Usage: python embedding_cache.py [--stats | --evict | --clear] [--path PATH]
+"""
+
+import argparse
+import hashlib
+import os
+import sqlite3
+import sys
+import time
+import unicodedata
+from array import array
+from pathlib import Path
+
+DEFAULT_CACHE_PATH = Path(__file__).resolve().parent.parent / 'data' / 'cache' / 'embeddings.sqlite'
+
+# SQLite limits the number of bound parameters per statement
+LOOKUP_CHUNK = 500
+
+def normalize_content(text):
+    """Normalize text so cosmetic differences don't defeat the cache."""
+    return ' '.join(unicodedata.normalize('NFC', text).split())
+
+def cache_key(model, dimensions, content):
+    """Content address for one embedding."""
+    material = f"{model}\0{dimensions or 'default'}\0{normalize_content(content)}"
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+def pack_vector(vector):
+    return array('f', vector).tobytes()
+
+def unpack_vector(blob):
+    values = array('f')
+    values.frombytes(blob)
+    return values.tolist()
+
+class EmbeddingCache:
+    """SQLite-backed embedding cache with LRU eviction."""
+
+    def __init__(self, path=None, max_entries=None, max_bytes=None):
+        self.path = Path(path or os.getenv('EMBEDDING_CACHE_PATH') or DEFAULT_CACHE_PATH)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+        # Callers that share one cache between threads (search_service.py) serialize access themselves
+        self.conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                dimensions INTEGER NOT NULL,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings(last_used)")
+        self.conn.commit()
+
+    def get_many(self, keys):
+        """Return {key: vector} for every key present in the cache."""
+        found = {}
+        keys = list(dict.fromkeys(keys))
+
+        for start in range(0, len(keys), LOOKUP_CHUNK):
+            part = keys[start:start + LOOKUP_CHUNK]
+            placeholders = ','.join('?' * len(part))
+            rows = self.conn.execute(
+                f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", part
+            ).fetchall()
+            found.update((key, unpack_vector(blob)) for key, blob in rows)
+
+        if found:
+            now = time.time()
+            self.conn.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?",
+                                  [(now, key) for key in found])
+            self.conn.commit()
+
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, model, items):
+        """Store (key, vector) pairs, then evict if the cache is over its bounds."""
+        now = time.time()
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO embeddings (key, model, dimensions, vector, last_used) VALUES (?, ?, ?, ?, ?)",
+            [(key, model, len(vector), pack_vector(vector), now) for key, vector in items]
+        )
+        self.conn.commit()
+        self.evict()
+
+    def evict(self):
+        """Drop least recently used entries until the cache fits its bounds."""
+        removed = 0
+
+        if self.max_entries is not None:
+            count = self.conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            if count > self.max_entries:
+                removed += self._evict_oldest(count - self.max_entries)
+
+        if self.max_bytes is not None:
+            total, count = self.conn.execute(
+                "SELECT COALESCE(SUM(LENGTH(vector)), 0), COUNT(*) FROM embeddings"
+            ).fetchone()
+            if total > self.max_bytes and count:
+                average = total / count
+                removed += self._evict_oldest(int((total - self.max_bytes) / average) + 1)
+
+        if removed:
+            self.conn.commit()
+        return removed
+
+    def _evict_oldest(self, count):
+        cursor = self.conn.execute(
+            "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+            (count,)
+        )
+        return cursor.rowcount
+
+    def stats(self):
+        """Entry count and stored vector bytes."""
+        count, total = self.conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings"
+        ).fetchone()
+        return {"entries": count, "vector_bytes": total}
+
+    def clear(self):
+        self.conn.execute("DELETE FROM embeddings")
+        self.conn.commit()
+        self.conn.execute("VACUUM")
+
+    def close(self):
+        self.conn.close()
+
+def main():
+    """Inspect or maintain the embedding cache."""
+
+    parser = argparse.ArgumentParser(description="Inspect or maintain the embedding cache.")
+    parser.add_argument('--path', help=f"Cache database (default: {DEFAULT_CACHE_PATH})")
+    parser.add_argument('--max-entries', type=int, help="Evict down to this many entries")
+    parser.add_argument('--max-mb', type=float, help="Evict down to this many megabytes of vectors")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--stats', action='store_true', help="Show cache size (default)")
+    group.add_argument('--evict', action='store_true', help="Apply --max-entries/--max-mb now")
+    group.add_argument('--clear', action='store_true', help="Remove every cached embedding")
+    args = parser.parse_args()
+
+    max_bytes = int(args.max_mb * 1024 * 1024) if args.max_mb else None
+    cache = EmbeddingCache(args.path, args.max_entries, max_bytes)
+
+    if args.clear:
+        cache.clear()
+        print("Cache cleared")
+    elif args.evict:
+        if args.max_entries is None and max_bytes is None:
+            print("Error: --evict needs --max-entries or --max-mb")
+            sys.exit(1)
+        print(f"Evicted {cache.evict()} entries")
+
+    stats = cache.stats()
+    print(f"Cache: {cache.path}")
+    print(f"Entries: {stats['entries']}")
+    print(f"Vector data: {stats['vector_bytes'] / (1024 * 1024):.1f} MB")
+    cache.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,629 @@
+#!/usr/bin/env python3
+"""
+Enrich JSONL chunks with the AI metadata described in docs/community_library_jsonl_specs.md:
+`metadata.rhetorical_function`, `topics`, `entities` and `scripture_refs`.
+
+Many chunks are packed into each Anthropic request (15 by default) and the model
+answers through a forced tool call whose input schema lists every rhetorical
+category and element from data/taxonomies/knowledge_elements_taxonomy.json, so
+replies are structured rather than free text to be scraped. The taxonomy and
+instructions are sent as a cached system block shared by every request. Several
+requests are kept in flight under the shared rate limiter.
+
+Results are cached in SQLite by content hash (data/cache/enrichment.sqlite), so
+unchanged text is never sent twice. Output is appended and fsynced request by
+request, and an interrupted run resumes after the last chunk written (use
+--restart to discard the partial output instead).
+
+Usage:
+    python enrich_chunks.py <input.jsonl> [output.jsonl] [--chunks-per-request 15] [--concurrency 4]
+
+Set ANTHROPIC_BASE_URL to point the script at a local fake Messages API server.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import time
+from collections import deque
+from pathlib import Path
+
+import anthropic
+from anthropic import AsyncAnthropic
+from dotenv import load_dotenv
+
+from concurrent_generation import DEFAULT_MODEL, TokenUsage, UnparseableResponse
+from embedding_cache import normalize_content
+from jsonl_checkpoint import CheckpointWriter, ResumeMismatch, ResumeState, recover_jsonl
+from rate_limiter import AdaptiveConcurrency, RETRYABLE_STATUS_CODES, TokenBucket, retry_delay
+from taxonomy_loader import load_taxonomy_file
+
+# Load environment variables
+load_dotenv()
+
+KNOWLEDGE_TAXONOMY_PATH = Path(__file__).resolve().parent.parent / 'data' / 'taxonomies' / 'knowledge_elements_taxonomy.json'
+DEFAULT_CACHE_PATH = Path(__file__).resolve().parent.parent / 'data' / 'cache' / 'enrichment.sqlite'
+
+# Bump when the prompt or schema changes so cached results are not reused
+ENRICHMENT_VERSION = 1
+
+DEFAULT_CHUNKS_PER_REQUEST = 15
+MAX_REQUEST_CHARS = 60000
+OUTPUT_TOKENS_PER_CHUNK = 400
+MAX_OUTPUT_TOKENS = 8192
+
+DEFAULT_CONCURRENCY = 4
+DEFAULT_REQUESTS_PER_MINUTE = 50
+MAX_RETRIES = 4
+
+TOOL_NAME = "record_chunk_metadata"
+ENTITY_KINDS = ("people", "places", "groups", "works")
+SCRIPTURE_REF_TYPES = ("explicit", "allusion")
+MAX_TOPICS = 8
+ENRICHMENT_FIELDS = ("rhetorical_function", "scripture_refs", "entities", "topics")
+
+def enriched(chunk):
+    """True if a chunk already carries the enrichment fields."""
+    metadata = chunk.get('metadata')
+    return isinstance(metadata, dict) and metadata.get('rhetorical_function') is not None
+
+def load_categories(taxonomy_path=KNOWLEDGE_TAXONOMY_PATH):
+    """Rhetorical function categories keyed by id ('logical', ...), each with its elements."""
+    return load_taxonomy_file(taxonomy_path)['rhetorical_function']['categories']
+
+def system_prompt(categories):
+    """Instructions plus the full category/element list; identical for every request."""
+    lines = [
+        "You annotate passages from books, essays, sermons and scripture for a research library.",
+        "For every passage you are given, record:",
+        "- rhetorical_function: what the text is DOING. Choose a primary category and 1-3 of its elements;",
+        "  add a secondary category only if a second function is clearly present. Elements must belong to their category.",
+        f"- topics: up to {MAX_TOPICS} short lowercase subject keywords, snake_case for multi-word topics.",
+        "- entities: people, places, groups and works named in the passage (as written, no duplicates).",
+        "- scripture_refs: Bible passages the text quotes or cites (`explicit`) or clearly alludes to (`allusion`),",
+        "  as standard references such as \"John 3:16\", with a few words of context.",
+        "Judge each passage on its own; use empty lists when nothing applies.",
+        "",
+        "Rhetorical function categories and their elements:",
+    ]
+    for key, category in categories.items():
+        lines.append(f"\n{key} ({category['name']}): {category['description']}")
+        lines.append("  Elements: " + ", ".join(category['elements']))
+    lines.append(f"\nAlways answer by calling the {TOOL_NAME} tool once, with one entry per passage index.")
+    return "\n".join(lines)
+
+def tool_definition(categories):
+    """Tool whose input schema is the structured output for a batch of chunks."""
+    elements = sorted({element for category in categories.values() for element in category['elements']})
+    function = {
+        "type": "object",
+        "properties": {
+            "category": {"type": "string", "enum": list(categories)},
+            "elements": {"type": "array", "items": {"type": "string", "enum": elements}},
+        },
+        "required": ["category", "elements"],
+    }
+    string_list = {"type": "array", "items": {"type": "string"}}
+
+    return {
+        "name": TOOL_NAME,
+        "description": "Record the metadata for every passage in the request.",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "chunks": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "index": {"type": "integer"},
+                            "rhetorical_function": {
+                                "type": "object",
+                                "properties": {"primary": function, "secondary": function},
+                                "required": ["primary"],
+                            },
+                            "topics": string_list,
+                            "entities": {
+                                "type": "object",
+                                "properties": {kind: string_list for kind in ENTITY_KINDS},
+                            },
+                            "scripture_refs": {
+                                "type": "array",
+                                "items": {
+                                    "type": "object",
+                                    "properties": {
+                                        "reference": {"type": "string"},
+                                        "type": {"type": "string", "enum": list(SCRIPTURE_REF_TYPES)},
+                                        "context": {"type": "string"},
+                                    },
+                                    "required": ["reference", "type"],
+                                },
+                            },
+                        },
+                        "required": ["index", "rhetorical_function", "topics", "entities", "scripture_refs"],
+                    },
+                },
+            },
+            "required": ["chunks"],
+        },
+    }
+
+def chunk_prompt(chunks):
+    """User message holding the numbered passages of one request."""
+    parts = [f"Annotate these {len(chunks)} passages."]
+    for i, chunk in enumerate(chunks):
+        title = chunk.get('source_title') or chunk.get('source')
+        label = " / ".join(str(part) for part in (title, chunk.get('author'), chunk.get('structure_path')) if part)
+        label = label.replace('"', "'")
+        parts.append(f'<chunk index="{i}" source="{label}">\n{chunk["content"].strip()}\n</chunk>')
+    return "\n\n".join(parts)
+
+def build_request(chunks, system, tool, model=DEFAULT_MODEL):
+    """Keyword arguments for messages.create for one batch of chunks."""
+    return {
+        "model": model,
+        "max_tokens": min(MAX_OUTPUT_TOKENS, 256 + OUTPUT_TOKENS_PER_CHUNK * len(chunks)),
+        "temperature": 0,
+        "system": [{"type": "text", "text": system, "cache_control": {"type": "ephemeral"}}],
+        "tools": [tool],
+        "tool_choice": {"type": "tool", "name": TOOL_NAME},
+        "messages": [{"role": "user", "content": chunk_prompt(chunks)}],
+    }
+
+def _strings(values, limit=None):
+    """Distinct non-empty strings, in order."""
+    seen = []
+    for value in values if isinstance(values, list) else []:
+        if isinstance(value, str) and value.strip() and value.strip() not in seen:
+            seen.append(value.strip())
+    return seen[:limit]
+
+def _function(raw, categories):
+    if not isinstance(raw, dict) or raw.get('category') not in categories:
+        return None
+    allowed = categories[raw['category']]['elements']
+    elements = [element for element in _strings(raw.get('elements')) if element in allowed]
+    return {"category": raw['category'], "elements": elements}
+
+def clean_metadata(raw, categories):
+    """
+    Validate one chunk's tool output against the taxonomy.
+
+    Elements outside their category are dropped and topics are normalized to
+    lowercase snake_case. Raises UnparseableResponse if there is no usable
+    primary rhetorical function.
+    """
+    functions = raw.get('rhetorical_function') or {}
+    primary = _function(functions.get('primary'), categories)
+    if primary is None:
+        raise UnparseableResponse("missing or unknown primary rhetorical function")
+    rhetorical_function = {"primary": primary}
+    secondary = _function(functions.get('secondary'), categories)
+    if secondary is not None and secondary['category'] != primary['category']:
+        rhetorical_function['secondary'] = secondary
+
+    topics = _strings(['_'.join(topic.lower().split()) for topic in _strings(raw.get('topics'))], MAX_TOPICS)
+
+    entities = raw.get('entities') if isinstance(raw.get('entities'), dict) else {}
+    scripture_refs = []
+    for ref in raw.get('scripture_refs') or []:
+        if isinstance(ref, dict) and isinstance(ref.get('reference'), str) and ref['reference'].strip():
+            scripture_refs.append({
+                "reference": ref['reference'].strip(),
+                "type": ref.get('type') if ref.get('type') in SCRIPTURE_REF_TYPES else "explicit",
+                "context": ref.get('context') or "",
+            })
+
+    return {
+        "rhetorical_function": rhetorical_function,
+        "scripture_refs": scripture_refs,
+        "entities": {kind: _strings(entities.get(kind)) for kind in ENTITY_KINDS},
+        "topics": topics,
+    }
+
+def parse_tool_response(response, count, categories):
+    """Map passage index -> cleaned metadata from a tool-use reply; bad entries are left out."""
+    for block in response.content:
+        if getattr(block, 'type', None) == 'tool_use' and block.name == TOOL_NAME:
+            entries = block.input.get('chunks') if isinstance(block.input, dict) else None
+            break
+    else:
+        raise UnparseableResponse(f"no {TOOL_NAME} call in response")
+    if not isinstance(entries, list):
+        raise UnparseableResponse("tool input has no chunks list")
+
+    results = {}
+    for entry in entries:
+        index = entry.get('index') if isinstance(entry, dict) else None
+        if isinstance(index, int) and 0 <= index < count and index not in results:
+            try:
+                results[index] = clean_metadata(entry, categories)
+            except UnparseableResponse:
+                continue
+    if not results:
+        raise UnparseableResponse("no valid chunk entries in tool input")
+    return results
+
+def enrichment_key(model, content):
+    """Content address for one chunk's enrichment."""
+    material = f"{ENRICHMENT_VERSION}\0{model}\0{normalize_content(content)}"
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+class EnrichmentCache:
+    """SQLite-backed cache of enrichment results keyed by content hash."""
+
+    def __init__(self, path=None):
+        self.path = Path(path or os.getenv('ENRICHMENT_CACHE_PATH') or DEFAULT_CACHE_PATH)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+
+        self.conn = sqlite3.connect(str(self.path))
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS enrichments (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                metadata TEXT NOT NULL,
+                created REAL NOT NULL
+            )
+        """)
+        self.conn.commit()
+
+    def get_many(self, keys):
+        """Return {key: metadata} for every key present in the cache."""
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        for start in range(0, len(keys), 500):
+            part = keys[start:start + 500]
+            placeholders = ','.join('?' * len(part))
+            rows = self.conn.execute(
+                f"SELECT key, metadata FROM enrichments WHERE key IN ({placeholders})", part
+            ).fetchall()
+            found.update((key, json.loads(metadata)) for key, metadata in rows)
+
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, model, items):
+        """Store (key, metadata) pairs."""
+        now = time.time()
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO enrichments (key, model, metadata, created) VALUES (?, ?, ?, ?)",
+            [(key, model, json.dumps(metadata, ensure_ascii=False), now) for key, metadata in items]
+        )
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+def apply_metadata(chunk, metadata):
+    """Merge enrichment fields into a chunk, keeping any other metadata (e.g. syntopicon_tags)."""
+    if not isinstance(chunk.get('metadata'), dict):
+        chunk['metadata'] = {}
+    chunk['metadata'].update(json.loads(json.dumps(metadata)))
+
+def iter_windows(infile, chunks_per_request=DEFAULT_CHUNKS_PER_REQUEST, max_request_chars=MAX_REQUEST_CHARS,
+                 resume=None, force=False):
+    """
+    Group JSONL lines into windows of rows, in input order.
+
+    Each window holds at most one request worth of chunks that still need
+    enrichment, plus any already-enriched or unparseable rows between them. Rows
+    are dicts with `line_num`, `chunk`, `pending` and `error` keys.
+    """
+    window = []
+    pending = 0
+    chars = 0
+
+    for line_num, line in enumerate(infile, 1):
+        line = line.strip()
+        if not line:
+            continue
+
+        try:
+            chunk = json.loads(line)
+        except json.JSONDecodeError as e:
+            window.append({"line_num": line_num, "chunk": None, "pending": False,
+                           "error": f"Error parsing JSON on line {line_num}: {e}"})
+            continue
+
+        if resume is not None and resume.already_done(chunk):
+            continue
+
+        if enriched(chunk) and not force:
+            window.append({"line_num": line_num, "chunk": chunk, "pending": False, "error": None})
+            continue
+
+        if not isinstance(chunk.get('content'), str) or not chunk['content'].strip():
+            window.append({"line_num": line_num, "chunk": None, "pending": False,
+                           "error": f"Error processing line {line_num}: missing 'content'"})
+            continue
+
+        size = len(chunk['content'])
+        if pending and (pending >= chunks_per_request or chars + size > max_request_chars):
+            yield window
+            window = []
+            pending = 0
+            chars = 0
+
+        window.append({"line_num": line_num, "chunk": chunk, "pending": True, "error": None})
+        pending += 1
+        chars += size
+
+    if window:
+        yield window
+
+def pending_rows(window):
+    """Rows in a window that still need enrichment."""
+    return [row for row in window if row['pending']]
+
+def fill_from_cache(cache, rows, model=DEFAULT_MODEL):
+    """Apply cached results to rows found in the cache; return the rows still missing."""
+    if cache is None or not rows:
+        return rows
+
+    keys = [enrichment_key(model, row['chunk']['content']) for row in rows]
+    found = cache.get_many(keys)
+    missing = []
+    for row, key in zip(rows, keys):
+        if key in found:
+            apply_metadata(row['chunk'], found[key])
+            row['pending'] = False
+        else:
+            missing.append(row)
+    return missing
+
+async def request_metadata(client, request, count, categories, limiter, concurrency, usage=None):
+    """
+    Send one packed request, retrying rate limits, server errors and unusable replies.
+
+    Returns {index: metadata}, which may be missing some passages; raises once the
+    retries are used up.
+    """
+    tokens = len(request['messages'][0]['content']) // 3 + request['max_tokens']
+
+    for attempt in range(MAX_RETRIES + 1):
+        await limiter.acquire(tokens)
+        headers = {}
+        try:
+            async with concurrency:
+                raw = await client.messages.with_raw_response.create(**request)
+            headers = raw.headers
+            concurrency.on_success(headers)
+            response = raw.parse()
+            if usage is not None:
+                usage.add(response.usage)
+            return parse_tool_response(response, count, categories)
+
+        except anthropic.APIStatusError as e:
+            if e.status_code not in RETRYABLE_STATUS_CODES or attempt == MAX_RETRIES:
+                raise
+            headers = e.response.headers
+            if e.status_code in (429, 529):
+                concurrency.on_throttle()
+                limiter.pause(retry_delay(attempt, headers, base=2.0))
+            reason = f"API returned {e.status_code}"
+        except (anthropic.APIConnectionError, anthropic.APITimeoutError) as e:
+            if attempt == MAX_RETRIES:
+                raise
+            reason = f"connection error ({e})"
+        except UnparseableResponse as e:
+            if attempt == MAX_RETRIES:
+                raise
+            reason = str(e)
+
+        delay = retry_delay(attempt, headers, base=2.0)
+        print(f"{reason}, retrying in {delay:.1f}s (concurrency {concurrency.limit})...")
+        await asyncio.sleep(delay)
+
+async def enrich_window(client, window, system, tool, categories, limiter, concurrency,
+                        model=DEFAULT_MODEL, cache=None, usage=None):
+    """
+    Enrich every pending row of a window with one packed request.
+
+    Passages the reply leaves out, or every passage if the packed request fails,
+    are retried one request each so a single bad chunk only costs itself.
+    """
+    rows = pending_rows(window)
+    if not rows:
+        return
+
+    async def attempt(batch):
+        request = build_request([row['chunk'] for row in batch], system, tool, model)
+        results = await request_metadata(client, request, len(batch), categories, limiter, concurrency, usage)
+        for i, row in enumerate(batch):
+            if i in results:
+                apply_metadata(row['chunk'], results[i])
+                row['pending'] = False
+        return [row for row in batch if row['pending']]
+
+    try:
+        missing = await attempt(rows)
+    except Exception as e:
+        if len(rows) == 1:
+            rows[0]['error'] = f"Error processing line {rows[0]['line_num']}: {e}"
+            return
+        print(f"Request for {len(rows)} chunks failed ({e}), retrying chunks individually...")
+        missing = rows
+    else:
+        if missing:
+            print(f"Reply left out {len(missing)} of {len(rows)} chunks, retrying them individually...")
+
+    async def enrich_row(row):
+        try:
+            if await attempt([row]):
+                row['error'] = f"Error processing line {row['line_num']}: no metadata returned"
+        except Exception as e:
+            row['error'] = f"Error processing line {row['line_num']}: {e}"
+
+    await asyncio.gather(*(enrich_row(row) for row in missing))
+
+    if cache is not None:
+        items = [(enrichment_key(model, row['chunk']['content']),
+                  {key: row['chunk']['metadata'][key] for key in ENRICHMENT_FIELDS})
+                 for row in rows if not row['pending'] and not row['error']]
+        if items:
+            cache.put_many(model, items)
+
+def write_window(writer, window):
+    """Append a window's rows in input order. Returns (processed, errors)."""
+    lines = []
+    error_count = 0
+    for row in window:
+        if row['error']:
+            print(row['error'])
+            error_count += 1
+            continue
+        lines.append(json.dumps(row['chunk'], ensure_ascii=False) + '\n')
+    writer.append(lines)
+    return len(lines), error_count
+
+def create_client():
+    """Create the async Anthropic client, exiting if no API key is configured."""
+    api_key = os.getenv('ANTHROPIC_API_KEY')
+    if not api_key:
+        print("Error: ANTHROPIC_API_KEY not found in environment variables")
+        sys.exit(1)
+    # Retries are handled here so Retry-After and the concurrency limit stay in sync
+    return AsyncAnthropic(api_key=api_key, max_retries=0)
+
+async def enrich_file(input_file, output_file, chunks_per_request=DEFAULT_CHUNKS_PER_REQUEST,
+                      max_request_chars=MAX_REQUEST_CHARS, concurrency=DEFAULT_CONCURRENCY,
+                      requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE, tokens_per_minute=None,
+                      model=DEFAULT_MODEL, cache=None, restart=False, force=False,
+                      taxonomy_path=KNOWLEDGE_TAXONOMY_PATH):
+    """
+    Enrich a JSONL file with several packed requests in flight at once.
+
+    Windows are enriched concurrently but written strictly in input order; at most
+    two windows per concurrency slot are held in memory at any time.
+    """
+    categories = load_categories(taxonomy_path)
+    system = system_prompt(categories)
+    tool = tool_definition(categories)
+
+    client = create_client()
+    limiter = TokenBucket(requests_per_minute, tokens_per_minute)
+    controller = AdaptiveConcurrency(concurrency, maximum=concurrency * 4)
+    usage = TokenUsage()
+
+    print(f"Reading from: {input_file}")
+    print(f"Writing to: {output_file}")
+    print(f"Model: {model}, {chunks_per_request} chunks per request")
+    print(f"Concurrency: {concurrency} (adaptive, up to {controller.maximum}), {requests_per_minute} RPM")
+
+    resume = None
+    if not restart and os.path.exists(output_file):
+        resume = ResumeState(recover_jsonl(output_file), is_done=enriched)
+        print(f"Found existing output with {len(resume)} enriched chunks, resuming...")
+
+    processed_count = 0
+    error_count = 0
+    request_count = 0
+    in_flight = deque()
+
+    async def drain_one():
+        nonlocal processed_count, error_count
+        window, task = in_flight.popleft()
+        await task
+        processed, errors = write_window(writer, window)
+        processed_count += processed
+        error_count += errors
+
+    with open(input_file, 'r', encoding='utf-8') as infile, \
+         CheckpointWriter(output_file, resume=resume is not None) as writer:
+
+        for window in iter_windows(infile, chunks_per_request, max_request_chars, resume, force):
+            rows = fill_from_cache(cache, pending_rows(window), model)
+            if rows:
+                print(f"Lines {rows[0]['line_num']}-{rows[-1]['line_num']}: Queued {len(rows)} chunks for enrichment...")
+                request_count += 1
+            in_flight.append((window, asyncio.create_task(
+                enrich_window(client, window, system, tool, categories, limiter, controller, model, cache, usage)
+            )))
+
+            while len(in_flight) >= controller.maximum * 2:
+                await drain_one()
+
+        while in_flight:
+            await drain_one()
+
+    await client.close()
+
+    print(f"\nCompleted!")
+    if resume is not None:
+        print(f"Resumed: {resume.skipped} chunks already enriched")
+    print(f"Processed: {processed_count} chunks")
+    print(f"Errors: {error_count} chunks")
+    if error_count:
+        print("Failed chunks were left out of the output; rerun the same command to retry them")
+    print(f"Packed requests: {request_count}")
+    if cache is not None:
+        lookups = cache.hits + cache.misses
+        rate = 100 * cache.hits / lookups if lookups else 0
+        print(f"Cache hits: {cache.hits}, misses: {cache.misses} ({rate:.0f}% hit rate)")
+    usage.report()
+    print(f"Output saved to: {output_file}")
+
+def main():
+    """Enrich a JSONL file from the command line."""
+
+    parser = argparse.ArgumentParser(
+        description="Add rhetorical function, topics, entities and scripture references to JSONL chunks.",
+        epilog="Example: python enrich_chunks.py data/sources/reading_old_books_lewis.jsonl"
+    )
+    parser.add_argument('input_file', help="JSONL file of chunks")
+    parser.add_argument('output_file', nargs='?', help="Output file (default: <input>_enriched.jsonl)")
+    parser.add_argument('--chunks-per-request', type=int, default=DEFAULT_CHUNKS_PER_REQUEST,
+                        help=f"Chunks packed into each request (default: {DEFAULT_CHUNKS_PER_REQUEST})")
+    parser.add_argument('--max-request-chars', type=int, default=MAX_REQUEST_CHARS,
+                        help=f"Maximum chunk characters per request (default: {MAX_REQUEST_CHARS})")
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY,
+                        help=f"Requests to keep in flight at once (default: {DEFAULT_CONCURRENCY})")
+    parser.add_argument('--rpm', type=int, default=DEFAULT_REQUESTS_PER_MINUTE,
+                        help=f"Requests per minute allowed by the account (default: {DEFAULT_REQUESTS_PER_MINUTE})")
+    parser.add_argument('--tpm', type=int, help="Tokens per minute allowed by the account (default: unlimited)")
+    parser.add_argument('--model', default=DEFAULT_MODEL, help=f"Model to use (default: {DEFAULT_MODEL})")
+    parser.add_argument('--taxonomy', default=KNOWLEDGE_TAXONOMY_PATH,
+                        help="Knowledge elements taxonomy (default: data/taxonomies/knowledge_elements_taxonomy.json)")
+    parser.add_argument('--cache', help="Enrichment cache database (default: data/cache/enrichment.sqlite)")
+    parser.add_argument('--no-cache', action='store_true', help="Always call the API, ignoring the enrichment cache")
+    parser.add_argument('--force', action='store_true', help="Re-enrich chunks that already have a rhetorical_function")
+    parser.add_argument('--restart', action='store_true',
+                        help="Discard any partial output from an interrupted run instead of resuming it")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.input_file):
+        print(f"Error: File '{args.input_file}' not found")
+        sys.exit(1)
+
+    input_path = Path(args.input_file)
+    output_file = args.output_file or str(input_path.parent / f"{input_path.stem}_enriched{input_path.suffix}")
+    if Path(output_file).resolve() == input_path.resolve():
+        print("Error: output file must differ from the input file")
+        sys.exit(1)
+
+    cache = None if args.no_cache else EnrichmentCache(args.cache)
+
+    try:
+        asyncio.run(enrich_file(
+            args.input_file, output_file, max(1, args.chunks_per_request), args.max_request_chars,
+            args.concurrency, args.rpm, args.tpm, args.model, cache, args.restart, args.force, args.taxonomy
+        ))
+    except ResumeMismatch as e:
+        print(f"Error: existing output does not match the input ({e})")
+        print("Rerun with --restart to regenerate it from scratch")
+        sys.exit(1)
+    finally:
+        if cache is not None:
+            cache.close()
+
+if __name__ == "__main__":
+    main()
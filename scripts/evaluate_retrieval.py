@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""
+Offline retrieval evaluation against a graded query set.
+
+Replaces the one-off Qdrant vs Azure dump in data/search-comparison-results.json
+with a reproducible check of both quality and speed. Each local backend (exact,
+IVF, int8-quantized, Matryoshka prefix, BM25 keyword, BM25+vector hybrid) answers
+every query in the set. The report gives recall@k, nDCG@k and MRR against the
+relevance labels, plus p50/p95/p99 single-query latency, as a table and
+optionally as JSON. Pass an earlier JSON report as --baseline to see deltas.
+
+A query set is a JSONL file, one query per line:
+
+    {"query": "What is the nature of virtue?",
+     "relevant": [{"source_title": "Mere Christianity", "chunk_index": 261, "grade": 3},
+                  {"id": "lewis_reading_old_books_3", "grade": 1}]}
+
+A label matches a result by `id`, or by source title and chunk index, which are
+the same in every backend. Grades run from 1 (marginal) to 3 (exactly on point).
+
+Query embeddings are kept in `<queries>.vectors.npz` next to the query set.
+Missing ones are embedded once, through the shared embedding cache; after that,
+evaluation needs no network access.
+
+Usage:
+    python evaluate_retrieval.py init <queries.jsonl> [--from ../data/search-comparison-results.json]
+    python evaluate_retrieval.py run <queries.jsonl> <file_embeddings.jsonl> [...] [-k 10] [--output report.json]
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from generate_embeddings import EMBEDDING_MODEL
+
+DEFAULT_K = 10
+BACKENDS = ('exact', 'ivf', 'sq', 'prefix', 'bm25', 'hybrid')
+
+# Silver labels taken from a comparison dump: results both backends returned
+# score higher than results only one did
+SILVER_DEPTH = 10
+
+def relevance_key(source_title, chunk_index):
+    """Backend-independent identity of a chunk."""
+    return f"{source_title}#{chunk_index}"
+
+def hit_keys(hit):
+    """Keys a result can match a label by."""
+    payload = hit.get('payload') or hit
+    keys = {str(hit['id'])}
+    if payload.get('chunk_id'):
+        keys.add(str(payload['chunk_id']))
+    title = payload.get('source_title') or payload.get('source')
+    if title is not None and payload.get('chunk_index') is not None:
+        keys.add(relevance_key(title, int(payload['chunk_index'])))
+    return keys
+
+def label_key(label):
+    if label.get('id') is not None:
+        return str(label['id'])
+    return relevance_key(label['source_title'], int(label['chunk_index']))
+
+def load_query_set(path):
+    """[(query, {key: grade})] from a query set file."""
+    queries = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_num, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+                labels = {label_key(label): int(label.get('grade', 1)) for label in entry.get('relevant') or []}
+            except (ValueError, KeyError, TypeError) as e:
+                print(f"Error: bad query on line {line_num} of {path}: {e}")
+                sys.exit(1)
+            queries.append((entry['query'], {key: grade for key, grade in labels.items() if grade > 0}))
+    return queries
+
+def vectors_path(query_set):
+    path = Path(query_set)
+    return path.with_name(f"{path.stem}.vectors.npz")
+
+def load_query_vectors(query_set, queries, embed_missing=True):
+    """Query vectors from the sidecar, embedding (and saving) any that are missing."""
+    path = vectors_path(query_set)
+    stored = {}
+    if path.exists():
+        with np.load(path) as data:
+            meta = json.loads(data['meta'].tobytes().decode('utf-8'))
+            if meta.get('model') == EMBEDDING_MODEL:
+                stored = dict(zip(meta['queries'], data['vectors']))
+
+    missing = [query for query in dict.fromkeys(queries) if query not in stored]
+    if missing:
+        if not embed_missing:
+            print(f"Error: {len(missing)} queries have no stored embedding in {path} (run without --offline)")
+            sys.exit(1)
+        from vector_search import embed_queries
+        print(f"Embedding {len(missing)} queries...")
+        stored.update(zip(missing, np.array(embed_queries(missing), dtype=np.float32)))
+        texts = list(stored)
+        meta = {"model": EMBEDDING_MODEL, "queries": texts}
+        with open(path, 'wb') as f:
+            np.savez(f, vectors=np.stack([stored[text] for text in texts]),
+                     meta=np.frombuffer(json.dumps(meta, ensure_ascii=False).encode('utf-8'), dtype=np.uint8))
+    return np.stack([stored[query] for query in queries])
+
+def dcg(grades):
+    return sum((2 ** grade - 1) / np.log2(rank + 1) for rank, grade in enumerate(grades, 1))
+
+def score_results(results, labels, k):
+    """(recall@k, nDCG@k, reciprocal rank) of one ranked result list."""
+    grades = []
+    found = set()
+    first = 0.0
+    for rank, hit in enumerate(results[:k], 1):
+        matched = hit_keys(hit) & labels.keys()
+        grade = max((labels[key] for key in matched), default=0)
+        grades.append(grade)
+        if grade:
+            found |= matched
+            first = first or 1.0 / rank
+    if not labels:
+        return None
+    ideal = dcg(sorted(labels.values(), reverse=True)[:k])
+    return len(found) / len(labels), dcg(grades) / ideal if ideal else 0.0, first
+
+def evaluate(search, queries, vectors, k):
+    """Run every query one at a time; returns the metrics dict of one backend."""
+    per_query = []
+    latencies = []
+    for (text, labels), vector in zip(queries, vectors):
+        started = time.perf_counter()
+        results = search(text, vector, k)
+        latencies.append((time.perf_counter() - started) * 1000)
+        per_query.append(score_results(results, labels, k))
+
+    scored = [row for row in per_query if row is not None]
+    recall, ndcg, mrr = (np.mean(scored, axis=0) if scored else (0.0, 0.0, 0.0))
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {
+        f"recall@{k}": float(recall), f"ndcg@{k}": float(ndcg), "mrr": float(mrr),
+        "p50_ms": float(p50), "p95_ms": float(p95), "p99_ms": float(p99),
+        "queries": len(queries), "labelled": len(scored),
+    }
+
+def build_backends(files, names, args):
+    """{name: search(text, vector, k)} for the requested backends."""
+    from vector_search import PrefixIndex, VectorIndex
+
+    exact = VectorIndex.from_jsonl(*files)
+    print(f"Corpus: {len(exact)} chunks x {exact.dims} dims")
+    backends = {}
+    keyword = None
+    if 'bm25' in names or 'hybrid' in names:
+        from bm25_index import BM25Index
+        keyword = BM25Index.from_jsonl(*files)
+
+    for name in names:
+        if name == 'exact':
+            backends[name] = lambda text, vector, k: exact.search(vector, k)
+        elif name == 'ivf':
+            from ann_index import IVFIndex
+            ivf = IVFIndex.build(exact.ids, exact.payloads, exact.vectors, nlist=args.nlist, nprobe=args.nprobe)
+            backends[f"ivf nprobe={ivf.nprobe}"] = lambda text, vector, k: ivf.search(vector, k)
+        elif name == 'sq':
+            from quantization import QuantizedIndex
+            quantized = QuantizedIndex.build(exact.ids, exact.payloads, exact.vectors, method='sq')
+            backends[f"sq rescore={args.rescore}"] = lambda text, vector, k: quantized.search(vector, k, rescore=args.rescore)
+        elif name == 'prefix':
+            if args.prefix_dims >= exact.dims:
+                print(f"Skipping prefix: vectors only have {exact.dims} dimensions")
+                continue
+            prefix = PrefixIndex(exact.ids, exact.payloads, exact.vectors, args.prefix_dims)
+            backends[f"prefix {args.prefix_dims}"] = lambda text, vector, k: prefix.search(vector, k)
+        elif name == 'bm25':
+            backends[name] = lambda text, vector, k: keyword.search(text, k)
+        elif name == 'hybrid':
+            from bm25_index import HybridSearch
+            hybrid = HybridSearch(keyword, exact)
+            backends[name] = lambda text, vector, k: hybrid.search(text, vector, k)
+    return backends
+
+def print_table(report, k, baseline=None):
+    columns = [f"recall@{k}", f"ndcg@{k}", "mrr", "p50_ms", "p95_ms", "p99_ms"]
+    print(f"\n{'backend':<22}" + ''.join(f"{column:>11}" for column in columns))
+    print('-' * (22 + 11 * len(columns)))
+    for name, metrics in report['backends'].items():
+        print(f"{name:<22}" + ''.join(f"{metrics[column]:>11.3f}" for column in columns))
+        previous = (baseline or {}).get('backends', {}).get(name)
+        if previous:
+            deltas = [metrics[column] - previous[column] if column in previous else 0.0 for column in columns]
+            print(f"{'  vs baseline':<22}" + ''.join(f"{delta:>+11.3f}" for delta in deltas))
+
+def silver_query_set(comparison_path, depth=SILVER_DEPTH):
+    """Query set seeded from a Qdrant/Azure comparison dump, to be regraded by hand."""
+    with open(comparison_path, 'r', encoding='utf-8') as f:
+        comparison = json.load(f)
+
+    entries = {}
+    for backend in ('qdrant', 'azure'):
+        for item in comparison.get(backend) or []:
+            labels = entries.setdefault(item['query'], {})
+            # One vote per backend, however often it repeats a chunk in its top results
+            keys = {(hit['source_title'], int(hit['chunk_index'])) for hit in item['results'][:depth]}
+            for key in keys:
+                labels[key] = labels.get(key, 0) + 1
+
+    return [{"query": query, "relevant": [{"source_title": title, "chunk_index": index, "grade": votes}
+                                          for (title, index), votes in labels.items()]}
+            for query, labels in entries.items()]
+
+def main():
+    """Create a query set or run an evaluation from the command line."""
+
+    parser = argparse.ArgumentParser(description="Evaluate local retrieval backends against graded relevance labels.")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    init = sub.add_parser('init', help="Write a query set seeded from a comparison dump")
+    init.add_argument('queries', help="Query set JSONL file to write")
+    init.add_argument('--from', dest='comparison', default=str(Path(__file__).resolve().parent.parent / 'data' /
+                                                              'search-comparison-results.json'),
+                      help="Comparison dump (default: data/search-comparison-results.json)")
+    init.add_argument('--depth', type=int, default=SILVER_DEPTH,
+                      help=f"Results per backend taken as relevant (default: {SILVER_DEPTH})")
+
+    run = sub.add_parser('run', help="Evaluate backends on embedding files")
+    run.add_argument('queries', help="Query set JSONL file")
+    run.add_argument('files', nargs='+', help="Embedding JSONL files forming the corpus")
+    run.add_argument('-k', type=int, default=DEFAULT_K, help=f"Cutoff for recall and nDCG (default: {DEFAULT_K})")
+    run.add_argument('--backend', action='append', choices=BACKENDS, help="Backends to run (default: all)")
+    run.add_argument('--nlist', type=int, help="IVF cells (default: 4 * sqrt(n))")
+    run.add_argument('--nprobe', type=int, default=8, help="IVF cells probed (default: 8)")
+    run.add_argument('--rescore', type=int, default=100, help="Quantized shortlist rescored (default: 100)")
+    run.add_argument('--prefix-dims', type=int, default=256, help="Prefix search dimensions (default: 256)")
+    run.add_argument('--offline', action='store_true', help="Fail instead of embedding queries missing from the sidecar")
+    run.add_argument('--output', help="Write the report as JSON to this file")
+    run.add_argument('--baseline', help="Earlier JSON report to compare against")
+
+    args = parser.parse_args()
+
+    if args.command == 'init':
+        if not Path(args.comparison).exists():
+            print(f"Error: File '{args.comparison}' not found")
+            sys.exit(1)
+        entries = silver_query_set(args.comparison, args.depth)
+        with open(args.queries, 'w', encoding='utf-8') as f:
+            for entry in entries:
+                f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        print(f"Wrote {len(entries)} queries to {args.queries}")
+        print("Labels are silver (grade = number of backends that returned the chunk); regrade them by hand")
+        return
+
+    for path in [args.queries, *args.files, *([args.baseline] if args.baseline else [])]:
+        if not Path(path).exists():
+            print(f"Error: File '{path}' not found")
+            sys.exit(1)
+
+    queries = load_query_set(args.queries)
+    if not queries:
+        print(f"Error: {args.queries} has no queries")
+        sys.exit(1)
+    vectors = load_query_vectors(args.queries, [text for text, _ in queries], embed_missing=not args.offline)
+    backends = build_backends(args.files, args.backend or BACKENDS, args)
+
+    report = {"queries": args.queries, "files": args.files, "k": args.k, "backends": {}}
+    for name, search in backends.items():
+        # Warm up once so first-call overhead does not land in the percentiles
+        search(queries[0][0], vectors[0], args.k)
+        report['backends'][name] = evaluate(search, queries, vectors, args.k)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+    print_table(report, args.k, baseline)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport saved to: {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -4,10 +4,11 @@ Script to generate the next 10 concepts for the Syntopicon taxonomy using Anthro
 """
 
 import os
-import json
 from anthropic import Anthropic
 from dotenv import load_dotenv
 
+from taxonomy_loader import load_taxonomy_file
+
 # Load environment variables
 load_dotenv()
 
@@ -16,8 +17,7 @@ def main():
     client = Anthropic(api_key=os.getenv('ANTHROPIC_API_KEY'))
     
     # Read the current JSON file to get the completed concepts count
-    with open('Taxonomies/syntopicon_taxonomy.json', 'r') as f:
-        taxonomy_data = json.load(f)
+    taxonomy_data = load_taxonomy_file('Taxonomies/syntopicon_taxonomy.json')
     
     completed_count = taxonomy_data['syntopicon_taxonomy']['concepts_completed']
     print(f"Current completed concepts: {completed_count}")
@@ -2,116 +2,504 @@
 """
 Generate embeddings for JSONL community source files.
 Reads a JSONL file, generates OpenAI embeddings for each chunk, and saves to a new file.
+
+Chunks are packed into batched embedding requests (many `content` strings per call),
+kept under the model's per-request input and token limits. With --concurrency > 1
+several batches are kept in flight at once under an adaptive rate limiter.
+
+Vectors are looked up in a persistent content-addressed cache (see embedding_cache.py)
+before calling the API, so unchanged text is never embedded twice.
+
+Output is appended and fsynced batch by batch. If an earlier run was interrupted,
+the partial output is detected and the run resumes after the last chunk written
+(use --restart to discard it instead). Chunks that failed are left out of the
+output; a rerun retries them and appends them at the end, so only a run without
+errors keeps the output in input order.
+
+With --layout store, vectors go to a binary sidecar (`<output>.vectors.npy`, see
+vector_store.py) and each JSONL row carries an `embedding_row` offset instead of the
+array. Inputs in either layout are accepted. --prefix-dims N also writes a
+renormalized N-dimension prefix index for two-stage search (see vector_search.py).
+
+Set OPENAI_BASE_URL to point the script at a local fake embeddings server.
 """
 
+import argparse
+import asyncio
 import json
 import os
 import sys
+from collections import deque
 from pathlib import Path
-from openai import OpenAI
+import openai
+from openai import OpenAI, AsyncOpenAI
 from dotenv import load_dotenv
 
+from embedding_cache import EmbeddingCache, cache_key
+from jsonl_checkpoint import CheckpointWriter, ResumeMismatch, ResumeState, recover_jsonl
+from rate_limiter import AdaptiveConcurrency, RETRYABLE_STATUS_CODES, TokenBucket, retry_delay
+from vector_store import ChunkVectors, VectorWriter, has_embedding, sidecar_path, write_prefix_index
+
 # Load environment variables
 load_dotenv()
 
-def generate_embeddings(input_file, output_file):
-    """Generate embeddings for a JSONL file and save to a new file."""
-    
-    # Initialize OpenAI client
+EMBEDDING_MODEL = "text-embedding-3-small"
+
+# Per-request limits of the OpenAI embeddings endpoint
+MAX_BATCH_INPUTS = 2048
+MAX_BATCH_TOKENS = 300000
+MAX_INPUT_TOKENS = 8191
+
+# Default account limits for text-embedding-3-small; override with --rpm/--tpm
+DEFAULT_REQUESTS_PER_MINUTE = 3000
+DEFAULT_TOKENS_PER_MINUTE = 1000000
+MAX_RETRIES = 6
+
+def estimate_tokens(text):
+    """Conservative token estimate (~3 characters per token) used to size batches."""
+    return len(text) // 3 + 1
+
+def iter_windows(infile, batch_size=MAX_BATCH_INPUTS, max_batch_tokens=MAX_BATCH_TOKENS, resume=None, vectors=None):
+    """
+    Group JSONL lines into windows of rows, in input order.
+
+    Each window holds at most one embedding batch worth of chunks that still need an
+    embedding, plus any already-embedded or unparseable rows that sit between them.
+    A row is a dict with `line_num`, `chunk` and `error` keys. Chunks that `resume`
+    reports as written by an earlier run are left out; sidecar vectors of a store
+    layout input are resolved through `vectors`.
+    """
+    window = []
+    batch_inputs = 0
+    batch_tokens = 0
+
+    for line_num, line in enumerate(infile, 1):
+        line = line.strip()
+        if not line:
+            continue
+
+        try:
+            chunk = json.loads(line)
+        except json.JSONDecodeError as e:
+            window.append({"line_num": line_num, "chunk": None, "error": f"Error parsing JSON on line {line_num}: {e}"})
+            continue
+
+        if resume is not None and resume.already_done(chunk):
+            continue
+
+        if chunk.get('embedding_row') is not None:
+            try:
+                vectors.resolve(chunk)
+            except Exception as e:
+                window.append({"line_num": line_num, "chunk": None, "error": f"Error processing line {line_num}: {e}"})
+                continue
+
+        if chunk.get('embedding') is not None:
+            window.append({"line_num": line_num, "chunk": chunk, "error": None})
+            continue
+
+        if not isinstance(chunk.get('content'), str) or not chunk['content'].strip():
+            window.append({"line_num": line_num, "chunk": None, "error": f"Error processing line {line_num}: missing 'content'"})
+            continue
+
+        tokens = min(estimate_tokens(chunk['content']), MAX_INPUT_TOKENS)
+        if batch_inputs and (batch_inputs >= batch_size or batch_tokens + tokens > max_batch_tokens):
+            yield window
+            window = []
+            batch_inputs = 0
+            batch_tokens = 0
+
+        window.append({"line_num": line_num, "chunk": chunk, "error": None})
+        batch_inputs += 1
+        batch_tokens += tokens
+
+    if window:
+        yield window
+
+def pending_rows(window):
+    """Rows in a window that still need an embedding."""
+    return [row for row in window if row['chunk'] is not None and row['chunk'].get('embedding') is None]
+
+def fill_from_cache(cache, rows, model=EMBEDDING_MODEL, dimensions=None):
+    """Fill embeddings for rows found in the cache; return the rows still missing."""
+    if cache is None or not rows:
+        return rows
+
+    keys = [cache_key(model, dimensions, row['chunk']['content']) for row in rows]
+    found = cache.get_many(keys)
+    missing = []
+    for row, key in zip(rows, keys):
+        if key in found:
+            row['chunk']['embedding'] = found[key]
+        else:
+            missing.append(row)
+    return missing
+
+def store_in_cache(cache, rows, model=EMBEDDING_MODEL, dimensions=None):
+    """Save freshly generated embeddings to the cache."""
+    if cache is None:
+        return
+
+    items = [
+        (cache_key(model, dimensions, row['chunk']['content']), row['chunk']['embedding'])
+        for row in rows if not row['error'] and row['chunk'].get('embedding') is not None
+    ]
+    if items:
+        cache.put_many(model, items)
+
+def embed_texts(client, texts, model=EMBEDDING_MODEL):
+    """Embed a list of texts in a single request, returning vectors in input order."""
+    response = client.embeddings.create(model=model, input=texts)
+    # Map each result back through its index rather than trusting response order
+    return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+def embed_window(client, window, model=EMBEDDING_MODEL, cache=None):
+    """
+    Fill in embeddings for every pending row of a window with one batched request.
+
+    New vectors are saved to the cache. If the batched request fails, each chunk is
+    retried on its own so a single bad chunk only costs itself.
+    """
+    rows = pending_rows(window)
+    if not rows:
+        return
+
+    try:
+        vectors = embed_texts(client, [row['chunk']['content'] for row in rows], model)
+        for row, vector in zip(rows, vectors):
+            row['chunk']['embedding'] = vector
+        store_in_cache(cache, rows, model)
+        return
+    except Exception as e:
+        if len(rows) == 1:
+            rows[0]['error'] = f"Error processing line {rows[0]['line_num']}: {e}"
+            return
+        print(f"Batch of {len(rows)} chunks failed ({e}), retrying chunks individually...")
+
+    for row in rows:
+        try:
+            row['chunk']['embedding'] = embed_texts(client, [row['chunk']['content']], model)[0]
+        except Exception as e:
+            row['error'] = f"Error processing line {row['line_num']}: {e}"
+    store_in_cache(cache, rows, model)
+
+class EmbeddingOutput:
+    """
+    Durable, ordered writer for embedded chunks in the inline or store layout.
+
+    An existing output file is treated as a partial run and resumed unless `restart`
+    is set. Rows with errors are not written; resuming retries them after the rows
+    already there. In the store layout each window's vectors are fsynced before the
+    JSONL rows that reference them.
+    """
+
+    def __init__(self, output_file, layout='inline', dtype='float32', restart=False):
+        self.resume = None
+        resume_rows = None
+
+        if not restart and os.path.exists(output_file):
+            rows = recover_jsonl(output_file)
+            self.resume = ResumeState(rows, is_done=has_embedding)
+            resume_rows = sum(1 for row in rows if row.get('embedding_row') is not None)
+            print(f"Found existing output with {len(self.resume)} embedded chunks, resuming...")
+
+        self.writer = CheckpointWriter(output_file, resume=self.resume is not None)
+        self.vectors = None
+        if layout == 'store':
+            self.vectors = VectorWriter(sidecar_path(output_file), dtype, resume_rows)
+
+    def write(self, window):
+        """Append a window's rows in input order. Returns (processed, errors)."""
+        lines = []
+        error_count = 0
+
+        for row in window:
+            if row['error']:
+                print(row['error'])
+                error_count += 1
+                continue
+            chunk = row['chunk']
+            if self.vectors is not None:
+                chunk['embedding_row'] = self.vectors.append(chunk.pop('embedding'))
+            lines.append(json.dumps(chunk, ensure_ascii=False) + '\n')
+
+        if self.vectors is not None:
+            self.vectors.flush()
+        self.writer.append(lines)
+        return len(lines), error_count
+
+    def close(self):
+        if self.vectors is not None:
+            self.vectors.close()
+        self.writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+async def embed_texts_async(client, texts, limiter, concurrency, model=EMBEDDING_MODEL):
+    """
+    Async version of embed_texts that waits on the rate limiter and retries 429/5xx
+    responses, honouring `Retry-After` and feeding the limit headers back into the
+    concurrency controller.
+    """
+    tokens = sum(min(estimate_tokens(text), MAX_INPUT_TOKENS) for text in texts)
+
+    for attempt in range(MAX_RETRIES + 1):
+        await limiter.acquire(tokens)
+        try:
+            async with concurrency:
+                raw = await client.embeddings.with_raw_response.create(model=model, input=texts)
+        except openai.APIStatusError as e:
+            if e.status_code not in RETRYABLE_STATUS_CODES or attempt == MAX_RETRIES:
+                raise
+            delay = retry_delay(attempt, e.response.headers)
+            if e.status_code == 429:
+                concurrency.on_throttle()
+                limiter.pause(delay)
+            print(f"API returned {e.status_code}, retrying in {delay:.1f}s (concurrency {concurrency.limit})...")
+            await asyncio.sleep(delay)
+            continue
+        except (openai.APIConnectionError, openai.APITimeoutError) as e:
+            if attempt == MAX_RETRIES:
+                raise
+            delay = retry_delay(attempt)
+            print(f"Connection error ({e}), retrying in {delay:.1f}s...")
+            await asyncio.sleep(delay)
+            continue
+
+        concurrency.on_success(raw.headers)
+        response = raw.parse()
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+async def embed_window_async(client, window, limiter, concurrency, model=EMBEDDING_MODEL, cache=None):
+    """Async version of embed_window with the same caching and per-chunk error isolation."""
+    rows = pending_rows(window)
+    if not rows:
+        return
+
+    try:
+        vectors = await embed_texts_async(client, [row['chunk']['content'] for row in rows], limiter, concurrency, model)
+        for row, vector in zip(rows, vectors):
+            row['chunk']['embedding'] = vector
+        store_in_cache(cache, rows, model)
+        return
+    except Exception as e:
+        if len(rows) == 1:
+            rows[0]['error'] = f"Error processing line {rows[0]['line_num']}: {e}"
+            return
+        print(f"Batch of {len(rows)} chunks failed ({e}), retrying chunks individually...")
+
+    async def embed_row(row):
+        try:
+            row['chunk']['embedding'] = (await embed_texts_async(client, [row['chunk']['content']], limiter, concurrency, model))[0]
+        except Exception as e:
+            row['error'] = f"Error processing line {row['line_num']}: {e}"
+
+    await asyncio.gather(*(embed_row(row) for row in rows))
+    store_in_cache(cache, rows, model)
+
+def create_client():
+    """Create the OpenAI client, exiting if no API key is configured."""
     client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
-    
+
     if not client.api_key:
         print("Error: OPENAI_API_KEY not found in environment variables")
         sys.exit(1)
-    
+
+    return client
+
+def print_cache_report(cache):
+    """Summarize cache hits and misses for this run."""
+    if cache is None:
+        return
+    lookups = cache.hits + cache.misses
+    rate = 100 * cache.hits / lookups if lookups else 0
+    print(f"Cache hits: {cache.hits}, misses: {cache.misses} ({rate:.0f}% hit rate)")
+
+def generate_embeddings(input_file, output_file, batch_size=MAX_BATCH_INPUTS, max_batch_tokens=MAX_BATCH_TOKENS,
+                        cache=None, restart=False, layout='inline', dtype='float32'):
+    """Generate embeddings for a JSONL file and save to a new file."""
+
+    # Initialize OpenAI client
+    client = create_client()
+
     print(f"Reading from: {input_file}")
     print(f"Writing to: {output_file}")
-    
+
     processed_count = 0
     error_count = 0
-    
+    request_count = 0
+
     with open(input_file, 'r', encoding='utf-8') as infile, \
-         open(output_file, 'w', encoding='utf-8') as outfile:
-        
-        for line_num, line in enumerate(infile, 1):
-            line = line.strip()
-            if not line:
-                continue
-                
-            try:
-                # Parse JSON line
-                chunk = json.loads(line)
-                
-                # Check if embedding already exists
-                if chunk.get('embedding') is not None:
-                    print(f"Line {line_num}: Embedding already exists, skipping...")
-                    json.dump(chunk, outfile, ensure_ascii=False)
-                    outfile.write('\n')
-                    processed_count += 1
-                    continue
-                
-                # Generate embedding
-                print(f"Line {line_num}: Generating embedding for chunk {chunk.get('chunk_index', 'unknown')}...")
-                
-                response = client.embeddings.create(
-                    model="text-embedding-3-small",
-                    input=chunk['content']
-                )
-                
-                # Add embedding to chunk
-                chunk['embedding'] = response.data[0].embedding
-                
-                # Write updated chunk to output file
-                json.dump(chunk, outfile, ensure_ascii=False)
-                outfile.write('\n')
-                
-                processed_count += 1
-                
-                # Small delay to avoid rate limiting
-                import time
-                time.sleep(0.1)
-                
-            except json.JSONDecodeError as e:
-                print(f"Error parsing JSON on line {line_num}: {e}")
-                error_count += 1
-                continue
-            except Exception as e:
-                print(f"Error processing line {line_num}: {e}")
-                error_count += 1
-                continue
-    
+         EmbeddingOutput(output_file, layout, dtype, restart) as output:
+
+        resume = output.resume
+        for window in iter_windows(infile, batch_size, max_batch_tokens, resume, ChunkVectors(input_file)):
+            rows = fill_from_cache(cache, pending_rows(window))
+            if rows:
+                print(f"Lines {rows[0]['line_num']}-{rows[-1]['line_num']}: Generating embeddings for {len(rows)} chunks...")
+                embed_window(client, window, cache=cache)
+                request_count += 1
+
+            processed, errors = output.write(window)
+            processed_count += processed
+            error_count += errors
+
+    print(f"\nCompleted!")
+    if resume is not None:
+        print(f"Resumed: {resume.skipped} chunks already embedded")
+    print(f"Processed: {processed_count} chunks")
+    print(f"Errors: {error_count} chunks")
+    if error_count:
+        print("Rerun the same command to retry the failed chunks (they will be appended at the end of the output)")
+    print(f"Batched requests: {request_count}")
+    print_cache_report(cache)
+    print(f"Output saved to: {output_file}")
+
+async def generate_embeddings_async(input_file, output_file, batch_size=MAX_BATCH_INPUTS,
+                                    max_batch_tokens=MAX_BATCH_TOKENS, concurrency=4,
+                                    requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE,
+                                    tokens_per_minute=DEFAULT_TOKENS_PER_MINUTE, cache=None, restart=False,
+                                    layout='inline', dtype='float32'):
+    """
+    Generate embeddings with several batches in flight at once.
+
+    Windows are embedded concurrently but written strictly in input order; at most
+    two windows per concurrency slot are held in memory at any time.
+    """
+
+    # Retries are handled here so Retry-After and the concurrency limit stay in sync
+    client = AsyncOpenAI(api_key=create_client().api_key, max_retries=0)
+    limiter = TokenBucket(requests_per_minute, tokens_per_minute)
+    controller = AdaptiveConcurrency(concurrency, maximum=concurrency * 4)
+
+    print(f"Reading from: {input_file}")
+    print(f"Writing to: {output_file}")
+    print(f"Concurrency: {concurrency} (adaptive, up to {controller.maximum}), {requests_per_minute} RPM, {tokens_per_minute} TPM")
+
+    processed_count = 0
+    error_count = 0
+    request_count = 0
+    in_flight = deque()
+
+    async def drain_one():
+        nonlocal processed_count, error_count
+        window, task = in_flight.popleft()
+        await task
+        processed, errors = output.write(window)
+        processed_count += processed
+        error_count += errors
+
+    with open(input_file, 'r', encoding='utf-8') as infile, \
+         EmbeddingOutput(output_file, layout, dtype, restart) as output:
+
+        resume = output.resume
+        for window in iter_windows(infile, batch_size, max_batch_tokens, resume, ChunkVectors(input_file)):
+            rows = fill_from_cache(cache, pending_rows(window))
+            if rows:
+                print(f"Lines {rows[0]['line_num']}-{rows[-1]['line_num']}: Queued {len(rows)} chunks for embedding...")
+                request_count += 1
+            in_flight.append((window, asyncio.create_task(embed_window_async(client, window, limiter, controller, cache=cache))))
+
+            while len(in_flight) >= controller.maximum * 2:
+                await drain_one()
+
+        while in_flight:
+            await drain_one()
+
+    await client.close()
+
     print(f"\nCompleted!")
+    if resume is not None:
+        print(f"Resumed: {resume.skipped} chunks already embedded")
     print(f"Processed: {processed_count} chunks")
     print(f"Errors: {error_count} chunks")
+    if error_count:
+        print("Rerun the same command to retry the failed chunks (they will be appended at the end of the output)")
+    print(f"Batched requests: {request_count}")
+    print(f"Final concurrency: {controller.limit}")
+    print_cache_report(cache)
     print(f"Output saved to: {output_file}")
 
 def main():
     """Main function to handle command line arguments."""
-    
-    if len(sys.argv) != 2:
-        print("Usage: python generate_embeddings.py <input_file.jsonl>")
-        print("Example: python generate_embeddings.py community_sources/reading_old_books_lewis.jsonl")
-        sys.exit(1)
-    
-    input_file = sys.argv[1]
-    
+
+    parser = argparse.ArgumentParser(
+        description="Generate OpenAI embeddings for a JSONL community source file.",
+        epilog="Example: python generate_embeddings.py community_sources/reading_old_books_lewis.jsonl"
+    )
+    parser.add_argument('input_file', help="JSONL file of chunks")
+    parser.add_argument('--batch-size', type=int, default=MAX_BATCH_INPUTS,
+                        help=f"Maximum chunks per embedding request (default: {MAX_BATCH_INPUTS})")
+    parser.add_argument('--max-batch-tokens', type=int, default=MAX_BATCH_TOKENS,
+                        help=f"Maximum estimated tokens per embedding request (default: {MAX_BATCH_TOKENS})")
+    parser.add_argument('--concurrency', type=int, default=1,
+                        help="Batches to keep in flight at once; above 1 uses the async pipeline (default: 1)")
+    parser.add_argument('--rpm', type=int, default=DEFAULT_REQUESTS_PER_MINUTE,
+                        help=f"Requests per minute allowed by the account (default: {DEFAULT_REQUESTS_PER_MINUTE})")
+    parser.add_argument('--tpm', type=int, default=DEFAULT_TOKENS_PER_MINUTE,
+                        help=f"Tokens per minute allowed by the account (default: {DEFAULT_TOKENS_PER_MINUTE})")
+    parser.add_argument('--cache', help="Embedding cache database (default: data/cache/embeddings.sqlite)")
+    parser.add_argument('--no-cache', action='store_true', help="Always call the API, ignoring the embedding cache")
+    parser.add_argument('--cache-max-entries', type=int, help="Evict least recently used cache entries beyond this count")
+    parser.add_argument('--cache-max-mb', type=float, help="Evict least recently used cache entries beyond this size")
+    parser.add_argument('--restart', action='store_true',
+                        help="Discard any partial output from an interrupted run instead of resuming it")
+    parser.add_argument('--layout', choices=['inline', 'store'], default='inline',
+                        help="Write vectors inline as JSON or to a binary .vectors.npy sidecar (default: inline)")
+    parser.add_argument('--dtype', choices=['float32', 'float16'], default='float32',
+                        help="Sidecar precision for --layout store (default: float32)")
+    parser.add_argument('--prefix-dims', type=int,
+                        help="Also write an N-dimension prefix index for two-stage search (e.g. 256 or 512)")
+    args = parser.parse_args()
+
+    input_file = args.input_file
+
     # Check if input file exists
     if not os.path.exists(input_file):
         print(f"Error: Input file '{input_file}' not found")
         sys.exit(1)
-    
+
+    batch_size = max(1, min(args.batch_size, MAX_BATCH_INPUTS))
+
     # Generate output filename
     input_path = Path(input_file)
     output_file = input_path.parent / f"{input_path.stem}_embeddings{input_path.suffix}"
-    
+
     # Confirm before proceeding
     print(f"This will generate embeddings for: {input_file}")
     print(f"Output will be saved to: {output_file}")
     print(f"Make sure you have OPENAI_API_KEY set in your .env file")
     print("Proceeding automatically...")
-    
+
+    cache = None
+    if not args.no_cache:
+        max_bytes = int(args.cache_max_mb * 1024 * 1024) if args.cache_max_mb else None
+        cache = EmbeddingCache(args.cache, args.cache_max_entries, max_bytes)
+
     # Generate embeddings
-    generate_embeddings(input_file, str(output_file))
+    try:
+        if args.concurrency > 1:
+            asyncio.run(generate_embeddings_async(
+                input_file, str(output_file), batch_size, args.max_batch_tokens,
+                args.concurrency, args.rpm, args.tpm, cache, args.restart, args.layout, args.dtype
+            ))
+        else:
+            generate_embeddings(input_file, str(output_file), batch_size, args.max_batch_tokens, cache,
+                                args.restart, args.layout, args.dtype)
+    except ResumeMismatch as e:
+        print(f"Error: existing output does not match the input ({e})")
+        print("Rerun with --restart to regenerate it from scratch")
+        sys.exit(1)
+
+    if cache is not None:
+        cache.close()
+
+    if args.prefix_dims:
+        print(f"Prefix index saved to: {write_prefix_index(output_file, args.prefix_dims)}")
 
 if __name__ == "__main__":
     main()
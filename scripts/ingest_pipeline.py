@@ -0,0 +1,440 @@
+#!/usr/bin/env python3
+"""
+Single-pass ingest: raw chunk JSONL -> Qdrant, with no intermediate files.
+
+Replaces running generate_embeddings.py, convert_to_qdrant.py and an upload as
+three full passes that each write a file many times larger than the source.
+Chunks stream through connected asyncio stages:
+
+    read/validate -> [tag] -> [enrich] -> embed -> convert -> upsert
+
+Stages pass batches over bounded queues (--queue-size batches each), so a slow
+stage makes the ones before it wait instead of buffering the whole source. Peak
+memory is roughly (stages x queue size x batch size) chunks however large the
+file is, and because all stages run at once the total time approaches that of
+the slowest stage rather than the sum of all of them. The per-stage timing
+report at the end shows which stage that is.
+
+Tagging uses the Syntopicon term matcher (syntopicon_tagger.py), enrichment the
+batched LLM enrichment (enrich_chunks.py), and embedding the same batched
+requests, rate limiter and embedding cache as generate_embeddings.py. Points are
+built as in convert_to_qdrant.py/bulk_upload.py and upserted in batches; upserts
+are idempotent, so an interrupted run can simply be rerun. Chunks may arrive in
+Qdrant out of input order. A run in which any upsert failed exits with status 1
+after reporting how many points are missing; rerunning it retries them (chunks
+already embedded come from the embedding and enrichment caches).
+
+Intermediates are written only when asked for (--write-embeddings, --write-qdrant),
+and only hold chunks that made it through conversion.
+
+Usage:
+    python ingest_pipeline.py <source.jsonl> [--tag] [--enrich] [--collection documents] [--create-collection]
+    python ingest_pipeline.py <source.jsonl> --enrich [--enrich-rpm 50] [--enrich-concurrency 4] [--chunks-per-request 15]
+"""
+
+import argparse
+import asyncio
+import resource
+import sys
+import time
+from pathlib import Path
+
+from openai import AsyncOpenAI
+
+from bulk_upload import qdrant_point
+from convert_to_qdrant import dumps, fallback_slug, loads, to_qdrant
+from embedding_cache import EmbeddingCache
+from generate_embeddings import (DEFAULT_REQUESTS_PER_MINUTE, DEFAULT_TOKENS_PER_MINUTE, MAX_BATCH_INPUTS,
+                                 create_client, embed_window_async, fill_from_cache, pending_rows)
+from qdrant_rest import DEFAULT_COLLECTION, QdrantError, QdrantREST
+from rate_limiter import AdaptiveConcurrency, TokenBucket
+
+DEFAULT_BATCH_SIZE = 256
+DEFAULT_QUEUE_SIZE = 4
+DEFAULT_EMBED_CONCURRENCY = 4
+DEFAULT_UPLOAD_WORKERS = 2
+
+# End-of-stream marker passed down the queues
+DONE = None
+
+class StageStats:
+    """Items, busy time (averaged over the stage's workers) and input queue high-water mark of one stage."""
+
+    def __init__(self, name, workers=1):
+        self.name = name
+        self.workers = workers
+        self.items = 0
+        self.busy = 0.0
+        self.max_queue = 0
+
+    @property
+    def busy_per_worker(self):
+        return self.busy / self.workers
+
+    def report(self, wall):
+        share = self.busy_per_worker / wall if wall else 0
+        print(f"  {self.name:<8} {self.items:>9,} chunks  {self.busy_per_worker:>7.1f}s busy ({share:>4.0%} of wall)  "
+              f"input queue peak {self.max_queue}")
+
+async def run_stage(name, work, inbox, outbox, stats, workers=1):
+    """
+    Apply `work(batch)` to every batch from `inbox` with `workers` concurrent tasks.
+
+    `work` returns the batch to pass on (or None to drop it). The last worker to
+    see the end-of-stream marker forwards it to `outbox`.
+    """
+    remaining = workers
+
+    async def worker():
+        nonlocal remaining
+        while True:
+            stats.max_queue = max(stats.max_queue, inbox.qsize())
+            batch = await inbox.get()
+            if batch is DONE:
+                # Let sibling workers see the marker too
+                await inbox.put(DONE)
+                remaining -= 1
+                if remaining == 0 and outbox is not None:
+                    await outbox.put(DONE)
+                return
+            started = time.perf_counter()
+            result = await work(batch)
+            stats.busy += time.perf_counter() - started
+            if result:
+                stats.items += len(result)
+                if outbox is not None:
+                    await outbox.put(result)
+
+    await asyncio.gather(*(worker() for _ in range(workers)))
+
+def read_batches(input_file, batch_size, errors):
+    """Yield batches of row dicts ({line_num, chunk, error}) of valid chunks."""
+    batch = []
+    with open(input_file, 'rb') as f:
+        for line_num, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                chunk = loads(line)
+            except ValueError as e:
+                errors.append(f"Error parsing JSON on line {line_num}: {e}")
+                continue
+            if not isinstance(chunk.get('content'), str) or not chunk['content'].strip():
+                errors.append(f"Error processing line {line_num}: missing 'content'")
+                continue
+            if chunk.get('chunk_index') is None:
+                errors.append(f"Error processing line {line_num}: missing 'chunk_index'")
+                continue
+            batch.append({"line_num": line_num, "chunk": chunk, "error": None})
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+def request_windows(rows, per_request, max_chars):
+    """Split rows into windows of at most `per_request` chunks and `max_chars` characters."""
+    windows = []
+    window = []
+    chars = 0
+    for row in rows:
+        size = len(row['chunk']['content'])
+        if window and (len(window) >= per_request or chars + size > max_chars):
+            windows.append(window)
+            window = []
+            chars = 0
+        window.append(row)
+        chars += size
+    if window:
+        windows.append(window)
+    return windows
+
+class IngestPipeline:
+    """Wires the stages together for one source file."""
+
+    def __init__(self, input_file, collection=DEFAULT_COLLECTION, batch_size=DEFAULT_BATCH_SIZE,
+                 queue_size=DEFAULT_QUEUE_SIZE, tag=False, enrich=False, embed_concurrency=DEFAULT_EMBED_CONCURRENCY,
+                 upload_workers=DEFAULT_UPLOAD_WORKERS, requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE,
+                 tokens_per_minute=DEFAULT_TOKENS_PER_MINUTE, cache=None, url=None, source_id=None,
+                 create_collection=False, upload=True, write_embeddings=None, write_qdrant=None,
+                 enrich_requests_per_minute=None, enrich_tokens_per_minute=None, enrich_concurrency=None,
+                 chunks_per_request=None):
+        self.input_file = input_file
+        self.collection = collection
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.tag = tag
+        self.enrich = enrich
+        self.embed_concurrency = embed_concurrency
+        self.upload_workers = upload_workers
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.cache = cache
+        self.url = url
+        self.source_id = source_id
+        self.create_collection = create_collection
+        self.upload = upload
+        self.write_embeddings = write_embeddings
+        self.write_qdrant = write_qdrant
+        # None means enrich_chunks.py's default
+        self.enrich_requests_per_minute = enrich_requests_per_minute
+        self.enrich_tokens_per_minute = enrich_tokens_per_minute
+        self.enrich_concurrency = enrich_concurrency
+        self.chunks_per_request = chunks_per_request
+        self.fallback = fallback_slug(input_file)
+        self.errors = []
+        self.failed_points = 0
+
+    # Stages -----------------------------------------------------------------
+
+    async def read(self, outbox, stats):
+        """Parse and validate lines; the file is read in a thread so the loop stays free."""
+        iterator = read_batches(self.input_file, self.batch_size, self.errors)
+        while True:
+            started = time.perf_counter()
+            batch = await asyncio.to_thread(next, iterator, None)
+            stats.busy += time.perf_counter() - started
+            if batch is None:
+                break
+            stats.items += len(batch)
+            await outbox.put(batch)
+        await outbox.put(DONE)
+
+    def tag_work(self):
+        from syntopicon_tagger import DEFAULT_TAXONOMY_PATH, TermAutomaton, tag_chunk
+        from taxonomy_loader import load_taxonomy_file
+        automaton = TermAutomaton.from_taxonomy(load_taxonomy_file(DEFAULT_TAXONOMY_PATH))
+        print(f"Tagging with {len(automaton.patterns)} Syntopicon patterns")
+
+        def tag_batch(batch):
+            for row in batch:
+                tag_chunk(automaton, row['chunk'], apply=True)
+            return batch
+
+        async def work(batch):
+            return await asyncio.to_thread(tag_batch, batch)
+        return work
+
+    def enrich_work(self):
+        import enrich_chunks
+        categories = enrich_chunks.load_categories()
+        system = enrich_chunks.system_prompt(categories)
+        tool = enrich_chunks.tool_definition(categories)
+        client = enrich_chunks.create_client()
+        requests_per_minute = self.enrich_requests_per_minute or enrich_chunks.DEFAULT_REQUESTS_PER_MINUTE
+        concurrency = self.enrich_concurrency or enrich_chunks.DEFAULT_CONCURRENCY
+        per_request = self.chunks_per_request or enrich_chunks.DEFAULT_CHUNKS_PER_REQUEST
+        limiter = TokenBucket(requests_per_minute, self.enrich_tokens_per_minute)
+        controller = AdaptiveConcurrency(concurrency, maximum=concurrency * 4)
+        cache = enrich_chunks.EnrichmentCache()
+        print(f"Enriching {per_request} chunks per request, concurrency {concurrency}, {requests_per_minute} RPM")
+        self.closers.append(client.close)
+        self.closers.append(cache.close)
+
+        async def work(batch):
+            for row in batch:
+                row['pending'] = not enrich_chunks.enriched(row['chunk'])
+            enrich_chunks.fill_from_cache(cache, enrich_chunks.pending_rows(batch))
+            windows = request_windows(enrich_chunks.pending_rows(batch), per_request, enrich_chunks.MAX_REQUEST_CHARS)
+            await asyncio.gather(*(enrich_chunks.enrich_window(client, window, system, tool, categories, limiter,
+                                                               controller, cache=cache) for window in windows))
+            return self.drop_errors(batch)
+        return work
+
+    def embed_work(self):
+        client = AsyncOpenAI(api_key=create_client().api_key, max_retries=0)
+        limiter = TokenBucket(self.requests_per_minute, self.tokens_per_minute)
+        controller = AdaptiveConcurrency(self.embed_concurrency, maximum=self.embed_concurrency * 4)
+        self.closers.append(client.close)
+
+        async def work(batch):
+            rows = fill_from_cache(self.cache, pending_rows(batch))
+            if rows:
+                await embed_window_async(client, batch, limiter, controller, cache=self.cache)
+            return self.drop_errors(batch)
+        return work
+
+    def convert_work(self):
+        embeddings_file = open(self.write_embeddings, 'w', encoding='utf-8') if self.write_embeddings else None
+        qdrant_file = open(self.write_qdrant, 'w', encoding='utf-8') if self.write_qdrant else None
+        self.closers.extend(f.close for f in (embeddings_file, qdrant_file) if f is not None)
+
+        async def work(batch):
+            points = []
+            converted_rows = []
+            for row in batch:
+                try:
+                    converted = to_qdrant(row['chunk'], self.fallback)
+                    points.append(qdrant_point(converted, self.fallback, self.source_id))
+                except Exception as e:
+                    self.errors.append(f"Error processing line {row['line_num']}: {type(e).__name__}: {e}")
+                    continue
+                converted_rows.append(row)
+                if qdrant_file is not None:
+                    qdrant_file.write(dumps(converted) + '\n')
+            if embeddings_file is not None:
+                embeddings_file.write(''.join(dumps(row['chunk']) + '\n' for row in converted_rows))
+            return points
+        return work
+
+    def upsert_work(self, client):
+        # The first batch creates the collection (if asked); later ones wait for it
+        created = asyncio.Lock()
+        checked = False
+
+        def ensure_collection(size):
+            if client.get_collection(self.collection) is None:
+                client.create_collection(self.collection, size)
+                client.create_payload_index(self.collection, 'source_id')
+                print(f"Created collection '{self.collection}' ({size} dimensions, cosine)")
+
+        async def work(points):
+            nonlocal checked
+            if self.create_collection and not checked:
+                async with created:
+                    if not checked:
+                        await asyncio.to_thread(ensure_collection, len(points[0]['vector']))
+                        checked = True
+            try:
+                await asyncio.to_thread(client.upsert, self.collection, points)
+            except QdrantError as e:
+                self.errors.append(f"Upsert of {len(points)} points failed: {e}")
+                self.failed_points += len(points)
+                return None
+            return points
+        return work
+
+    def drop_errors(self, batch):
+        kept = []
+        for row in batch:
+            if row['error']:
+                self.errors.append(row['error'])
+            else:
+                kept.append(row)
+        return kept
+
+    # Driver -----------------------------------------------------------------
+
+    async def run(self):
+        """Run every stage to completion; returns the number of points upserted."""
+        started = time.perf_counter()
+        self.closers = []
+
+        client = None
+        if self.upload:
+            client = QdrantREST(self.url, pool_size=self.upload_workers)
+            if not self.create_collection and client.get_collection(self.collection) is None:
+                raise QdrantError(f"Collection '{self.collection}' does not exist (use --create-collection)")
+
+        stages = [("read", None, 1)]
+        if self.tag:
+            stages.append(("tag", self.tag_work(), 1))
+        if self.enrich:
+            stages.append(("enrich", self.enrich_work(), 2))
+        stages.append(("embed", self.embed_work(), self.embed_concurrency))
+        stages.append(("convert", self.convert_work(), 1))
+        if client is not None:
+            stages.append(("upsert", self.upsert_work(client), self.upload_workers))
+
+        queues = [asyncio.Queue(self.queue_size) for _ in stages[1:]]
+        stats = [StageStats(name, workers) for name, _, workers in stages]
+        print(f"Stages: {' -> '.join(name for name, _, _ in stages)}")
+        print(f"Batch size {self.batch_size}, {self.queue_size} batches per queue")
+
+        tasks = [self.read(queues[0], stats[0])]
+        for i, (name, work, workers) in enumerate(stages[1:], 1):
+            outbox = queues[i] if i < len(queues) else None
+            tasks.append(run_stage(name, work, queues[i - 1], outbox, stats[i], workers))
+
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for close in self.closers:
+                result = close()
+                if asyncio.iscoroutine(result):
+                    await result
+            if client is not None:
+                client.close()
+
+        wall = time.perf_counter() - started
+        for message in self.errors[:20]:
+            print(message)
+        if len(self.errors) > 20:
+            print(f"... and {len(self.errors) - 20} more errors")
+
+        print(f"\nCompleted in {wall:.1f}s")
+        for stage in stats:
+            stage.report(wall)
+        print(f"Sum of stage times: {sum(stage.busy_per_worker for stage in stats):.1f}s")
+        print(f"Errors: {len(self.errors)}")
+        if self.failed_points:
+            print(f"Failed upserts: {self.failed_points:,} points are not in Qdrant; rerun the same command to retry")
+        print(f"Peak memory: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB")
+        return stats[-1].items
+
+def main():
+    """Ingest a source file from the command line."""
+
+    parser = argparse.ArgumentParser(
+        description="Stream raw chunks through tag/enrich, embedding, conversion and upsert in one pass.",
+        epilog="Example: python ingest_pipeline.py data/sources/reading_old_books_lewis.jsonl --tag --create-collection"
+    )
+    parser.add_argument('input_file', help="JSONL file of chunks")
+    parser.add_argument('--collection', default=DEFAULT_COLLECTION, help=f"Collection (default: {DEFAULT_COLLECTION})")
+    parser.add_argument('--url', help="Qdrant URL (default: QDRANT_URL or http://localhost:6333)")
+    parser.add_argument('--create-collection', action='store_true',
+                        help="Create the collection (cosine, sized from the first vector) if it does not exist")
+    parser.add_argument('--source-id', help="Database source id to store in each payload's source_id")
+    parser.add_argument('--tag', action='store_true', help="Tag chunks with Syntopicon term matches")
+    parser.add_argument('--enrich', action='store_true', help="Add LLM metadata (rhetorical function, topics, ...)")
+    parser.add_argument('--enrich-rpm', type=int,
+                        help="Enrichment requests per minute (default: enrich_chunks.py's, 50)")
+    parser.add_argument('--enrich-tpm', type=int, help="Enrichment tokens per minute (default: unlimited)")
+    parser.add_argument('--enrich-concurrency', type=int,
+                        help="Enrichment requests in flight (default: enrich_chunks.py's, 4)")
+    parser.add_argument('--chunks-per-request', type=int,
+                        help="Chunks packed into each enrichment request (default: enrich_chunks.py's, 15)")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                        help=f"Chunks per batch passed between stages (default: {DEFAULT_BATCH_SIZE})")
+    parser.add_argument('--queue-size', type=int, default=DEFAULT_QUEUE_SIZE,
+                        help=f"Batches buffered between two stages (default: {DEFAULT_QUEUE_SIZE})")
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_EMBED_CONCURRENCY,
+                        help=f"Embedding batches in flight (default: {DEFAULT_EMBED_CONCURRENCY})")
+    parser.add_argument('--upload-workers', type=int, default=DEFAULT_UPLOAD_WORKERS,
+                        help=f"Upserts in flight (default: {DEFAULT_UPLOAD_WORKERS})")
+    parser.add_argument('--rpm', type=int, default=DEFAULT_REQUESTS_PER_MINUTE,
+                        help=f"Embedding requests per minute (default: {DEFAULT_REQUESTS_PER_MINUTE})")
+    parser.add_argument('--tpm', type=int, default=DEFAULT_TOKENS_PER_MINUTE,
+                        help=f"Embedding tokens per minute (default: {DEFAULT_TOKENS_PER_MINUTE})")
+    parser.add_argument('--no-cache', action='store_true', help="Always call the API, ignoring the embedding cache")
+    parser.add_argument('--no-upload', action='store_true', help="Stop after conversion (use with --write-qdrant)")
+    parser.add_argument('--write-embeddings', help="Also write the embedded chunks to this JSONL file")
+    parser.add_argument('--write-qdrant', help="Also write the Qdrant-ready chunks to this JSONL file")
+    args = parser.parse_args()
+
+    if not Path(args.input_file).exists():
+        print(f"Error: File '{args.input_file}' not found")
+        sys.exit(1)
+
+    cache = None if args.no_cache else EmbeddingCache()
+    pipeline = IngestPipeline(
+        args.input_file, args.collection, max(1, min(args.batch_size, MAX_BATCH_INPUTS)), max(1, args.queue_size),
+        args.tag, args.enrich, max(1, args.concurrency), max(1, args.upload_workers), args.rpm, args.tpm, cache,
+        args.url, args.source_id, args.create_collection, not args.no_upload, args.write_embeddings, args.write_qdrant,
+        enrich_requests_per_minute=args.enrich_rpm, enrich_tokens_per_minute=args.enrich_tpm,
+        enrich_concurrency=args.enrich_concurrency and max(1, args.enrich_concurrency),
+        chunks_per_request=args.chunks_per_request and max(1, args.chunks_per_request)
+    )
+    try:
+        asyncio.run(pipeline.run())
+    except QdrantError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    finally:
+        if cache is not None:
+            cache.close()
+    if pipeline.failed_points:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Crash-safe JSONL output for long-running scripts.
+
+Output is appended in whole lines and fsynced after every batch, so a killed run
+leaves a valid prefix plus at most one torn trailing line. recover_jsonl() trims
+that torn line and returns the rows already written, which ResumeState uses to skip
+chunks that were finished before the interruption.
+
+write_atomically() and write_text_atomically() replace whole files (manifests,
+the taxonomy) via a temp file, fsync and os.replace, for outputs that are
+rewritten rather than appended to.
+"""
+
+import hashlib
+import json
+import os
+from collections import Counter
+from pathlib import Path
+
+def chunk_key(chunk):
+    """
+    Identity of a chunk across runs: its `id`, falling back to `chunk_index`, then to
+    a hash of its content for rows that carry neither.
+    """
+    if chunk.get('id') is not None:
+        return ('id', chunk['id'])
+    if chunk.get('chunk_index') is not None:
+        return ('chunk_index', chunk['chunk_index'])
+    if isinstance(chunk.get('content'), str):
+        return ('content', hashlib.sha256(chunk['content'].encode('utf-8')).hexdigest())
+    return None
+
+def recover_jsonl(path):
+    """
+    Read the complete rows of a partially written JSONL file.
+
+    A trailing line that is unterminated or fails to parse is truncated away so the
+    file can safely be appended to.
+    """
+    rows = []
+    if not os.path.exists(path):
+        return rows
+
+    valid_bytes = 0
+    with open(path, 'rb') as f:
+        for raw in f:
+            if not raw.endswith(b'\n'):
+                break
+            line = raw.strip()
+            if line:
+                try:
+                    rows.append(json.loads(line))
+                except json.JSONDecodeError:
+                    break
+            valid_bytes += len(raw)
+
+    if valid_bytes < os.path.getsize(path):
+        with open(path, 'r+b') as f:
+            f.truncate(valid_bytes)
+            f.flush()
+            os.fsync(f.fileno())
+        print(f"Truncated torn trailing line from {path}")
+
+    return rows
+
+class ResumeMismatch(Exception):
+    """The existing output does not correspond to the current input."""
+
+class ResumeState:
+    """
+    Tracks which chunks an earlier, interrupted run already finished.
+
+    Each written row accounts for one input row, so a key that occurs twice in the
+    input (two identical unkeyed paragraphs, say) is only skipped as often as it
+    was written.
+    """
+
+    def __init__(self, rows, is_done=None):
+        is_done = is_done or (lambda row: True)
+        self.done = {}
+        self.remaining = Counter()
+        for row in rows:
+            key = chunk_key(row)
+            if key is not None and is_done(row):
+                self.done[key] = row.get('content')
+                self.remaining[key] += 1
+        self.count = sum(self.remaining.values())
+        self.skipped = 0
+
+    def __len__(self):
+        return self.count
+
+    def already_done(self, chunk):
+        """True if this chunk was written by an earlier run (and should be skipped)."""
+        key = chunk_key(chunk)
+        if not self.remaining.get(key):
+            return False
+        if self.done[key] != chunk.get('content'):
+            raise ResumeMismatch(f"{key[0]} {key[1]!r} has different content in the existing output")
+        self.remaining[key] -= 1
+        self.skipped += 1
+        return True
+
+class CheckpointWriter:
+    """Appends batches of lines and makes each batch durable before returning."""
+
+    def __init__(self, path, resume=False):
+        self.path = path
+        self.file = open(path, 'a' if resume else 'w', encoding='utf-8')
+
+    def append(self, lines):
+        if not lines:
+            return
+        self.file.write(''.join(lines))
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+def write_atomically(path, data):
+    """Replace `path` with `data` serialized as JSON so readers never see a partial file."""
+    write_text_atomically(path, json.dumps(data, indent=2, ensure_ascii=False))
+
+def write_text_atomically(path, text):
+    """Replace `path` with `text` so readers never see a partial file."""
+    path = Path(path)
+    temp_path = path.with_name(f".{path.name}.tmp")
+
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+    # Persist the rename itself
+    if os.name == 'posix':
+        dir_fd = os.open(path.parent, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
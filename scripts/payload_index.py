@@ -0,0 +1,388 @@
+#!/usr/bin/env python3
+"""
+Pre-filtered local vector search with per-value payload indexes.
+
+Post-filtering a top-k result wastes the scan and returns too few hits when the
+filter is selective ("only Augustine", "only chunks tagged Wisdom"). Instead,
+PayloadIndex keeps a sorted row list for every value of the commonly filtered
+fields (author, genre, year, source type, Syntopicon tags, rhetorical function,
+topics) and resolves a Qdrant-style filter to a candidate bitmap before any
+vector is scored:
+
+    {"must": [{"key": "author", "match": {"value": "C. S. Lewis"}},
+              {"key": "year", "range": {"gte": 1940, "lt": 1950}}],
+     "should": [{"key": "syntopicon_tags", "match": {"any": ["Education", "Wisdom"]}}],
+     "must_not": [{"key": "genre", "match": {"value": "Letter"}}]}
+
+FilteredSearch then picks a plan by selectivity: candidates that fit in what an
+IVF probe would scan anyway are scored exactly (brute force over just those
+rows); larger candidate sets use the IVF cells, skipping non-matching rows and
+probing more cells until enough matches are found.
+
+Values are read from the top level of the payload or from its `metadata`, so both
+Qdrant-ready chunks and uploaded payloads work. Keys without an index fall back to
+a payload scan. {"scripture": "Romans 8:1-17"} matches chunks citing any verse
+in the passage, through the interval index in scripture_refs.py.
+
+Usage:
+    python payload_index.py <file.jsonl> [...] --like <chunk id> --where author="C. S. Lewis" [--where year>=1940]
+    python payload_index.py <file.jsonl> [...] --like <chunk id> --filter '{"must": [...]}' [--ivf]
+"""
+
+import argparse
+import json
+import re
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from vector_search import VectorIndex, normalize_rows, top_k
+
+INDEXED_FIELDS = ("author", "genre", "year", "source_title", "source_type", "syntopicon_tags",
+                  "rhetorical_function", "topics")
+
+# Probe widening for filtered IVF search stops once this many cells have been tried
+MAX_PROBE_GROWTH = 64
+
+def field_values(payload, key):
+    """Values of a (possibly dotted) payload key, flattened to a list of hashable scalars."""
+    value = payload
+    for part in key.split('.'):
+        if not isinstance(value, dict):
+            return []
+        found = value.get(part)
+        if found is None and part == key and isinstance(value.get('metadata'), dict):
+            found = value['metadata'].get(part)
+        value = found
+    return list(_flatten(value))
+
+def _flatten(value):
+    if value is None:
+        return
+    if isinstance(value, list):
+        for item in value:
+            yield from _flatten(item)
+    elif isinstance(value, dict):
+        # Tag objects ({"concept": ...}) and enriched rhetorical functions ({"primary": {"category": ...}})
+        if 'concept' in value:
+            yield value['concept']
+        elif 'category' in value:
+            yield value['category']
+        else:
+            for key in ('primary', 'secondary'):
+                yield from _flatten(value.get(key))
+    else:
+        yield value
+
+def normalize_value(value):
+    """Match semantics are on strings, so 1944 and "1944" are the same year."""
+    return str(value)
+
+def as_number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+class PayloadIndex:
+    """Row lists per (field, value), plus sorted numeric values for range conditions."""
+
+    def __init__(self, payloads, fields=INDEXED_FIELDS):
+        self.payloads = payloads
+        self.count = len(payloads)
+        self.fields = tuple(fields)
+        self.postings = {}
+        self.numeric = {}
+        self._scripture = None
+
+        for field in self.fields:
+            rows_by_value = {}
+            numbers = []
+            for row, payload in enumerate(payloads):
+                for value in field_values(payload, field):
+                    rows_by_value.setdefault(normalize_value(value), []).append(row)
+                    number = as_number(value)
+                    if number is not None:
+                        numbers.append((number, row))
+            self.postings[field] = {value: np.unique(np.array(rows, dtype=np.int32))
+                                    for value, rows in rows_by_value.items()}
+            numbers.sort()
+            self.numeric[field] = (np.array([n for n, _ in numbers], dtype=np.float64),
+                                   np.array([r for _, r in numbers], dtype=np.int32))
+
+    def scripture(self):
+        """Interval index over the payloads' scripture references, built on first use."""
+        if self._scripture is None:
+            from scripture_refs import ScriptureIndex
+            self._scripture = ScriptureIndex.from_payloads(self.payloads)
+        return self._scripture
+
+    def values(self, field):
+        """{value: number of chunks} for an indexed field."""
+        return {value: len(rows) for value, rows in self.postings[field].items()}
+
+    def _mask(self, rows):
+        mask = np.zeros(self.count, dtype=bool)
+        mask[rows] = True
+        return mask
+
+    def _scan(self, test):
+        return np.fromiter((test(payload) for payload in self.payloads), dtype=bool, count=self.count)
+
+    def field(self, key):
+        """`metadata.topics` and `topics` name the same indexed field."""
+        if key.startswith('metadata.') and key[len('metadata.'):] in self.postings:
+            return key[len('metadata.'):]
+        return key
+
+    def match(self, key, values):
+        """Bitmap of rows having any of `values` under `key`."""
+        key = self.field(key)
+        wanted = {normalize_value(value) for value in values}
+        if key not in self.postings:
+            return self._scan(lambda payload: any(normalize_value(v) in wanted for v in field_values(payload, key)))
+        lists = [self.postings[key][value] for value in wanted if value in self.postings[key]]
+        return self._mask(np.concatenate(lists)) if lists else np.zeros(self.count, dtype=bool)
+
+    def range(self, key, bounds):
+        """Bitmap of rows with a numeric value inside `bounds` ({gt, gte, lt, lte})."""
+        key = self.field(key)
+        if key not in self.numeric:
+            def within(payload):
+                return any(_in_range(as_number(v), bounds) for v in field_values(payload, key))
+            return self._scan(within)
+        numbers, rows = self.numeric[key]
+        low = 0
+        high = len(numbers)
+        if bounds.get('gte') is not None:
+            low = np.searchsorted(numbers, float(bounds['gte']), 'left')
+        if bounds.get('gt') is not None:
+            low = max(low, np.searchsorted(numbers, float(bounds['gt']), 'right'))
+        if bounds.get('lte') is not None:
+            high = np.searchsorted(numbers, float(bounds['lte']), 'right')
+        if bounds.get('lt') is not None:
+            high = min(high, np.searchsorted(numbers, float(bounds['lt']), 'left'))
+        return self._mask(rows[low:max(low, high)])
+
+    def condition(self, condition, ids=None):
+        """Bitmap of one condition (or nested filter)."""
+        if 'must' in condition or 'should' in condition or 'must_not' in condition:
+            return self.resolve(condition, ids)
+        if 'has_id' in condition:
+            if ids is None:
+                raise ValueError("has_id conditions need the index's point ids")
+            wanted = set(condition['has_id'])
+            return np.fromiter((point in wanted for point in ids), dtype=bool, count=self.count)
+        if 'scripture' in condition:
+            return self.scripture().mask(condition['scripture'])
+        if 'is_empty' in condition:
+            key = condition['is_empty']['key']
+            return self._scan(lambda payload: not field_values(payload, key))
+
+        key = condition['key']
+        if 'range' in condition:
+            return self.range(key, condition['range'])
+        match = condition.get('match') or {}
+        if 'value' in match:
+            return self.match(key, [match['value']])
+        if 'any' in match:
+            return self.match(key, match['any'])
+        if 'except' in match:
+            return ~self.match(key, match['except'])
+        raise ValueError(f"Unsupported condition: {condition}")
+
+    def resolve(self, query, ids=None):
+        """Bitmap of rows matching a filter ({must, should, must_not}); None matches everything."""
+        mask = np.ones(self.count, dtype=bool)
+        if not query:
+            return mask
+        for condition in query.get('must') or []:
+            mask &= self.condition(condition, ids)
+        if query.get('should'):
+            any_of = np.zeros(self.count, dtype=bool)
+            for condition in query['should']:
+                any_of |= self.condition(condition, ids)
+            mask &= any_of
+        for condition in query.get('must_not') or []:
+            mask &= ~self.condition(condition, ids)
+        return mask
+
+def _in_range(number, bounds):
+    if number is None:
+        return False
+    return ((bounds.get('gt') is None or number > bounds['gt']) and
+            (bounds.get('gte') is None or number >= bounds['gte']) and
+            (bounds.get('lt') is None or number < bounds['lt']) and
+            (bounds.get('lte') is None or number <= bounds['lte']))
+
+class FilteredSearch:
+    """
+    Filtered top-k over a VectorIndex or IVFIndex.
+
+    The payload index is built over the index's rows; call `refresh` after adding,
+    removing or compacting an IVF index.
+    """
+
+    def __init__(self, index, fields=INDEXED_FIELDS):
+        self.index = index
+        self.fields = fields
+        self.refresh()
+
+    def refresh(self):
+        self.payloads = PayloadIndex(self.index.payloads, self.fields)
+
+    @property
+    def is_ivf(self):
+        return hasattr(self.index, 'centroids')
+
+    def plan(self, query_filter, nprobe=None):
+        """(candidate bitmap, strategy): 'exact', 'brute-force' or 'ivf'."""
+        mask = self.payloads.resolve(query_filter, self.index.ids)
+        if self.is_ivf:
+            mask &= self.index.alive
+            nprobe = min(nprobe or self.index.nprobe, self.index.nlist)
+            # An unfiltered probe scans about this many rows; fewer candidates are cheaper to score exactly
+            probe_rows = len(self.index.ids) * nprobe / self.index.nlist
+            return mask, 'brute-force' if mask.sum() <= probe_rows else 'ivf'
+        return mask, 'exact'
+
+    def _format(self, rows, scores, with_payload):
+        hits = []
+        for row, score in zip(rows, scores):
+            point = {"id": self.index.ids[row], "score": float(score)}
+            if with_payload:
+                point["payload"] = self.index.payloads[row]
+            hits.append(point)
+        return hits
+
+    def _score_rows(self, query, rows, limit, with_payload):
+        scores = self.index.vectors[rows] @ query
+        best = top_k(scores[np.newaxis, :], limit)[0]
+        return self._format(rows[best], scores[best], with_payload)
+
+    def _filtered_ivf(self, query, mask, limit, with_payload, nprobe):
+        """
+        Probe cells nearest-first, skipping rows that fail the filter, until as many
+        matching rows have been collected as an unfiltered probe would score.
+        """
+        index = self.index
+        target = max(limit, len(index.ids) * nprobe // index.nlist)
+        order = np.argsort(-(index.centroids @ query))
+        parts = []
+        found = 0
+        probed = 0
+        step = nprobe
+        while probed < min(index.nlist, MAX_PROBE_GROWTH * nprobe):
+            cells = order[probed:probed + step]
+            probed += len(cells)
+            rows = index._candidates(cells)
+            rows = rows[mask[rows]]
+            parts.append(rows)
+            found += len(rows)
+            if found >= target:
+                break
+            step *= 2
+        return self._score_rows(query, np.concatenate(parts), limit, with_payload)
+
+    def search_batch(self, query_vectors, limit=10, query_filter=None, with_payload=True, nprobe=None):
+        """Top-k matches among the rows passing `query_filter`, for each query vector."""
+        if query_filter is None:
+            if self.is_ivf:
+                return self.index.search_batch(query_vectors, limit, with_payload, nprobe)
+            return self.index.search_batch(query_vectors, limit, with_payload)
+
+        queries = normalize_rows(np.array(query_vectors, dtype=np.float32, ndmin=2, copy=True))
+        mask, strategy = self.plan(query_filter, nprobe)
+        rows = np.flatnonzero(mask)
+        if not len(rows):
+            return [[] for _ in queries]
+
+        if strategy == 'ivf':
+            nprobe = min(nprobe or self.index.nprobe, self.index.nlist)
+            return [self._filtered_ivf(query, mask, limit, with_payload, nprobe) for query in queries]
+
+        if strategy == 'exact' and len(rows) > len(mask) // 2:
+            # Most rows pass: one full matrix product with the rest masked out is cheaper than gathering
+            results = []
+            for query in queries:
+                scores = self.index.vectors @ query
+                scores[~mask] = -np.inf
+                best = top_k(scores[np.newaxis, :], min(limit, len(rows)))[0]
+                results.append(self._format(best, scores[best], with_payload))
+            return results
+
+        return [self._score_rows(query, rows, limit, with_payload) for query in queries]
+
+    def search(self, query_vector, limit=10, query_filter=None, with_payload=True, nprobe=None):
+        return self.search_batch([query_vector], limit, query_filter, with_payload, nprobe)[0]
+
+WHERE_PATTERN = re.compile(r'^([\w.]+)\s*(>=|<=|!=|=|>|<)\s*(.+)$')
+
+def parse_where(expressions):
+    """Filter from `key=value`, `key!=value` and `key>=number` shorthands (all must hold)."""
+    query = {"must": [], "must_not": []}
+    for expression in expressions:
+        m = WHERE_PATTERN.match(expression)
+        if not m:
+            raise ValueError(f"Cannot parse --where '{expression}'")
+        key, op, value = m.groups()
+        value = value.strip().strip('"\'')
+        if op == '=':
+            query['must'].append({"key": key, "match": {"value": value}})
+        elif op == '!=':
+            query['must_not'].append({"key": key, "match": {"value": value}})
+        else:
+            bound = {'>=': 'gte', '<=': 'lte', '>': 'gt', '<': 'lt'}[op]
+            query['must'].append({"key": key, "range": {bound: float(value)}})
+    return query
+
+def main():
+    """Run a filtered search from the command line."""
+
+    parser = argparse.ArgumentParser(description="Pre-filtered vector search over embedding JSONL files.")
+    parser.add_argument('files', nargs='+', help="Embedding JSONL files to search")
+    parser.add_argument('--like', required=True, help="Chunk id whose vector is the query")
+    parser.add_argument('--where', action='append', default=[], help='Condition like author="C. S. Lewis" or year>=1940')
+    parser.add_argument('--filter', help="Qdrant-style filter as JSON")
+    parser.add_argument('--limit', type=int, default=5, help="Results (default: 5)")
+    parser.add_argument('--ivf', action='store_true', help="Search an IVF index built over the files")
+    parser.add_argument('--nprobe', type=int, help="IVF cells probed")
+    args = parser.parse_args()
+
+    for path in args.files:
+        if not Path(path).exists():
+            print(f"Error: File '{path}' not found")
+            sys.exit(1)
+
+    try:
+        query_filter = json.loads(args.filter) if args.filter else parse_where(args.where) if args.where else None
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    index = VectorIndex.from_jsonl(*args.files)
+    if args.like not in index.positions:
+        print(f"Error: no chunk with id '{args.like}'")
+        sys.exit(1)
+    query = index.vector(args.like)
+    if args.ivf:
+        from ann_index import IVFIndex
+        index = IVFIndex.build(index.ids, index.payloads, index.vectors)
+
+    search = FilteredSearch(index)
+    if query_filter:
+        mask, strategy = search.plan(query_filter, args.nprobe)
+        print(f"Filter matches {int(mask.sum())} of {len(index)} chunks; plan: {strategy}")
+
+    started = time.perf_counter()
+    hits = search.search(query, args.limit, query_filter, nprobe=args.nprobe)
+    print(f"Searched in {(time.perf_counter() - started) * 1000:.2f} ms")
+    for rank, point in enumerate(hits, 1):
+        payload = point['payload']
+        print(f"{rank:2d}. {point['score']:.4f}  {point['id']}  {payload.get('author', '')}, "
+              f"{payload.get('source_title', '')} ({payload.get('year', '')})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Minimal Qdrant REST client shared by the upload and sync scripts.
+
+Uses one pooled keep-alive requests.Session, so concurrent batches reuse
+connections instead of opening one per request. Request bodies above a small size
+are gzip-compressed, and 429/5xx responses and dropped connections are retried
+with backoff (honouring `Retry-After`).
+
+QDRANT_URL and QDRANT_API_KEY are read from the environment (or .env), as the
+backend does. Point any of the scripts at `qdrant_standin.py` to test without a
+real Qdrant.
+"""
+
+import gzip
+import os
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+
+from convert_to_qdrant import dumps
+from rate_limiter import RETRYABLE_STATUS_CODES, retry_delay
+
+# Load environment variables
+load_dotenv()
+
+DEFAULT_URL = "http://localhost:6333"
+DEFAULT_COLLECTION = "documents"
+DEFAULT_TIMEOUT = 120
+MAX_RETRIES = 6
+
+# Bodies smaller than this are sent uncompressed; gzip level trades CPU for bytes
+GZIP_MIN_BYTES = 1024
+GZIP_LEVEL = 1
+
+class QdrantError(Exception):
+    """A request Qdrant rejected, or one that still failed after all retries."""
+
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+class QdrantREST:
+    """Thread-safe enough for a pool of upload threads sharing one session."""
+
+    def __init__(self, url=None, api_key=None, gzip_requests=True, pool_size=8,
+                 timeout=DEFAULT_TIMEOUT, max_retries=MAX_RETRIES):
+        self.url = (url or os.getenv('QDRANT_URL') or DEFAULT_URL).rstrip('/')
+        self.gzip_requests = gzip_requests
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.bytes_sent = 0
+        self.bytes_uncompressed = 0
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers['Content-Type'] = 'application/json'
+        api_key = api_key or os.getenv('QDRANT_API_KEY')
+        if api_key:
+            self.session.headers['api-key'] = api_key
+
+    def request(self, method, path, body=None, params=None, missing_ok=False):
+        """
+        Send one request and return the `result` field of the response.
+
+        With `missing_ok`, a 404 returns None instead of raising.
+        """
+        headers = {}
+        data = None
+        if body is not None:
+            data = dumps(body).encode('utf-8')
+            self.bytes_uncompressed += len(data)
+            if self.gzip_requests and len(data) >= GZIP_MIN_BYTES:
+                data = gzip.compress(data, compresslevel=GZIP_LEVEL)
+                headers['Content-Encoding'] = 'gzip'
+            self.bytes_sent += len(data)
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self.session.request(method, f"{self.url}{path}", data=data, params=params,
+                                                headers=headers, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt == self.max_retries:
+                    raise QdrantError(f"{method} {path} failed: {e}")
+                delay = retry_delay(attempt)
+                print(f"Connection error ({e}), retrying in {delay:.1f}s...")
+                time.sleep(delay)
+                continue
+            except requests.RequestException as e:
+                # Bad URL, redirect loop, broken response body: retrying will not help
+                raise QdrantError(f"{method} {path} failed: {e}")
+
+            if response.status_code == 404 and missing_ok:
+                return None
+            if response.status_code in RETRYABLE_STATUS_CODES and attempt < self.max_retries:
+                delay = retry_delay(attempt, response.headers)
+                print(f"Qdrant returned {response.status_code}, retrying in {delay:.1f}s...")
+                time.sleep(delay)
+                continue
+            if response.status_code >= 400:
+                raise QdrantError(f"{method} {path} returned {response.status_code}: {response.text[:500]}",
+                                  response.status_code)
+            try:
+                return response.json().get('result')
+            except ValueError:
+                raise QdrantError(f"{method} {path} returned invalid JSON: {response.text[:500]}",
+                                  response.status_code)
+
+    def get_collection(self, collection=DEFAULT_COLLECTION):
+        """Collection info, or None if it does not exist."""
+        return self.request('GET', f"/collections/{collection}", missing_ok=True)
+
+    def create_collection(self, collection, size, distance='Cosine'):
+        return self.request('PUT', f"/collections/{collection}", {"vectors": {"size": size, "distance": distance}})
+
+    def create_payload_index(self, collection, field, schema='keyword'):
+        return self.request('PUT', f"/collections/{collection}/index", {"field_name": field, "field_schema": schema},
+                            params={"wait": "true"})
+
+    def upsert(self, collection, points, wait=True):
+        """Insert or replace points ({id, vector, payload})."""
+        return self.request('PUT', f"/collections/{collection}/points", {"points": points},
+                            params={"wait": str(wait).lower()})
+
+    def delete(self, collection, ids, wait=True):
+        return self.request('POST', f"/collections/{collection}/points/delete", {"points": list(ids)},
+                            params={"wait": str(wait).lower()})
+
+    def overwrite_payload(self, collection, payload, ids, wait=True):
+        """Replace the whole payload of the given points, leaving their vectors untouched."""
+        return self.request('PUT', f"/collections/{collection}/points/payload",
+                            {"payload": payload, "points": list(ids)}, params={"wait": str(wait).lower()})
+
+    def batch_update(self, collection, operations, wait=True):
+        """Apply several operations (e.g. {"overwrite_payload": {...}}) in one request."""
+        return self.request('POST', f"/collections/{collection}/points/batch", {"operations": operations},
+                            params={"wait": str(wait).lower()})
+
+    def retrieve(self, collection, ids, with_payload=True, with_vector=False):
+        return self.request('POST', f"/collections/{collection}/points",
+                            {"ids": list(ids), "with_payload": with_payload, "with_vector": with_vector})
+
+    def scroll(self, collection, filter=None, with_payload=True, with_vector=False, page_size=1000):
+        """Yield every point matching `filter`, a page at a time."""
+        offset = None
+        while True:
+            body = {"limit": page_size, "with_payload": with_payload, "with_vector": with_vector}
+            if filter is not None:
+                body["filter"] = filter
+            if offset is not None:
+                body["offset"] = offset
+            result = self.request('POST', f"/collections/{collection}/points/scroll", body)
+            yield from result.get('points', [])
+            offset = result.get('next_page_offset')
+            if offset is None:
+                return
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+In-memory stand-in for the parts of the Qdrant REST API the upload scripts use.
+
+Supports creating/inspecting collections, upserting, retrieving, scrolling,
+deleting, payload updates and batched operations, gzip request bodies, an
+optional api-key, and injected 503 responses (--fail-every N) to exercise
+retries. Point ids must be unsigned integers or UUIDs, as in Qdrant. Nothing is
+persisted.
+
+Usage:
+    python qdrant_standin.py [--port 6333] [--api-key KEY] [--fail-every N]
+    QDRANT_URL=http://localhost:6333 python bulk_upload.py ...
+"""
+
+import argparse
+import gzip
+import json
+import re
+import threading
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+def valid_point_id(point_id):
+    if isinstance(point_id, int):
+        return point_id >= 0
+    try:
+        uuid.UUID(str(point_id))
+        return True
+    except ValueError:
+        return False
+
+def payload_value(payload, key):
+    for part in key.split('.'):
+        if not isinstance(payload, dict):
+            return None
+        payload = payload.get(part)
+    return payload
+
+def matches_condition(point_id, payload, condition):
+    if 'has_id' in condition:
+        return point_id in condition['has_id']
+    if 'must' in condition or 'should' in condition or 'must_not' in condition:
+        return matches_filter(point_id, payload, condition)
+    value = payload_value(payload, condition['key'])
+    values = value if isinstance(value, list) else [value]
+    match = condition.get('match', {})
+    if 'value' in match:
+        return match['value'] in values
+    if 'any' in match:
+        return any(v in match['any'] for v in values)
+    if 'except' in match:
+        return not any(v in match['except'] for v in values)
+    return False
+
+def matches_filter(point_id, payload, query):
+    if not query:
+        return True
+    if any(not matches_condition(point_id, payload, c) for c in query.get('must') or []):
+        return False
+    if query.get('should') and not any(matches_condition(point_id, payload, c) for c in query['should']):
+        return False
+    return not any(matches_condition(point_id, payload, c) for c in query.get('must_not') or [])
+
+class Store:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.collections = {}
+        self.requests = 0
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    store = None
+    api_key = None
+    fail_every = 0
+
+    def log_message(self, *args):
+        pass
+
+    def reply(self, code, result=None, error=None):
+        body = {"result": result, "status": "ok", "time": 0.0} if error is None else {"status": {"error": error}, "time": 0.0}
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        if code == 503:
+            self.send_header('Retry-After', '0.1')
+        self.end_headers()
+        self.wfile.write(data)
+
+    def read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        data = self.rfile.read(length) if length else b''
+        if self.headers.get('Content-Encoding') == 'gzip':
+            data = gzip.decompress(data)
+        return json.loads(data) if data else {}
+
+    def handle_request(self, method):
+        body = self.read_body() if method in ('PUT', 'POST') else {}
+        if self.api_key and self.headers.get('api-key') != self.api_key:
+            return self.reply(403, error="Invalid api-key")
+
+        store = self.store
+        with store.lock:
+            store.requests += 1
+            if self.fail_every and store.requests % self.fail_every == 0:
+                return self.reply(503, error="Service temporarily unavailable (injected)")
+
+        path = self.path.split('?')[0].rstrip('/')
+        if path == '/collections' and method == 'GET':
+            with store.lock:
+                return self.reply(200, {"collections": [{"name": name} for name in store.collections]})
+
+        m = re.fullmatch(r'/collections/([^/]+)(/.*)?', path)
+        if not m:
+            return self.reply(404, error=f"Not found: {path}")
+        name, rest = m.group(1), m.group(2) or ''
+
+        with store.lock:
+            collection = store.collections.get(name)
+            if rest == '' and method == 'PUT':
+                if collection is not None:
+                    return self.reply(409, error=f"Collection `{name}` already exists!")
+                store.collections[name] = {"config": body, "points": {}}
+                return self.reply(200, True)
+            if collection is None:
+                return self.reply(404, error=f"Collection `{name}` doesn't exist!")
+            points = collection['points']
+
+            if rest == '' and method == 'GET':
+                vectors = collection['config'].get('vectors', {})
+                return self.reply(200, {"status": "green", "points_count": len(points),
+                                        "config": {"params": {"vectors": vectors}}})
+            if rest == '' and method == 'DELETE':
+                del store.collections[name]
+                return self.reply(200, True)
+            if rest == '/index' and method == 'PUT':
+                return self.reply(200, {"operation_id": 0, "status": "completed"})
+
+            if rest == '/points' and method == 'PUT':
+                size = collection['config'].get('vectors', {}).get('size')
+                for point in body.get('points', []):
+                    if not valid_point_id(point.get('id')):
+                        return self.reply(400, error=f"Bad point id {point.get('id')!r}: must be an unsigned integer or UUID")
+                    if size and len(point.get('vector') or []) != size:
+                        return self.reply(400, error=f"Wrong vector dimension: expected {size}, got {len(point.get('vector') or [])}")
+                for point in body.get('points', []):
+                    points[str(point['id'])] = {"id": point['id'], "vector": point['vector'], "payload": point.get('payload') or {}}
+                return self.reply(200, {"operation_id": store.requests, "status": "completed"})
+
+            if rest == '/points' and method == 'POST':
+                found = [points[str(i)] for i in body.get('ids', []) if str(i) in points]
+                return self.reply(200, [self.render(p, body) for p in found])
+
+            if rest == '/points/delete' and method == 'POST':
+                if 'filter' in body:
+                    ids = [key for key, p in points.items() if matches_filter(p['id'], p['payload'], body['filter'])]
+                else:
+                    ids = [str(i) for i in body.get('points', [])]
+                for key in ids:
+                    points.pop(key, None)
+                return self.reply(200, {"operation_id": store.requests, "status": "completed"})
+
+            if rest == '/points/payload' and method in ('POST', 'PUT'):
+                for i in body.get('points', []):
+                    if str(i) in points:
+                        if method == 'PUT':
+                            points[str(i)]['payload'] = dict(body.get('payload') or {})
+                        else:
+                            points[str(i)]['payload'].update(body.get('payload') or {})
+                return self.reply(200, {"operation_id": store.requests, "status": "completed"})
+
+            if rest == '/points/batch' and method == 'POST':
+                for operation in body.get('operations', []):
+                    (kind, args), = operation.items()
+                    if kind == 'upsert':
+                        for point in args.get('points', []):
+                            points[str(point['id'])] = {"id": point['id'], "vector": point['vector'],
+                                                        "payload": point.get('payload') or {}}
+                    elif kind == 'delete':
+                        for i in args.get('points', []):
+                            points.pop(str(i), None)
+                    elif kind in ('overwrite_payload', 'set_payload'):
+                        for i in args.get('points', []):
+                            if str(i) in points:
+                                if kind == 'overwrite_payload':
+                                    points[str(i)]['payload'] = dict(args.get('payload') or {})
+                                else:
+                                    points[str(i)]['payload'].update(args.get('payload') or {})
+                    else:
+                        return self.reply(400, error=f"Unsupported operation {kind}")
+                return self.reply(200, [{"operation_id": store.requests, "status": "completed"}])
+
+            if rest == '/points/scroll' and method == 'POST':
+                selected = sorted((key for key, p in points.items()
+                                   if matches_filter(p['id'], p['payload'], body.get('filter'))), key=str)
+                offset = body.get('offset')
+                if offset is not None:
+                    selected = [key for key in selected if key >= str(offset)]
+                limit = body.get('limit', 10)
+                page = selected[:limit]
+                next_offset = points[selected[limit]]['id'] if len(selected) > limit else None
+                return self.reply(200, {"points": [self.render(points[key], body) for key in page],
+                                        "next_page_offset": next_offset})
+
+        return self.reply(404, error=f"Unsupported: {method} {self.path}")
+
+    @staticmethod
+    def render(point, body):
+        result = {"id": point['id']}
+        if body.get('with_payload', True):
+            result['payload'] = point['payload']
+        if body.get('with_vector'):
+            result['vector'] = point['vector']
+        return result
+
+    def do_GET(self):
+        self.handle_request('GET')
+
+    def do_PUT(self):
+        self.handle_request('PUT')
+
+    def do_POST(self):
+        self.handle_request('POST')
+
+    def do_DELETE(self):
+        self.handle_request('DELETE')
+
+def main():
+    """Serve the stand-in until interrupted."""
+
+    parser = argparse.ArgumentParser(description="Run an in-memory Qdrant REST stand-in for local testing.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=6333)
+    parser.add_argument('--api-key', help="Require this api-key header")
+    parser.add_argument('--fail-every', type=int, default=0, help="Answer every Nth request with a 503")
+    args = parser.parse_args()
+
+    Handler.store = Store()
+    Handler.api_key = args.api_key
+    Handler.fail_every = args.fail_every
+
+    server = ThreadingHTTPServer((args.host, args.port), Handler)
+    print(f"Qdrant stand-in listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+Quantized embedding storage with rescoring.
+
+Two compact encodings of normalized embeddings:
+- ScalarQuantizer: 8 bits per dimension, with per-dimension min/max (4x smaller).
+- ProductQuantizer: the vector is split into `m` subvectors, each stored as one
+  byte naming its nearest of 256 trained sub-centroids (1536 dims, m=96 -> 96 bytes).
+
+QuantizedIndex scores every chunk against the compact codes, keeps a shortlist and
+rescores it with the original vectors. Those can stay on disk in the .vectors.npy
+sidecar (see vector_store.py), so only the codes need to be in RAM.
+
+Usage:
+    python quantization.py build <index.npz> <file.jsonl> [...] [--method sq|pq] [--m 96]
+    python quantization.py search <index.npz> --like <chunk id> [--rescore 100]
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+
+from convert_to_qdrant import chunk_id, fallback_slug
+from vector_search import VectorIndex, normalize_rows, top_k
+from vector_store import load_embeddings
+
+# Rows decoded per block while scanning codes, to bound temporary memory
+SCAN_BLOCK = 8192
+DEFAULT_RESCORE = 100
+
+class ScalarQuantizer:
+    """Per-dimension 8-bit scalar quantization."""
+
+    method = 'sq'
+
+    def __init__(self, low, scale):
+        self.low = np.asarray(low, dtype=np.float32)
+        self.scale = np.asarray(scale, dtype=np.float32)
+
+    @classmethod
+    def train(cls, vectors):
+        low = vectors.min(axis=0)
+        high = vectors.max(axis=0)
+        scale = (high - low) / 255
+        scale[scale == 0] = 1
+        return cls(low, scale)
+
+    def encode(self, vectors):
+        codes = np.rint((np.asarray(vectors, dtype=np.float32) - self.low) / self.scale)
+        return np.clip(codes, 0, 255).astype(np.uint8)
+
+    def decode(self, codes):
+        return self.low + codes.astype(np.float32) * self.scale
+
+    def scores(self, queries, codes):
+        """Approximate dot products of queries with encoded rows: q.low + (q*scale).codes."""
+        offsets = queries @ self.low
+        weighted = queries * self.scale
+        result = np.empty((len(queries), len(codes)), dtype=np.float32)
+        for start in range(0, len(codes), SCAN_BLOCK):
+            block = codes[start:start + SCAN_BLOCK].astype(np.float32)
+            result[:, start:start + SCAN_BLOCK] = weighted @ block.T
+        return result + offsets[:, np.newaxis]
+
+    def params(self):
+        return {"low": self.low, "scale": self.scale}
+
+def kmeans_l2(vectors, k, iterations=15, seed=0):
+    """Plain (Euclidean) k-means, used to train PQ sub-codebooks."""
+    rng = np.random.default_rng(seed)
+    k = min(k, len(vectors))
+    centroids = np.array(vectors[rng.choice(len(vectors), k, replace=False)], dtype=np.float32)
+
+    for _ in range(iterations):
+        distances = (vectors ** 2).sum(axis=1)[:, np.newaxis] - 2 * vectors @ centroids.T + (centroids ** 2).sum(axis=1)
+        assignments = np.argmin(distances, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, vectors)
+        counts = np.bincount(assignments, minlength=k)
+        empty = counts == 0
+        centroids[~empty] = sums[~empty] / counts[~empty, np.newaxis]
+        if empty.any():
+            centroids[empty] = vectors[rng.choice(len(vectors), int(empty.sum()), replace=False)]
+
+    return centroids
+
+class ProductQuantizer:
+    """Product quantization with 256 centroids per subspace (one byte per subvector)."""
+
+    method = 'pq'
+
+    def __init__(self, codebooks):
+        # codebooks: (m, 256, dims / m)
+        self.codebooks = np.asarray(codebooks, dtype=np.float32)
+
+    @property
+    def m(self):
+        return self.codebooks.shape[0]
+
+    @classmethod
+    def train(cls, vectors, m=96, iterations=10, max_points=32768, seed=0):
+        dims = vectors.shape[1]
+        if dims % m:
+            raise ValueError(f"{dims} dimensions cannot be split into {m} equal subvectors")
+        rng = np.random.default_rng(seed)
+        if len(vectors) > max_points:
+            vectors = vectors[np.sort(rng.choice(len(vectors), max_points, replace=False))]
+        sub = dims // m
+        codebooks = np.zeros((m, 256, sub), dtype=np.float32)
+        for j in range(m):
+            trained = kmeans_l2(np.ascontiguousarray(vectors[:, j * sub:(j + 1) * sub]), 256, iterations, seed + j)
+            codebooks[j, :len(trained)] = trained
+        return cls(codebooks)
+
+    def encode(self, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        sub = self.codebooks.shape[2]
+        codes = np.empty((len(vectors), self.m), dtype=np.uint8)
+        for j, codebook in enumerate(self.codebooks):
+            part = vectors[:, j * sub:(j + 1) * sub]
+            distances = -2 * part @ codebook.T + (codebook ** 2).sum(axis=1)
+            codes[:, j] = np.argmin(distances, axis=1)
+        return codes
+
+    def decode(self, codes):
+        return np.concatenate([self.codebooks[j][codes[:, j]] for j in range(self.m)], axis=1)
+
+    def scores(self, queries, codes):
+        """Asymmetric distance computation: per-query lookup tables summed over subspaces."""
+        sub = self.codebooks.shape[2]
+        subspaces = np.arange(self.m)
+        result = np.empty((len(queries), len(codes)), dtype=np.float32)
+        for qi, query in enumerate(queries):
+            # tables[j, c] = query_subvector_j . codebook_j[c]
+            tables = np.einsum('js,jcs->jc', query.reshape(self.m, sub), self.codebooks)
+            for start in range(0, len(codes), SCAN_BLOCK):
+                block = codes[start:start + SCAN_BLOCK]
+                result[qi, start:start + SCAN_BLOCK] = tables[subspaces, block].sum(axis=1)
+        return result
+
+    def params(self):
+        return {"codebooks": self.codebooks}
+
+QUANTIZERS = {"sq": ScalarQuantizer, "pq": ProductQuantizer}
+
+class QuantizedIndex:
+    """First-stage search on quantized codes, rescored with the original vectors."""
+
+    def __init__(self, ids, payloads, quantizer, codes, originals=None):
+        self.ids = list(ids)
+        self.payloads = list(payloads)
+        self.quantizer = quantizer
+        self.codes = codes
+        # Original vectors (possibly a read-only memmap); None disables rescoring
+        self.originals = originals
+        self.positions = {point: i for i, point in enumerate(self.ids)}
+
+    @classmethod
+    def build(cls, ids, payloads, vectors, method='sq', m=96, keep_originals=True):
+        normalized = normalize_rows(np.array(vectors, dtype=np.float32, copy=True))
+        if method == 'pq':
+            quantizer = ProductQuantizer.train(normalized, m)
+        else:
+            quantizer = ScalarQuantizer.train(normalized)
+        codes = quantizer.encode(normalized)
+        return cls(ids, payloads, quantizer, codes, vectors if keep_originals else None)
+
+    @classmethod
+    def from_jsonl(cls, *paths, **options):
+        ids, payloads, matrices = _load_files(paths)
+        return cls.build(ids, payloads, matrices, **options)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def code_bytes(self):
+        return self.codes.nbytes
+
+    def vector(self, point):
+        """Original vector of a point (decoded from codes if originals are not loaded)."""
+        row = self.positions[point]
+        if self.originals is not None:
+            return np.asarray(self.originals[row], dtype=np.float32)
+        return self.quantizer.decode(self.codes[row:row + 1])[0]
+
+    def search_batch(self, query_vectors, limit=10, with_payload=True, rescore=DEFAULT_RESCORE):
+        """Top-k matches per query; `rescore` candidates are re-ranked with original vectors."""
+        queries = normalize_rows(np.array(query_vectors, dtype=np.float32, ndmin=2, copy=True))
+        approximate = self.quantizer.scores(queries, self.codes)
+        use_originals = self.originals is not None and rescore
+        shortlist = top_k(approximate, max(limit, rescore) if use_originals else limit)
+        results = []
+
+        for qi, candidates in enumerate(shortlist):
+            if use_originals:
+                rows = np.sort(candidates)
+                exact = normalize_rows(np.array(self.originals[rows], dtype=np.float32)) @ queries[qi]
+                best = top_k(exact[np.newaxis, :], limit)[0]
+                rows, scores = rows[best], exact[best]
+            else:
+                rows, scores = candidates, approximate[qi, candidates]
+
+            hits = []
+            for row, score in zip(rows, scores):
+                point = {"id": self.ids[row], "score": float(score)}
+                if with_payload:
+                    point["payload"] = self.payloads[row]
+                hits.append(point)
+            results.append(hits)
+
+        return results
+
+    def search(self, query_vector, limit=10, with_payload=True, rescore=DEFAULT_RESCORE):
+        return self.search_batch([query_vector], limit, with_payload, rescore)[0]
+
+    def save(self, path, sources=()):
+        """Write codes and quantizer parameters; originals are re-opened from `sources` on load."""
+        meta = {"method": self.quantizer.method, "ids": self.ids, "sources": [str(s) for s in sources]}
+        payloads = '\n'.join(json.dumps(payload, ensure_ascii=False) for payload in self.payloads)
+        with open(path, 'wb') as f:
+            np.savez(
+                f,
+                codes=self.codes,
+                meta=np.frombuffer(json.dumps(meta).encode('utf-8'), dtype=np.uint8),
+                payloads=np.frombuffer(payloads.encode('utf-8'), dtype=np.uint8),
+                **self.quantizer.params()
+            )
+
+    @classmethod
+    def load(cls, path, with_originals=True):
+        with np.load(path) as data:
+            meta = json.loads(data['meta'].tobytes().decode('utf-8'))
+            payloads = data['payloads'].tobytes().decode('utf-8')
+            quantizer_class = QUANTIZERS[meta['method']]
+            params = {name: data[name] for name in ('low', 'scale', 'codebooks') if name in data}
+            quantizer = quantizer_class(**params)
+            codes = data['codes']
+
+        originals = None
+        if with_originals and meta['sources']:
+            _, _, originals = _load_files(meta['sources'])
+        payloads = [json.loads(line) for line in payloads.split('\n')] if meta['ids'] else []
+        return cls(meta['ids'], payloads, quantizer, codes, originals)
+
+def _load_files(paths):
+    """ids, payloads and vectors of embedding files; a single store-layout file stays memory-mapped."""
+    if len(paths) == 1:
+        rows, matrix = load_embeddings(paths[0])
+        fallback = fallback_slug(paths[0])
+        ids = [chunk_id(chunk, fallback) for chunk in rows]
+        payloads = [{key: value for key, value in chunk.items() if key != 'id'} for chunk in rows]
+        return ids, payloads, matrix
+
+    exact = VectorIndex.from_jsonl(*paths)
+    return exact.ids, exact.payloads, exact.vectors
+
+def main():
+    """Build or query a quantized index from the command line."""
+
+    parser = argparse.ArgumentParser(description="Quantized embedding index with rescoring.")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    build = sub.add_parser('build', help="Quantize embedding files")
+    build.add_argument('index')
+    build.add_argument('files', nargs='+')
+    build.add_argument('--method', choices=sorted(QUANTIZERS), default='sq', help="sq (int8) or pq (default: sq)")
+    build.add_argument('--m', type=int, default=96, help="PQ subvectors; must divide the dimensions (default: 96)")
+
+    search = sub.add_parser('search', help="Query with a stored chunk's vector")
+    search.add_argument('index')
+    search.add_argument('--like', required=True, help="Chunk id whose vector is the query")
+    search.add_argument('--limit', type=int, default=5)
+    search.add_argument('--rescore', type=int, default=DEFAULT_RESCORE, help="Shortlist rescored with originals (0 = off)")
+
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        for path in args.files:
+            if not Path(path).exists():
+                print(f"Error: File '{path}' not found")
+                sys.exit(1)
+        index = QuantizedIndex.from_jsonl(*args.files, method=args.method, m=args.m)
+        index.save(args.index, args.files)
+        original_bytes = len(index) * index.originals.shape[1] * 4
+        print(f"Quantized {len(index)} vectors with {args.method}: {index.code_bytes() / 1024:.0f} KB of codes "
+              f"(float32 vectors: {original_bytes / 1024:.0f} KB)")
+        print(f"Index saved to: {args.index}")
+        return
+
+    index = QuantizedIndex.load(args.index)
+    if args.like not in index.positions:
+        print(f"Error: no chunk with id '{args.like}'")
+        sys.exit(1)
+    for rank, point in enumerate(index.search(index.vector(args.like), args.limit, rescore=args.rescore), 1):
+        print(f"{rank:2d}. {point['score']:.4f}  {point['id']}")
+
+if __name__ == "__main__":
+    main()
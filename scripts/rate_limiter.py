@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Async rate limiting helpers shared by the API-calling scripts.
+
+- TokenBucket: client-side limiter sized by requests/min and tokens/min.
+- AdaptiveConcurrency: caps in-flight requests, backing off when the API throttles
+  and growing again while the rate limit headers show plenty of headroom.
+- retry_delay: how long to wait before retrying, honouring `Retry-After`.
+"""
+
+import asyncio
+import random
+import re
+import time
+
+# Status codes worth retrying: rate limited, or a transient server-side failure
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504, 529}
+
+class TokenBucket:
+    """Two token buckets (requests and tokens) refilled continuously per minute."""
+
+    def __init__(self, requests_per_minute, tokens_per_minute=None):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._request_allowance = float(requests_per_minute)
+        self._token_allowance = float(tokens_per_minute or 0)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._updated
+        self._updated = now
+        self._request_allowance = min(
+            self.requests_per_minute,
+            self._request_allowance + elapsed * self.requests_per_minute / 60
+        )
+        if self.tokens_per_minute:
+            self._token_allowance = min(
+                self.tokens_per_minute,
+                self._token_allowance + elapsed * self.tokens_per_minute / 60
+            )
+
+    async def acquire(self, tokens=0):
+        """Wait until one request carrying `tokens` tokens fits in both buckets."""
+        if self.tokens_per_minute:
+            # A single request larger than the whole bucket could never be admitted
+            tokens = min(tokens, self.tokens_per_minute)
+
+        async with self._lock:
+            while True:
+                self._refill()
+                needs_tokens = bool(self.tokens_per_minute) and self._token_allowance < tokens
+                if self._request_allowance >= 1 and not needs_tokens:
+                    self._request_allowance -= 1
+                    if self.tokens_per_minute:
+                        self._token_allowance -= tokens
+                    return
+
+                wait = 0.0
+                if self._request_allowance < 1:
+                    wait = (1 - self._request_allowance) * 60 / self.requests_per_minute
+                if needs_tokens:
+                    wait = max(wait, (tokens - self._token_allowance) * 60 / self.tokens_per_minute)
+                await asyncio.sleep(wait)
+
+    def pause(self, seconds):
+        """Drain the buckets so nothing new is sent for roughly `seconds`."""
+        self._refill()
+        self._request_allowance = min(self._request_allowance, -seconds * self.requests_per_minute / 60)
+
+class AdaptiveConcurrency:
+    """
+    A resizable semaphore for in-flight requests.
+
+    The limit is halved whenever the API throttles us and grows by one after a run of
+    successful responses whose rate limit headers show more than `headroom` of the
+    window still unused.
+    """
+
+    def __init__(self, initial, minimum=1, maximum=None, headroom=0.5, grow_after=5):
+        self.minimum = minimum
+        self.maximum = maximum or initial
+        self.limit = max(minimum, min(initial, self.maximum))
+        self.headroom = headroom
+        self.grow_after = grow_after
+        self._in_flight = 0
+        self._successes = 0
+        self._condition = asyncio.Condition()
+
+    async def __aenter__(self):
+        async with self._condition:
+            while self._in_flight >= self.limit:
+                await self._condition.wait()
+            self._in_flight += 1
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        async with self._condition:
+            self._in_flight -= 1
+            self._condition.notify_all()
+
+    def on_success(self, headers=None):
+        """Record a successful response; grow the limit if headers show headroom."""
+        self._successes += 1
+        if self._successes < self.grow_after or self.limit >= self.maximum:
+            return
+
+        fraction = remaining_fraction(headers or {})
+        if fraction is not None and fraction <= self.headroom:
+            if fraction < self.headroom / 4:
+                # Close to the limit: trim before the API starts refusing requests
+                self.limit = max(self.minimum, self.limit - 1)
+            self._successes = 0
+            return
+
+        self.limit += 1
+        self._successes = 0
+
+    def on_throttle(self):
+        """Record a 429/overload response; halve the limit."""
+        self.limit = max(self.minimum, self.limit // 2)
+        self._successes = 0
+
+def remaining_fraction(headers):
+    """
+    Smallest remaining/limit ratio across the request and token rate limit headers,
+    or None if the response carried no rate limit headers.
+    """
+    fractions = []
+    for kind in ('requests', 'tokens'):
+        limit = _header(headers, f'x-ratelimit-limit-{kind}', f'anthropic-ratelimit-{kind}-limit')
+        remaining = _header(headers, f'x-ratelimit-remaining-{kind}', f'anthropic-ratelimit-{kind}-remaining')
+        try:
+            limit = float(limit)
+            remaining = float(remaining)
+        except (TypeError, ValueError):
+            continue
+        if limit > 0:
+            fractions.append(remaining / limit)
+    return min(fractions) if fractions else None
+
+def _header(headers, *names):
+    for name in names:
+        value = headers.get(name)
+        if value is not None:
+            return value
+    return None
+
+def parse_duration(value):
+    """Parse durations such as '1.5', '20ms', '6m0s' or '1h2m3.5s' into seconds."""
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+
+    parts = re.findall(r'(\d+(?:\.\d+)?)(ms|h|m|s)', value)
+    if not parts:
+        return None
+    scale = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600}
+    return sum(float(amount) * scale[unit] for amount, unit in parts)
+
+def retry_delay(attempt, headers=None, base=1.0, maximum=60.0):
+    """
+    Seconds to wait before retry number `attempt` (starting at 0).
+
+    Uses `Retry-After` (or `retry-after-ms`) when the server sent one, otherwise
+    exponential backoff with jitter.
+    """
+    headers = headers or {}
+    retry_after_ms = headers.get('retry-after-ms')
+    if retry_after_ms is not None:
+        seconds = parse_duration(retry_after_ms)
+        if seconds is not None:
+            return min(seconds / 1000, maximum)
+
+    seconds = parse_duration(headers.get('retry-after'))
+    if seconds is not None:
+        return min(seconds, maximum)
+
+    return min(base * (2 ** attempt), maximum) * (0.5 + random.random() / 2)
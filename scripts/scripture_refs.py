@@ -0,0 +1,438 @@
+#!/usr/bin/env python3
+"""
+Scripture reference normalizer and interval index.
+
+`metadata.scripture_refs` holds free-form strings ("Rom. 8:28", "1 Cor 13",
+"Matt 5:3-12; 6:9") or enrichment objects ({"reference": ..., "type": ...}), or
+nothing at all. `parse` turns any of these into canonical verse ranges. A verse is
+the ordinal book * 1,000,000 + chapter * 1,000 + verse, with books numbered 1-66
+in Protestant canon order, so a reference becomes one or more [start, end]
+integer intervals:
+
+    Romans 8:1-17    -> [45008001, 45008017]
+    Romans 8         -> [45008000, 45008999]
+    Romans 8:28-9:5  -> [45008028, 45009005]
+
+Book names, common abbreviations, numbered-book spellings ("1 Cor", "I
+Corinthians", "First Corinthians"), verse lists and ranges, chapter ranges,
+"ff" suffixes and references that continue the previous book ("John 3:16;
+4:24", "Romans 8:1-17 and 12:1", "Rom 5:12 cf. 8:3") are understood. Single-chapter
+books take a bare number as a verse ("Jude 5"). Names are matched in any case
+("romans 8:1"), except short aliases that are also English words ("is", "am",
+"job", "mark"), which only count when capitalized.
+
+ScriptureIndex answers "which chunks cite anything in Romans 8:1-17" as an
+interval overlap query in O(log n + matches): intervals sorted by start, plus a
+max-end tree over that order. bulk_upload.qdrant_point stores each chunk's
+intervals as `scripture_ranges` at ingest time, and payload_index.py accepts
+{"scripture": "Romans 8:1-17"} as a filter condition.
+
+Usage:
+    python scripture_refs.py parse "Rom 8:1–17; 1 Cor 13" ["Gen 1:1, 3, 5-7" ...]
+    python scripture_refs.py search <file.jsonl> [...] --ref "Romans 8:1-17"
+"""
+
+import argparse
+import json
+import re
+import sys
+from pathlib import Path
+
+import numpy as np
+
+BOOK_FACTOR = 1000000
+CHAPTER_FACTOR = 1000
+# Open-ended chapter or book ranges run to these (never-reached) numbers
+LAST = 999
+
+# (canonical name, aliases); numbered books list aliases without the number
+BOOKS = [
+    ("Genesis", ["gen", "ge", "gn"]),
+    ("Exodus", ["exod", "exo", "ex"]),
+    ("Leviticus", ["lev", "le", "lv"]),
+    ("Numbers", ["num", "nu", "nm", "nb"]),
+    ("Deuteronomy", ["deut", "dt", "de"]),
+    ("Joshua", ["josh", "jos", "jsh"]),
+    ("Judges", ["judg", "jdg", "jg", "jdgs"]),
+    ("Ruth", ["rth", "ru"]),
+    ("1 Samuel", ["samuel", "sam", "sa", "sm"]),
+    ("2 Samuel", ["samuel", "sam", "sa", "sm"]),
+    ("1 Kings", ["kings", "kgs", "ki", "kin"]),
+    ("2 Kings", ["kings", "kgs", "ki", "kin"]),
+    ("1 Chronicles", ["chronicles", "chron", "chr", "ch"]),
+    ("2 Chronicles", ["chronicles", "chron", "chr", "ch"]),
+    ("Ezra", ["ezr"]),
+    ("Nehemiah", ["neh", "ne"]),
+    ("Esther", ["esth", "est", "es"]),
+    ("Job", ["jb"]),
+    ("Psalms", ["psalm", "ps", "psa", "pss", "psm"]),
+    ("Proverbs", ["prov", "pro", "prv", "pr"]),
+    ("Ecclesiastes", ["eccles", "eccl", "ecc", "ec", "qoh", "qoheleth"]),
+    ("Song of Solomon", ["song of songs", "song", "sos", "canticles", "cant"]),
+    ("Isaiah", ["isa", "is"]),
+    ("Jeremiah", ["jer", "je", "jr"]),
+    ("Lamentations", ["lam"]),
+    ("Ezekiel", ["ezek", "eze", "ezk"]),
+    ("Daniel", ["dan", "da", "dn"]),
+    ("Hosea", ["hos", "ho"]),
+    ("Joel", ["jl"]),
+    ("Amos", ["am"]),
+    ("Obadiah", ["obad", "ob"]),
+    ("Jonah", ["jnh", "jon"]),
+    ("Micah", ["mic", "mc"]),
+    ("Nahum", ["nah"]),
+    ("Habakkuk", ["hab", "hb"]),
+    ("Zephaniah", ["zeph", "zep", "zp"]),
+    ("Haggai", ["hag", "hg"]),
+    ("Zechariah", ["zech", "zec", "zc"]),
+    ("Malachi", ["mal", "ml"]),
+    ("Matthew", ["matt", "mat", "mt"]),
+    ("Mark", ["mrk", "mk", "mr"]),
+    ("Luke", ["luk", "lk"]),
+    ("John", ["joh", "jhn", "jn"]),
+    ("Acts", ["act", "ac"]),
+    ("Romans", ["rom", "ro", "rm"]),
+    ("1 Corinthians", ["corinthians", "cor", "co"]),
+    ("2 Corinthians", ["corinthians", "cor", "co"]),
+    ("Galatians", ["gal", "ga"]),
+    ("Ephesians", ["eph", "ephes"]),
+    ("Philippians", ["phil", "php"]),
+    ("Colossians", ["col", "co"]),
+    ("1 Thessalonians", ["thessalonians", "thess", "thes", "th"]),
+    ("2 Thessalonians", ["thessalonians", "thess", "thes", "th"]),
+    ("1 Timothy", ["timothy", "tim", "ti"]),
+    ("2 Timothy", ["timothy", "tim", "ti"]),
+    ("Titus", ["tit", "ti"]),
+    ("Philemon", ["philem", "phm"]),
+    ("Hebrews", ["heb"]),
+    ("James", ["jas", "jm"]),
+    ("1 Peter", ["peter", "pet", "pe", "pt"]),
+    ("2 Peter", ["peter", "pet", "pe", "pt"]),
+    ("1 John", ["john", "joh", "jhn", "jn"]),
+    ("2 John", ["john", "joh", "jhn", "jn"]),
+    ("3 John", ["john", "joh", "jhn", "jn"]),
+    ("Jude", ["jud", "jd"]),
+    ("Revelation", ["revelations", "rev", "apocalypse"]),
+]
+
+SINGLE_CHAPTER = {"Obadiah", "Philemon", "2 John", "3 John", "Jude"}
+
+NUMBER_PREFIXES = {
+    1: ["1", "i", "1st", "first"],
+    2: ["2", "ii", "2nd", "second"],
+    3: ["3", "iii", "3rd", "third"],
+}
+
+def _alias_table():
+    """{lowercase alias: book number}; a numbered book's aliases get every spelling of its number."""
+    table = {}
+    for number, (name, aliases) in enumerate(BOOKS, 1):
+        m = re.match(r'^([123]) (.+)$', name)
+        if m:
+            base = m.group(2).lower()
+            for prefix in NUMBER_PREFIXES[int(m.group(1))]:
+                for alias in [base, *aliases]:
+                    table[f"{prefix} {alias}"] = number
+                    if prefix.isdigit():
+                        table[f"{prefix}{alias}"] = number
+        else:
+            for alias in [name.lower(), *aliases]:
+                # An unnumbered book keeps an alias shared with a numbered one ("John", "jn")
+                table.setdefault(alias, number)
+    return table
+
+ALIASES = _alias_table()
+
+# Aliases that read as ordinary words in running text ("job 3 of 5", "mark 4")
+# only count as book names when capitalized
+AMBIGUOUS_ALIASES = {alias for _, aliases in BOOKS for alias in aliases if len(alias) <= 2} | {
+    "act", "acts", "cant", "col", "dan", "gal", "hag", "job", "jon", "lam", "mark", "mat", "mic", "nah",
+    "numbers", "pet", "phil", "pro", "rev", "song", "tim",
+}
+BOOK_NAMES = {number: name for number, (name, _) in enumerate(BOOKS, 1)}
+
+# Longest aliases first so "1 John" wins over "John" and "Song of Songs" over "Song"
+BOOK_PATTERN = re.compile(
+    r'(?<![\w])(' + '|'.join(re.escape(alias).replace(r'\ ', r'\s+')
+                             for alias in sorted(ALIASES, key=len, reverse=True)) + r')\.?(?![\w])',
+    re.IGNORECASE
+)
+# Chapter/verse expression that follows a book name
+NUMBERS_PATTERN = re.compile(r'\s*(\d+(?:\s*[:.]\s*\d+)?(?:\s*ff?\b)?(?:\s*[-,;]\s*\d+(?:\s*[:.]\s*\d+)?(?:\s*ff?\b)?)*)')
+# "and 12:1" / "cf. 8:3": more numbers for the same book after a joining word
+CONTINUATION_PATTERN = re.compile(r'\s*[,;]?\s*(?:and|cf\.?)(?![\w])' + NUMBERS_PATTERN.pattern, re.IGNORECASE)
+PART_PATTERN = re.compile(r'^(\d+)(?:[:.](\d+))?(ff?)?(?:-(\d+)(?:[:.](\d+))?(ff?)?)?$')
+
+def ordinal(book, chapter, verse):
+    return book * BOOK_FACTOR + chapter * CHAPTER_FACTOR + verse
+
+def split_ordinal(value):
+    """(book, chapter, verse) of an ordinal."""
+    return value // BOOK_FACTOR, value // CHAPTER_FACTOR % CHAPTER_FACTOR, value % CHAPTER_FACTOR
+
+def _book_number(alias):
+    return ALIASES.get(re.sub(r'\s+', ' ', alias.lower()).rstrip('.'))
+
+def _names_book(alias):
+    """Whether matched text names a book rather than being an everyday word ("is", "job")."""
+    if alias[0].isupper() or alias[0].isdigit():
+        return True
+    return re.sub(r'\s+', ' ', alias.lower()).split(' ')[-1] not in AMBIGUOUS_ALIASES
+
+def _parse_numbers(book, text):
+    """Intervals for the chapter/verse expression after one book name."""
+    intervals = []
+    single = BOOK_NAMES[book] in SINGLE_CHAPTER
+    chapter = 1 if single else None
+    # Bare numbers after a chapter:verse part are verses of that chapter
+    in_verses = single
+
+    for part in re.split(r'[,;]', re.sub(r'\s+', '', text)):
+        m = PART_PATTERN.match(part)
+        if not m:
+            continue
+        a, b, a_suffix, c, d, c_suffix = m.groups()
+        a = int(a)
+        if b is not None:
+            chapter, in_verses = a, True
+            start = ordinal(book, a, int(b))
+            if c is None:
+                end = _suffix_end(book, a, int(b), a_suffix)
+            elif d is not None:
+                end = _suffix_end(book, int(c), int(d), c_suffix)
+            else:
+                end = _suffix_end(book, a, int(c), c_suffix)
+        elif in_verses and chapter is not None:
+            start = ordinal(book, chapter, a)
+            end = _suffix_end(book, chapter, int(c) if c else a, c_suffix if c else a_suffix)
+            if d is not None:
+                # "5-7:2" after a verse context reads as verse 5 through chapter 7 verse 2
+                end = ordinal(book, int(c), int(d))
+        else:
+            start = ordinal(book, a, 0)
+            if c is None:
+                end = ordinal(book, a, LAST)
+            elif d is not None:
+                end = ordinal(book, int(c), int(d))
+            else:
+                end = ordinal(book, int(c), LAST)
+            chapter = int(c) if c else a
+        if end >= start:
+            intervals.append((start, end))
+    return intervals
+
+def _suffix_end(book, chapter, verse, suffix):
+    """End of a verse with an optional "f" (and the next verse) or "ff" (to the end of the chapter)."""
+    if suffix == 'ff':
+        return ordinal(book, chapter, LAST)
+    if suffix == 'f':
+        return ordinal(book, chapter, verse + 1)
+    return ordinal(book, chapter, verse)
+
+def parse_string(text):
+    """Intervals of every reference in a string, merged and sorted."""
+    text = text.replace('–', '-').replace('—', '-').replace('−', '-')
+    matches = [m for m in BOOK_PATTERN.finditer(text) if _names_book(m.group(1))]
+    intervals = []
+    for i, m in enumerate(matches):
+        book = _book_number(m.group(1))
+        if book is None:
+            continue
+        # A reference's numbers stop where the next book name begins ("John 3:16; 1 John 4:8")
+        stop = matches[i + 1].start() if i + 1 < len(matches) else len(text)
+        numbers = NUMBERS_PATTERN.match(text[:stop], m.end())
+        if numbers and numbers.group(1):
+            parts = [numbers.group(1)]
+            more = CONTINUATION_PATTERN.match(text[:stop], numbers.end())
+            while more:
+                parts.append(more.group(1))
+                more = CONTINUATION_PATTERN.match(text[:stop], more.end())
+            # Joined as a list, so "Romans 8:1 and 3" stays in chapter 8 as "Romans 8:1, 3" would
+            intervals.extend(_parse_numbers(book, ','.join(parts)))
+        elif text.strip().rstrip('.').lower() == m.group(0).strip().rstrip('.').lower():
+            # A bare book name on its own means the whole book
+            intervals.append((ordinal(book, 0, 0), ordinal(book, LAST, LAST)))
+    return merge(intervals)
+
+def parse(value):
+    """
+    Canonical intervals for a `scripture_refs` value: a string, a list of strings,
+    enrichment objects ({"reference": ...}) or None.
+    """
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return parse_string(value)
+    if isinstance(value, dict):
+        return parse(value.get('reference') or value.get('ref'))
+    if isinstance(value, (list, tuple)):
+        intervals = []
+        for item in value:
+            intervals.extend(parse(item))
+        return merge(intervals)
+    return []
+
+def merge(intervals):
+    """Sort intervals and merge overlapping or adjacent ones."""
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+def format_interval(start, end):
+    """Human-readable canonical form of an interval ("Romans 8:1-17", "Romans 8", "Genesis 1-3")."""
+    book, c1, v1 = split_ordinal(start)
+    end_book, c2, v2 = split_ordinal(end)
+    name = BOOK_NAMES.get(book, f"Book {book}")
+    if end_book != book:
+        return f"{name} {c1}:{v1}-{BOOK_NAMES.get(end_book, end_book)} {c2}:{v2}"
+    if c1 == 0 and c2 == LAST:
+        return name
+    if v1 == 0 and v2 == LAST:
+        return f"{name} {c1}" if c1 == c2 else f"{name} {c1}-{c2}"
+    if book and name in SINGLE_CHAPTER and c1 == c2 == 1:
+        return f"{name} {v1}" if v1 == v2 else f"{name} {v1}-{v2}"
+    if c1 == c2:
+        if v2 == LAST:
+            return f"{name} {c1}:{v1}ff"
+        return f"{name} {c1}:{v1}" if v1 == v2 else f"{name} {c1}:{v1}-{v2}"
+    return f"{name} {c1}:{max(v1, 1)}-{c2}:{v2}"
+
+def normalize(value):
+    """Canonical reference strings for a `scripture_refs` value."""
+    return [format_interval(start, end) for start, end in parse(value)]
+
+def payload_ranges(payload):
+    """A payload's intervals: precomputed `scripture_ranges`, else parsed from `scripture_refs`."""
+    if payload.get('scripture_ranges') is not None:
+        return [tuple(interval) for interval in payload['scripture_ranges']]
+    refs = payload.get('scripture_refs')
+    if refs is None and isinstance(payload.get('metadata'), dict):
+        refs = payload['metadata'].get('scripture_refs')
+    return parse(refs)
+
+class ScriptureIndex:
+    """
+    Static interval index over (start, end, row) triples.
+
+    Intervals are sorted by start; `tree` is an implicit binary tree (heap layout)
+    over that order holding the maximum end in each subtree. An overlap query takes
+    the prefix of intervals starting at or before the query end, then descends the
+    tree only into subtrees whose maximum end reaches the query start.
+    """
+
+    def __init__(self, starts, ends, rows, count=None):
+        order = np.argsort(starts, kind='stable')
+        self.starts = np.asarray(starts, dtype=np.int64)[order]
+        self.ends = np.asarray(ends, dtype=np.int64)[order]
+        self.rows = np.asarray(rows, dtype=np.int64)[order]
+        self.count = count if count is not None else (int(self.rows.max()) + 1 if len(self.rows) else 0)
+
+        size = 1
+        while size < len(self.starts):
+            size *= 2
+        self.size = size
+        self.tree = np.full(2 * size, -1, dtype=np.int64)
+        self.tree[size:size + len(self.ends)] = self.ends
+        level = size // 2
+        while level:
+            children = self.tree[2 * level:4 * level]
+            self.tree[level:2 * level] = np.maximum(children[0::2], children[1::2])
+            level //= 2
+
+    @classmethod
+    def from_payloads(cls, payloads):
+        starts, ends, rows = [], [], []
+        for row, payload in enumerate(payloads):
+            for start, end in payload_ranges(payload):
+                starts.append(start)
+                ends.append(end)
+                rows.append(row)
+        return cls(starts, ends, rows, len(payloads))
+
+    def __len__(self):
+        return len(self.starts)
+
+    def overlapping(self, start, end):
+        """Positions (in start order) of intervals overlapping [start, end]."""
+        limit = int(np.searchsorted(self.starts, end, 'right'))
+        if limit == 0 or self.tree[1] < start:
+            return []
+        found = []
+        stack = [(1, 0, self.size)]
+        while stack:
+            node, low, high = stack.pop()
+            if low >= limit or self.tree[node] < start:
+                continue
+            if high - low == 1:
+                found.append(low)
+                continue
+            middle = (low + high) // 2
+            stack.append((2 * node + 1, middle, high))
+            stack.append((2 * node, low, middle))
+        return found
+
+    def query(self, refs):
+        """Sorted rows citing anything that overlaps `refs` (a reference string or intervals)."""
+        intervals = parse(refs) if not _is_intervals(refs) else refs
+        hits = [self.rows[i] for start, end in intervals for i in self.overlapping(start, end)]
+        return np.unique(np.array(hits, dtype=np.int64))
+
+    def mask(self, refs):
+        """Bitmap over rows, for use as a search filter."""
+        mask = np.zeros(self.count, dtype=bool)
+        mask[self.query(refs)] = True
+        return mask
+
+def _is_intervals(value):
+    return isinstance(value, list) and all(isinstance(item, (tuple, list)) and len(item) == 2 and
+                                           all(isinstance(x, (int, np.integer)) for x in item) for item in value)
+
+def main():
+    """Parse references or search files by reference from the command line."""
+
+    parser = argparse.ArgumentParser(description="Normalize scripture references and find chunks citing a passage.")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    parse_cmd = sub.add_parser('parse', help="Show the canonical form and verse ordinals of references")
+    parse_cmd.add_argument('refs', nargs='+')
+
+    search = sub.add_parser('search', help="List chunks whose references overlap a passage")
+    search.add_argument('files', nargs='+')
+    search.add_argument('--ref', required=True, help='Passage, e.g. "Romans 8:1-17"')
+
+    args = parser.parse_args()
+
+    if args.command == 'parse':
+        for text in args.refs:
+            intervals = parse(text)
+            print(f"{text!r} -> {'; '.join(format_interval(*i) for i in intervals) or '(no references)'}")
+            for start, end in intervals:
+                print(f"    [{start}, {end}]")
+        return
+
+    for path in args.files:
+        if not Path(path).exists():
+            print(f"Error: File '{path}' not found")
+            sys.exit(1)
+    if not parse(args.ref):
+        print(f"Error: no scripture reference found in '{args.ref}'")
+        sys.exit(1)
+
+    chunks = []
+    for path in args.files:
+        with open(path, 'r', encoding='utf-8') as f:
+            chunks.extend(json.loads(line) for line in f if line.strip())
+    index = ScriptureIndex.from_payloads(chunks)
+    rows = index.query(args.ref)
+    print(f"{len(rows)} of {len(chunks)} chunks cite {'; '.join(normalize(args.ref))} ({len(index)} references indexed)")
+    for row in rows:
+        chunk = chunks[row]
+        refs = normalize(chunk.get('scripture_refs') or (chunk.get('metadata') or {}).get('scripture_refs'))
+        print(f"  {chunk.get('id') or chunk.get('chunk_index')}  {chunk.get('source_title', '')}: {'; '.join(refs)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+"""
+Local search front layer with query-embedding and result caches.
+
+The backend's /test-search embeds every query with a fresh OpenAI call and
+recomputes identical searches each time. SearchService puts two caches in front
+of the local index (FilteredSearch over a VectorIndex or IVFIndex):
+
+- Query embeddings: an in-memory LRU with a TTL, backed by a persistent SQLite
+  embedding cache (data/cache/query_embeddings.sqlite, see embedding_cache.py),
+  so a query text is embedded once and survives restarts.
+- Results: an in-memory LRU with a TTL keyed by (query, filter, limit, index
+  version). Every upsert or delete bumps the index version, so cached results
+  never outlive the data they were computed from.
+
+The service lock covers the caches and the index, not the embedding call, so a
+slow API request does not hold up cached queries or other searches.
+
+Hit rates, API calls and latency percentiles are available from `metrics()`, or
+from GET /metrics when serving over HTTP.
+
+Usage:
+    python search_service.py <file.jsonl> [...] --query "What is the nature of virtue?" [--query ...]
+    python search_service.py <file.jsonl> [...] --serve [--port 8090] [--ivf]
+        POST /search {"query": "...", "limit": 5, "filter": {...}}
+        POST /upsert {"file": "path/to/file_qdrant.jsonl"}
+        POST /delete {"filter": {...}}
+        GET  /metrics
+"""
+
+import argparse
+import json
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import numpy as np
+
+from embedding_cache import EmbeddingCache, cache_key, normalize_content
+from generate_embeddings import EMBEDDING_MODEL
+from payload_index import FilteredSearch
+from vector_search import VectorIndex
+
+DEFAULT_QUERY_CACHE_PATH = Path(__file__).resolve().parent.parent / 'data' / 'cache' / 'query_embeddings.sqlite'
+
+DEFAULT_EMBEDDING_ENTRIES = 4096
+DEFAULT_EMBEDDING_TTL = 24 * 3600
+DEFAULT_RESULT_ENTRIES = 1024
+DEFAULT_RESULT_TTL = 600
+# Bound on the persistent query-embedding cache (LRU-evicted)
+DEFAULT_PERSISTED_QUERIES = 100000
+
+# Latency samples kept per timer for percentiles
+LATENCY_WINDOW = 10000
+
+class TTLCache:
+    """Least-recently-used mapping whose entries also expire `ttl` seconds after insertion."""
+
+    def __init__(self, max_entries, ttl=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is not None:
+            value, stored = entry
+            if self.ttl is None or time.monotonic() - stored < self.ttl:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return value
+            del self.entries[key]
+            self.expired += 1
+        self.misses += 1
+        return None
+
+    def put(self, key, value):
+        self.entries[key] = (value, time.monotonic())
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {"entries": len(self.entries), "hits": self.hits, "misses": self.misses, "expired": self.expired,
+                "hit_rate": self.hits / lookups if lookups else 0.0}
+
+class LatencyStats:
+    """Rolling window of timings in milliseconds."""
+
+    def __init__(self):
+        self.samples = {}
+
+    def add(self, name, seconds):
+        self.samples.setdefault(name, deque(maxlen=LATENCY_WINDOW)).append(seconds * 1000)
+
+    def summary(self):
+        summary = {}
+        for name, samples in self.samples.items():
+            p50, p95, p99 = np.percentile(list(samples), [50, 95, 99])
+            summary[name] = {"count": len(samples), "p50_ms": float(p50), "p95_ms": float(p95), "p99_ms": float(p99)}
+        return summary
+
+def openai_embedder(model=EMBEDDING_MODEL):
+    """embed(texts) -> vectors using the same client and model as the chunks."""
+    from generate_embeddings import create_client, embed_texts
+    client = create_client()
+    return lambda texts: embed_texts(client, texts, model)
+
+class QueryEmbedder:
+    """Query text -> embedding through the in-memory LRU, the persistent cache, then the API."""
+
+    def __init__(self, embed=None, model=EMBEDDING_MODEL, max_entries=DEFAULT_EMBEDDING_ENTRIES,
+                 ttl=DEFAULT_EMBEDDING_TTL, persistent=None):
+        self.embed = embed
+        self.model = model
+        self.memory = TTLCache(max_entries, ttl)
+        self.persistent = persistent
+        self.persistent_hits = 0
+        self.api_calls = 0
+        # Guards both caches; the API call itself runs unlocked
+        self.lock = threading.Lock()
+
+    def __call__(self, query):
+        key = cache_key(self.model, None, query)
+        with self.lock:
+            vector = self.memory.get(key)
+            if vector is not None:
+                return vector
+
+            if self.persistent is not None:
+                found = self.persistent.get_many([key])
+                if key in found:
+                    self.persistent_hits += 1
+                    vector = np.array(found[key], dtype=np.float32)
+                    self.memory.put(key, vector)
+                    return vector
+
+            if self.embed is None:
+                self.embed = openai_embedder(self.model)
+            self.api_calls += 1
+            embed = self.embed
+
+        vector = np.array(embed([normalize_content(query)])[0], dtype=np.float32)
+        with self.lock:
+            if self.persistent is not None:
+                self.persistent.put_many(self.model, [(key, vector.tolist())])
+            self.memory.put(key, vector)
+        return vector
+
+    def stats(self):
+        with self.lock:
+            return {**self.memory.stats(), "persistent_hits": self.persistent_hits, "api_calls": self.api_calls}
+
+class SearchService:
+    """Cached search over a mutable local index."""
+
+    def __init__(self, index, embedder=None, result_entries=DEFAULT_RESULT_ENTRIES, result_ttl=DEFAULT_RESULT_TTL):
+        self.search_index = FilteredSearch(index)
+        self.embedder = embedder or QueryEmbedder()
+        self.results = TTLCache(result_entries, result_ttl)
+        self.latency = LatencyStats()
+        self.version = 0
+        self.lock = threading.RLock()
+
+    @property
+    def index(self):
+        return self.search_index.index
+
+    def result_key(self, query, limit, query_filter):
+        return (normalize_content(query), json.dumps(query_filter, sort_keys=True), limit, self.version)
+
+    def search(self, query, limit=10, query_filter=None):
+        """{results, cached, elapsed_ms} for one query text."""
+        started = time.perf_counter()
+        with self.lock:
+            version = self.version
+            key = self.result_key(query, limit, query_filter)
+            results = self.results.get(key)
+            cached = results is not None
+            if cached:
+                elapsed = time.perf_counter() - started
+                self.latency.add('total_cached', elapsed)
+                return {"results": results, "cached": True, "elapsed_ms": elapsed * 1000}
+
+        # Embedding may wait on the API; other searches and updates go ahead meanwhile
+        embed_started = time.perf_counter()
+        vector = self.embedder(query)
+        search_started = time.perf_counter()
+
+        with self.lock:
+            if self.version != version:
+                # The index changed while embedding: the search below sees the new
+                # data, so cache it under the new version
+                key = self.result_key(query, limit, query_filter)
+            results = self.search_index.search(vector, limit, query_filter)
+            self.results.put(key, results)
+            elapsed = time.perf_counter() - started
+            self.latency.add('embed', search_started - embed_started)
+            self.latency.add('search', time.perf_counter() - search_started)
+            self.latency.add('total_uncached', elapsed)
+        return {"results": results, "cached": False, "elapsed_ms": elapsed * 1000}
+
+    def _changed(self):
+        """Refresh the payload index and invalidate every cached result."""
+        self.search_index.refresh()
+        self.version += 1
+        self.results.clear()
+
+    def upsert(self, ids, payloads, vectors):
+        """Insert or replace points."""
+        with self.lock:
+            index = self.index
+            if hasattr(index, 'add'):
+                index.add(ids, payloads, vectors)
+                index.compact()
+            else:
+                replaced = set(ids)
+                keep = [i for i, point in enumerate(index.ids) if point not in replaced]
+                self.search_index.index = VectorIndex(
+                    [index.ids[i] for i in keep] + list(ids),
+                    [index.payloads[i] for i in keep] + list(payloads),
+                    np.concatenate([index.vectors[keep], np.asarray(vectors, dtype=np.float32).reshape(len(ids), -1)])
+                )
+            self._changed()
+
+    def upsert_file(self, path):
+        """Insert or replace every chunk of an embedding JSONL file; returns the count."""
+        loaded = VectorIndex.from_jsonl(path)
+        self.upsert(loaded.ids, loaded.payloads, loaded.vectors)
+        return len(loaded)
+
+    def delete(self, ids):
+        """Delete points by id; returns the number removed."""
+        with self.lock:
+            index = self.index
+            doomed = {point for point in ids if point in index.positions}
+            if not doomed:
+                return 0
+            if hasattr(index, 'remove'):
+                index.remove(doomed)
+                index.compact()
+            else:
+                keep = [i for i, point in enumerate(index.ids) if point not in doomed]
+                self.search_index.index = VectorIndex([index.ids[i] for i in keep], [index.payloads[i] for i in keep],
+                                                      index.vectors[keep])
+            self._changed()
+            return len(doomed)
+
+    def delete_where(self, query_filter):
+        """Delete every point matching a filter (e.g. one source's community_source_id)."""
+        with self.lock:
+            mask = self.search_index.payloads.resolve(query_filter, self.index.ids)
+            return self.delete([self.index.ids[row] for row in np.flatnonzero(mask)])
+
+    def metrics(self):
+        with self.lock:
+            return {
+                "index_version": self.version,
+                "points": len(self.index),
+                "query_embeddings": self.embedder.stats(),
+                "results": self.results.stats(),
+                "latency": self.latency.summary(),
+            }
+
+def make_handler(service):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *args):
+            pass
+
+        def reply(self, code, body):
+            data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+            self.send_response(code)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path.rstrip('/') == '/metrics':
+                return self.reply(200, service.metrics())
+            self.reply(404, {"error": f"Not found: {self.path}"})
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            try:
+                body = json.loads(self.rfile.read(length) or b'{}')
+                path = self.path.rstrip('/')
+                if path == '/search':
+                    if not body.get('query'):
+                        return self.reply(400, {"error": "query is required"})
+                    return self.reply(200, {"query": body['query'],
+                                            **service.search(body['query'], int(body.get('limit', 5)),
+                                                             body.get('filter'))})
+                if path == '/upsert':
+                    return self.reply(200, {"upserted": service.upsert_file(body['file']),
+                                            "index_version": service.version})
+                if path == '/delete':
+                    return self.reply(200, {"deleted": service.delete_where(body['filter']),
+                                            "index_version": service.version})
+                return self.reply(404, {"error": f"Not found: {self.path}"})
+            except (ValueError, KeyError, OSError) as e:
+                return self.reply(400, {"error": f"{type(e).__name__}: {e}"})
+
+    return Handler
+
+def main():
+    """Run queries or serve the cached search layer from the command line."""
+
+    parser = argparse.ArgumentParser(description="Cached local search over embedding JSONL files.")
+    parser.add_argument('files', nargs='+', help="Embedding JSONL files to serve")
+    parser.add_argument('--query', action='append', default=[], help="Query text; repeatable (each runs twice)")
+    parser.add_argument('--limit', type=int, default=5, help="Results per query (default: 5)")
+    parser.add_argument('--ivf', action='store_true', help="Search an IVF index built over the files")
+    parser.add_argument('--serve', action='store_true', help="Serve /search, /upsert, /delete and /metrics over HTTP")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8090)
+    parser.add_argument('--result-ttl', type=float, default=DEFAULT_RESULT_TTL,
+                        help=f"Seconds a cached result stays valid (default: {DEFAULT_RESULT_TTL})")
+    parser.add_argument('--cache-path', default=str(DEFAULT_QUERY_CACHE_PATH), help="Persistent query-embedding cache")
+    args = parser.parse_args()
+
+    for path in args.files:
+        if not Path(path).exists():
+            print(f"Error: File '{path}' not found")
+            sys.exit(1)
+    if not args.query and not args.serve:
+        print("Error: give at least one --query, or --serve")
+        sys.exit(1)
+
+    index = VectorIndex.from_jsonl(*args.files)
+    if args.ivf:
+        from ann_index import IVFIndex
+        index = IVFIndex.build(index.ids, index.payloads, index.vectors)
+    persistent = EmbeddingCache(args.cache_path, max_entries=DEFAULT_PERSISTED_QUERIES)
+    service = SearchService(index, QueryEmbedder(persistent=persistent), result_ttl=args.result_ttl)
+    print(f"Loaded {len(index)} chunks", file=sys.stderr)
+
+    try:
+        for query in args.query:
+            for _ in range(2):
+                response = service.search(query, args.limit)
+                label = 'cached' if response['cached'] else 'computed'
+                print(f"{query!r}: {len(response['results'])} results, {label} in {response['elapsed_ms']:.3f} ms")
+
+        if args.serve:
+            server = ThreadingHTTPServer((args.host, args.port), make_handler(service))
+            print(f"Search service listening on http://{args.host}:{args.port}")
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+        else:
+            print(json.dumps(service.metrics(), indent=2))
+    finally:
+        persistent.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+"""
+Incrementally sync a new version of a source JSONL file into Qdrant.
+
+Instead of clearing a source's vectors and re-uploading everything after it is
+re-chunked, the new file is compared with the manifest of the last sync (chunk id
+-> point id, content hash, payload hash) and only the differences are pushed:
+
+- new chunks and chunks whose text changed are upserted with a fresh vector
+- chunks whose text is unchanged but whose metadata/position changed get a
+  payload-only update (vectors untouched)
+- chunks that no longer exist are deleted
+
+Vectors are only computed for text the index has never seen: a chunk that merely
+moved to a new id reuses the stored vector of the point with the same content
+hash, an `embedding` already in the file is used as is, and anything else goes
+through the embedding cache before the OpenAI API. All changes are applied in
+batches, and the manifest is only rewritten once they have all been acknowledged,
+so an interrupted sync is simply rerun.
+
+Manifests live in data/cache/sync/<collection>/<source>.json. If one is missing it
+is rebuilt from the points already in the collection.
+
+Points keep the database `source_id` they were uploaded with (bulk_upload.py
+--source-id, or the backend): it is taken from --source-id, else from the
+manifest, else from the indexed points. Payload updates use set_payload, so any
+other key the file doesn't produce survives as well.
+
+Usage:
+    python sync_source.py <source.jsonl> [--collection documents] [--source SLUG] [--source-id ID] [--dry-run]
+"""
+
+import argparse
+import hashlib
+import json
+import sys
+import time
+from pathlib import Path
+
+from convert_to_qdrant import fallback_slug, loads, source_slug
+from bulk_upload import qdrant_point
+from embedding_cache import EmbeddingCache, cache_key, normalize_content
+from generate_embeddings import (EMBEDDING_MODEL, MAX_BATCH_INPUTS, MAX_BATCH_TOKENS, MAX_INPUT_TOKENS, create_client,
+                                 embed_texts, estimate_tokens)
+from jsonl_checkpoint import write_atomically
+from qdrant_rest import DEFAULT_COLLECTION, QdrantError, QdrantREST
+from vector_store import ChunkVectors
+
+MANIFEST_DIR = Path(__file__).resolve().parent.parent / 'data' / 'cache' / 'sync'
+MANIFEST_FORMAT = 2
+
+DEFAULT_BATCH_SIZE = 256
+
+def content_hash(content):
+    return hashlib.sha256(normalize_content(content).encode('utf-8')).hexdigest()
+
+def payload_hash(payload):
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+def manifest_path(collection, source):
+    return MANIFEST_DIR / collection / f"{source}.json"
+
+def load_manifest(path):
+    """
+    Saved manifest {"source_id", "chunks": {chunk id: {point_id, content_hash, payload_hash}}},
+    or None if there is none (or it predates the current format).
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return None
+    if manifest.get('format') != MANIFEST_FORMAT:
+        return None
+    return {"source_id": manifest.get('source_id'), "chunks": manifest['chunks']}
+
+def manifest_from_index(client, collection, source):
+    """Rebuild a manifest from the points of this source already in the collection."""
+    chunks = {}
+    source_ids = set()
+    query = {"must": [{"key": "community_source_id", "match": {"value": source.replace('_', '-')}}]}
+    for point in client.scroll(collection, query):
+        payload = point.get('payload') or {}
+        if payload.get('chunk_id') is None or payload.get('content') is None:
+            continue
+        if payload.get('source_id') is not None:
+            source_ids.add(payload['source_id'])
+        chunks[payload['chunk_id']] = {
+            "point_id": point['id'],
+            "content_hash": content_hash(payload['content']),
+            "payload_hash": payload_hash(payload),
+        }
+    if len(source_ids) > 1:
+        raise ValueError(f"Points of '{source}' carry {len(source_ids)} different source_id values "
+                         f"({', '.join(sorted(map(str, source_ids)))}); pass --source-id")
+    return {"source_id": source_ids.pop() if source_ids else None, "chunks": chunks}
+
+def read_source(input_file, source, source_id=None):
+    """
+    Qdrant points (vector left as None when the file has no embedding) for every chunk.
+
+    Returns (points by chunk id, line errors).
+    """
+    vectors = ChunkVectors(input_file)
+    points = {}
+    errors = []
+    with open(input_file, 'rb') as f:
+        for line_num, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                chunk = loads(line)
+                row = chunk.pop('embedding_row', None)
+                if row is not None:
+                    chunk['embedding'] = vectors.vectors[row]
+                chunk.setdefault('embedding', None)
+                point = qdrant_point(chunk, source, source_id, source=source)
+            except Exception as e:
+                errors.append(f"Error processing line {line_num}: {type(e).__name__}: {e}")
+                continue
+            identifier = point['payload']['chunk_id']
+            if identifier in points:
+                errors.append(f"Error processing line {line_num}: duplicate chunk id {identifier!r}")
+                continue
+            points[identifier] = point
+    return points, errors
+
+def plan_sync(points, manifest):
+    """
+    Minimal changes turning the indexed state into `points`.
+
+    Returns {"upsert": [chunk ids], "payload": [chunk ids], "delete": [point ids],
+    "unchanged": count}.
+    """
+    plan = {"upsert": [], "payload": [], "delete": [], "unchanged": 0}
+    for identifier, point in points.items():
+        entry = manifest.get(identifier)
+        if entry is None or entry['point_id'] != point['id'] or entry['content_hash'] != content_hash(point['payload']['content']):
+            plan['upsert'].append(identifier)
+        elif entry['payload_hash'] != payload_hash(point['payload']):
+            plan['payload'].append(identifier)
+        else:
+            plan['unchanged'] += 1
+    plan['delete'] = [entry['point_id'] for identifier, entry in manifest.items() if identifier not in points]
+    return plan
+
+def embedding_batches(points):
+    """Split points into groups that fit one embeddings request."""
+    batch = []
+    tokens = 0
+    for point in points:
+        size = min(estimate_tokens(point['payload']['content']), MAX_INPUT_TOKENS)
+        if batch and (len(batch) >= MAX_BATCH_INPUTS or tokens + size > MAX_BATCH_TOKENS):
+            yield batch
+            batch = []
+            tokens = 0
+        batch.append(point)
+        tokens += size
+    if batch:
+        yield batch
+
+def fill_vectors(client, collection, points, manifest, cache=None):
+    """
+    Give every point in `points` a vector, embedding as little as possible.
+
+    Returns counts of vectors taken from the file, reused from the index, taken
+    from the cache and freshly embedded.
+    """
+    counts = {"from_file": 0, "from_index": 0, "from_cache": 0, "embedded": 0}
+    missing = []
+    for point in points:
+        if point['vector'] is not None:
+            counts['from_file'] += 1
+        else:
+            missing.append(point)
+
+    # Unchanged text under a new id (re-chunking shifts ids): reuse the indexed vector
+    by_hash = {entry['content_hash']: entry['point_id'] for entry in manifest.values()}
+    reusable = {}
+    for point in missing:
+        old_id = by_hash.get(content_hash(point['payload']['content']))
+        if old_id is not None:
+            reusable.setdefault(old_id, []).append(point)
+    old_ids = list(reusable)
+    for start in range(0, len(old_ids), DEFAULT_BATCH_SIZE):
+        for stored in client.retrieve(collection, old_ids[start:start + DEFAULT_BATCH_SIZE], with_payload=False, with_vector=True):
+            for point in reusable.get(stored['id'], []):
+                point['vector'] = stored['vector']
+                counts['from_index'] += 1
+    missing = [point for point in missing if point['vector'] is None]
+
+    if missing and cache is not None:
+        keys = [cache_key(EMBEDDING_MODEL, None, point['payload']['content']) for point in missing]
+        found = cache.get_many(keys)
+        for point, key in zip(missing, keys):
+            if key in found:
+                point['vector'] = found[key]
+                counts['from_cache'] += 1
+        missing = [point for point in missing if point['vector'] is None]
+
+    if missing:
+        openai_client = create_client()
+        for batch in embedding_batches(missing):
+            vectors = embed_texts(openai_client, [point['payload']['content'] for point in batch])
+            for point, vector in zip(batch, vectors):
+                point['vector'] = vector
+            if cache is not None:
+                cache.put_many(EMBEDDING_MODEL, [(cache_key(EMBEDDING_MODEL, None, point['payload']['content']), point['vector'])
+                                                 for point in batch])
+            counts['embedded'] += len(batch)
+    return counts
+
+def apply_sync(client, collection, points, plan, batch_size=DEFAULT_BATCH_SIZE):
+    """Push the planned upserts, payload updates and deletes in batches."""
+    upserts = [points[identifier] for identifier in plan['upsert']]
+    for start in range(0, len(upserts), batch_size):
+        client.upsert(collection, upserts[start:start + batch_size])
+
+    # set_payload rather than overwrite_payload: keys the file doesn't own are kept
+    updates = [{"set_payload": {"payload": points[identifier]['payload'], "points": [points[identifier]['id']]}}
+               for identifier in plan['payload']]
+    for start in range(0, len(updates), batch_size):
+        client.batch_update(collection, updates[start:start + batch_size])
+
+    for start in range(0, len(plan['delete']), batch_size):
+        client.delete(collection, plan['delete'][start:start + batch_size])
+
+def sync_source(input_file, collection=DEFAULT_COLLECTION, source=None, url=None, batch_size=DEFAULT_BATCH_SIZE,
+                cache=None, dry_run=False, rebuild_manifest=False, source_id=None):
+    """Sync one source file. Returns the plan that was (or would be) applied."""
+    started = time.perf_counter()
+    if source is None:
+        with open(input_file, 'rb') as f:
+            first = next((loads(line) for line in f if line.strip()), {})
+        source = source_slug(first, fallback_slug(input_file))
+
+    client = QdrantREST(url)
+    if client.get_collection(collection) is None:
+        raise QdrantError(f"Collection '{collection}' does not exist (create it with bulk_upload.py --create-collection)")
+
+    path = manifest_path(collection, source)
+    manifest = None if rebuild_manifest else load_manifest(path)
+    if manifest is None:
+        print(f"No manifest for '{source}', rebuilding it from {collection}...")
+        manifest = manifest_from_index(client, collection, source)
+    if source_id is None:
+        source_id = manifest['source_id']
+    elif manifest['source_id'] is not None and str(manifest['source_id']) != str(source_id):
+        print(f"Warning: '{source}' was synced with source_id {manifest['source_id']}, now {source_id}")
+    manifest = manifest['chunks']
+
+    points, errors = read_source(input_file, source, source_id)
+    for message in errors:
+        print(message)
+    if errors:
+        raise ValueError(f"{len(errors)} lines of {input_file} could not be read; fix them before syncing")
+
+    plan = plan_sync(points, manifest)
+    print(f"Source '{source}'{f' (source_id {source_id})' if source_id is not None else ''}: "
+          f"{len(points)} chunks in file, {len(manifest)} in the index")
+    print(f"  Upserts:         {len(plan['upsert'])}")
+    print(f"  Payload updates: {len(plan['payload'])}")
+    print(f"  Deletes:         {len(plan['delete'])}")
+    print(f"  Unchanged:       {plan['unchanged']}")
+
+    if dry_run or not (plan['upsert'] or plan['payload'] or plan['delete']):
+        if not dry_run:
+            print("Already in sync")
+        client.close()
+        return plan
+
+    counts = fill_vectors(client, collection, [points[identifier] for identifier in plan['upsert']], manifest, cache)
+    print(f"Vectors: {counts['from_file']} from file, {counts['from_index']} reused from the index, "
+          f"{counts['from_cache']} from cache, {counts['embedded']} embedded")
+
+    apply_sync(client, collection, points, plan, batch_size)
+    client.close()
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    write_atomically(path, {
+        "format": MANIFEST_FORMAT,
+        "collection": collection,
+        "source": source,
+        "source_id": source_id,
+        "synced_at": time.strftime('%Y-%m-%dT%H:%M:%S'),
+        "chunks": {
+            identifier: {
+                "point_id": point['id'],
+                "content_hash": content_hash(point['payload']['content']),
+                "payload_hash": payload_hash(point['payload']),
+            }
+            for identifier, point in points.items()
+        },
+    })
+    print(f"Synced in {time.perf_counter() - started:.1f}s; manifest saved to {path}")
+    return plan
+
+def main():
+    """Sync a source file from the command line."""
+
+    parser = argparse.ArgumentParser(description="Push only the changes in a source JSONL file to Qdrant.")
+    parser.add_argument('input_file', help="Source JSONL file (chunks, with or without embeddings)")
+    parser.add_argument('--collection', default=DEFAULT_COLLECTION, help=f"Collection (default: {DEFAULT_COLLECTION})")
+    parser.add_argument('--source', help="Source slug the manifest is kept under (default: <author surname>_<title>)")
+    parser.add_argument('--source-id',
+                        help="Database source id to store in each payload's source_id "
+                             "(default: the one the source's points already carry)")
+    parser.add_argument('--url', help="Qdrant URL (default: QDRANT_URL or http://localhost:6333)")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                        help=f"Points per request (default: {DEFAULT_BATCH_SIZE})")
+    parser.add_argument('--dry-run', action='store_true', help="Print the plan without changing anything")
+    parser.add_argument('--rebuild-manifest', action='store_true',
+                        help="Ignore the saved manifest and diff against the points in the collection")
+    parser.add_argument('--no-cache', action='store_true', help="Embed changed chunks without the embedding cache")
+    args = parser.parse_args()
+
+    if not Path(args.input_file).exists():
+        print(f"Error: File '{args.input_file}' not found")
+        sys.exit(1)
+
+    cache = None if args.no_cache else EmbeddingCache()
+    try:
+        sync_source(args.input_file, args.collection, args.source, args.url, max(1, args.batch_size), cache,
+                    args.dry_run, args.rebuild_manifest, args.source_id)
+    except (QdrantError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    finally:
+        if cache is not None:
+            cache.close()
+
+if __name__ == "__main__":
+    main()
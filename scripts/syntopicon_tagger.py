@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+Tag chunks with candidate Syntopicon Ideas by matching taxonomy terms and topics.
+
+Every Idea's `terms` and `topics` are compiled into one Aho-Corasick automaton, so
+each chunk's content is scanned once no matter how many patterns there are.
+Matching is case-insensitive, treats typographic quotes/dashes like their ASCII
+forms, and only accepts matches on word boundaries ("Art" does not match
+"article"). Results go into `metadata.syntopicon_candidates` as
+{concept, hits, matches: [{text, start, end, kind}]}, with start/end as character
+offsets into `content`; --apply also merges the candidate names into
+`metadata.syntopicon_tags`.
+
+Runs between chunking and embedding/convert_to_qdrant.py. Large files are tagged
+in parallel across cores.
+
+Usage:
+    python syntopicon_tagger.py <input.jsonl> [output.jsonl] [--apply] [--min-hits N] [--workers N]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from collections import deque
+from multiprocessing import Pool
+from pathlib import Path
+
+from taxonomy_loader import load_taxonomy_file
+
+DEFAULT_TAXONOMY_PATH = Path(__file__).resolve().parent.parent / 'data' / 'taxonomies' / 'syntopicon_taxonomy.json'
+
+# Lines handed to a worker at a time, and the input size that switches to parallel tagging
+BATCH_LINES = 512
+PARALLEL_THRESHOLD_BYTES = 8 * 1024 * 1024
+
+# Patterns shorter than this are too ambiguous to tag on
+MIN_PATTERN_LENGTH = 3
+
+# One-to-one replacements, so offsets in the normalized text match the original
+NORMALIZE = str.maketrans({
+    '\u2018': "'", '\u2019': "'", '\u201c': '"', '\u201d': '"',
+    '\u2013': '-', '\u2014': '-', '\u00a0': ' ', '\n': ' ', '\r': ' ', '\t': ' ',
+})
+
+def normalize_text(text):
+    """Case-fold and normalize punctuation without changing the string's length."""
+    text = text.translate(NORMALIZE)
+    folded = text.lower()
+    if len(folded) != len(text):
+        # A few characters lowercase to several; leave those as they are
+        folded = ''.join(c.lower() if len(c.lower()) == 1 else c for c in text)
+    return folded
+
+def normalize_pattern(pattern):
+    return ' '.join(normalize_text(pattern).split())
+
+class TermAutomaton:
+    """Aho-Corasick automaton over taxonomy patterns, each owned by (concept, kind) pairs."""
+
+    def __init__(self):
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [()]
+        self.patterns = []
+        self.owners = []
+        self.pattern_ids = {}
+
+    def add(self, pattern, concept, kind):
+        """Register a pattern (already normalized) for a concept."""
+        if pattern in self.pattern_ids:
+            owner = (concept, kind)
+            if owner not in self.owners[self.pattern_ids[pattern]]:
+                self.owners[self.pattern_ids[pattern]].append(owner)
+            return
+
+        state = 0
+        for ch in pattern:
+            next_state = self.goto[state].get(ch)
+            if next_state is None:
+                next_state = len(self.goto)
+                self.goto[state][ch] = next_state
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append(())
+            state = next_state
+
+        pattern_id = len(self.patterns)
+        self.pattern_ids[pattern] = pattern_id
+        self.patterns.append(pattern)
+        self.owners.append([(concept, kind)])
+        self.output[state] = (pattern_id,)
+
+    def build(self):
+        """Compute failure links and merge outputs along them (breadth first)."""
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, child in self.goto[state].items():
+                queue.append(child)
+                fallback = self.fail[state]
+                while fallback and ch not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(ch, 0)
+                self.output[child] = self.output[child] + self.output[self.fail[child]]
+        return self
+
+    @classmethod
+    def from_taxonomy(cls, taxonomy):
+        """Compile every Idea's terms and topics."""
+        automaton = cls()
+        for concept in taxonomy['syntopicon_taxonomy']['concepts']:
+            for kind, key in (('term', 'terms'), ('topic', 'topics')):
+                for phrase in concept.get(key) or []:
+                    pattern = normalize_pattern(phrase)
+                    if len(pattern) >= MIN_PATTERN_LENGTH:
+                        automaton.add(pattern, concept['name'], kind)
+        return automaton.build()
+
+    def find(self, text):
+        """Yield (start, end, pattern_id) for every word-bounded match in `text`."""
+        folded = normalize_text(text)
+        goto, fail, output, patterns = self.goto, self.fail, self.output, self.patterns
+        length = len(folded)
+        state = 0
+
+        for i, ch in enumerate(folded):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if not output[state]:
+                continue
+
+            end = i + 1
+            for pattern_id in output[state]:
+                pattern = patterns[pattern_id]
+                start = end - len(pattern)
+                if pattern[0].isalnum() and start > 0 and folded[start - 1].isalnum():
+                    continue
+                if pattern[-1].isalnum() and end < length and folded[end].isalnum():
+                    continue
+                yield start, end, pattern_id
+
+    def candidates(self, text, min_hits=1):
+        """
+        Candidate concepts for a text, most hits first.
+
+        Within a concept, a match nested inside a longer match ("The One" inside
+        "The One and the Many") is not counted separately.
+        """
+        spans = {}
+        for start, end, pattern_id in self.find(text):
+            for concept, kind in self.owners[pattern_id]:
+                spans.setdefault(concept, []).append((start, end, kind))
+
+        results = []
+        for concept, matches in spans.items():
+            matches.sort(key=lambda m: (m[0], -m[1]))
+            kept = []
+            covered_to = -1
+            for start, end, kind in matches:
+                if end <= covered_to:
+                    continue
+                kept.append({"text": text[start:end], "start": start, "end": end, "kind": kind})
+                covered_to = max(covered_to, end)
+            if len(kept) >= min_hits:
+                results.append({"concept": concept, "hits": len(kept), "matches": kept})
+
+        results.sort(key=lambda c: (-c['hits'], c['concept']))
+        return results
+
+def tag_chunk(automaton, chunk, min_hits=1, apply=False):
+    """Add `metadata.syntopicon_candidates` (and optionally merge into `syntopicon_tags`)."""
+    metadata = chunk.get('metadata')
+    if not isinstance(metadata, dict):
+        metadata = chunk['metadata'] = {}
+    candidates = automaton.candidates(chunk.get('content') or '', min_hits)
+    metadata['syntopicon_candidates'] = candidates
+
+    if apply and candidates:
+        tags = metadata.get('syntopicon_tags') or []
+        existing = {tag.get('concept') if isinstance(tag, dict) else tag for tag in tags}
+        as_objects = any(isinstance(tag, dict) for tag in tags)
+        for candidate in candidates:
+            if candidate['concept'] not in existing:
+                tags.append({"concept": candidate['concept']} if as_objects else candidate['concept'])
+        metadata['syntopicon_tags'] = tags
+
+    return len(candidates)
+
+# Worker state for parallel tagging (set once per process by the pool initializer)
+_worker = {}
+
+def _init_worker(automaton, min_hits, apply):
+    _worker.update(automaton=automaton, min_hits=min_hits, apply=apply)
+
+def _tag_lines(lines):
+    """Tag a batch of JSONL lines; returns (output lines, chunks tagged, chunks with candidates, errors)."""
+    output = []
+    tagged = matched = errors = 0
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            chunk = json.loads(line)
+        except json.JSONDecodeError:
+            errors += 1
+            output.append(line.rstrip('\n'))
+            continue
+        tagged += 1
+        if tag_chunk(_worker['automaton'], chunk, _worker['min_hits'], _worker['apply']):
+            matched += 1
+        output.append(json.dumps(chunk, ensure_ascii=False))
+    return output, tagged, matched, errors
+
+def _batches(infile):
+    batch = []
+    for line in infile:
+        batch.append(line)
+        if len(batch) >= BATCH_LINES:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def tag_file(input_file, output_file, taxonomy_path=DEFAULT_TAXONOMY_PATH, min_hits=1, apply=False, workers=0):
+    """Tag every chunk of a JSONL file. workers=0 picks serial or all cores by file size."""
+    started = time.perf_counter()
+    automaton = TermAutomaton.from_taxonomy(load_taxonomy_file(taxonomy_path))
+    print(f"Compiled {len(automaton.patterns)} patterns ({len(automaton.goto)} states) from {taxonomy_path}")
+
+    if not workers:
+        workers = (os.cpu_count() or 1) if os.path.getsize(input_file) >= PARALLEL_THRESHOLD_BYTES else 1
+
+    tagged = matched = errors = 0
+    with open(input_file, 'r', encoding='utf-8') as infile, \
+         open(output_file, 'w', encoding='utf-8') as outfile:
+        if workers > 1:
+            print(f"Tagging with {workers} processes...")
+            with Pool(workers, _init_worker, (automaton, min_hits, apply)) as pool:
+                results = pool.imap(_tag_lines, _batches(infile))
+                for lines, batch_tagged, batch_matched, batch_errors in results:
+                    outfile.writelines(line + '\n' for line in lines)
+                    tagged += batch_tagged
+                    matched += batch_matched
+                    errors += batch_errors
+        else:
+            _init_worker(automaton, min_hits, apply)
+            for batch in _batches(infile):
+                lines, batch_tagged, batch_matched, batch_errors = _tag_lines(batch)
+                outfile.writelines(line + '\n' for line in lines)
+                tagged += batch_tagged
+                matched += batch_matched
+                errors += batch_errors
+
+    elapsed = time.perf_counter() - started
+    print(f"Tagged {tagged} chunks ({matched} with candidates) in {elapsed:.1f}s "
+          f"({tagged / elapsed if elapsed else 0:,.0f} chunks/s)")
+    if errors:
+        print(f"Warning: {errors} lines were not valid JSON and were copied through unchanged")
+    return tagged
+
+def main():
+    """Tag a JSONL file from the command line."""
+
+    parser = argparse.ArgumentParser(description="Tag chunks with Syntopicon Ideas by matching taxonomy terms and topics.")
+    parser.add_argument('input', help="Chunk JSONL file")
+    parser.add_argument('output', nargs='?', help="Output file (default: <input>_tagged.jsonl)")
+    parser.add_argument('--taxonomy', default=DEFAULT_TAXONOMY_PATH, help="Taxonomy file (default: data/taxonomies/syntopicon_taxonomy.json)")
+    parser.add_argument('--min-hits', type=int, default=1, help="Matches an Idea needs to become a candidate (default: 1)")
+    parser.add_argument('--apply', action='store_true', help="Also merge candidate Ideas into metadata.syntopicon_tags")
+    parser.add_argument('--workers', type=int, default=0,
+                        help="Processes to tag with (default: all cores for files over 8 MB, otherwise 1)")
+    args = parser.parse_args()
+
+    if not Path(args.input).exists():
+        print(f"Error: File '{args.input}' not found")
+        sys.exit(1)
+
+    output_file = args.output or str(Path(args.input).with_name(f"{Path(args.input).stem}_tagged.jsonl"))
+    if Path(output_file).resolve() == Path(args.input).resolve():
+        print("Error: output file must differ from the input file")
+        sys.exit(1)
+
+    tag_file(args.input, output_file, args.taxonomy, args.min_hits, args.apply, args.workers)
+    print(f"Output saved to: {output_file}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+Append-only journal for Syntopicon taxonomy writes.
+
+Generated concepts are appended to `<taxonomy>.journal.jsonl` (one JSON object per
+line, fsynced after every append) instead of re-serializing the whole taxonomy file
+for each concept. load_taxonomy() returns the canonical file with the journal
+replayed on top, so readers always see a consistent merged view. compact() writes
+that view back to the canonical file atomically (temp file, fsync, os.replace) and
+then removes the journal. Replaying is idempotent (a concept replaces any earlier
+concept of the same name), so a crash between those two steps loses nothing.
+
+Compaction edits the canonical file's text rather than re-serializing the parsed
+tree: journaled concepts replace the text of the concept they supersede or are
+appended to the `concepts` array, and `concepts_completed` is updated in place.
+Everything else, including `// Source` comments and the file's own formatting,
+is left as it was; the loader's `term_sources` fields never reach the file.
+
+Usage:
+    python taxonomy_journal.py status [Taxonomies/syntopicon_taxonomy.json]
+    python taxonomy_journal.py compact [Taxonomies/syntopicon_taxonomy.json] [--backup]
+"""
+
+import argparse
+import copy
+import json
+import os
+import re
+import shutil
+import sys
+import time
+from pathlib import Path
+
+from jsonl_checkpoint import recover_jsonl, write_text_atomically
+from taxonomy_loader import STRING, load_taxonomy_file, parse_taxonomy
+
+TAXONOMY_PATH = 'Taxonomies/syntopicon_taxonomy.json'
+
+# Strings, comments and structural characters of the JSONC taxonomy text
+TOKENS = re.compile(rf'{STRING}|//[^\n]*|/\*.*?\*/|[{{}}\[\]:,]', re.S)
+
+def journal_path(taxonomy_path=TAXONOMY_PATH):
+    """Journal file that sits next to a taxonomy file."""
+    path = Path(taxonomy_path)
+    return path.with_name(f"{path.stem}.journal.jsonl")
+
+def read_journal(path):
+    """
+    Concepts in a journal, in append order.
+
+    Read-only: a torn trailing line (from a writer that was killed mid-append) is
+    ignored rather than truncated, since another process may still be writing.
+    """
+    concepts = []
+    if not os.path.exists(path):
+        return concepts
+
+    with open(path, 'rb') as f:
+        for raw in f:
+            if not raw.endswith(b'\n'):
+                break
+            line = raw.strip()
+            if line:
+                try:
+                    concepts.append(json.loads(line))
+                except json.JSONDecodeError:
+                    break
+    return concepts
+
+def apply_concepts(taxonomy, concepts):
+    """Merge concepts into a taxonomy, replacing existing concepts with the same name."""
+    root = taxonomy["syntopicon_taxonomy"]
+    positions = {concept.get("name"): i for i, concept in enumerate(root["concepts"])}
+
+    for concept in concepts:
+        name = concept.get("name")
+        if name in positions:
+            root["concepts"][positions[name]] = concept
+        else:
+            positions[name] = len(root["concepts"])
+            root["concepts"].append(concept)
+
+    root["concepts_completed"] = len(root["concepts"])
+    return taxonomy
+
+def load_taxonomy(taxonomy_path=TAXONOMY_PATH):
+    """The canonical taxonomy with any journaled concepts merged in."""
+    return apply_concepts(load_taxonomy_file(taxonomy_path), read_journal(journal_path(taxonomy_path)))
+
+def concept_spans(text):
+    """
+    Character spans of the concept objects in taxonomy text, plus the offset just
+    inside the `concepts` array's opening bracket.
+    """
+    # Open containers as (bracket, key in the parent); the array is root.syntopicon_taxonomy.concepts
+    concepts_path = [('{', None), ('{', 'syntopicon_taxonomy'), ('[', 'concepts')]
+    stack = []
+    key = None
+    last_string = None
+    array_start = None
+    spans = []
+    for match in TOKENS.finditer(text):
+        token = match.group()
+        if token.startswith('//') or token.startswith('/*'):
+            continue
+        if token.startswith('"'):
+            last_string = token
+        elif token == ':':
+            key = json.loads(last_string)
+        elif token == ',':
+            key = None
+        elif token in '{[':
+            if stack == concepts_path and token == '{':
+                spans.append([match.start(), None])
+            stack.append((token, key))
+            if stack == concepts_path:
+                array_start = match.end()
+            key = None
+        else:
+            stack.pop()
+            if stack == concepts_path and token == '}':
+                spans[-1][1] = match.end()
+            key = None
+    if array_start is None:
+        raise ValueError("No syntopicon_taxonomy.concepts array found")
+    return array_start, [tuple(span) for span in spans]
+
+def _indented(concept, indent):
+    return '\n'.join(indent + line for line in json.dumps(concept, indent=2, ensure_ascii=False).split('\n'))
+
+def patch_taxonomy_text(text, concepts):
+    """
+    Taxonomy text with `concepts` merged in (as apply_concepts would), editing only
+    the concepts they add or replace and the `concepts_completed` count.
+    """
+    original = parse_taxonomy(text)
+    expected = apply_concepts(copy.deepcopy(original), concepts)
+    existing = original["syntopicon_taxonomy"]["concepts"]
+
+    array_start, spans = concept_spans(text)
+    if len(spans) != len(existing):
+        raise ValueError(f"Found {len(spans)} concept objects in the text but {len(existing)} in the parsed taxonomy")
+
+    indent = '      '
+    if spans:
+        line_start = text.rfind('\n', 0, spans[0][0]) + 1
+        if not text[line_start:spans[0][0]].strip():
+            indent = text[line_start:spans[0][0]]
+
+    # Last journaled version of each concept, in first-journaled order
+    latest = {}
+    for concept in concepts:
+        latest[concept.get("name")] = concept
+    positions = {concept.get("name"): i for i, concept in enumerate(existing)}
+    replaced = {positions[name]: concept for name, concept in latest.items() if name in positions}
+    added = [concept for name, concept in latest.items() if name not in positions]
+
+    edits = [(start, end, _indented(replaced[i], indent)[len(indent):])
+             for i, (start, end) in enumerate(spans) if i in replaced]
+    if added:
+        block = ',\n'.join(_indented(concept, indent) for concept in added)
+        if spans:
+            edits.append((spans[-1][1], spans[-1][1], ',\n' + block))
+        else:
+            edits.append((array_start, array_start, '\n' + block + '\n' + indent[:-2]))
+
+    for start, end, replacement in sorted(edits, reverse=True):
+        text = text[:start] + replacement + text[end:]
+
+    count = expected["syntopicon_taxonomy"]["concepts_completed"]
+    text = re.sub(r'("concepts_completed"\s*:\s*)\d+', lambda m: f"{m.group(1)}{count}", text, count=1)
+
+    if parse_taxonomy(text) != expected:
+        raise ValueError("Patched taxonomy text does not match the merged taxonomy")
+    return text
+
+def compact(taxonomy_path=TAXONOMY_PATH, backup=False):
+    """
+    Fold the journal into the canonical taxonomy file and remove the journal.
+
+    Run this when no generation run is appending to the journal. With `backup`, the
+    canonical file is first copied to a timestamped backup. Returns the number of
+    journaled concepts that were folded in.
+    """
+    journal = journal_path(taxonomy_path)
+    concepts = read_journal(journal)
+    if not concepts:
+        if journal.exists():
+            journal.unlink()
+        return 0
+
+    with open(taxonomy_path, 'r', encoding='utf-8') as f:
+        text = patch_taxonomy_text(f.read(), concepts)
+
+    if backup:
+        path = Path(taxonomy_path)
+        backup_path = path.with_name(f"{path.stem}_backup_{int(time.time())}.json")
+        shutil.copyfile(taxonomy_path, backup_path)
+        print(f"Backup saved to: {backup_path}")
+
+    write_text_atomically(taxonomy_path, text)
+    journal.unlink()
+    return len(concepts)
+
+class ConceptJournal:
+    """Appends generated concepts to a taxonomy's journal, one fsynced line each."""
+
+    def __init__(self, taxonomy_path=TAXONOMY_PATH):
+        self.taxonomy_path = taxonomy_path
+        self.path = journal_path(taxonomy_path)
+        # The single writer may trim a line torn by an earlier crash before appending
+        self.concepts = recover_jsonl(self.path)
+        self.file = None
+
+    def __len__(self):
+        return len(self.concepts)
+
+    def append(self, concept):
+        """Durably record one concept."""
+        if self.file is None:
+            self.file = open(self.path, 'a', encoding='utf-8')
+        self.file.write(json.dumps(concept, ensure_ascii=False) + '\n')
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.concepts.append(concept)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def compact(self, backup=False):
+        """Close the journal and fold it into the canonical taxonomy file."""
+        self.close()
+        compacted = compact(self.taxonomy_path, backup)
+        self.concepts = []
+        return compacted
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def main():
+    """Inspect or compact a taxonomy journal from the command line."""
+
+    parser = argparse.ArgumentParser(description="Inspect or compact the Syntopicon concept journal.")
+    parser.add_argument('command', choices=['status', 'compact'])
+    parser.add_argument('taxonomy', nargs='?', default=TAXONOMY_PATH, help=f"Taxonomy file (default: {TAXONOMY_PATH})")
+    parser.add_argument('--backup', action='store_true', help="Copy the taxonomy file to a timestamped backup first")
+    args = parser.parse_args()
+
+    if not Path(args.taxonomy).exists():
+        print(f"Error: File '{args.taxonomy}' not found")
+        sys.exit(1)
+
+    journal = journal_path(args.taxonomy)
+    if args.command == 'status':
+        concepts = read_journal(journal)
+        taxonomy = load_taxonomy(args.taxonomy)
+        print(f"Journal: {journal} ({len(concepts)} concepts)")
+        for concept in concepts:
+            print(f"  {concept.get('name')}")
+        print(f"Merged view: {taxonomy['syntopicon_taxonomy']['concepts_completed']} concepts")
+    else:
+        compacted = compact(args.taxonomy, args.backup)
+        print(f"Folded {compacted} journaled concepts into {args.taxonomy}")
+
+if __name__ == "__main__":
+    main()
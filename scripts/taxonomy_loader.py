@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Shared loader for the Syntopicon taxonomy files.
+
+The taxonomy is JSON with inline `// Source` comments after term lines (and may
+carry /* block */ comments or trailing commas), so plain json.load rejects it.
+parse_taxonomy() strips comments outside strings and keeps each inline comment as
+structured data: a comment after a list item is recorded in a sibling
+`<item>_sources` mapping (`terms` -> `term_sources: {term: source}`), and one
+after an object value in `<key>_source`.
+
+load_taxonomy_file() caches the parsed result as a pickle under data/cache/taxonomy,
+keyed by the file's size and mtime with a sha256 fallback, so repeated loads skip
+parsing entirely.
+
+Usage: python taxonomy_loader.py [taxonomy.json] [--no-cache]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import re
+import sys
+import time
+from pathlib import Path
+
+DEFAULT_TAXONOMY_PATH = 'Taxonomies/syntopicon_taxonomy.json'
+DEFAULT_CACHE_DIR = Path(__file__).resolve().parent.parent / 'data' / 'cache' / 'taxonomy'
+
+# Bump when the parsed representation changes so stale caches are ignored
+CACHE_FORMAT = 1
+
+# Joins a string to its inline comment until the parsed tree is walked
+SOURCE_MARK = '\x1f'
+
+STRING = r'"(?:[^"\\\n]|\\.)*"'
+TOKENS = re.compile(
+    rf'(?P<string>{STRING})(?P<annotation>[ \t]*(?P<comma>,?)[ \t]*//(?P<comment>[^\n]*))?'
+    r'|(?P<line_comment>//[^\n]*)'
+    r'|(?P<block_comment>/\*.*?\*/)',
+    re.S
+)
+TRAILING_COMMAS = re.compile(rf'({STRING})|,(?=\s*[\]}}])')
+
+def _strip_token(match):
+    if match.group('string') is None:
+        # Keep line structure so JSON error positions still match the source file
+        return '\n' * match.group(0).count('\n')
+    if match.group('annotation') is None:
+        return match.group('string')
+    comment = json.dumps(match.group('comment').strip(), ensure_ascii=False)[1:-1]
+    return f"{match.group('string')[:-1]}\\u001f{comment}\"{match.group('comma')}"
+
+def strip_comments(text):
+    """JSONC to JSON: drop comments and trailing commas, marking inline comments on strings."""
+    text = TOKENS.sub(_strip_token, text)
+    return TRAILING_COMMAS.sub(lambda m: m.group(1) or '', text)
+
+def _sources_key(key):
+    return f"{key[:-1] if key.endswith('s') else key}_sources"
+
+def _attach_sources(node):
+    """Move marked comments out of strings into `_source` / `_sources` fields."""
+    if isinstance(node, list):
+        for item in node:
+            _attach_sources(item)
+        return
+
+    if not isinstance(node, dict):
+        return
+
+    for key, value in list(node.items()):
+        if isinstance(value, str) and SOURCE_MARK in value:
+            node[key], node[f"{key}_source"] = value.split(SOURCE_MARK, 1)
+        elif isinstance(value, list):
+            sources = {}
+            for i, item in enumerate(value):
+                if isinstance(item, str) and SOURCE_MARK in item:
+                    item, source = item.split(SOURCE_MARK, 1)
+                    value[i] = item
+                    sources[item] = source
+                else:
+                    _attach_sources(item)
+            if sources:
+                node.setdefault(_sources_key(key), {}).update(sources)
+        else:
+            _attach_sources(value)
+
+def parse_taxonomy(text):
+    """Parse taxonomy JSONC text, keeping inline comments as structured source data."""
+    data = json.loads(strip_comments(text))
+    _attach_sources(data)
+    return data
+
+def cache_path(path, cache_dir=None):
+    """Cache file for a taxonomy file (one per absolute path)."""
+    path = Path(path).resolve()
+    cache_dir = Path(cache_dir or os.getenv('TAXONOMY_CACHE_DIR') or DEFAULT_CACHE_DIR)
+    tag = hashlib.sha1(str(path).encode('utf-8')).hexdigest()[:12]
+    return cache_dir / f"{path.stem}-{tag}.pickle"
+
+def _read_cache(path):
+    try:
+        with open(path, 'rb') as f:
+            cached = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ValueError):
+        return None
+    if not isinstance(cached, dict) or cached.get('format') != CACHE_FORMAT:
+        return None
+    return cached
+
+def _write_cache(path, cached):
+    """Best effort: a read-only checkout just parses every time."""
+    temp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(temp_path, 'wb') as f:
+            pickle.dump(cached, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, path)
+    except OSError:
+        if temp_path.exists():
+            temp_path.unlink()
+
+def load_taxonomy_file(path=DEFAULT_TAXONOMY_PATH, use_cache=True, cache_dir=None):
+    """
+    Load a taxonomy file, reusing the compiled cache when the file is unchanged.
+
+    An unchanged size and mtime return the cached tree without reading the file;
+    otherwise the file is hashed and only reparsed if its sha256 differs too. Each
+    call returns a fresh object, so callers may modify it.
+    """
+    path = Path(path)
+    if not use_cache:
+        return parse_taxonomy(path.read_text(encoding='utf-8'))
+
+    stat = path.stat()
+    cache_file = cache_path(path, cache_dir)
+    cached = _read_cache(cache_file)
+    if cached and cached['size'] == stat.st_size and cached['mtime_ns'] == stat.st_mtime_ns:
+        return cached['data']
+
+    raw = path.read_bytes()
+    digest = hashlib.sha256(raw).hexdigest()
+    if cached and cached['sha256'] == digest:
+        data = cached['data']
+    else:
+        data = parse_taxonomy(raw.decode('utf-8'))
+
+    _write_cache(cache_file, {
+        "format": CACHE_FORMAT,
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "sha256": digest,
+        "data": data,
+    })
+    return data
+
+def main():
+    """Parse a taxonomy file and report what it contains and how fast it loads."""
+
+    parser = argparse.ArgumentParser(description="Load a Syntopicon taxonomy file (JSON with // comments).")
+    parser.add_argument('taxonomy', nargs='?', default=DEFAULT_TAXONOMY_PATH,
+                        help=f"Taxonomy file (default: {DEFAULT_TAXONOMY_PATH})")
+    parser.add_argument('--no-cache', action='store_true', help="Parse without reading or writing the cache")
+    args = parser.parse_args()
+
+    if not Path(args.taxonomy).exists():
+        print(f"Error: File '{args.taxonomy}' not found")
+        sys.exit(1)
+
+    started = time.perf_counter()
+    try:
+        taxonomy = load_taxonomy_file(args.taxonomy, use_cache=not args.no_cache)
+    except json.JSONDecodeError as e:
+        print(f"Error: {args.taxonomy} is not valid JSON after removing comments: {e}")
+        sys.exit(1)
+    elapsed = (time.perf_counter() - started) * 1000
+
+    concepts = taxonomy.get('syntopicon_taxonomy', {}).get('concepts', [])
+    sourced = sum(len(concept.get('term_sources', {})) for concept in concepts)
+    print(f"Loaded {args.taxonomy} in {elapsed:.1f} ms")
+    print(f"Concepts: {len(concepts)}")
+    print(f"Terms: {sum(len(concept.get('terms', [])) for concept in concepts)} ({sourced} with sources)")
+
+if __name__ == "__main__":
+    main()
@@ -4,10 +4,11 @@ Test script to verify the setup is working correctly.
 """
 
 import os
-import json
 from pathlib import Path
 from dotenv import load_dotenv
 
+from taxonomy_loader import load_taxonomy_file
+
 def test_environment():
     """Test if the environment is set up correctly."""
     print("Testing environment setup...")
@@ -37,10 +38,9 @@ def test_environment():
             print(f"❌ {file_path} missing")
             return False
     
-    # Check if taxonomy is valid JSON
+    # Check if taxonomy is valid JSON (// source comments allowed)
     try:
-        with open('Taxonomies/syntopicon_taxonomy.json', 'r') as f:
-            taxonomy = json.load(f)
+        taxonomy = load_taxonomy_file('Taxonomies/syntopicon_taxonomy.json')
         print(f"✅ Taxonomy JSON is valid ({taxonomy['syntopicon_taxonomy']['concepts_completed']}/102 concepts)")
     except Exception as e:
         print(f"❌ Taxonomy JSON is invalid: {e}")
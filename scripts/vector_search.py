@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""
+Local exact vector search over embedding JSONL files (an offline Qdrant stand-in).
+
+Loads `_qdrant.jsonl` / `_embeddings.jsonl` files (inline or sidecar layout) into one
+contiguous float32 matrix with L2-normalized rows, then answers top-k cosine
+queries with a single matrix multiply plus argpartition. Results use the same
+id/score/payload shape as `qdrant.search`.
+
+With --prefix-dims, PrefixIndex scans only a short renormalized prefix of each
+vector (text-embedding-3 vectors are Matryoshka-trained) and reranks the top
+candidates with the full vectors.
+
+Usage:
+    python vector_search.py <file.jsonl> [...] --query "What is the nature of virtue?"
+    python vector_search.py <file.jsonl> [...] --like lewis_reading_old_books_3
+    python vector_search.py <file.jsonl> [...] --query "..." --prefix-dims 256 --rerank 100
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+
+from convert_to_qdrant import chunk_id, fallback_slug
+from vector_store import load_embeddings, load_prefix_index, truncate_and_normalize
+
+# Queries are scored in blocks so the (queries x chunks) score matrix stays bounded
+QUERY_BLOCK = 64
+
+DEFAULT_PREFIX_DIMS = 256
+DEFAULT_RERANK = 100
+
+def normalize_rows(matrix):
+    """L2-normalize rows in place (zero rows are left as zeros)."""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    matrix /= norms
+    return matrix
+
+def top_k(scores, limit):
+    """Indices of the `limit` highest scores in each row, best first."""
+    n = scores.shape[1]
+    limit = min(limit, n)
+    if limit == 0:
+        return np.zeros((scores.shape[0], 0), dtype=np.int64)
+    if limit < n:
+        candidates = np.argpartition(-scores, limit - 1, axis=1)[:, :limit]
+    else:
+        candidates = np.tile(np.arange(n), (scores.shape[0], 1))
+    order = np.argsort(-np.take_along_axis(scores, candidates, axis=1), axis=1, kind='stable')
+    return np.take_along_axis(candidates, order, axis=1)
+
+class VectorIndex:
+    """Exact cosine search over an in-memory matrix of normalized vectors."""
+
+    def __init__(self, ids, payloads, vectors):
+        if len(ids) != len(payloads) or len(ids) != len(vectors):
+            raise ValueError("ids, payloads and vectors must have the same length")
+        self.ids = list(ids)
+        self.payloads = list(payloads)
+        self.vectors = normalize_rows(np.array(vectors, dtype=np.float32, order='C', copy=True))
+        self.positions = {point: i for i, point in enumerate(self.ids)}
+
+    @classmethod
+    def from_jsonl(cls, *paths):
+        """Build an index from one or more embedding JSONL files."""
+        ids = []
+        payloads = []
+        matrices = []
+
+        for path in paths:
+            rows, matrix = load_embeddings(path)
+            if not rows:
+                continue
+            fallback = fallback_slug(path)
+            for chunk in rows:
+                ids.append(chunk_id(chunk, fallback))
+                payloads.append({key: value for key, value in chunk.items() if key != 'id'})
+            matrices.append(matrix)
+
+        if not matrices:
+            return cls([], [], np.zeros((0, 0), dtype=np.float32))
+        return cls(ids, payloads, np.concatenate(matrices).astype(np.float32, copy=False))
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def dims(self):
+        return self.vectors.shape[1]
+
+    def vector(self, point):
+        """Stored (normalized) vector of a point id."""
+        return self.vectors[self.positions[point]]
+
+    def _prepare_queries(self, query_vectors):
+        queries = np.array(query_vectors, dtype=np.float32, ndmin=2, copy=True)
+        if queries.shape[1] != self.dims:
+            raise ValueError(f"Expected {self.dims}-dimensional queries, got {queries.shape[1]}")
+        return normalize_rows(queries)
+
+    def _format(self, indices, scores, with_payload):
+        results = []
+        for i, score in zip(indices, scores):
+            point = {"id": self.ids[i], "score": float(score)}
+            if with_payload:
+                point["payload"] = self.payloads[i]
+            results.append(point)
+        return results
+
+    def search_batch(self, query_vectors, limit=10, with_payload=True):
+        """Top-k cosine matches for each query vector, as lists of {id, score, payload}."""
+        queries = self._prepare_queries(query_vectors)
+        results = []
+
+        for start in range(0, len(queries), QUERY_BLOCK):
+            block = queries[start:start + QUERY_BLOCK]
+            scores = block @ self.vectors.T
+            best = top_k(scores, limit)
+            best_scores = np.take_along_axis(scores, best, axis=1)
+            results.extend(self._format(idx, sc, with_payload) for idx, sc in zip(best, best_scores))
+
+        return results
+
+    def search(self, query_vector, limit=10, with_payload=True):
+        """Top-k cosine matches for one query vector."""
+        return self.search_batch([query_vector], limit, with_payload)[0]
+
+class PrefixIndex:
+    """
+    Two-stage search: candidate generation on a short prefix of every vector, then
+    reranking of the top `rerank` candidates with the full vectors.
+
+    Only the prefix matrix is held in RAM; the full vectors may be a read-only memmap
+    of a .vectors.npy sidecar.
+    """
+
+    def __init__(self, ids, payloads, vectors, prefix_dims=DEFAULT_PREFIX_DIMS, prefix=None):
+        if prefix_dims > vectors.shape[1]:
+            raise ValueError(f"Prefix of {prefix_dims} dimensions is longer than the {vectors.shape[1]}-dimension vectors")
+        self.ids = list(ids)
+        self.payloads = list(payloads)
+        self.full = vectors
+        self.prefix_dims = prefix_dims
+        self.prefix = np.ascontiguousarray(prefix if prefix is not None else truncate_and_normalize(vectors, prefix_dims),
+                                           dtype=np.float32)
+        self.positions = {point: i for i, point in enumerate(self.ids)}
+
+    @classmethod
+    def from_jsonl(cls, *paths, prefix_dims=DEFAULT_PREFIX_DIMS):
+        """Build from embedding files, reusing prefix indexes written by generate_embeddings.py."""
+        ids = []
+        payloads = []
+        fulls = []
+        prefixes = []
+
+        for path in paths:
+            rows, matrix = load_embeddings(path)
+            if not rows:
+                continue
+            fallback = fallback_slug(path)
+            for chunk in rows:
+                ids.append(chunk_id(chunk, fallback))
+                payloads.append({key: value for key, value in chunk.items() if key != 'id'})
+            fulls.append(matrix)
+            prefix = load_prefix_index(path, prefix_dims)
+            prefixes.append(prefix if prefix is not None and len(prefix) == len(rows)
+                            else truncate_and_normalize(matrix, prefix_dims))
+
+        if not fulls:
+            raise ValueError("No embedded chunks found")
+        # A single store-layout file stays memory-mapped; several are concatenated
+        full = fulls[0] if len(fulls) == 1 else np.concatenate([np.asarray(f, dtype=np.float32) for f in fulls])
+        return cls(ids, payloads, full, prefix_dims, np.concatenate(prefixes))
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def dims(self):
+        return self.full.shape[1]
+
+    def vector(self, point):
+        return np.asarray(self.full[self.positions[point]], dtype=np.float32)
+
+    def search_batch(self, query_vectors, limit=10, with_payload=True, rerank=DEFAULT_RERANK):
+        """Top-k matches per query: prefix scan for candidates, full vectors for the final order."""
+        queries = normalize_rows(np.array(query_vectors, dtype=np.float32, ndmin=2, copy=True))
+        if queries.shape[1] != self.dims:
+            raise ValueError(f"Expected {self.dims}-dimensional queries, got {queries.shape[1]}")
+        short = truncate_and_normalize(queries, self.prefix_dims)
+        shortlist_size = max(limit, rerank or 0)
+        results = []
+
+        for start in range(0, len(queries), QUERY_BLOCK):
+            scores = short[start:start + QUERY_BLOCK] @ self.prefix.T
+            for qi, candidates in enumerate(top_k(scores, shortlist_size), start):
+                if rerank:
+                    rows = np.sort(candidates)
+                    exact = normalize_rows(np.array(self.full[rows], dtype=np.float32)) @ queries[qi]
+                    best = top_k(exact[np.newaxis, :], limit)[0]
+                    rows, row_scores = rows[best], exact[best]
+                else:
+                    rows, row_scores = candidates, scores[qi - start, candidates]
+
+                hits = []
+                for row, score in zip(rows, row_scores):
+                    point = {"id": self.ids[row], "score": float(score)}
+                    if with_payload:
+                        point["payload"] = self.payloads[row]
+                    hits.append(point)
+                results.append(hits)
+
+        return results
+
+    def search(self, query_vector, limit=10, with_payload=True, rerank=DEFAULT_RERANK):
+        return self.search_batch([query_vector], limit, with_payload, rerank)[0]
+
+def embed_queries(queries):
+    """Embed query texts with the same model and cache used for the chunks."""
+    from embedding_cache import EmbeddingCache
+    from generate_embeddings import create_client, embed_texts, fill_from_cache, store_in_cache
+
+    rows = [{"line_num": i, "chunk": {"content": query}, "error": None} for i, query in enumerate(queries)]
+    cache = EmbeddingCache()
+    missing = fill_from_cache(cache, rows)
+    if missing:
+        vectors = embed_texts(create_client(), [row['chunk']['content'] for row in missing])
+        for row, vector in zip(missing, vectors):
+            row['chunk']['embedding'] = vector
+        store_in_cache(cache, missing)
+    cache.close()
+    return [row['chunk']['embedding'] for row in rows]
+
+def print_results(label, results):
+    print(f"\n=== {label} ===")
+    for rank, point in enumerate(results, 1):
+        payload = point.get('payload', {})
+        preview = (payload.get('content') or '')[:100].replace('\n', ' ')
+        print(f"{rank:2d}. {point['score']:.4f}  {point['id']}  {payload.get('source_title', '')}")
+        print(f"    {preview}...")
+
+def main():
+    """Search embedding files from the command line."""
+
+    parser = argparse.ArgumentParser(description="Exact local vector search over embedding JSONL files.")
+    parser.add_argument('files', nargs='+', help="Embedding JSONL files to search")
+    parser.add_argument('--query', action='append', default=[], help="Query text (embedded with OpenAI); repeatable")
+    parser.add_argument('--like', action='append', default=[], help="Use a stored chunk's vector as the query; repeatable")
+    parser.add_argument('--limit', type=int, default=5, help="Results per query (default: 5)")
+    parser.add_argument('--json', action='store_true', help="Print results as JSON")
+    parser.add_argument('--prefix-dims', type=int,
+                        help="Two-stage search: scan an N-dimension prefix first (e.g. 256 or 512)")
+    parser.add_argument('--rerank', type=int, default=DEFAULT_RERANK,
+                        help=f"Candidates reranked with full vectors in two-stage search (default: {DEFAULT_RERANK})")
+    args = parser.parse_args()
+
+    for path in args.files:
+        if not Path(path).exists():
+            print(f"Error: File '{path}' not found")
+            sys.exit(1)
+
+    if not args.query and not args.like:
+        print("Error: give at least one --query or --like")
+        sys.exit(1)
+
+    if args.prefix_dims:
+        index = PrefixIndex.from_jsonl(*args.files, prefix_dims=args.prefix_dims)
+    else:
+        index = VectorIndex.from_jsonl(*args.files)
+    print(f"Loaded {len(index)} vectors ({index.dims} dimensions)", file=sys.stderr)
+
+    labels = list(args.query)
+    vectors = embed_queries(args.query) if args.query else []
+    for point in args.like:
+        if point not in index.positions:
+            print(f"Error: no chunk with id '{point}'")
+            sys.exit(1)
+        labels.append(f"like {point}")
+        vectors.append(index.vector(point))
+
+    if args.prefix_dims:
+        results = index.search_batch(vectors, args.limit, rerank=args.rerank)
+    else:
+        results = index.search_batch(vectors, args.limit)
+
+    if args.json:
+        print(json.dumps([{"query": label, "results": hits} for label, hits in zip(labels, results)],
+                         indent=2, ensure_ascii=False))
+        return
+
+    for label, hits in zip(labels, results):
+        print_results(label, hits)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+Binary sidecar storage for chunk embeddings.
+
+Instead of carrying 1,536 decimal floats per row, a JSONL file in "store" layout
+keeps its vectors in a fixed-stride float32/float16 `.npy` file next to it
+(`book_embeddings.jsonl` -> `book_embeddings.vectors.npy`), and each row holds an
+`embedding_row` offset into it. The sidecar is a standard .npy file, so it opens
+with np.load(..., mmap_mode='r') and loads millions of vectors without copying.
+
+A prefix index (`book_embeddings.prefix256.npy`) holds the first N dimensions of
+every vector, renormalized. text-embedding-3 vectors are Matryoshka-trained, so the
+prefix is a usable low-dimensional embedding for first-stage candidate search.
+
+Usage:
+    python vector_store.py to-store <file.jsonl> [--dtype float16]
+    python vector_store.py to-inline <file.jsonl>
+    python vector_store.py prefix <file.jsonl> --dims 256
+"""
+
+import argparse
+import json
+import os
+import struct
+import sys
+from pathlib import Path
+
+import numpy as np
+
+NPY_MAGIC = b'\x93NUMPY\x01\x00'
+
+# Fixed header size so the row count can be rewritten in place as rows are appended
+HEADER_SIZE = 128
+
+def sidecar_path(jsonl_path):
+    """Vector file that belongs to a JSONL file."""
+    path = Path(jsonl_path)
+    return path.with_name(f"{path.stem}.vectors.npy")
+
+def prefix_path(jsonl_path, dims):
+    """Prefix index file that belongs to a JSONL file."""
+    path = Path(jsonl_path)
+    return path.with_name(f"{path.stem}.prefix{dims}.npy")
+
+def has_embedding(chunk):
+    """True if a chunk carries a vector, inline or as a sidecar reference."""
+    return chunk.get('embedding') is not None or chunk.get('embedding_row') is not None
+
+def _header_bytes(count, dims, dtype):
+    header = "{'descr': %r, 'fortran_order': False, 'shape': (%d, %d), }" % (np.dtype(dtype).str, count, dims)
+    header = header.ljust(HEADER_SIZE - len(NPY_MAGIC) - 2 - 1) + '\n'
+    return NPY_MAGIC + struct.pack('<H', len(header)) + header.encode('latin1')
+
+def _read_header(f):
+    f.seek(0)
+    version = np.lib.format.read_magic(f)
+    if version == (1, 0):
+        shape, _, dtype = np.lib.format.read_array_header_1_0(f)
+    else:
+        shape, _, dtype = np.lib.format.read_array_header_2_0(f)
+    return shape, dtype, f.tell()
+
+class VectorWriter:
+    """
+    Appends vectors to a sidecar .npy file.
+
+    The header's row count is rewritten on every flush(), so the file is a valid
+    .npy array of every row flushed so far even if the process is killed.
+    """
+
+    def __init__(self, path, dtype='float32', resume_rows=None):
+        self.path = Path(path)
+        self.dtype = np.dtype(dtype)
+        self.dims = None
+        self.count = 0
+        self.file = None
+
+        if resume_rows is not None and self.path.exists():
+            self.file = open(self.path, 'r+b')
+            (rows, self.dims), file_dtype, offset = _read_header(self.file)
+            if offset != HEADER_SIZE:
+                raise ValueError(f"{self.path} was not written by VectorWriter and cannot be appended to")
+            self.dtype = file_dtype
+            # Rows written after the last JSONL checkpoint are orphans; drop them
+            self.count = min(resume_rows, rows, (os.path.getsize(self.path) - HEADER_SIZE) // self._stride())
+            self.file.truncate(HEADER_SIZE + self.count * self._stride())
+            self.file.seek(0, os.SEEK_END)
+
+    def _stride(self):
+        return self.dims * self.dtype.itemsize
+
+    def append(self, vector):
+        """Append one vector and return its row number."""
+        vector = np.asarray(vector, dtype=self.dtype).reshape(-1)
+        if self.file is None:
+            self.dims = vector.shape[0]
+            self.file = open(self.path, 'w+b')
+            self.file.write(_header_bytes(0, self.dims, self.dtype))
+        elif vector.shape[0] != self.dims:
+            raise ValueError(f"Expected {self.dims}-dimensional vector, got {vector.shape[0]}")
+
+        self.file.write(vector.tobytes())
+        self.count += 1
+        return self.count - 1
+
+    def flush(self):
+        """Make every appended row durable and visible in the header."""
+        if self.file is None:
+            return
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.seek(0)
+        self.file.write(_header_bytes(self.count, self.dims, self.dtype))
+        self.file.seek(0, os.SEEK_END)
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        if self.file is not None:
+            self.flush()
+            self.file.close()
+            self.file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+def open_vectors(path):
+    """Memory-map a sidecar vector file read-only."""
+    path = Path(path)
+    with open(path, 'rb') as f:
+        shape, dtype, _ = _read_header(f)
+    if shape[0] == 0:
+        return np.zeros(shape, dtype=dtype)
+    return np.load(path, mmap_mode='r')
+
+class ChunkVectors:
+    """Resolves `embedding_row` references of one JSONL file, opening its sidecar lazily."""
+
+    def __init__(self, jsonl_path):
+        self.path = sidecar_path(jsonl_path)
+        self._vectors = None
+
+    @property
+    def vectors(self):
+        if self._vectors is None:
+            if not self.path.exists():
+                raise FileNotFoundError(f"Vector file '{self.path}' not found")
+            self._vectors = open_vectors(self.path)
+        return self._vectors
+
+    def resolve(self, chunk):
+        """Move a chunk's sidecar vector inline (as a list) and return the chunk."""
+        row = chunk.pop('embedding_row', None)
+        if row is not None:
+            chunk['embedding'] = self.vectors[row].astype(np.float32).tolist()
+        return chunk
+
+def iter_chunks(jsonl_path, resolve=True):
+    """Yield (line_num, chunk) from a JSONL file in either layout, vectors inline."""
+    vectors = ChunkVectors(jsonl_path)
+    with open(jsonl_path, 'r', encoding='utf-8') as f:
+        for line_num, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            chunk = json.loads(line)
+            yield line_num, (vectors.resolve(chunk) if resolve else chunk)
+
+def load_embeddings(jsonl_path):
+    """
+    Load a JSONL file as (rows, matrix).
+
+    `rows` are the chunk dicts without their vectors and `matrix` is an (n, dims)
+    array; for the store layout it is a read-only memmap when the rows reference the
+    sidecar in order, so nothing is copied.
+    """
+    rows = []
+    inline = []
+    offsets = []
+
+    with open(jsonl_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            chunk = json.loads(line)
+            embedding = chunk.pop('embedding', None)
+            row = chunk.pop('embedding_row', None)
+            if row is not None:
+                offsets.append(row)
+            elif embedding is not None:
+                inline.append(embedding)
+            else:
+                continue
+            rows.append(chunk)
+
+    if offsets and inline:
+        raise ValueError(f"{jsonl_path} mixes inline and sidecar embeddings")
+
+    if offsets:
+        vectors = open_vectors(sidecar_path(jsonl_path))
+        if offsets == list(range(len(offsets))):
+            return rows, vectors[:len(offsets)]
+        return rows, np.asarray(vectors[offsets])
+
+    if not inline:
+        return rows, np.zeros((0, 0), dtype=np.float32)
+    return rows, np.asarray(inline, dtype=np.float32)
+
+def truncate_and_normalize(vectors, dims, block=65536):
+    """First `dims` components of each vector, L2-normalized, as float32."""
+    prefix = np.empty((len(vectors), dims), dtype=np.float32)
+    for start in range(0, len(vectors), block):
+        part = np.asarray(vectors[start:start + block, :dims], dtype=np.float32)
+        norms = np.linalg.norm(part, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        prefix[start:start + block] = part / norms
+    return prefix
+
+def write_prefix_index(jsonl_path, dims):
+    """Write the renormalized `dims`-dimension prefix of every vector. Returns its path."""
+    _, matrix = load_embeddings(jsonl_path)
+    if dims > matrix.shape[1]:
+        raise ValueError(f"Prefix of {dims} dimensions is longer than the {matrix.shape[1]}-dimension vectors")
+    path = prefix_path(jsonl_path, dims)
+    np.save(path, truncate_and_normalize(matrix, dims))
+    return path
+
+def load_prefix_index(jsonl_path, dims):
+    """Memory-map a prefix index if it exists and is current with its JSONL file, else None."""
+    path = prefix_path(jsonl_path, dims)
+    if not path.exists() or path.stat().st_mtime < Path(jsonl_path).stat().st_mtime:
+        return None
+    return np.load(path, mmap_mode='r')
+
+def write_chunks(chunks, output_file, layout='inline', dtype='float32'):
+    """Write chunks (vectors inline) to a JSONL file in the requested layout. Returns the count."""
+    count = 0
+    with open(output_file, 'w', encoding='utf-8') as outfile:
+        writer = VectorWriter(sidecar_path(output_file), dtype) if layout == 'store' else None
+        try:
+            for chunk in chunks:
+                if writer is not None and chunk.get('embedding') is not None:
+                    chunk['embedding_row'] = writer.append(chunk.pop('embedding'))
+                outfile.write(json.dumps(chunk, ensure_ascii=False) + '\n')
+                count += 1
+        finally:
+            if writer is not None:
+                writer.close()
+    return count
+
+def convert_layout(input_file, output_file, layout, dtype='float32'):
+    """Convert a JSONL file between the inline and store layouts."""
+    if Path(input_file).resolve() == Path(output_file).resolve():
+        raise ValueError("Input and output must be different files")
+    chunks = (chunk for _, chunk in iter_chunks(input_file))
+    return write_chunks(chunks, output_file, layout, dtype)
+
+def main():
+    """Convert embedding files between inline JSON and sidecar vector layouts."""
+
+    parser = argparse.ArgumentParser(description="Convert embedding JSONL files between inline and sidecar layouts.")
+    parser.add_argument('command', choices=['to-store', 'to-inline', 'prefix'])
+    parser.add_argument('input_file')
+    parser.add_argument('--dims', type=int, default=256, help="Prefix dimensions for the prefix command (default: 256)")
+    parser.add_argument('--output', help="Output JSONL (default: <input>_store.jsonl or <input>_inline.jsonl)")
+    parser.add_argument('--dtype', choices=['float32', 'float16'], default='float32',
+                        help="Sidecar precision for to-store (default: float32)")
+    args = parser.parse_args()
+
+    if not Path(args.input_file).exists():
+        print(f"Error: Input file '{args.input_file}' not found")
+        sys.exit(1)
+
+    if args.command == 'prefix':
+        path = write_prefix_index(args.input_file, args.dims)
+        print(f"Prefix index saved to: {path} ({os.path.getsize(path) / 1024:.0f} KB)")
+        return
+
+    layout = 'store' if args.command == 'to-store' else 'inline'
+    input_path = Path(args.input_file)
+    output_file = args.output or input_path.with_name(f"{input_path.stem}_{layout}{input_path.suffix}")
+
+    count = convert_layout(args.input_file, output_file, layout, args.dtype)
+
+    print(f"Converted {count} chunks")
+    print(f"Output saved to: {output_file} ({os.path.getsize(output_file) / 1024:.0f} KB)")
+    if layout == 'store':
+        vectors = sidecar_path(output_file)
+        print(f"Vectors saved to: {vectors} ({os.path.getsize(vectors) / 1024:.0f} KB)")
+
+if __name__ == "__main__":
+    main()
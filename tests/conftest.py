@@ -0,0 +1,161 @@
+"""
+Shared fixtures. The scripts import each other as top-level modules, so their
+directory goes on sys.path; `qdrant` runs qdrant_standin.py on a free port and
+`fake_openai` serves a scripted /v1/embeddings endpoint.
+"""
+
+import json
+import sys
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+SCRIPTS = Path(__file__).resolve().parent.parent / 'scripts'
+sys.path.insert(0, str(SCRIPTS))
+
+def serve(handler):
+    """Run an HTTP handler class on a free port; returns (server, base URL)."""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+@pytest.fixture
+def qdrant():
+    """URL of a fresh in-memory Qdrant stand-in."""
+    import qdrant_standin
+
+    handler = type('Handler', (qdrant_standin.Handler,), {"store": qdrant_standin.Store()})
+    server, url = serve(handler)
+    yield url
+    server.shutdown()
+    server.server_close()
+
+def fake_vector(text):
+    """Deterministic stand-in embedding of a text."""
+    return [float(len(text)), float(sum(map(ord, text)) % 997), 1.0]
+
+class FakeAPI:
+    """
+    Script for a fake API server. Each request pops the next entry of `replies`
+    (a (status, headers, body) triple) if there is one, else gets the normal
+    answer; `delay(body)` seconds are slept first. Every request body is recorded.
+    """
+
+    def __init__(self):
+        self.replies = deque()
+        self.requests = []
+        self.delay = lambda body: 0
+        self.lock = threading.Lock()
+        self.url = None
+
+    def next_reply(self, body):
+        with self.lock:
+            self.requests.append(body)
+            return self.replies.popleft() if self.replies else None
+
+class JSONHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    api = None
+
+    def log_message(self, *args):
+        pass
+
+    def reply(self, status, body, headers=None):
+        data = body if isinstance(body, bytes) else json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)) or b'{}')
+        scripted = self.api.next_reply(body)
+        time.sleep(self.api.delay(body))
+        if scripted is not None:
+            status, headers, reply_body = scripted
+            return self.reply(status, reply_body, headers)
+        return self.answer(body)
+
+class EmbeddingsHandler(JSONHandler):
+    # Plenty of headroom, so AdaptiveConcurrency may grow
+    HEADERS = {"x-ratelimit-limit-requests": "3000", "x-ratelimit-remaining-requests": "2999",
+               "x-ratelimit-limit-tokens": "1000000", "x-ratelimit-remaining-tokens": "999000"}
+
+    def answer(self, body):
+        if self.path.rstrip('/') != '/v1/embeddings':
+            return self.reply(404, {"error": {"message": f"Not found: {self.path}"}})
+        texts = body['input'] if isinstance(body['input'], list) else [body['input']]
+        # Deliberately returned in reverse: clients must map results back by `index`
+        data = [{"object": "embedding", "index": i, "embedding": fake_vector(text)}
+                for i, text in reversed(list(enumerate(texts)))]
+        tokens = sum(len(text) // 4 + 1 for text in texts)
+        self.reply(200, {"object": "list", "data": data, "model": body.get('model'),
+                         "usage": {"prompt_tokens": tokens, "total_tokens": tokens}}, self.HEADERS)
+
+def fake_message(text, cache_read_tokens=0):
+    """A Messages API reply body whose only content block is `text`."""
+    return {"id": "msg_test", "type": "message", "role": "assistant", "model": "test",
+            "content": [{"type": "text", "text": text}] if text else [],
+            "stop_reason": "end_turn", "stop_sequence": None,
+            "usage": {"input_tokens": 10, "output_tokens": 20, "cache_creation_input_tokens": 0,
+                      "cache_read_input_tokens": cache_read_tokens}}
+
+def fake_tool_message(name, tool_input):
+    """A Messages API reply body that calls tool `name` with `tool_input`."""
+    reply = fake_message(None)
+    reply["content"] = [{"type": "tool_use", "id": "toolu_test", "name": name, "input": tool_input}]
+    reply["stop_reason"] = "tool_use"
+    return reply
+
+def fake_annotation(body, index):
+    """A valid enrich_chunks tool entry for one passage, using the first category and element offered."""
+    function = body['tools'][0]['input_schema']['properties']['chunks']['items']['properties'][
+        'rhetorical_function']['properties']['primary']['properties']
+    return {"index": index,
+            "rhetorical_function": {"primary": {"category": function['category']['enum'][0],
+                                                "elements": function['elements']['items']['enum'][:1]}},
+            "topics": [f"Passage {index}"], "entities": {"people": []}, "scripture_refs": []}
+
+class MessagesHandler(JSONHandler):
+    def answer(self, body):
+        if self.path.rstrip('/') != '/v1/messages':
+            return self.reply(404, {"error": {"message": f"Not found: {self.path}"}})
+        if body.get('tools'):
+            # enrich_chunks.py: annotate every passage of the request through the forced tool call
+            count = body['messages'][-1]['content'].count('<chunk index=')
+            entries = [fake_annotation(body, i) for i in range(count)]
+            return self.reply(200, fake_tool_message(body['tools'][0]['name'], {"chunks": entries}))
+        # The per-concept prompt names the concept in quotes
+        name = body['messages'][-1]['content'].split('"')[1]
+        self.reply(200, fake_message(json.dumps({"name": name, "topics": [], "terms": []})))
+
+@pytest.fixture
+def fake_anthropic(monkeypatch):
+    """FakeAPI behind a local /v1/messages server, with ANTHROPIC_BASE_URL pointing at it."""
+    api = FakeAPI()
+    server, url = serve(type('Handler', (MessagesHandler,), {"api": api}))
+    api.url = url
+    monkeypatch.setenv('ANTHROPIC_BASE_URL', url)
+    monkeypatch.setenv('ANTHROPIC_API_KEY', 'test')
+    yield api
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def fake_openai(monkeypatch):
+    """FakeAPI behind a local /v1/embeddings server, with OPENAI_BASE_URL pointing at it."""
+    api = FakeAPI()
+    server, url = serve(type('Handler', (EmbeddingsHandler,), {"api": api}))
+    api.url = url
+    monkeypatch.setenv('OPENAI_BASE_URL', f"{url}/v1")
+    monkeypatch.setenv('OPENAI_API_KEY', 'test')
+    yield api
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from ann_index import IVFIndex
+from vector_search import VectorIndex
+
+def corpus(n=2000, dims=32, seed=0):
+    rng = np.random.default_rng(seed)
+    return [f"p{i}" for i in range(n)], [{"i": i} for i in range(n)], rng.standard_normal((n, dims)).astype(np.float32)
+
+def test_probing_every_cell_is_exact():
+    ids, payloads, vectors = corpus()
+    index = IVFIndex.build(ids, payloads, vectors, nlist=16)
+    exact = VectorIndex(ids, payloads, vectors)
+    query = np.random.default_rng(1).standard_normal(32)
+    assert [hit['id'] for hit in index.search(query, 10, nprobe=16)] == [hit['id'] for hit in exact.search(query, 10)]
+
+def test_build_rejects_empty_corpus():
+    with pytest.raises(ValueError, match="without any vectors"):
+        IVFIndex.build([], [], np.zeros((0, 8), dtype=np.float32))
+
+def test_add_replaces_and_deduplicates_within_batch():
+    ids, payloads, vectors = corpus(200, 8)
+    index = IVFIndex.build(ids, payloads, vectors, nlist=4)
+    new = np.eye(8, dtype=np.float32)[:3]
+    index.add(["p0", "x", "x"], [{"v": 1}, {"v": 2}, {"v": 3}], new)
+
+    assert len(index) == 201
+    assert index.payloads[index.positions["x"]] == {"v": 3}
+    assert np.allclose(index.vector("x"), new[2])
+    hits = index.search(new[2], 3, nprobe=4)
+    assert [hit['id'] for hit in hits].count("x") == 1
+
+    index.compact()
+    assert index.ids.count("x") == 1 and index.ids.count("p0") == 1
+    assert np.allclose(index.vector("p0"), new[0])
+
+def test_save_and_load_round_trip(tmp_path):
+    ids, payloads, vectors = corpus(300, 8)
+    index = IVFIndex.build(ids, payloads, vectors, nlist=8)
+    index.save(tmp_path / 'index.npz')
+    loaded = IVFIndex.load(tmp_path / 'index.npz')
+    assert loaded.search(vectors[5], 5) == index.search(vectors[5], 5)
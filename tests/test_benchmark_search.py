@@ -0,0 +1,27 @@
+from types import SimpleNamespace
+
+import numpy as np
+
+from benchmark_search import load_corpus, perturbed_queries, synthetic_corpus
+
+def test_synthetic_corpus_has_no_decay_by_default():
+    vectors = synthetic_corpus(4000, dims=256)
+    head, tail = vectors[:, :32].var(), vectors[:, -32:].var()
+    assert 0.8 < head / tail < 1.25
+
+def test_decay_is_opt_in():
+    vectors = synthetic_corpus(4000, dims=256, decay=64)
+    assert vectors[:, :32].var() > 2 * vectors[:, -32:].var()
+
+def test_synthetic_queries_are_held_out():
+    args = SimpleNamespace(files=[], synthetic=1000, dims=64, queries=50, query_noise=1.0)
+    exact, queries = load_corpus(args)
+    assert len(exact) == 1000 and len(queries) == 50
+    best = np.max(queries @ exact.vectors.T, axis=1)
+    assert best.max() < 0.99
+
+def test_file_queries_are_not_near_copies():
+    vectors = synthetic_corpus(500, dims=256)
+    queries = perturbed_queries(vectors, 100)
+    best = np.max(queries @ vectors.T, axis=1)
+    assert 0.6 < best.mean() < 0.8
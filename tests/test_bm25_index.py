@@ -0,0 +1,83 @@
+import math
+import random
+
+import numpy as np
+import pytest
+
+from bm25_index import BM25Index, HybridSearch, decode_varints, encode_varints, parse_query, rrf_fuse, tokenize
+from vector_search import VectorIndex
+
+WORDS = "virtue grace reason faith joy law love truth old books snobbery chronological".split()
+
+def corpus(count=200, seed=3):
+    rng = random.Random(seed)
+    return [' '.join(rng.choice(WORDS) for _ in range(rng.randint(1, 40))) for _ in range(count)]
+
+def naive_scores(texts, terms, k1=1.2, b=0.75):
+    docs = [tokenize(text) for text in texts]
+    average = sum(map(len, docs)) / len(docs)
+    scores = []
+    for doc in docs:
+        score = 0.0
+        for term in set(terms):
+            df = sum(term in other for other in docs)
+            tf = doc.count(term)
+            if tf:
+                idf = math.log(1 + (len(docs) - df + 0.5) / (df + 0.5))
+                score += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * len(doc) / average))
+        scores.append(score)
+    return np.array(scores)
+
+def test_varints_round_trip():
+    values = np.array([0, 1, 127, 128, 300, 16383, 16384, 2 ** 40], dtype=np.int64)
+    assert decode_varints(encode_varints(values)).tolist() == values.tolist()
+    assert len(encode_varints([5, 127])) == 2
+    assert decode_varints(encode_varints([])).tolist() == []
+
+def test_tokenize_and_parse_query():
+    assert tokenize("Lewis’s OLD books_") == ["lewis's", "old", "books"]
+    assert parse_query('reading "old books" now') == (["reading", "now"], [["old", "books"]])
+
+def test_scores_match_naive_bm25():
+    texts = corpus()
+    index = BM25Index.build([str(i) for i in range(len(texts))], [{}] * len(texts), texts)
+    for terms in (["virtue"], ["grace", "joy", "unknown"], ["old", "books", "old"]):
+        assert index.score(terms) == pytest.approx(naive_scores(texts, terms), rel=1e-5)
+
+    hits = index.search("grace joy", limit=5)
+    expected = np.argsort(-naive_scores(texts, ["grace", "joy"]), kind='stable')[:5]
+    assert [hit['score'] for hit in hits] == pytest.approx(naive_scores(texts, ["grace", "joy"])[expected], rel=1e-5)
+
+def test_phrases_need_consecutive_positions():
+    texts = corpus()
+    index = BM25Index.build([str(i) for i in range(len(texts))], [{}] * len(texts), texts)
+    expected = {str(i) for i, text in enumerate(texts) if ' chronological snobbery ' in f" {text} "}
+    hits = index.search('"chronological snobbery"', limit=len(texts))
+    assert expected and {hit['id'] for hit in hits} == expected
+
+    index = BM25Index.build(["a", "b"], [{}, {}], ["snobbery chronological", "a chronological snobbery"])
+    assert [hit['id'] for hit in index.search('"chronological snobbery"')] == ["b"]
+    assert index.search('"chronological unknown"') == []
+
+def test_save_and_load(tmp_path):
+    texts = corpus(50)
+    index = BM25Index.build([f"doc{i}" for i in range(50)], [{"n": i} for i in range(50)], texts)
+    path = tmp_path / 'index.npz'
+    index.save(path)
+    loaded = BM25Index.load(path)
+    for query in ("virtue law", '"old books"'):
+        assert loaded.search(query, 10) == index.search(query, 10)
+
+def test_rrf_fuse():
+    fused = rrf_fuse([[{"id": "a"}, {"id": "b", "payload": {"x": 1}}], [{"id": "b"}, {"id": "c"}]], k=60)
+    assert [point['id'] for point in fused] == ["b", "a", "c"]
+    assert fused[0]['score'] == pytest.approx(1 / 62 + 1 / 61)
+    assert fused[0]['payload'] == {"x": 1} and 'payload' not in fused[1]
+    assert [p['id'] for p in rrf_fuse([[{"id": "a"}], [{"id": "b"}]], weights=[1.0, 2.0])] == ["b", "a"]
+
+def test_hybrid_search_fuses_both_lists():
+    keyword = BM25Index.build(["a", "b", "c"], [{}] * 3, ["grace", "virtue", "grace grace"])
+    vector = VectorIndex(["a", "b", "c"], [{}] * 3, [[1.0, 0.0], [0.0, 1.0], [0.7, 0.7]])
+    hybrid = HybridSearch(keyword, vector)
+    # Vector ranks b, c, a; keyword ranks c, a. "a" (in both lists) beats "b" (top of one)
+    assert [hit['id'] for hit in hybrid.search("grace", np.array([0.1, 1.0]), limit=3)] == ["c", "a", "b"]
@@ -0,0 +1,68 @@
+import json
+
+import bulk_upload
+from bulk_upload import UploadCheckpoint, checkpoint_path, iter_batches, qdrant_point, upload_file
+from qdrant_rest import QdrantREST
+
+def chunk(index, dims=4, text="Paragraph"):
+    return {"source_title": "The Republic", "author": "Plato", "chunk_index": index,
+            "content": f"{text} {index}", "embedding": [1.0] + [float(index)] * (dims - 1),
+            "metadata": {"scripture_refs": ["Rom 8:28"]}}
+
+def write_source(path, chunks):
+    path.write_text(''.join(json.dumps(c) + '\n' for c in chunks), encoding='utf-8')
+
+def stored_contents(url):
+    with QdrantREST(url) as client:
+        return sorted(point['payload']['content'] for point in client.scroll('documents'))
+
+def test_qdrant_point_payload():
+    point = qdrant_point(chunk(3), "fallback", source_id="42")
+    payload = point['payload']
+    assert payload['chunk_id'] == "plato_the_republic_3"
+    assert payload['community_source_id'] == "plato-the-republic"
+    assert payload['source_id'] == "42"
+    assert payload['scripture_ranges'] == [[45008028, 45008028]]
+
+def test_iter_batches_numbering_is_stable():
+    lines = [b'{"a": 1}\n', b'\n', b'{"a": 2}\n', b'{"a": 3}\n']
+    batches = list(iter_batches(lines, 2))
+    assert [(number, first, last) for number, first, last, _ in batches] == [(0, 1, 3), (1, 4, 4)]
+    assert [number for number, *_ in iter_batches(lines, 2, skip={0})] == [1]
+
+def test_checkpoint_resumes_only_for_the_same_input(tmp_path):
+    path = tmp_path / 'republic_embeddings.jsonl'
+    write_source(path, [chunk(i) for i in range(4)])
+    settings = {"collection": "documents", "batch_size": 2, "input": bulk_upload.input_fingerprint(str(path))}
+    checkpoint = UploadCheckpoint(checkpoint_path(path), settings)
+    checkpoint.ack(0, 1, 2, 2)
+    checkpoint.close()
+
+    resumed = UploadCheckpoint(checkpoint_path(path), settings)
+    resumed.close()
+    assert resumed.acked == {0}
+
+    write_source(path, [chunk(i, text="Rewritten") for i in range(4)])
+    settings = dict(settings, input=bulk_upload.input_fingerprint(str(path)))
+    restarted = UploadCheckpoint(checkpoint_path(path), settings)
+    restarted.close()
+    assert restarted.acked == set()
+
+def test_failed_batch_keeps_checkpoint(tmp_path, qdrant):
+    path = tmp_path / 'republic_embeddings.jsonl'
+    # A wrong-sized vector makes the stand-in reject the second batch
+    write_source(path, [chunk(0), chunk(1), chunk(2, dims=3), chunk(3)])
+    uploaded, _, failed = upload_file(str(path), batch_size=2, url=qdrant, create=True)
+    assert (uploaded, failed) == (2, [1])
+    assert checkpoint_path(path).exists()
+
+def test_regenerated_input_restarts(tmp_path, qdrant):
+    path = tmp_path / 'republic_embeddings.jsonl'
+    write_source(path, [chunk(0), chunk(1), chunk(2, dims=3), chunk(3)])
+    upload_file(str(path), batch_size=2, url=qdrant, create=True)
+
+    # Regenerated with different text: the "acknowledged" first batch must be sent again
+    write_source(path, [chunk(i, text="Rewritten") for i in range(4)])
+    uploaded, _, failed = upload_file(str(path), batch_size=2, url=qdrant)
+    assert (uploaded, failed) == (4, [])
+    assert [c for c in stored_contents(qdrant) if c.startswith("Rewritten")] == [f"Rewritten {i}" for i in range(4)]
@@ -0,0 +1,91 @@
+import json
+import sys
+
+import numpy as np
+import pytest
+
+import concept_classifier
+from concept_classifier import IdeaVectors, classify_file
+
+IDEAS = ["Beauty", "Goodness", "Truth", "Wisdom"]
+IDEA_MATRIX = [
+    [1.0, 0.0, 0.0],
+    [0.0, 1.0, 0.0],
+    [0.0, 0.0, 1.0],
+    [0.6, 0.0, 0.8],
+]
+
+@pytest.fixture
+def ideas():
+    return IdeaVectors(IDEAS, IDEA_MATRIX)
+
+def write_chunks(path, vectors, metadata=None):
+    with open(path, 'w', encoding='utf-8') as f:
+        for i, vector in enumerate(vectors):
+            chunk = {"chunk_index": i, "content": f"chunk {i}", "embedding": vector}
+            if metadata is not None:
+                chunk["metadata"] = dict(metadata)
+            f.write(json.dumps(chunk) + '\n')
+
+def read_chunks(path):
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+def test_scores_pick_the_nearest_ideas(ideas, monkeypatch):
+    # Small blocks so scoring crosses block boundaries
+    monkeypatch.setattr(concept_classifier, 'SCORE_BLOCK', 3)
+    rng = np.random.default_rng(7)
+    chunks = rng.normal(size=(10, 3)).astype(np.float32) * rng.uniform(0.5, 20, size=(10, 1))
+
+    best, best_scores, all_scores = ideas.score(chunks, limit=2)
+
+    unit_chunks = chunks / np.linalg.norm(chunks, axis=1, keepdims=True)
+    unit_ideas = np.array(IDEA_MATRIX) / np.linalg.norm(IDEA_MATRIX, axis=1, keepdims=True)
+    expected = unit_chunks @ unit_ideas.T
+    np.testing.assert_allclose(all_scores, expected, atol=1e-5)
+    assert best[:, 0].tolist() == np.argmax(expected, axis=1).tolist()
+    assert best[:, 1].tolist() == np.argsort(-expected, axis=1)[:, 1].tolist()
+    np.testing.assert_allclose(best_scores, np.take_along_axis(expected, best, axis=1), atol=1e-5)
+
+def test_dimension_mismatch_is_rejected(ideas):
+    with pytest.raises(ValueError):
+        ideas.score(np.ones((2, 4), dtype=np.float32))
+
+def test_classify_writes_score_objects_best_first(ideas, tmp_path):
+    source = tmp_path / 'book_embeddings.jsonl'
+    write_chunks(source, [[0.1, 0.0, 2.0], [0.0, 5.0, 0.1]], metadata={"syntopicon_tags": ["Love"]})
+    output = tmp_path / 'out.jsonl'
+
+    assert classify_file(source, output, ideas, limit=2, min_score=0.5) == 2
+
+    first, second = [chunk['metadata'] for chunk in read_chunks(output)]
+    assert [tag['concept'] for tag in first['syntopicon_tags']] == ["Truth", "Wisdom", "Love"]
+    assert first['syntopicon_tags'][0]['confidence'] == pytest.approx(0.9988, abs=1e-4)
+    # Tags that are not Ideas are kept, unscored
+    assert first['syntopicon_tags'][2] == {"concept": "Love", "confidence": None}
+    assert [tag['concept'] for tag in second['syntopicon_tags']] == ["Goodness", "Love"]
+    assert 'syntopicon_scores' not in first
+
+def test_classify_names_and_replace(ideas, tmp_path):
+    source = tmp_path / 'book_embeddings.jsonl'
+    write_chunks(source, [[0.1, 0.0, 2.0]], metadata={"syntopicon_tags": ["Love"]})
+    output = tmp_path / 'out.jsonl'
+
+    classify_file(source, output, ideas, limit=2, min_score=0.5, replace=True, objects=False)
+
+    [chunk] = read_chunks(output)
+    assert chunk['metadata']['syntopicon_tags'] == ["Truth", "Wisdom"]
+    assert list(chunk['metadata']['syntopicon_scores']) == ["Truth", "Wisdom"]
+
+def test_default_output_leaves_the_input_alone(ideas, tmp_path, monkeypatch):
+    source = tmp_path / 'book_embeddings.jsonl'
+    write_chunks(source, [[1.0, 0.0, 0.0]])
+    original = source.read_text(encoding='utf-8')
+    monkeypatch.setattr(IdeaVectors, 'load', classmethod(lambda cls, taxonomy_path, cache_dir=None: ideas))
+    monkeypatch.setattr(sys, 'argv', ['concept_classifier.py', str(source)])
+
+    concept_classifier.main()
+
+    assert source.read_text(encoding='utf-8') == original
+    [chunk] = read_chunks(tmp_path / 'book_embeddings_classified.jsonl')
+    assert chunk['metadata']['syntopicon_tags'][0]['concept'] == "Beauty"
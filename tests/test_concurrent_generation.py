@@ -0,0 +1,94 @@
+import argparse
+import asyncio
+import time
+
+from conftest import fake_message
+from concurrent_generation import (DEFAULT_MODEL, DEFAULT_REQUESTS_PER_MINUTE, TokenUsage, concept_request, generate_concepts,
+                                   generate_in_order)
+
+NAMES = ["History", "Honor", "Hypothesis", "Idea", "Immortality"]
+EXAMPLES = [{"name": "Angel"}]
+QUICK_RETRY = {"retry-after-ms": "10"}
+
+def build_request(name):
+    return concept_request(name, "instructions", EXAMPLES)
+
+def requested_name(body):
+    return body['messages'][-1]['content'].split('"')[1]
+
+def generate(names, workers=1, max_retries=4, usage=None):
+    results = []
+    asyncio.run(generate_in_order(names, build_request, lambda name, concept: results.append((name, concept)),
+                                  workers, requests_per_minute=6000, max_retries=max_retries, usage=usage))
+    return results
+
+def test_results_are_committed_in_canonical_order(fake_anthropic):
+    # The first concepts answer last, so replies arrive in reverse order
+    fake_anthropic.delay = lambda body: 0.1 * (len(NAMES) - NAMES.index(requested_name(body)))
+
+    results = generate(NAMES, workers=len(NAMES))
+
+    assert [name for name, _ in results] == NAMES
+    assert [concept['name'] for _, concept in results] == NAMES
+    assert sorted(requested_name(body) for body in fake_anthropic.requests) == sorted(NAMES)
+
+def test_first_request_warms_the_cache_before_the_rest_start(fake_anthropic):
+    arrivals = {}
+
+    def delay(body):
+        arrivals[requested_name(body)] = time.monotonic()
+        return 0.3 if requested_name(body) == NAMES[0] else 0.0
+    fake_anthropic.delay = delay
+
+    generate(NAMES, workers=len(NAMES))
+
+    assert min(arrivals[name] for name in NAMES[1:]) >= arrivals[NAMES[0]] + 0.3
+    assert {body['model'] for body in fake_anthropic.requests} == {DEFAULT_MODEL}
+
+def test_throttling_and_unparseable_replies_are_retried(fake_anthropic):
+    fake_anthropic.replies.extend([
+        (429, QUICK_RETRY, {"type": "error", "error": {"type": "rate_limit_error", "message": "slow down"}}),
+        (529, QUICK_RETRY, {"type": "error", "error": {"type": "overloaded_error", "message": "overloaded"}}),
+        (200, QUICK_RETRY, fake_message("I cannot produce JSON for this concept.")),
+        (200, QUICK_RETRY, fake_message('{"name": "History", "topics": [')),
+        (200, QUICK_RETRY, fake_message("")),
+    ])
+    usage = TokenUsage()
+
+    [(name, concept)] = generate(["History"], max_retries=5, usage=usage)
+
+    assert (name, concept['name']) == ("History", "History")
+    assert len(fake_anthropic.requests) == 6
+    # Only the replies that reached parsing are counted
+    assert usage.requests == 4
+
+def test_gives_up_after_max_retries(fake_anthropic):
+    fake_anthropic.replies.extend([(200, QUICK_RETRY, fake_message("no concept here"))] * 2)
+
+    assert generate(["History"], max_retries=1) == [("History", None)]
+    assert len(fake_anthropic.requests) == 2
+
+def test_client_errors_are_not_retried(fake_anthropic):
+    fake_anthropic.replies.append(
+        (400, {}, {"type": "error", "error": {"type": "invalid_request_error", "message": "bad request"}}))
+
+    assert generate(["History"]) == [("History", None)]
+    assert len(fake_anthropic.requests) == 1
+
+class ListJournal(list):
+    def append(self, concept):
+        super().append(concept)
+
+def test_generate_concepts_journals_in_canonical_order(fake_anthropic):
+    fake_anthropic.delay = lambda body: 0.2 if requested_name(body) == "History" else 0.0
+    taxonomy = {"syntopicon_taxonomy": {"concepts": list(EXAMPLES), "concepts_completed": 1}}
+    journal = ListJournal()
+    args = argparse.Namespace(workers=3, rpm=DEFAULT_REQUESTS_PER_MINUTE, batch=False, batch_id=None)
+
+    taxonomy, successful = generate_concepts(NAMES[:3], "instructions", EXAMPLES, taxonomy, journal, args)
+
+    assert successful == 3
+    assert [concept['name'] for concept in journal] == NAMES[:3]
+    assert [concept['name'] for concept in taxonomy["syntopicon_taxonomy"]["concepts"]] == ["Angel"] + NAMES[:3]
+    # Every request shares the same cached system prefix
+    assert len({body['system'][0]['text'] for body in fake_anthropic.requests}) == 1
@@ -0,0 +1,24 @@
+from convert_to_qdrant import chunk_id, point_id, source_slug, to_qdrant
+
+LEWIS = {"source_title": "On Reading Old Books", "author": "C. S. Lewis", "chunk_index": 3,
+         "content": "There is a strange idea abroad...", "embedding": [0.1, 0.2]}
+
+def test_chunk_keeps_its_own_id():
+    assert chunk_id(dict(LEWIS, id="custom_7"), "fallback") == "custom_7"
+
+def test_id_derived_from_author_and_title():
+    chunk = dict(LEWIS, source_title="The Republic", author="Plato")
+    assert chunk_id(chunk, "fallback") == "plato_the_republic_3"
+
+def test_existing_source_keeps_legacy_ids():
+    # Matches data/sources/reading_old_books_lewis_qdrant.jsonl and the backend's community_source_id
+    assert source_slug(LEWIS, "fallback") == "lewis_reading_old_books"
+    assert chunk_id(LEWIS, "fallback") == "lewis_reading_old_books_3"
+
+def test_fallback_without_title():
+    assert chunk_id({"chunk_index": 0}, "my_file") == "my_file_0"
+
+def test_point_id_is_stable_uuid():
+    point = to_qdrant(LEWIS, "fallback")
+    assert point['point_id'] == point_id("lewis_reading_old_books_3")
+    assert point['point_id'] == to_qdrant(dict(LEWIS), "other")['point_id']
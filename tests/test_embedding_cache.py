@@ -0,0 +1,39 @@
+from embedding_cache import EmbeddingCache, cache_key, pack_vector, unpack_vector
+
+def test_key_ignores_cosmetic_differences_only():
+    assert cache_key("m", None, "Old  books\n") == cache_key("m", None, "Old books")
+    assert cache_key("m", None, "Old books") != cache_key("m", 256, "Old books")
+    assert cache_key("m", None, "Old books") != cache_key("other", None, "Old books")
+
+def test_vectors_round_trip_as_float32():
+    assert unpack_vector(pack_vector([0.5, -1.0, 2.0])) == [0.5, -1.0, 2.0]
+    assert len(pack_vector([0.0] * 1536)) == 1536 * 4
+
+def test_get_and_put_count_hits_and_misses(tmp_path):
+    cache = EmbeddingCache(tmp_path / 'cache.sqlite')
+    cache.put_many("m", [("a", [1.0, 2.0]), ("b", [3.0, 4.0])])
+    assert cache.get_many(["a", "c", "a"]) == {"a": [1.0, 2.0]}
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert cache.stats() == {"entries": 2, "vector_bytes": 16}
+    cache.close()
+
+    reopened = EmbeddingCache(tmp_path / 'cache.sqlite')
+    assert reopened.get_many(["b"]) == {"b": [3.0, 4.0]}
+    reopened.close()
+
+def test_eviction_drops_least_recently_used(tmp_path):
+    cache = EmbeddingCache(tmp_path / 'cache.sqlite', max_entries=2)
+    cache.put_many("m", [("a", [1.0])])
+    cache.put_many("m", [("b", [2.0])])
+    cache.get_many(["a"])
+    cache.put_many("m", [("c", [3.0])])
+    assert set(cache.get_many(["a", "b", "c"])) == {"a", "c"}
+    cache.close()
+
+def test_eviction_by_size(tmp_path):
+    cache = EmbeddingCache(tmp_path / 'cache.sqlite', max_bytes=3 * 16)
+    for key in "abcde":
+        cache.put_many("m", [(key, [0.0] * 4)])
+    assert cache.stats()['vector_bytes'] <= 3 * 16
+    assert set(cache.get_many(list("abcde"))) >= {"e"}
+    cache.close()
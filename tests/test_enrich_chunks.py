@@ -0,0 +1,163 @@
+import asyncio
+import json
+
+import pytest
+from anthropic.types import Message
+
+from conftest import fake_annotation, fake_message, fake_tool_message
+from concurrent_generation import UnparseableResponse
+from enrich_chunks import (TOOL_NAME, EnrichmentCache, build_request, chunk_prompt, clean_metadata, enrich_file,
+                           enrichment_key, parse_tool_response, tool_definition)
+
+CATEGORIES = {
+    "logical": {"name": "Logical", "description": "How the argument works", "elements": ["Claim", "Evidence"]},
+}
+MORE_CATEGORIES = dict(CATEGORIES, semantic={"name": "Semantic", "description": "What is discussed",
+                                             "elements": ["Concept", "Definition"]})
+
+@pytest.fixture
+def taxonomy(tmp_path, monkeypatch):
+    monkeypatch.setenv('TAXONOMY_CACHE_DIR', str(tmp_path / 'taxonomy_cache'))
+    path = tmp_path / 'knowledge_elements_taxonomy.json'
+    path.write_text(json.dumps({"rhetorical_function": {"categories": CATEGORIES}}), encoding='utf-8')
+    return path
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = EnrichmentCache(tmp_path / 'enrichment.sqlite')
+    yield cache
+    cache.close()
+
+def write_chunks(path, count):
+    path.write_text(''.join(json.dumps({"chunk_index": i, "content": f"Passage number {i}.", "source": "book"}) + '\n'
+                            for i in range(count)), encoding='utf-8')
+
+def read_chunks(path):
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+def enrich(source, output, taxonomy, cache=None, **options):
+    options.setdefault('chunks_per_request', 3)
+    asyncio.run(enrich_file(str(source), str(output), cache=cache, taxonomy_path=taxonomy, **options))
+
+def passages(body):
+    return body['messages'][-1]['content'].count('<chunk index=')
+
+def test_prompt_labels_passages_with_the_source_title():
+    prompt = chunk_prompt([
+        {"content": " First. ", "source_title": "Mere Christianity", "source": "mere_christianity", "author": "Lewis"},
+        {"content": "Second.", "source": "reading_old_books", "structure_path": 'Essay "1"'},
+    ])
+    assert '<chunk index="0" source="Mere Christianity / Lewis">\nFirst.\n</chunk>' in prompt
+    assert '<chunk index="1" source="reading_old_books / Essay \'1\'">' in prompt
+
+def test_clean_metadata_validates_against_the_taxonomy():
+    cleaned = clean_metadata({
+        "rhetorical_function": {"primary": {"category": "logical", "elements": ["Claim", "Concept", "Claim"]},
+                                "secondary": {"category": "semantic", "elements": ["Definition"]}},
+        "topics": ["Natural Law", "natural law", " virtue "],
+        "entities": {"people": ["Aquinas", "Aquinas"], "gods": ["Zeus"]},
+        "scripture_refs": [{"reference": " Romans 2:15 ", "type": "quote"}, {"reference": ""}],
+    }, MORE_CATEGORIES)
+
+    assert cleaned["rhetorical_function"] == {"primary": {"category": "logical", "elements": ["Claim"]},
+                                              "secondary": {"category": "semantic", "elements": ["Definition"]}}
+    assert cleaned["topics"] == ["natural_law", "virtue"]
+    assert cleaned["entities"] == {"people": ["Aquinas"], "places": [], "groups": [], "works": []}
+    assert cleaned["scripture_refs"] == [{"reference": "Romans 2:15", "type": "explicit", "context": ""}]
+
+def test_clean_metadata_drops_a_secondary_in_the_primary_category():
+    cleaned = clean_metadata({"rhetorical_function": {"primary": {"category": "logical", "elements": ["Claim"]},
+                                                      "secondary": {"category": "logical", "elements": []}}},
+                             CATEGORIES)
+    assert list(cleaned["rhetorical_function"]) == ["primary"]
+
+@pytest.mark.parametrize("function", [None, {"category": "aesthetic", "elements": []}, "logical"])
+def test_clean_metadata_rejects_unknown_primary_functions(function):
+    with pytest.raises(UnparseableResponse):
+        clean_metadata({"rhetorical_function": {"primary": function}}, CATEGORIES)
+
+def test_tool_response_keeps_only_valid_entries():
+    body = {"tools": [tool_definition(CATEGORIES)]}
+    entries = [fake_annotation(body, 0), fake_annotation(body, 0), {"index": 1, "rhetorical_function": {}},
+               fake_annotation(body, 5), "junk", fake_annotation(body, 2)]
+    response = Message.model_validate(fake_tool_message(TOOL_NAME, {"chunks": entries}))
+
+    assert sorted(parse_tool_response(response, 3, CATEGORIES)) == [0, 2]
+
+@pytest.mark.parametrize("reply", [
+    fake_message("Here is the metadata."),
+    fake_tool_message("other_tool", {"chunks": []}),
+    fake_tool_message(TOOL_NAME, {"chunks": "none"}),
+    fake_tool_message(TOOL_NAME, {"chunks": [{"index": 0}]}),
+])
+def test_unusable_tool_responses_raise(reply):
+    with pytest.raises(UnparseableResponse):
+        parse_tool_response(Message.model_validate(reply), 1, CATEGORIES)
+
+def test_cache_round_trip_and_counts(tmp_path, cache):
+    first = enrichment_key("model-a", "In the  beginning")
+    assert first == enrichment_key("model-a", "In the beginning\n")
+    assert first != enrichment_key("model-b", "In the beginning")
+
+    cache.put_many("model-a", [(first, {"topics": ["creation"]})])
+    assert cache.get_many([first, first, "missing"]) == {first: {"topics": ["creation"]}}
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    cache.close()
+    reopened = EnrichmentCache(tmp_path / 'enrichment.sqlite')
+    try:
+        assert reopened.get_many([first]) == {first: {"topics": ["creation"]}}
+    finally:
+        reopened.close()
+
+def test_enrich_packs_requests_and_keeps_input_order(fake_anthropic, tmp_path, taxonomy, cache):
+    source = tmp_path / 'book.jsonl'
+    write_chunks(source, 7)
+    # The first request answers last
+    fake_anthropic.delay = lambda body: 0.3 if 'Passage number 0.' in body['messages'][-1]['content'] else 0.0
+
+    enrich(source, tmp_path / 'book_enriched.jsonl', taxonomy, cache, concurrency=3)
+
+    rows = read_chunks(tmp_path / 'book_enriched.jsonl')
+    assert [row['chunk_index'] for row in rows] == list(range(7))
+    assert all(row['metadata']['rhetorical_function']['primary']['category'] == "logical" for row in rows)
+    assert sorted(passages(body) for body in fake_anthropic.requests) == [1, 3, 3]
+
+    # Unchanged content is served from the cache on the next run
+    enrich(source, tmp_path / 'again.jsonl', taxonomy, cache)
+    assert len(fake_anthropic.requests) == 3
+    assert read_chunks(tmp_path / 'again.jsonl') == rows
+
+def test_passages_left_out_of_a_reply_are_retried_alone(fake_anthropic, tmp_path, taxonomy):
+    source = tmp_path / 'book.jsonl'
+    write_chunks(source, 3)
+    body = {"tools": [tool_definition(CATEGORIES)]}
+    bad = dict(fake_annotation(body, 1), rhetorical_function={"primary": {"category": "aesthetic", "elements": []}})
+    fake_anthropic.replies.append(
+        (200, {}, fake_tool_message(TOOL_NAME, {"chunks": [fake_annotation(body, 0), bad, fake_annotation(body, 2)]})))
+
+    enrich(source, tmp_path / 'out.jsonl', taxonomy)
+
+    assert [passages(body) for body in fake_anthropic.requests] == [3, 1]
+    assert 'Passage number 1.' in fake_anthropic.requests[1]['messages'][-1]['content']
+    assert len(read_chunks(tmp_path / 'out.jsonl')) == 3
+
+def test_interrupted_output_is_resumed(fake_anthropic, tmp_path, taxonomy):
+    source = tmp_path / 'book.jsonl'
+    write_chunks(source, 6)
+    output = tmp_path / 'out.jsonl'
+    enrich(source, output, taxonomy)
+    lines = output.read_text(encoding='utf-8').splitlines(keepends=True)
+    fake_anthropic.requests.clear()
+
+    # Two chunks were written and the third was torn mid-line
+    output.write_text(''.join(lines[:2]) + lines[2][:20], encoding='utf-8')
+    enrich(source, output, taxonomy)
+
+    rows = read_chunks(output)
+    assert [row['chunk_index'] for row in rows] == list(range(6))
+    assert output.read_text(encoding='utf-8').startswith(''.join(lines[:2]))
+    assert all(row['metadata']['rhetorical_function'] for row in rows)
+    assert sorted(passages(body) for body in fake_anthropic.requests) == [1, 3]
+    assert 'Passage number 0.' not in json.dumps(fake_anthropic.requests)
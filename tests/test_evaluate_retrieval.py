@@ -0,0 +1,49 @@
+import json
+
+import pytest
+
+from evaluate_retrieval import load_query_set, relevance_key, score_results, silver_query_set
+
+def hit(title, index, hit_id=None):
+    return {"id": hit_id or f"{title}-{index}", "payload": {"source_title": title, "chunk_index": index}}
+
+def test_silver_labels_count_one_vote_per_backend(tmp_path):
+    path = tmp_path / 'comparison.json'
+    repeated = [hit('Orthodoxy', 1)['payload'], hit('Orthodoxy', 1)['payload'], hit('Orthodoxy', 2)['payload']]
+    path.write_text(json.dumps({
+        "qdrant": [{"query": "paradox", "results": repeated}],
+        "azure": [{"query": "paradox", "results": [hit('Orthodoxy', 2)['payload']]}],
+    }), encoding='utf-8')
+
+    [entry] = silver_query_set(str(path))
+    grades = {(label['source_title'], label['chunk_index']): label['grade'] for label in entry['relevant']}
+    assert grades == {('Orthodoxy', 1): 1, ('Orthodoxy', 2): 2}
+
+def test_silver_depth_limits_each_backend(tmp_path):
+    path = tmp_path / 'comparison.json'
+    results = [hit('Orthodoxy', i)['payload'] for i in range(5)]
+    path.write_text(json.dumps({"qdrant": [{"query": "q", "results": results}]}), encoding='utf-8')
+    [entry] = silver_query_set(str(path), depth=2)
+    assert sorted(label['chunk_index'] for label in entry['relevant']) == [0, 1]
+
+def test_load_query_set_drops_zero_grades(tmp_path):
+    path = tmp_path / 'queries.jsonl'
+    path.write_text(json.dumps({"query": "q", "relevant": [
+        {"source_title": "Orthodoxy", "chunk_index": 1, "grade": 2},
+        {"source_title": "Orthodoxy", "chunk_index": 2, "grade": 0},
+        {"id": "chesterton_orthodoxy_3"},
+    ]}) + '\n', encoding='utf-8')
+    assert load_query_set(str(path)) == [("q", {relevance_key("Orthodoxy", 1): 2, "chesterton_orthodoxy_3": 1})]
+
+def test_score_results():
+    labels = {relevance_key("Orthodoxy", 1): 2, relevance_key("Orthodoxy", 2): 1}
+    perfect = score_results([hit("Orthodoxy", 1), hit("Orthodoxy", 2)], labels, 10)
+    assert perfect == pytest.approx((1.0, 1.0, 1.0))
+
+    recall, ndcg, reciprocal = score_results([hit("Orthodoxy", 9), hit("Orthodoxy", 2)], labels, 10)
+    assert recall == 0.5
+    assert reciprocal == 0.5
+    assert 0.0 < ndcg < 1.0
+
+    assert score_results([hit("Orthodoxy", 9), hit("Orthodoxy", 1)], labels, 1) == (0.0, 0.0, 0.0)
+    assert score_results([hit("Orthodoxy", 1)], {}, 10) is None
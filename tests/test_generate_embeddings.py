@@ -0,0 +1,145 @@
+import asyncio
+import io
+import json
+import time
+
+import pytest
+from openai import AsyncOpenAI
+
+from conftest import fake_vector
+from generate_embeddings import (embed_window_async, estimate_tokens, generate_embeddings, generate_embeddings_async,
+                                 iter_windows, pending_rows)
+from jsonl_checkpoint import ResumeMismatch
+from rate_limiter import AdaptiveConcurrency, TokenBucket
+
+def lines(*chunks):
+    return io.StringIO(''.join((c if isinstance(c, str) else json.dumps(c)) + '\n' for c in chunks))
+
+def chunk(index, text="word " * 10, embedding=None):
+    return {"chunk_index": index, "content": text, "embedding": embedding}
+
+def test_windows_respect_batch_size_and_keep_order():
+    windows = list(iter_windows(lines(*[chunk(i) for i in range(7)]), batch_size=3))
+    assert [len(pending_rows(w)) for w in windows] == [3, 3, 1]
+    assert [row['line_num'] for w in windows for row in w] == list(range(1, 8))
+
+def test_windows_respect_token_limit():
+    text = "x" * 300
+    budget = 2 * estimate_tokens(text)
+    windows = list(iter_windows(lines(*[chunk(i, text) for i in range(5)]), max_batch_tokens=budget))
+    assert [len(w) for w in windows] == [2, 2, 1]
+
+def test_oversized_chunk_gets_its_own_window():
+    windows = list(iter_windows(lines(chunk(0), chunk(1, "x" * 90000), chunk(2)), max_batch_tokens=1000))
+    assert [[row['line_num'] for row in w] for w in windows] == [[1], [2], [3]]
+
+def test_embedded_and_bad_rows_stay_in_place_without_counting():
+    source = lines(chunk(0), chunk(1, embedding=[0.1]), '{not json', {"chunk_index": 3}, chunk(4))
+    [window] = iter_windows(source, batch_size=2)
+    assert [row['line_num'] for row in window] == [1, 2, 3, 4, 5]
+    assert [row['line_num'] for row in pending_rows(window)] == [1, 5]
+    assert "Error parsing JSON on line 3" in window[2]['error']
+    assert "missing 'content'" in window[3]['error']
+
+def read_output(path):
+    return [json.loads(line) for line in path.read_text(encoding='utf-8').splitlines()]
+
+def test_async_window_maps_results_back_by_index(fake_openai):
+    window = [{"line_num": i, "chunk": {"content": f"chunk {i}" * (i + 1)}, "error": None} for i in range(5)]
+
+    async def run():
+        client = AsyncOpenAI(max_retries=0)
+        try:
+            await embed_window_async(client, window, TokenBucket(600), AdaptiveConcurrency(2))
+        finally:
+            await client.close()
+
+    asyncio.run(run())
+    assert [row['chunk']['embedding'] for row in window] == [fake_vector(row['chunk']['content']) for row in window]
+    assert len(fake_openai.requests) == 1
+
+def test_async_retries_throttled_requests(fake_openai):
+    fake_openai.replies.extend([
+        (429, {"retry-after": "0.2"}, {"error": {"message": "rate limited"}}),
+        (503, {"retry-after-ms": "50"}, {"error": {"message": "overloaded"}}),
+    ])
+    window = [{"line_num": 1, "chunk": {"content": "grace"}, "error": None}]
+    controller = AdaptiveConcurrency(4)
+
+    async def run():
+        client = AsyncOpenAI(max_retries=0)
+        try:
+            started = time.monotonic()
+            await embed_window_async(client, window, TokenBucket(6000), controller)
+            return time.monotonic() - started
+        finally:
+            await client.close()
+
+    elapsed = asyncio.run(run())
+    assert window[0]['error'] is None and window[0]['chunk']['embedding'] == fake_vector("grace")
+    assert len(fake_openai.requests) == 3
+    assert elapsed >= 0.25
+    # Only the 429 counts as throttling
+    assert controller.limit == 2
+
+def test_async_gives_up_on_non_retryable_errors(fake_openai):
+    fake_openai.replies.append((400, {}, {"error": {"message": "bad input"}}))
+    window = [{"line_num": 7, "chunk": {"content": "grace"}, "error": None}]
+
+    async def run():
+        client = AsyncOpenAI(max_retries=0)
+        try:
+            await embed_window_async(client, window, TokenBucket(600), AdaptiveConcurrency(1))
+        finally:
+            await client.close()
+
+    asyncio.run(run())
+    assert window[0]['error'].startswith("Error processing line 7")
+    assert len(fake_openai.requests) == 1
+
+def test_async_pipeline_writes_in_input_order(fake_openai, tmp_path):
+    source = tmp_path / 'book.jsonl'
+    texts = [f"paragraph {i} " * (i + 1) for i in range(12)]
+    source.write_text(''.join(json.dumps({"chunk_index": i, "content": t}) + '\n' for i, t in enumerate(texts)),
+                      encoding='utf-8')
+    # Earlier batches answer last, so responses arrive out of input order
+    fake_openai.delay = lambda body: 0.3 if "paragraph 0 " in body['input'][0] else 0.0
+    output = tmp_path / 'book_embeddings.jsonl'
+
+    asyncio.run(generate_embeddings_async(str(source), str(output), batch_size=2, concurrency=4))
+
+    rows = read_output(output)
+    assert [row['chunk_index'] for row in rows] == list(range(12))
+    assert [row['embedding'] for row in rows] == [fake_vector(text) for text in texts]
+    assert len(fake_openai.requests) == 6
+
+def write_source(path, chunks):
+    path.write_text(''.join(json.dumps(c) + '\n' for c in chunks), encoding='utf-8')
+
+def test_resume_embeds_only_what_is_missing(fake_openai, tmp_path):
+    source = tmp_path / 'book.jsonl'
+    # Two identical paragraphs without any id or chunk_index
+    chunks = [{"chunk_index": 0, "content": "first"}, {"content": "untitled"}, {"content": "untitled"},
+              {"chunk_index": 3, "content": "last"}]
+    write_source(source, chunks)
+    output = tmp_path / 'book_embeddings.jsonl'
+    first = dict(chunks[0], embedding=fake_vector("first"))
+    second = dict(chunks[1], embedding=fake_vector("untitled"))
+    # An interrupted run: two rows written, the third torn mid-line
+    output.write_text(json.dumps(first) + '\n' + json.dumps(second) + '\n{"content": "unt', encoding='utf-8')
+
+    generate_embeddings(str(source), str(output))
+
+    rows = read_output(output)
+    assert [row['content'] for row in rows] == ["first", "untitled", "untitled", "last"]
+    assert [text for body in fake_openai.requests for text in body['input']] == ["untitled", "last"]
+
+def test_resume_rejects_a_changed_input(fake_openai, tmp_path):
+    source = tmp_path / 'book.jsonl'
+    write_source(source, [{"chunk_index": 0, "content": "revised"}])
+    output = tmp_path / 'book_embeddings.jsonl'
+    output.write_text(json.dumps({"chunk_index": 0, "content": "original", "embedding": [1.0]}) + '\n',
+                      encoding='utf-8')
+    with pytest.raises(ResumeMismatch):
+        generate_embeddings(str(source), str(output))
+    assert fake_openai.requests == []
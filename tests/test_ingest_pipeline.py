@@ -0,0 +1,47 @@
+import asyncio
+import json
+
+from embedding_cache import EmbeddingCache, cache_key
+from generate_embeddings import EMBEDDING_MODEL
+from ingest_pipeline import IngestPipeline, request_windows
+from qdrant_rest import QdrantREST
+
+def chunk(index, metadata=None):
+    return {"source_title": "The Republic", "author": "Plato", "chunk_index": index,
+            "content": f"Paragraph {index}", "metadata": metadata or {}}
+
+def cached(tmp_path, vectors):
+    """Embedding cache pre-filled so the embed stage never calls the API."""
+    cache = EmbeddingCache(tmp_path / 'cache.db')
+    cache.put_many(EMBEDDING_MODEL, [(cache_key(EMBEDDING_MODEL, None, f"Paragraph {index}"), vector)
+                                     for index, vector in vectors.items()])
+    return cache
+
+def test_request_windows_respects_count_and_size():
+    rows = [{"chunk": {"content": "x" * 40}} for _ in range(5)]
+    assert [len(w) for w in request_windows(rows, 2, 1000)] == [2, 2, 1]
+    assert [len(w) for w in request_windows(rows, 5, 100)] == [2, 2, 1]
+
+def test_failed_rows_and_upserts_are_reported(tmp_path, qdrant, monkeypatch):
+    monkeypatch.setenv('OPENAI_API_KEY', 'test')
+    source = tmp_path / 'republic.jsonl'
+    # Chunk 1 fails conversion (metadata is not an object); chunk 2's vector has the wrong dimension
+    chunks = [chunk(0), chunk(1, metadata=["bad"]), chunk(2), chunk(3)]
+    source.write_text(''.join(json.dumps(c) + '\n' for c in chunks), encoding='utf-8')
+    cache = cached(tmp_path, {0: [1.0, 0.0, 0.0], 1: [0.0, 1.0, 0.0], 2: [1.0, 1.0, 1.0, 1.0], 3: [0.0, 0.0, 1.0]})
+    with QdrantREST(qdrant) as client:
+        client.create_collection('documents', 3)
+
+    embeddings = tmp_path / 'republic_embeddings.jsonl'
+    pipeline = IngestPipeline(str(source), batch_size=1, cache=cache, url=qdrant, write_embeddings=str(embeddings))
+    try:
+        upserted = asyncio.run(pipeline.run())
+    finally:
+        cache.close()
+
+    assert upserted == 2
+    assert pipeline.failed_points == 1
+    written = [json.loads(line)['chunk_index'] for line in embeddings.read_text(encoding='utf-8').splitlines()]
+    assert sorted(written) == [0, 2, 3]
+    with QdrantREST(qdrant) as client:
+        assert sorted(p['payload']['chunk_index'] for p in client.scroll('documents')) == [0, 3]
@@ -0,0 +1,67 @@
+import json
+
+import pytest
+
+from jsonl_checkpoint import (CheckpointWriter, ResumeMismatch, ResumeState, chunk_key, recover_jsonl,
+                              write_atomically)
+
+def test_recover_truncates_a_torn_trailing_line(tmp_path):
+    path = tmp_path / 'out.jsonl'
+    path.write_bytes(b'{"id": 1}\n\n{"id": 2}\n{"id": 3, "cont')
+    assert recover_jsonl(path) == [{"id": 1}, {"id": 2}]
+    assert path.read_bytes() == b'{"id": 1}\n\n{"id": 2}\n'
+
+def test_recover_drops_an_unparseable_last_line(tmp_path):
+    path = tmp_path / 'out.jsonl'
+    path.write_bytes(b'{"id": 1}\n{"id": \n')
+    assert recover_jsonl(path) == [{"id": 1}]
+    assert path.read_bytes() == b'{"id": 1}\n'
+    assert recover_jsonl(tmp_path / 'missing.jsonl') == []
+
+def test_checkpoint_writer_appends_on_resume(tmp_path):
+    path = tmp_path / 'out.jsonl'
+    with CheckpointWriter(path) as writer:
+        writer.append(['{"id": 1}\n'])
+    with CheckpointWriter(path, resume=True) as writer:
+        writer.append([])
+        writer.append(['{"id": 2}\n'])
+    assert recover_jsonl(path) == [{"id": 1}, {"id": 2}]
+
+def test_chunk_key_falls_back_to_content():
+    assert chunk_key({"id": "a", "chunk_index": 1}) == ('id', "a")
+    assert chunk_key({"chunk_index": 0}) == ('chunk_index', 0)
+    assert chunk_key({"content": "x"})[0] == 'content'
+    assert chunk_key({"content": "x"}) == chunk_key({"content": "x", "embedding": [1.0]})
+    assert chunk_key({}) is None
+
+def test_resume_skips_finished_chunks_only():
+    written = [{"chunk_index": 0, "content": "a", "embedding": [1.0]},
+               {"chunk_index": 1, "content": "b", "embedding": None},
+               {"content": "c", "embedding": [1.0]}]
+    state = ResumeState(written, is_done=lambda row: row['embedding'] is not None)
+    assert len(state) == 2
+    assert state.already_done({"chunk_index": 0, "content": "a"})
+    assert not state.already_done({"chunk_index": 1, "content": "b"})
+    assert not state.already_done({"chunk_index": 2, "content": "d"})
+    assert state.already_done({"content": "c"})
+    assert state.skipped == 2
+
+def test_resume_counts_repeated_keys():
+    state = ResumeState([{"content": "same"}])
+    assert state.already_done({"content": "same"})
+    # The second identical paragraph was never written
+    assert not state.already_done({"content": "same"})
+
+def test_resume_refuses_changed_content():
+    state = ResumeState([{"id": "lewis_3", "content": "old text"}])
+    with pytest.raises(ResumeMismatch, match="lewis_3"):
+        state.already_done({"id": "lewis_3", "content": "new text"})
+
+def test_atomic_write_replaces_the_whole_file(tmp_path):
+    path = tmp_path / 'manifest.json'
+    path.write_text('{"old": true, "padding": "' + 'x' * 100 + '"}', encoding='utf-8')
+
+    write_atomically(path, {"name": "Ἀγάπη"})
+
+    assert json.loads(path.read_text(encoding='utf-8')) == {"name": "Ἀγάπη"}
+    assert [p.name for p in tmp_path.iterdir()] == ['manifest.json']
@@ -0,0 +1,106 @@
+import random
+
+import numpy as np
+import pytest
+
+from ann_index import IVFIndex
+from payload_index import FilteredSearch, PayloadIndex, parse_where
+from vector_search import VectorIndex
+
+AUTHORS = ["C. S. Lewis", "Augustine", "G. K. Chesterton"]
+TAGS = ["Wisdom", "Education", "Virtue", "Love"]
+
+def corpus(n=1500, dims=16, seed=0):
+    rng = random.Random(seed)
+    payloads = []
+    for i in range(n):
+        payload = {"author": rng.choice(AUTHORS), "year": rng.randint(1900, 1960),
+                   "metadata": {"syntopicon_tags": [{"concept": tag} for tag in rng.sample(TAGS, rng.randint(0, 2))]}}
+        if rng.random() < 0.3:
+            payload["scripture_refs"] = [rng.choice(["Rom 8:28", "Rom 9:1", "John 3:16"])]
+        payloads.append(payload)
+    vectors = np.random.default_rng(seed).standard_normal((n, dims)).astype(np.float32)
+    return [f"p{i}" for i in range(n)], payloads, vectors
+
+def tags(payload):
+    return {tag['concept'] for tag in payload['metadata']['syntopicon_tags']}
+
+FILTERS = [
+    ({"must": [{"key": "author", "match": {"value": "Augustine"}}]},
+     lambda p: p['author'] == "Augustine"),
+    ({"must": [{"key": "year", "range": {"gte": 1940, "lt": 1950}}],
+      "must_not": [{"key": "author", "match": {"value": "C. S. Lewis"}}]},
+     lambda p: 1940 <= p['year'] < 1950 and p['author'] != "C. S. Lewis"),
+    ({"should": [{"key": "metadata.syntopicon_tags", "match": {"any": ["Wisdom", "Love"]}}]},
+     lambda p: bool(tags(p) & {"Wisdom", "Love"})),
+    ({"must": [{"key": "year", "match": {"value": "1944"}}, {"key": "syntopicon_tags", "match": {"except": ["Virtue"]}}]},
+     lambda p: p['year'] == 1944 and "Virtue" not in tags(p)),
+    ({"must": [{"scripture": "Romans 8"}]},
+     lambda p: p.get('scripture_refs') == ["Rom 8:28"]),
+    ({"must": [{"is_empty": {"key": "syntopicon_tags"}}]},
+     lambda p: not tags(p)),
+]
+
+def brute_force(ids, payloads, vectors, query, test, limit):
+    vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    scores = vectors @ (query / np.linalg.norm(query))
+    rows = sorted((row for row, payload in enumerate(payloads) if test(payload)), key=lambda row: -scores[row])
+    return [ids[row] for row in rows[:limit]]
+
+@pytest.mark.parametrize("query_filter, test", FILTERS)
+def test_resolve_matches_scan(query_filter, test):
+    ids, payloads, _ = corpus()
+    mask = PayloadIndex(payloads).resolve(query_filter, ids)
+    assert mask.tolist() == [test(payload) for payload in payloads]
+
+@pytest.mark.parametrize("query_filter, test", FILTERS)
+def test_filtered_search_matches_brute_force(query_filter, test):
+    ids, payloads, vectors = corpus()
+    search = FilteredSearch(VectorIndex(ids, payloads, vectors))
+    query = np.random.default_rng(5).standard_normal(vectors.shape[1])
+    hits = search.search(query, 10, query_filter)
+    assert [hit['id'] for hit in hits] == brute_force(ids, payloads, vectors, query, test, 10)
+    assert all(test(hit['payload']) for hit in hits)
+
+@pytest.mark.parametrize("query_filter, test", FILTERS)
+def test_filtered_ivf_probing_every_cell_is_exact(query_filter, test):
+    ids, payloads, vectors = corpus()
+    search = FilteredSearch(IVFIndex.build(ids, payloads, vectors, nlist=16))
+    query = np.random.default_rng(5).standard_normal(vectors.shape[1])
+    hits = search.search(query, 10, query_filter, nprobe=16)
+    assert [hit['id'] for hit in hits] == brute_force(ids, payloads, vectors, query, test, 10)
+
+def test_plan_picks_brute_force_for_selective_filters():
+    ids, payloads, vectors = corpus()
+    search = FilteredSearch(IVFIndex.build(ids, payloads, vectors, nlist=16))
+    assert search.plan({"must": [{"key": "year", "match": {"value": 1944}}]}, nprobe=4)[1] == 'brute-force'
+    assert search.plan({"must_not": [{"key": "year", "match": {"value": 1944}}]}, nprobe=4)[1] == 'ivf'
+    assert FilteredSearch(VectorIndex(ids, payloads, vectors)).plan(None)[1] == 'exact'
+
+def test_filtered_ivf_probe_returns_only_matches():
+    ids, payloads, vectors = corpus()
+    search = FilteredSearch(IVFIndex.build(ids, payloads, vectors, nlist=16))
+    query_filter, test = FILTERS[2]
+    assert search.plan(query_filter, nprobe=4)[1] == 'ivf'
+    query = np.random.default_rng(5).standard_normal(vectors.shape[1])
+    hits = search.search(query, 10, query_filter, nprobe=4)
+    assert len(hits) == 10 and all(test(hit['payload']) for hit in hits)
+    expected = brute_force(ids, payloads, vectors, query, test, 10)
+    assert len({hit['id'] for hit in hits} & set(expected)) >= 7
+
+def test_has_id_and_empty_results():
+    ids, payloads, vectors = corpus(50)
+    search = FilteredSearch(VectorIndex(ids, payloads, vectors))
+    hits = search.search(vectors[0], 10, {"must": [{"has_id": ["p3", "p7"]}]})
+    assert sorted(hit['id'] for hit in hits) == ["p3", "p7"]
+    assert search.search(vectors[0], 10, {"must": [{"key": "author", "match": {"value": "Nobody"}}]}) == []
+    with pytest.raises(ValueError):
+        PayloadIndex(payloads).resolve({"must": [{"key": "author"}]})
+
+def test_parse_where():
+    assert parse_where(['author="C. S. Lewis"', "year>=1940", "genre!=Letter"]) == {
+        "must": [{"key": "author", "match": {"value": "C. S. Lewis"}}, {"key": "year", "range": {"gte": 1940.0}}],
+        "must_not": [{"key": "genre", "match": {"value": "Letter"}}],
+    }
+    with pytest.raises(ValueError):
+        parse_where(["author"])
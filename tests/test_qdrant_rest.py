@@ -0,0 +1,66 @@
+import socket
+from http.server import BaseHTTPRequestHandler
+
+import pytest
+
+from conftest import serve
+from qdrant_rest import QdrantError, QdrantREST
+
+class ScriptedHandler(BaseHTTPRequestHandler):
+    """Answers each GET with the next (status, headers, body) in `replies`."""
+    replies = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        status, headers, body = self.replies.pop(0)
+        data = body.encode('utf-8')
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+@pytest.fixture
+def scripted():
+    replies = []
+    server, url = serve(type('Handler', (ScriptedHandler,), {"replies": replies}))
+    yield url, replies
+    server.shutdown()
+    server.server_close()
+
+def closed_port_url():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return f"http://127.0.0.1:{sock.getsockname()[1]}"
+
+def test_retries_server_errors(scripted):
+    url, replies = scripted
+    replies.extend([(503, {"Retry-After": "0"}, "busy"), (200, {}, '{"result": {"status": "green"}}')])
+    with QdrantREST(url) as client:
+        assert client.request('GET', '/collections/documents') == {"status": "green"}
+    assert replies == []
+
+def test_rejected_requests_carry_the_status(scripted):
+    url, replies = scripted
+    replies.append((400, {}, '{"status": {"error": "bad vector"}}'))
+    with QdrantREST(url) as client, pytest.raises(QdrantError) as raised:
+        client.request('GET', '/collections/documents')
+    assert raised.value.status_code == 400
+    assert "bad vector" in str(raised.value)
+
+def test_invalid_json_raises_qdrant_error(scripted):
+    url, replies = scripted
+    replies.append((200, {}, "<html>proxy login</html>"))
+    with QdrantREST(url) as client, pytest.raises(QdrantError, match="invalid JSON"):
+        client.request('GET', '/collections')
+
+def test_connection_errors_raise_qdrant_error_after_retries():
+    with QdrantREST(closed_port_url(), max_retries=0) as client, pytest.raises(QdrantError):
+        client.request('GET', '/collections')
+
+def test_other_request_errors_raise_qdrant_error():
+    with QdrantREST("qdrant://localhost:6333") as client, pytest.raises(QdrantError, match="failed"):
+        client.request('GET', '/collections')
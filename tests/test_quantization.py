@@ -0,0 +1,47 @@
+from pathlib import Path
+
+import numpy as np
+
+from quantization import ProductQuantizer, QuantizedIndex, ScalarQuantizer
+from vector_search import VectorIndex, normalize_rows
+
+LEWIS = Path(__file__).resolve().parent.parent / 'data' / 'sources' / 'reading_old_books_lewis_embeddings.jsonl'
+
+def vectors(n=1000, dims=64, seed=0):
+    return normalize_rows(np.random.default_rng(seed).standard_normal((n, dims)).astype(np.float32))
+
+def test_scalar_round_trip_error_is_small():
+    data = vectors()
+    quantizer = ScalarQuantizer.train(data)
+    codes = quantizer.encode(data)
+    assert codes.dtype == np.uint8 and codes.nbytes * 4 == data.nbytes
+    assert np.abs(quantizer.decode(codes) - data).max() < 0.01
+
+def test_product_quantizer_code_size():
+    data = vectors()
+    quantizer = ProductQuantizer.train(data, m=8)
+    assert quantizer.encode(data).shape == (len(data), 8)
+
+def test_full_rescore_matches_exact():
+    data = vectors()
+    ids = [f"p{i}" for i in range(len(data))]
+    exact = VectorIndex(ids, [{}] * len(ids), data)
+    for method in ('sq', 'pq'):
+        index = QuantizedIndex.build(ids, [{}] * len(ids), data, method=method, m=8)
+        assert [h['id'] for h in index.search(data[3], 10, rescore=len(data))] == \
+               [h['id'] for h in exact.search(data[3], 10)]
+
+def test_lewis_embeddings_keep_their_neighbours():
+    index = QuantizedIndex.from_jsonl(str(LEWIS), method='sq')
+    exact = VectorIndex.from_jsonl(str(LEWIS))
+    for point in exact.ids:
+        query = exact.vector(point)
+        assert index.search(query, 5, rescore=0)[0]['id'] == point
+        assert [h['id'] for h in index.search(query, 5)] == [h['id'] for h in exact.search(query, 5)]
+
+def test_save_and_load(tmp_path):
+    index = QuantizedIndex.from_jsonl(str(LEWIS), method='sq')
+    index.save(tmp_path / 'lewis.npz', sources=[LEWIS])
+    loaded = QuantizedIndex.load(tmp_path / 'lewis.npz')
+    query = index.vector(index.ids[2])
+    assert loaded.search(query, 5) == index.search(query, 5)
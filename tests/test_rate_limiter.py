@@ -0,0 +1,91 @@
+import asyncio
+import time
+
+import pytest
+
+from rate_limiter import AdaptiveConcurrency, TokenBucket, parse_duration, remaining_fraction, retry_delay
+
+PLENTY = {"x-ratelimit-limit-requests": "100", "x-ratelimit-remaining-requests": "90"}
+SCARCE = {"x-ratelimit-limit-requests": "100", "x-ratelimit-remaining-requests": "5"}
+
+@pytest.mark.parametrize("value, seconds", [("1.5", 1.5), ("20ms", 0.02), ("6m0s", 360), ("1h2m3.5s", 3723.5),
+                                            (None, None), ("soon", None)])
+def test_parse_duration(value, seconds):
+    assert parse_duration(value) == seconds
+
+def test_retry_delay_honours_retry_after():
+    assert retry_delay(5, {"retry-after": "2"}) == 2
+    assert retry_delay(0, {"retry-after-ms": "250", "retry-after": "9"}) == 0.25
+    assert retry_delay(0, {"retry-after": "600"}, maximum=60) == 60
+    for attempt in range(4):
+        assert 2 ** attempt / 2 <= retry_delay(attempt) <= 2 ** attempt
+
+def test_remaining_fraction_takes_the_scarcest_limit():
+    headers = {**PLENTY, "anthropic-ratelimit-tokens-limit": "1000", "anthropic-ratelimit-tokens-remaining": "100"}
+    assert remaining_fraction(headers) == pytest.approx(0.1)
+    assert remaining_fraction({}) is None
+
+def test_concurrency_shrinks_on_throttle_and_grows_back():
+    controller = AdaptiveConcurrency(8, maximum=8, grow_after=3)
+    controller.on_throttle()
+    controller.on_throttle()
+    assert controller.limit == 2
+    for _ in range(3):
+        controller.on_success(PLENTY)
+    assert controller.limit == 3
+    for _ in range(30):
+        controller.on_success(PLENTY)
+    assert controller.limit == 8
+
+def test_concurrency_holds_or_trims_near_the_limit():
+    controller = AdaptiveConcurrency(4, maximum=8, grow_after=1)
+    controller.on_success({"x-ratelimit-limit-requests": "100", "x-ratelimit-remaining-requests": "40"})
+    assert controller.limit == 4
+    controller.on_success(SCARCE)
+    assert controller.limit == 3
+    controller.on_throttle()
+    controller.on_throttle()
+    controller.on_throttle()
+    assert controller.limit == 1
+
+def test_concurrency_caps_requests_in_flight():
+    controller = AdaptiveConcurrency(2)
+    peak = 0
+    running = 0
+
+    async def request():
+        nonlocal peak, running
+        async with controller:
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+
+    async def run():
+        await asyncio.gather(*(request() for _ in range(8)))
+
+    asyncio.run(run())
+    assert peak == 2
+
+def test_token_bucket_limits_requests_and_tokens():
+    async def timed(bucket, *tokens):
+        started = time.monotonic()
+        for count in tokens:
+            await bucket.acquire(count)
+        return time.monotonic() - started
+
+    # 240 RPM: the bucket starts with a minute's allowance, then admits one request every 0.25s
+    assert asyncio.run(timed(TokenBucket(240), *[0] * 240)) < 0.1
+    assert 0.2 < asyncio.run(timed(TokenBucket(240), *[0] * 241)) < 0.6
+    # 6,000 TPM: 100 tokens per second
+    assert 0.1 < asyncio.run(timed(TokenBucket(6000, 6000), 6000, 20)) < 0.6
+
+def test_token_bucket_pause_delays_the_next_request():
+    async def run():
+        bucket = TokenBucket(600)
+        bucket.pause(0.2)
+        started = time.monotonic()
+        await bucket.acquire()
+        return time.monotonic() - started
+
+    assert 0.15 < asyncio.run(run()) < 0.6
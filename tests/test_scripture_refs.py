@@ -0,0 +1,86 @@
+import random
+
+import numpy as np
+import pytest
+
+from scripture_refs import ScriptureIndex, format_interval, normalize, parse, payload_ranges
+
+@pytest.mark.parametrize("text, expected", [
+    ("Romans 8:1-17", [(45008001, 45008017)]),
+    ("Romans 8", [(45008000, 45008999)]),
+    ("Romans 8:28-9:5", [(45008028, 45009005)]),
+    ("Rom. 8:1–17", [(45008001, 45008017)]),
+    ("Jude 5", [(65001005, 65001005)]),
+    ("Romans", [(45000000, 45999999)]),
+])
+def test_parse_intervals(text, expected):
+    assert parse(text) == expected
+
+@pytest.mark.parametrize("text, expected", [
+    ("1 Cor 13", ["1 Corinthians 13"]),
+    ("I Corinthians 13:4", ["1 Corinthians 13:4"]),
+    ("First Corinthians 13:4-7", ["1 Corinthians 13:4-7"]),
+    ("John 3:16; 1 John 4:8", ["John 3:16", "1 John 4:8"]),
+    ("John 3:16; 4:24", ["John 3:16", "John 4:24"]),
+    ("Gen 1:1, 3, 5-7", ["Genesis 1:1", "Genesis 1:3", "Genesis 1:5-7"]),
+    ("Matt 5:3ff", ["Matthew 5:3ff"]),
+    ("Genesis 1-3", ["Genesis 1-3"]),
+    ("Song of Songs 2:1", ["Song of Solomon 2:1"]),
+])
+def test_normalize_spellings(text, expected):
+    assert normalize(text) == expected
+
+@pytest.mark.parametrize("text, expected", [
+    ("romans 8:1", ["Romans 8:1"]),
+    ("see genesis 1:1 and revelation 22", ["Genesis 1:1", "Revelation 22"]),
+    ("Is 53:5", ["Isaiah 53:5"]),
+    ("Job 38", ["Job 38"]),
+    ("this is 5 and job 3 of 4", []),
+    ("mark 4 on the page", []),
+])
+def test_case_only_decides_ambiguous_aliases(text, expected):
+    assert normalize(text) == expected
+
+@pytest.mark.parametrize("text, expected", [
+    ("Romans 8:1-17 and 12:1", ["Romans 8:1-17", "Romans 12:1"]),
+    ("Rom 5:12 cf. 8:3", ["Romans 5:12", "Romans 8:3"]),
+    ("Romans 8:1 and 3", ["Romans 8:1", "Romans 8:3"]),
+    ("Rom 8:28 and 1 Cor 13", ["Romans 8:28", "1 Corinthians 13"]),
+])
+def test_continuation_keeps_the_book(text, expected):
+    assert normalize(text) == expected
+
+def test_parse_values():
+    assert parse(None) == []
+    assert parse({"reference": "Rom 8:28", "type": "quote"}) == [(45008028, 45008028)]
+    assert parse(["Rom 8:28", "Rom 8:29"]) == [(45008028, 45008029)]
+    assert payload_ranges({"scripture_ranges": [[1, 2]]}) == [(1, 2)]
+    assert payload_ranges({"metadata": {"scripture_refs": ["Jude 5"]}}) == [(65001005, 65001005)]
+
+def test_format_interval_round_trips():
+    for text in ["Romans 8:1-17", "Romans 8", "Genesis 1-3", "Romans 8:28-9:5", "Jude 5"]:
+        assert format_interval(*parse(text)[0]) == text
+
+def test_index_matches_brute_force():
+    rng = random.Random(7)
+    intervals = []
+    for row in range(300):
+        for _ in range(rng.randint(0, 3)):
+            start = rng.randint(0, 10000)
+            intervals.append((start, start + rng.randint(0, 500), row))
+    index = ScriptureIndex(*zip(*intervals), count=300)
+
+    for _ in range(200):
+        start = rng.randint(-100, 10600)
+        end = start + rng.randint(0, 300)
+        expected = sorted({row for s, e, row in intervals if s <= end and e >= start})
+        assert index.query([(start, end)]).tolist() == expected
+        assert np.flatnonzero(index.mask([(start, end)])).tolist() == expected
+
+def test_index_from_payloads():
+    payloads = [{"scripture_refs": ["Rom 8:28"]}, {"scripture_refs": ["Rom 9"]}, {}, {"scripture_refs": "Gen 1:1"}]
+    index = ScriptureIndex.from_payloads(payloads)
+    assert index.query("Romans 8:1-9:1").tolist() == [0, 1]
+    assert index.query("Romans 10").tolist() == []
+    assert index.mask("Genesis 1").tolist() == [False, False, False, True]
+    assert len(ScriptureIndex.from_payloads([{}])) == 0
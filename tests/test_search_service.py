@@ -0,0 +1,71 @@
+import threading
+
+from search_service import QueryEmbedder, SearchService
+from vector_search import VectorIndex
+
+VECTORS = {"grace": [1.0, 0.0, 0.0], "virtue": [0.0, 1.0, 0.0], "slow": [0.0, 0.0, 1.0]}
+
+class BlockingEmbedder:
+    """Embeds from VECTORS, holding the "slow" query until released."""
+
+    def __init__(self):
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self, texts):
+        if texts == ["slow"]:
+            self.started.set()
+            assert self.release.wait(5)
+        return [VECTORS[text] for text in texts]
+
+def make_service(embed):
+    index = VectorIndex(["a", "b"], [{"source_title": "A"}, {"source_title": "B"}],
+                        [[1.0, 0.0, 0.0], [0.0, 1.0, 0.0]])
+    return SearchService(index, QueryEmbedder(embed))
+
+def search_in_thread(service, query):
+    responses = []
+    thread = threading.Thread(target=lambda: responses.append(service.search(query, limit=1)))
+    thread.start()
+    return thread, responses
+
+def test_results_are_cached_until_the_index_changes():
+    service = make_service(BlockingEmbedder())
+    first = service.search("grace", limit=1)
+    assert not first['cached'] and first['results'][0]['id'] == "a"
+    assert service.search("grace", limit=1)['cached']
+
+    service.upsert(["c"], [{"source_title": "C"}], [[1.0, 0.1, 0.0]])
+    assert not service.search("grace", limit=1)['cached']
+    assert service.embedder.stats()['api_calls'] == 1
+
+def test_slow_embedding_does_not_block_other_searches():
+    embedder = BlockingEmbedder()
+    service = make_service(embedder)
+    service.search("grace", limit=1)
+
+    thread, _ = search_in_thread(service, "slow")
+    try:
+        assert embedder.started.wait(5)
+        cached, responses = search_in_thread(service, "grace")
+        cached.join(2)
+        assert not cached.is_alive() and responses[0]['cached']
+        assert service.search("virtue", limit=1)['results'][0]['id'] == "b"
+        assert service.delete(["b"]) == 1
+    finally:
+        embedder.release.set()
+        thread.join(5)
+
+def test_result_computed_across_an_update_is_cached_for_the_new_version():
+    embedder = BlockingEmbedder()
+    service = make_service(embedder)
+
+    thread, responses = search_in_thread(service, "slow")
+    assert embedder.started.wait(5)
+    service.upsert(["c"], [{"source_title": "C"}], [[0.0, 0.0, 1.0]])
+    embedder.release.set()
+    thread.join(5)
+
+    assert responses[0]['results'][0]['id'] == "c"
+    again = service.search("slow", limit=1)
+    assert again['cached'] and again['results'][0]['id'] == "c"
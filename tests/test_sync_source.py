@@ -0,0 +1,84 @@
+import json
+
+import pytest
+
+import sync_source
+from bulk_upload import upload_file
+from qdrant_rest import QdrantREST
+from sync_source import plan_sync
+
+def chunk(index, **changes):
+    row = {"source_title": "On Reading Old Books", "author": "C. S. Lewis", "year": "1944", "genre": "Essay",
+           "chunk_index": index, "content": f"Paragraph {index} about old books.",
+           "embedding": [1.0, float(index), 0.5, 0.25],
+           "metadata": {"source_type": "essay", "topics": ["reading"], "scripture_refs": None}}
+    row.update(changes)
+    return row
+
+def write_source(path, chunks):
+    path.write_text(''.join(json.dumps(c) + '\n' for c in chunks), encoding='utf-8')
+
+def stored_payloads(url):
+    with QdrantREST(url) as client:
+        return {point['payload']['chunk_id']: point['payload'] for point in client.scroll('documents')}
+
+@pytest.fixture
+def manifests(tmp_path, monkeypatch):
+    monkeypatch.setattr(sync_source, 'MANIFEST_DIR', tmp_path / 'sync')
+
+@pytest.fixture
+def uploaded(tmp_path, qdrant):
+    """A six-chunk source uploaded with --source-id 42."""
+    path = tmp_path / 'reading_old_books_lewis_embeddings.jsonl'
+    write_source(path, [chunk(i) for i in range(6)])
+    upload_file(str(path), url=qdrant, source_id='42', create=True)
+    return path
+
+def test_plan_sync():
+    points = {"a": {"id": "1", "payload": {"content": "same", "x": 1}},
+              "b": {"id": "2", "payload": {"content": "new text", "x": 1}},
+              "c": {"id": "3", "payload": {"content": "same", "x": 2}},
+              "d": {"id": "4", "payload": {"content": "fresh"}}}
+    manifest = {key: {"point_id": str(i), "content_hash": sync_source.content_hash("same"),
+                      "payload_hash": sync_source.payload_hash({"content": "same", "x": 1})}
+                for i, key in enumerate("abce", 1)}
+    plan = plan_sync(points, manifest)
+    assert plan == {"upsert": ["b", "d"], "payload": ["c"], "delete": ["4"], "unchanged": 1}
+
+def test_unchanged_file_after_bulk_upload_is_in_sync(uploaded, qdrant, manifests):
+    plan = sync_source.sync_source(str(uploaded), url=qdrant)
+    assert plan['payload'] == [] and plan['upsert'] == [] and plan['delete'] == []
+    assert plan['unchanged'] == 6
+    assert all(payload['source_id'] == '42' for payload in stored_payloads(qdrant).values())
+
+def test_payload_update_keeps_source_id(uploaded, qdrant, manifests):
+    sync_source.sync_source(str(uploaded), url=qdrant)
+    with QdrantREST(qdrant) as client:
+        point = next(iter(client.scroll('documents')))
+        client.batch_update('documents', [{"set_payload": {"payload": {"note": "kept"}, "points": [point['id']]}}])
+    changed = [chunk(i) for i in range(6)]
+    for row in changed:
+        row['metadata']['topics'] = ["reading", "humility"]
+    write_source(uploaded, changed)
+
+    plan = sync_source.sync_source(str(uploaded), url=qdrant)
+    assert len(plan['payload']) == 6 and plan['upsert'] == []
+    payloads = stored_payloads(qdrant)
+    assert all(payload['source_id'] == '42' for payload in payloads.values())
+    assert all(payload['topics'] == ["reading", "humility"] for payload in payloads.values())
+    assert payloads[point['payload']['chunk_id']]['note'] == 'kept'
+
+def test_new_chunks_get_source_id_from_manifest(uploaded, qdrant, manifests):
+    sync_source.sync_source(str(uploaded), url=qdrant)
+    write_source(uploaded, [chunk(i) for i in range(5)] + [chunk(9, content="A new paragraph.")])
+    plan = sync_source.sync_source(str(uploaded), url=qdrant)
+    assert plan['upsert'] == ['lewis_reading_old_books_9'] and len(plan['delete']) == 1
+    assert stored_payloads(qdrant)['lewis_reading_old_books_9']['source_id'] == '42'
+
+def test_explicit_source_id(tmp_path, qdrant, manifests):
+    path = tmp_path / 'reading_old_books_lewis_embeddings.jsonl'
+    write_source(path, [chunk(i) for i in range(3)])
+    upload_file(str(path), url=qdrant, create=True)
+    plan = sync_source.sync_source(str(path), url=qdrant, source_id='7')
+    assert len(plan['payload']) == 3
+    assert all(payload['source_id'] == '7' for payload in stored_payloads(qdrant).values())
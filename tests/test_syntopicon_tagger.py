@@ -0,0 +1,111 @@
+import random
+
+from syntopicon_tagger import MIN_PATTERN_LENGTH, TermAutomaton, normalize_pattern, normalize_text, tag_chunk
+
+TAXONOMY = {"syntopicon_taxonomy": {"concepts": [
+    {"name": "One and Many", "terms": ["The One", "The One and the Many", "one and the many", "many"],
+     "topics": ["The one and the many in being"]},
+    {"name": "Art", "terms": ["Art", "art of war", "Ars longa"], "topics": []},
+    {"name": "War and Peace", "terms": ["War", "art of war", "war of all against all", "Pax"], "topics": []},
+    {"name": "Wisdom", "terms": ["“Know thyself”", "self-knowledge", "Know", "ox"], "topics": []},
+]}}
+
+WORDS = ["the", "one", "and", "many", "art", "article", "of", "war", "warfare", "all", "against", "know",
+         "thyself", "self-knowledge", "“know", "thyself”", "ars", "longa", "pax", "ox", "box", "being",
+         "in", "The", "One", "ART", "War"]
+
+def patterns():
+    for concept in TAXONOMY['syntopicon_taxonomy']['concepts']:
+        for kind, key in (('term', 'terms'), ('topic', 'topics')):
+            for phrase in concept[key]:
+                if len(normalize_pattern(phrase)) >= MIN_PATTERN_LENGTH:
+                    yield normalize_pattern(phrase), concept['name'], kind
+
+def naive_find(text):
+    """Every word-bounded occurrence of every pattern, by brute-force substring search."""
+    folded = normalize_text(text)
+    found = set()
+    for pattern in {pattern for pattern, _, _ in patterns()}:
+        start = folded.find(pattern)
+        while start != -1:
+            end = start + len(pattern)
+            left_ok = not pattern[0].isalnum() or start == 0 or not folded[start - 1].isalnum()
+            right_ok = not pattern[-1].isalnum() or end == len(folded) or not folded[end].isalnum()
+            if left_ok and right_ok:
+                found.add((start, end, pattern))
+            start = folded.find(pattern, start + 1)
+    return found
+
+def naive_hits(text):
+    """Hits per concept, not counting a match nested inside a longer one of the same concept."""
+    spans = {}
+    for start, end, pattern in naive_find(text):
+        for other, concept, _ in patterns():
+            if other == pattern:
+                spans.setdefault(concept, set()).add((start, end))
+    hits = {}
+    for concept, matches in spans.items():
+        covered_to = -1
+        for start, end in sorted(matches, key=lambda m: (m[0], -m[1])):
+            if end > covered_to:
+                hits[concept] = hits.get(concept, 0) + 1
+                covered_to = end
+    return hits
+
+def automaton_find(automaton, text):
+    return {(start, end, automaton.patterns[pattern_id]) for start, end, pattern_id in automaton.find(text)}
+
+def check(automaton, text):
+    assert automaton_find(automaton, text) == naive_find(text), text
+    candidates = automaton.candidates(text)
+    assert {c['concept']: c['hits'] for c in candidates} == naive_hits(text), text
+    for candidate in candidates:
+        for match in candidate['matches']:
+            assert normalize_text(text[match['start']:match['end']]) == normalize_text(match['text'])
+
+def test_overlapping_and_nested_terms():
+    automaton = TermAutomaton.from_taxonomy(TAXONOMY)
+    text = "The One and the Many: the one and the many in being, and the art of war is war of all against all."
+    check(automaton, text)
+
+    hits = {c['concept']: c for c in automaton.candidates(text)}
+    # "The One", "one and the many" and "many" nest inside "The One and the Many", and the second
+    # "the one and the many" inside the topic "the one and the many in being"
+    assert [m['text'] for m in hits["One and Many"]['matches']] == [
+        "The One and the Many", "the one and the many in being"]
+    assert [m['text'] for m in hits["War and Peace"]['matches']] == ["art of war", "war of all against all"]
+
+def test_word_boundaries():
+    automaton = TermAutomaton.from_taxonomy(TAXONOMY)
+    text = "An article on warfare, a box of artifacts; ART. War! Pax-romana"
+    check(automaton, text)
+    found = {(text[start:end], automaton.patterns[pattern_id]) for start, end, pattern_id in automaton.find(text)}
+    assert found == {("ART", "art"), ("War", "war"), ("Pax", "pax")}
+
+def test_typographic_punctuation_and_case():
+    automaton = TermAutomaton.from_taxonomy(TAXONOMY)
+    text = "He said “KNOW THYSELF” and \"know thyself\"; self–knowledge is Self-Knowledge."
+    check(automaton, text)
+    [wisdom] = automaton.candidates(text)
+    assert [m['text'] for m in wisdom['matches']] == [
+        "“KNOW THYSELF”", "\"know thyself\"", "self–knowledge", "Self-Knowledge"]
+
+def test_matches_naive_scan_on_random_text():
+    automaton = TermAutomaton.from_taxonomy(TAXONOMY)
+    rng = random.Random(1)
+    for _ in range(300):
+        text = ''.join(rng.choice(WORDS) + rng.choice([" ", " ", ", ", "-", "", ".\n"])
+                       for _ in range(rng.randint(1, 25)))
+        check(automaton, text)
+
+def test_short_patterns_are_not_tagged():
+    automaton = TermAutomaton.from_taxonomy(TAXONOMY)
+    assert "ox" not in automaton.patterns
+    assert automaton.candidates("an ox in a box") == []
+
+def test_apply_merges_tags_in_the_existing_shape():
+    automaton = TermAutomaton.from_taxonomy(TAXONOMY)
+    chunk = {"content": "Ars longa, and war.", "metadata": {"syntopicon_tags": [{"concept": "Art"}]}}
+
+    assert tag_chunk(automaton, chunk, apply=True) == 2
+    assert chunk['metadata']['syntopicon_tags'] == [{"concept": "Art"}, {"concept": "War and Peace"}]
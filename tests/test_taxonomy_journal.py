@@ -0,0 +1,77 @@
+import pytest
+
+from taxonomy_journal import ConceptJournal, compact, journal_path, load_taxonomy, patch_taxonomy_text
+from taxonomy_loader import parse_taxonomy
+
+TAXONOMY = '''{
+  "syntopicon_taxonomy": {
+    "version": "3.0",
+    "concepts_completed": 2,
+    "concepts": [
+      {
+        "id": "angel",
+        "name": "Angel",
+        "domains": ["metaphysics"],
+        "terms": [
+          "Seraphim",
+          "To Hen", // Greek for "The One"
+        ]
+      },
+      {
+        "id": "animal",
+        "name": "Animal",
+        "terms": ["Instinct"]
+      }
+    ]
+  }
+}
+'''
+
+@pytest.fixture
+def taxonomy_file(tmp_path):
+    path = tmp_path / 'syntopicon_taxonomy.json'
+    path.write_text(TAXONOMY, encoding='utf-8')
+    return path
+
+def test_loader_keeps_inline_comments_as_sources():
+    concept = parse_taxonomy(TAXONOMY)["syntopicon_taxonomy"]["concepts"][0]
+    assert concept["terms"] == ["Seraphim", "To Hen"]
+    assert concept["term_sources"] == {"To Hen": 'Greek for "The One"'}
+
+def test_journal_is_merged_on_load(taxonomy_file):
+    with ConceptJournal(taxonomy_file) as journal:
+        journal.append({"id": "art", "name": "Art", "terms": ["Mimesis"]})
+    names = [c["name"] for c in load_taxonomy(taxonomy_file)["syntopicon_taxonomy"]["concepts"]]
+    assert names == ["Angel", "Animal", "Art"]
+    assert taxonomy_file.read_text(encoding='utf-8') == TAXONOMY
+
+def test_compact_appends_without_touching_existing_text(taxonomy_file):
+    journal = ConceptJournal(taxonomy_file)
+    journal.append({"id": "art", "name": "Art", "terms": ["Mimesis"]})
+    assert journal.compact() == 1
+
+    text = taxonomy_file.read_text(encoding='utf-8')
+    assert not journal_path(taxonomy_file).exists()
+    assert '"To Hen", // Greek for "The One"' in text
+    assert '"domains": ["metaphysics"]' in text
+    assert 'term_sources' not in text
+    assert text.startswith(TAXONOMY.split('"concepts_completed"')[0] + '"concepts_completed": 3')
+    taxonomy = parse_taxonomy(text)["syntopicon_taxonomy"]
+    assert [c["name"] for c in taxonomy["concepts"]] == ["Angel", "Animal", "Art"]
+
+def test_compact_replaces_regenerated_concept(taxonomy_file):
+    with ConceptJournal(taxonomy_file) as journal:
+        journal.append({"id": "animal", "name": "Animal", "terms": ["Old"]})
+        journal.append({"id": "animal", "name": "Animal", "terms": ["Sensation", "Locomotion"]})
+    compact(taxonomy_file, backup=True)
+
+    text = taxonomy_file.read_text(encoding='utf-8')
+    assert '// Greek for "The One"' in text
+    concepts = parse_taxonomy(text)["syntopicon_taxonomy"]["concepts"]
+    assert concepts[1] == {"id": "animal", "name": "Animal", "terms": ["Sensation", "Locomotion"]}
+    assert len(list(taxonomy_file.parent.glob('syntopicon_taxonomy_backup_*.json'))) == 1
+
+def test_patch_into_empty_concepts_array():
+    text = '{\n  "syntopicon_taxonomy": {\n    "concepts_completed": 0,\n    "concepts": []\n  }\n}\n'
+    patched = patch_taxonomy_text(text, [{"name": "Art"}])
+    assert parse_taxonomy(patched)["syntopicon_taxonomy"] == {"concepts_completed": 1, "concepts": [{"name": "Art"}]}
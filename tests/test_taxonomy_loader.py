@@ -0,0 +1,111 @@
+import os
+
+import pytest
+
+import taxonomy_loader
+from taxonomy_loader import cache_path, load_taxonomy_file
+
+TAXONOMY = '''{
+  "syntopicon_taxonomy": {
+    "concepts": [
+      {
+        "name": "Angel",
+        "terms": [
+          "Ministering spirits", // Hebrews 1:14
+          "Separate substances",
+        ],
+      }
+    ]
+  }
+}
+'''
+
+@pytest.fixture
+def taxonomy_file(tmp_path):
+    path = tmp_path / 'taxonomy.json'
+    path.write_text(TAXONOMY, encoding='utf-8')
+    return path
+
+@pytest.fixture
+def parses(monkeypatch):
+    """Count calls to parse_taxonomy."""
+    calls = []
+    parse = taxonomy_loader.parse_taxonomy
+
+    def counting_parse(text):
+        calls.append(text)
+        return parse(text)
+    monkeypatch.setattr(taxonomy_loader, 'parse_taxonomy', counting_parse)
+    return calls
+
+def load(path, tmp_path):
+    return load_taxonomy_file(path, cache_dir=tmp_path / 'cache')
+
+def angel(taxonomy):
+    return taxonomy['syntopicon_taxonomy']['concepts'][0]
+
+def test_comments_become_sources(taxonomy_file, tmp_path):
+    concept = angel(load(taxonomy_file, tmp_path))
+    assert concept['terms'] == ["Ministering spirits", "Separate substances"]
+    assert concept['term_sources'] == {"Ministering spirits": "Hebrews 1:14"}
+
+def test_unchanged_size_and_mtime_skip_reading_the_file(taxonomy_file, tmp_path, parses):
+    load(taxonomy_file, tmp_path)
+    stat = taxonomy_file.stat()
+    # Same size and mtime, different content: the cache is trusted without reading the file
+    taxonomy_file.write_text(TAXONOMY.replace("Angel", "Devil"), encoding='utf-8')
+    os.utime(taxonomy_file, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+    assert angel(load(taxonomy_file, tmp_path))['name'] == "Angel"
+    assert len(parses) == 1
+
+def test_touched_file_with_same_content_uses_sha256(taxonomy_file, tmp_path, parses):
+    load(taxonomy_file, tmp_path)
+    stat = taxonomy_file.stat()
+    os.utime(taxonomy_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+    assert angel(load(taxonomy_file, tmp_path))['name'] == "Angel"
+    assert len(parses) == 1
+    # The cache now carries the new mtime, so the next load takes the shortcut again
+    assert taxonomy_loader._read_cache(cache_path(taxonomy_file, tmp_path / 'cache'))['mtime_ns'] == \
+        stat.st_mtime_ns + 10**9
+
+def test_changed_content_is_reparsed(taxonomy_file, tmp_path, parses):
+    load(taxonomy_file, tmp_path)
+    stat = taxonomy_file.stat()
+    taxonomy_file.write_text(TAXONOMY.replace("Angel", "Devil"), encoding='utf-8')
+    os.utime(taxonomy_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+    assert angel(load(taxonomy_file, tmp_path))['name'] == "Devil"
+    assert len(parses) == 2
+
+def test_cache_format_bump_invalidates_the_cache(taxonomy_file, tmp_path, parses, monkeypatch):
+    load(taxonomy_file, tmp_path)
+    monkeypatch.setattr(taxonomy_loader, 'CACHE_FORMAT', taxonomy_loader.CACHE_FORMAT + 1)
+
+    load(taxonomy_file, tmp_path)
+    load(taxonomy_file, tmp_path)
+
+    assert len(parses) == 2
+
+def test_each_call_returns_a_fresh_object(taxonomy_file, tmp_path):
+    first = load(taxonomy_file, tmp_path)
+    angel(first)['terms'].append("Guardian angels")
+
+    second = load(taxonomy_file, tmp_path)
+    third = load(taxonomy_file, tmp_path)
+
+    assert second is not third
+    assert angel(second)['terms'] == ["Ministering spirits", "Separate substances"]
+
+def test_unreadable_cache_is_reparsed(taxonomy_file, tmp_path, parses):
+    load(taxonomy_file, tmp_path)
+    cache_path(taxonomy_file, tmp_path / 'cache').write_bytes(b'not a pickle')
+
+    assert angel(load(taxonomy_file, tmp_path))['name'] == "Angel"
+    assert len(parses) == 2
+
+def test_no_cache_writes_nothing(taxonomy_file, tmp_path, monkeypatch):
+    monkeypatch.setenv('TAXONOMY_CACHE_DIR', str(tmp_path / 'cache'))
+    load_taxonomy_file(taxonomy_file, use_cache=False)
+    assert not (tmp_path / 'cache').exists()
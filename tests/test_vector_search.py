@@ -0,0 +1,48 @@
+from pathlib import Path
+
+import numpy as np
+
+from bulk_upload import qdrant_point
+from convert_to_qdrant import loads
+from vector_search import PrefixIndex, VectorIndex, top_k
+
+SOURCES = Path(__file__).resolve().parent.parent / 'data' / 'sources'
+EMBEDDINGS = SOURCES / 'reading_old_books_lewis_embeddings.jsonl'
+QDRANT_READY = SOURCES / 'reading_old_books_lewis_qdrant.jsonl'
+
+def random_index(n=500, dims=32, seed=0):
+    rng = np.random.default_rng(seed)
+    return VectorIndex([f"p{i}" for i in range(n)], [{"i": i} for i in range(n)],
+                       rng.standard_normal((n, dims)).astype(np.float32))
+
+def test_top_k_orders_best_first():
+    scores = np.array([[0.1, 0.9, 0.5, 0.7], [0.4, 0.3, 0.2, 0.1]])
+    assert top_k(scores, 2).tolist() == [[1, 3], [0, 1]]
+    assert top_k(scores, 10).shape == (2, 4)
+
+def test_exact_search_matches_brute_force():
+    index = random_index()
+    query = np.random.default_rng(1).standard_normal(32)
+    expected = np.argsort(-(index.vectors @ (query / np.linalg.norm(query))))[:5]
+    assert [hit['id'] for hit in index.search(query, 5)] == [f"p{i}" for i in expected]
+
+def test_prefix_search_with_full_rerank_matches_exact():
+    index = random_index(dims=64)
+    prefix = PrefixIndex(index.ids, index.payloads, index.vectors, prefix_dims=16)
+    query = index.vectors[7]
+    assert [hit['id'] for hit in prefix.search(query, 5, rerank=len(index))] == \
+           [hit['id'] for hit in index.search(query, 5)]
+
+def test_local_ids_join_with_qdrant_chunk_ids():
+    raw = VectorIndex.from_jsonl(str(EMBEDDINGS))
+    converted = VectorIndex.from_jsonl(str(QDRANT_READY))
+    assert raw.ids == converted.ids
+    assert raw.ids[0] == "lewis_reading_old_books_0"
+    with open(EMBEDDINGS, 'rb') as f:
+        first = loads(f.readline())
+    assert qdrant_point(first, "unused")['payload']['chunk_id'] == raw.ids[0]
+
+def test_raw_file_ids_fall_back_to_file_slug(tmp_path):
+    path = tmp_path / 'notes_embeddings.jsonl'
+    path.write_text('{"chunk_index": 2, "content": "x", "embedding": [1.0, 0.0]}\n', encoding='utf-8')
+    assert VectorIndex.from_jsonl(str(path)).ids == ["notes_2"]
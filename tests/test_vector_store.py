@@ -0,0 +1,63 @@
+import json
+
+import numpy as np
+import pytest
+
+from vector_store import (HEADER_SIZE, VectorWriter, convert_layout, iter_chunks, load_embeddings, open_vectors,
+                          sidecar_path)
+
+def test_header_is_fixed_size_and_tracks_flushed_rows(tmp_path):
+    path = tmp_path / 'book.vectors.npy'
+    writer = VectorWriter(path)
+    assert writer.append([1.0, 2.0, 3.0]) == 0
+    assert writer.append([4.0, 5.0, 6.0]) == 1
+    writer.flush()
+    assert open_vectors(path).shape == (2, 3)
+    writer.append([7.0, 8.0, 9.0])
+    # Rows appended since the last flush are not in the header yet
+    assert np.load(path, mmap_mode='r').shape == (2, 3)
+    writer.close()
+
+    with open(path, 'rb') as f:
+        assert f.read(HEADER_SIZE).endswith(b'\n')
+    assert np.load(path).tolist() == [[1, 2, 3], [4, 5, 6], [7, 8, 9]]
+
+def test_rejects_mismatched_dimensions(tmp_path):
+    with VectorWriter(tmp_path / 'v.npy') as writer:
+        writer.append([1.0, 2.0])
+        with pytest.raises(ValueError, match="2-dimensional"):
+            writer.append([1.0, 2.0, 3.0])
+
+def test_resume_truncates_rows_past_the_jsonl_checkpoint(tmp_path):
+    path = tmp_path / 'v.npy'
+    with VectorWriter(path, 'float16') as writer:
+        for i in range(4):
+            writer.append([float(i)] * 4)
+    with open(path, 'ab') as f:
+        f.write(b'\x00' * 5)
+
+    # The JSONL only references the first two rows
+    with VectorWriter(path, 'float32', resume_rows=2) as writer:
+        assert writer.dtype == np.float16
+        assert writer.append([9.0] * 4) == 2
+    assert np.load(path).tolist() == [[0.0] * 4, [1.0] * 4, [9.0] * 4]
+
+def test_layouts_round_trip(tmp_path):
+    inline = tmp_path / 'book_embeddings.jsonl'
+    chunks = [{"chunk_index": i, "content": f"p{i}", "embedding": [float(i), 1.0]} for i in range(3)]
+    chunks.append({"chunk_index": 3, "content": "pending", "embedding": None})
+    inline.write_text(''.join(json.dumps(c) + '\n' for c in chunks), encoding='utf-8')
+
+    store = tmp_path / 'book_store.jsonl'
+    assert convert_layout(inline, store, 'store') == 4
+    rows = [json.loads(line) for line in store.read_text(encoding='utf-8').splitlines()]
+    assert [row.get('embedding_row') for row in rows] == [0, 1, 2, None]
+    assert open_vectors(sidecar_path(store)).shape == (3, 2)
+
+    back = tmp_path / 'book_inline.jsonl'
+    convert_layout(store, back, 'inline')
+    assert [chunk for _, chunk in iter_chunks(back)] == chunks
+
+    rows, matrix = load_embeddings(store)
+    assert isinstance(matrix, np.memmap) and matrix.tolist() == [[0.0, 1.0], [1.0, 1.0], [2.0, 1.0]]
+    assert [row['chunk_index'] for row in rows] == [0, 1, 2]